@@ -18,6 +18,24 @@ export default function AdminUsers({ user }) {
   const [selectAll, setSelectAll] = useState(false)
   const [originalMap, setOriginalMap] = useState({})
   const [bulkRole, setBulkRole] = useState('nutritionist')
+  const [nextUrl, setNextUrl] = useState(null)
+
+  function listUrl(q) {
+    // `cursor=` opts into keyset pagination (cheap deep pages, no COUNT)
+    const params = new URLSearchParams({ cursor: '' })
+    if (q) params.set('search', q)
+    return `${API_BASE}/api/auth/admin/users/?${params}`
+  }
+
+  function loadMore() {
+    fetch(nextUrl, { headers: authHeaders() })
+      .then(r => r.json())
+      .then(d => {
+        setUsers(prev => prev.concat(d.results))
+        setOriginalMap(m => { const next = { ...m }; d.results.forEach(u => { next[u.id] = { ...u } }); return next })
+        setNextUrl(d.next)
+      }).catch(e => showToast({ message: String(e), type: 'error' }))
+  }
 
   useEffect(() => {
     if (!user || !(user.role === 'admin' || (user.admin_level && user.admin_level >= 50))) {
@@ -25,17 +43,19 @@ export default function AdminUsers({ user }) {
       setLoading(false)
       return
     }
-    const url = query ? `${API_BASE}/api/auth/admin/users/?search=${encodeURIComponent(query)}` : `${API_BASE}/api/auth/admin/users/`
-    fetch(url, { headers: authHeaders() })
+    fetch(listUrl(query), { headers: authHeaders() })
       .then(r => {
         if (!r.ok) throw new Error(r.statusText)
         return r.json()
       })
       .then(data => {
-        setUsers(data)
+        // list endpoint is paginated ({count, results}); search is server-side
+        const rows = data.results || data
+        setUsers(rows)
+        setNextUrl(data.next || null)
         // capture original state for undo
         const map = {}
-        data.forEach(u => { map[u.id] = { ...u } })
+        rows.forEach(u => { map[u.id] = { ...u } })
         setOriginalMap(map)
         setLoading(false)
       }).catch(e => { setError(String(e)); setLoading(false) })
@@ -128,7 +148,7 @@ export default function AdminUsers({ user }) {
       <h2>Admin: Manage Users</h2>
       <div style={{ marginBottom: 12 }}>
         <input placeholder="Search username/email" value={query} onChange={e => setQuery(e.target.value)} style={{ width: 300 }} />
-        <button onClick={() => { setLoading(true); setError(null); fetch(`${API_BASE}/api/auth/admin/users/?search=${encodeURIComponent(query)}`, { headers: authHeaders() }).then(r => r.json()).then(d => { setUsers(d); setLoading(false) }).catch(e => { setError(String(e)); setLoading(false) }) }} style={{ marginLeft: 8 }}>Search</button>
+        <button onClick={() => { setLoading(true); setError(null); fetch(listUrl(query), { headers: authHeaders() }).then(r => r.json()).then(d => { setUsers(d.results || d); setNextUrl(d.next || null); setLoading(false) }).catch(e => { setError(String(e)); setLoading(false) }) }} style={{ marginLeft: 8 }}>Search</button>
         <select value={bulkRole} onChange={e => setBulkRole(e.target.value)} style={{ marginLeft: 12 }}>
           <option value="nutritionist">Nutritionist</option>
           <option value="regulator">Regulator</option>
@@ -181,6 +201,7 @@ export default function AdminUsers({ user }) {
           ))}
         </tbody>
       </table>
+      {nextUrl && <button onClick={loadMore} style={{ marginTop: 12 }}>Load more</button>}
     </div>
   )
 }
@@ -12,6 +12,29 @@ export default function AdminVerifications({ user }) {
   const [requests, setRequests] = useState([])
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState(null)
+  // keyset pagination: the list endpoint returns `next` when more rows exist
+  const [nextUrl, setNextUrl] = useState(null)
+  // status/role counts come from the server instead of the downloaded rows
+  const [summary, setSummary] = useState(null)
+
+  function loadSummary() {
+    return fetch(`${API_BASE}/api/auth/verification/requests/summary/`, { headers: authHeaders() })
+      .then(r => r.ok ? r.json() : null)
+      .then(d => setSummary(d))
+      .catch(() => setSummary(null))
+  }
+
+  function loadPage(url, append) {
+    return fetch(url, { headers: authHeaders() })
+      .then(r => {
+        if (!r.ok) throw new Error(r.statusText)
+        return r.json()
+      }).then(d => {
+        setRequests(reqs => append ? reqs.concat(d.results) : d.results)
+        setNextUrl(d.next)
+        setLoading(false)
+      }).catch(e => { setError(String(e)); setLoading(false) })
+  }
 
   useEffect(() => {
     if (!user || !(user.role === 'admin' || (user.admin_level && user.admin_level >= 50))) {
@@ -19,11 +42,8 @@ export default function AdminVerifications({ user }) {
       setLoading(false)
       return
     }
-    fetch(`${API_BASE}/api/auth/verification/requests/`, { headers: authHeaders() })
-      .then(r => {
-        if (!r.ok) throw new Error(r.statusText)
-        return r.json()
-      }).then(d => { setRequests(d); setLoading(false) }).catch(e => { setError(String(e)); setLoading(false) })
+    loadPage(`${API_BASE}/api/auth/verification/requests/?cursor=`, false)
+    loadSummary()
   }, [user])
 
   async function review(id, status) {
@@ -36,6 +56,7 @@ export default function AdminVerifications({ user }) {
       if (!res.ok) throw new Error(await res.text())
       const updated = await res.json()
       setRequests(reqs => reqs.map(r => r.id === updated.id ? updated : r))
+      loadSummary()
       showToast({ message: `Request ${id} ${status}`, type: 'success' })
     } catch (e) {
       setError(String(e))
@@ -50,6 +71,14 @@ export default function AdminVerifications({ user }) {
     <div style={{ maxWidth: 900 }}>
       <ToastContainer />
       <h2>Verification Requests</h2>
+      {summary && (
+        <div style={{ marginBottom: 12 }}>
+          {Object.entries(summary.by_status).map(([k, n]) => <span key={k} style={{ marginRight: 16 }}>{k}: {n}</span>)}
+          <span style={{ marginLeft: 8, color: '#666' }}>
+            ({Object.entries(summary.by_role).map(([k, n]) => `${k} ${n}`).join(', ')})
+          </span>
+        </div>
+      )}
       <table style={{ width: '100%', borderCollapse: 'collapse' }}>
         <thead>
           <tr>
@@ -77,6 +106,7 @@ export default function AdminVerifications({ user }) {
           ))}
         </tbody>
       </table>
+      {nextUrl && <button onClick={() => loadPage(nextUrl, true)} style={{ marginTop: 12 }}>Load more</button>}
     </div>
   )
 }
@@ -0,0 +1,9 @@
+"""Performance benchmarks for KitchenKonnect.
+
+Each module is runnable from the `kitchen_konnect/` directory, e.g.
+
+    python -m benchmarks.pagination --rows 250000
+
+Benchmarks run against a throwaway test database (created and destroyed by
+`benchmarks.harness.test_database`), never against `db.sqlite3`.
+"""
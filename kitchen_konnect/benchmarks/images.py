@@ -0,0 +1,90 @@
+"""Photo uploads: what the request pays against the variant rendering it hands off.
+
+Stores `--photos` synthetic JPEG photos of each `--size` through
+`store_image` (hash, check and file the original: the upload request's
+share) and times rendering their variants (`render_variants`) inline and
+on a pool of `--workers` processes:
+
+    python -m benchmarks.images --size 1200 3000 --photos 8 --workers 2
+"""
+import argparse
+import os
+import tempfile
+import time
+from io import BytesIO
+from unittest import mock
+
+from benchmarks.harness import format_row, measure, setup_django, summarize, test_database
+
+
+def synthetic_jpeg(size, seed):
+    from PIL import Image
+
+    width, height = size, size * 3 // 4
+    # a gradient with noise, so the encoder has real work
+    img = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    noise = Image.effect_noise((width, height), 40 + seed).convert('RGB')
+    out = BytesIO()
+    Image.blend(img, noise, 0.3).save(out, 'JPEG', quality=90)
+    return out.getvalue()
+
+
+def bench(args):
+    from django.test import override_settings
+
+    from core import images
+
+    for size in args.size:
+        photos = [synthetic_jpeg(size, seed) for seed in range(args.photos)]
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media, IMAGE_WORKERS=args.workers):
+            digests = []
+
+            def upload():
+                # trailing bytes make every upload new rather than deduplicated
+                count = len(digests)
+                data = photos[count % len(photos)] + count.to_bytes(4, 'big')
+                digests.append(images.store_image(BytesIO(data)).digest)
+
+            # rendering is timed separately below
+            with mock.patch.object(images, 'schedule_variants'):
+                stored = summarize(measure(upload, repeat=args.photos, warmup=1))
+            print(format_row(f'{size}px upload (store original)', stored, f'{len(photos[0]) / 1024:.0f} KiB'))
+
+            start = time.perf_counter()
+            for digest in digests:
+                images.render_variants(images.image_path(digest, 'original.jpg'), images.image_path(digest, ''))
+            inline = time.perf_counter() - start
+            print(f'{size}px variants inline: {inline / len(digests) * 1000:.1f} ms/photo')
+
+            for digest in digests:
+                for name in os.listdir(images.image_path(digest, '')):
+                    if name != 'original.jpg':
+                        os.remove(images.image_path(digest, name))
+            if args.workers:
+                pool = images.get_image_executor()
+                # workers started before timing
+                list(pool.map(abs, range(args.workers)))
+                start = time.perf_counter()
+                futures = [images.schedule_variants(digest, 'jpg') for digest in digests]
+                for future in futures:
+                    future.result()
+                pooled = time.perf_counter() - start
+                print(f'{size}px variants on {args.workers} workers: {pooled / len(digests) * 1000:.1f} ms/photo')
+                pool.shutdown()
+                images._executor = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', type=int, nargs='+', default=[1200, 3000])
+    parser.add_argument('--photos', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=2)
+    args = parser.parse_args(argv)
+
+    setup_django()
+    with test_database():
+        bench(args)
+
+
+if __name__ == '__main__':
+    main()
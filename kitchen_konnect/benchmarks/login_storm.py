@@ -0,0 +1,137 @@
+"""`/me/` latency during a login storm, sync vs async auth views.
+
+Drives the ASGI application in process (httpx `ASGITransport`) with
+`--concurrency` clients posting to `/api/auth/token/` while one client polls
+`/api/auth/me/` with a DRF token, and reports `/me/` latency at rest and
+during the storm for both configurations:
+
+    python -m benchmarks.login_storm --logins 200 --concurrency 32
+
+Each configuration runs in a child process because `users/urls.py` reads
+`ASYNC_AUTH_VIEWS` at import time. With the sync views every login hashes
+on its own request thread, so the storm competes with `/me/` for every CPU;
+the async views queue hashing on `PASSWORD_HASH_WORKERS` threads.
+
+`--shedding on` keeps the auth throttles and the hashing concurrency limit
+(see `core/throttling.py`) at their configured values, so most of the storm
+is answered 429/503 without hashing; `off` disables both. The storm uses a
+new username per login, as credential stuffing does.
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.harness import format_row, setup_django, summarize, test_database
+
+ME_URL = '/api/auth/me/'
+TOKEN_URL = '/api/auth/token/'
+PASSWORD = 'storm-password-123'
+
+
+def seed():
+    from django.contrib.auth import get_user_model
+    from users.models import AuthToken
+
+    User = get_user_model()
+    User.objects.create_user(username='storm', email='storm@example.com', password=PASSWORD)
+    prober = User.objects.create_user(username='prober', email='prober@example.com', password=None)
+    return AuthToken.objects.create(user=prober).key
+
+
+async def probe(client, headers, stop, interval):
+    samples = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        resp = await client.get(ME_URL, headers=headers)
+        samples.append((time.perf_counter() - start) * 1000)
+        assert resp.status_code == 200, resp.status_code
+        await asyncio.sleep(interval)
+    return samples
+
+
+async def storm(client, logins, concurrency):
+    remaining = iter(range(logins))
+    statuses = []
+
+    async def worker():
+        for n in remaining:
+            resp = await client.post(TOKEN_URL, json={'username': f'storm{n}', 'password': PASSWORD})
+            statuses.append(resp.status_code)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return statuses
+
+
+async def run(args, token_key):
+    import httpx
+    from django.core.asgi import get_asgi_application
+
+    transport = httpx.ASGITransport(app=get_asgi_application())
+    headers = {'Authorization': f'Token {token_key}'}
+    async with httpx.AsyncClient(transport=transport, base_url='http://testserver', timeout=None) as client:
+        await client.get(ME_URL, headers=headers)  # warm up URL resolution and auth caches
+        idle = []
+        for _ in range(args.idle_requests):
+            start = time.perf_counter()
+            await client.get(ME_URL, headers=headers)
+            idle.append((time.perf_counter() - start) * 1000)
+
+        stop = asyncio.Event()
+        prober = asyncio.create_task(probe(client, headers, stop, args.interval / 1000))
+        start = time.perf_counter()
+        statuses = await storm(client, args.logins, args.concurrency)
+        elapsed = time.perf_counter() - start
+        stop.set()
+        busy = await prober
+    return idle, busy, statuses, elapsed
+
+
+def child(args):
+    setup_django()
+    from django.conf import settings
+
+    label = f"{'async' if settings.ASYNC_AUTH_VIEWS else 'sync'}, shedding {os.environ['LOGIN_STORM_SHEDDING']}"
+    with test_database():
+        token_key = seed()
+        idle, busy, statuses, elapsed = asyncio.run(run(args, token_key))
+    counts = ', '.join(f'{count} x {status}' for status, count in sorted(
+        (status, len(list(group))) for status, group in itertools.groupby(sorted(statuses))))
+    print(format_row(f'{label}: /me/ idle', summarize(idle)))
+    print(format_row(f'{label}: /me/ during login storm', summarize(busy),
+                     f' ({len(busy)} probes, {len(statuses) / elapsed:.1f} logins/s: {counts})'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--logins', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--interval', type=float, default=10, help='pause between /me/ probes in ms')
+    parser.add_argument('--idle-requests', type=int, default=50)
+    parser.add_argument('--config', choices=('sync', 'async', 'both'), default='both')
+    parser.add_argument('--shedding', choices=('on', 'off', 'both'), default='both')
+    args, _ = parser.parse_known_args(argv)
+
+    if os.environ.get('LOGIN_STORM_CHILD'):
+        child(args)
+        return
+    configs = ('sync', 'async') if args.config == 'both' else (args.config,)
+    sheddings = ('off', 'on') if args.shedding == 'both' else (args.shedding,)
+    for config, shedding in itertools.product(configs, sheddings):
+        env = {
+            **os.environ,
+            'LOGIN_STORM_CHILD': '1',
+            'LOGIN_STORM_SHEDDING': shedding,
+            'ASYNC_AUTH_VIEWS': 'True' if config == 'async' else 'False',
+        }
+        if shedding == 'off':
+            env.update(AUTH_THROTTLE_IP_RATE='', AUTH_THROTTLE_USERNAME_RATE='', AUTH_THROTTLE_ROUTE_RATE='',
+                       PASSWORD_HASH_CONCURRENCY='0')
+        subprocess.run([sys.executable, '-m', 'benchmarks.login_storm', *(argv or sys.argv[1:])], env=env, check=True)
+
+
+if __name__ == '__main__':
+    main()
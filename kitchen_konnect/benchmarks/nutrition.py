@@ -0,0 +1,146 @@
+"""Nutrient totals of recipe batches: the vectorized product against a per-line loop.
+
+Builds a nutrient matrix (health/nutrition.py) for `--ingredients` synthetic
+ingredients with `--nutrients` nutrients (16 are seeded), and totals
+batches of recipes of 5-15 lines each, with a mix of mass, volume and piece
+units, both ways:
+`NutrientMatrix.totals()` (numpy segment sums) and `naive_totals()` (a
+Python loop over the lines and nutrients):
+
+    python -m benchmarks.nutrition --recipes 1000 10000 50000 --nutrients 60
+
+`--db N` also seeds N recipes into a test database and times computing and
+storing their totals (`compute_recipe_totals`) and reading them back
+(`recipe_totals`).
+"""
+import argparse
+import math
+import random
+import time
+
+from benchmarks.harness import format_row, measure, setup_django, summarize, test_database
+
+UNITS = ('g', 'g', 'kg', 'oz', 'ml', 'cup', 'tbsp', 'tsp', '', 'pieces', 'handful')
+SEED_BATCH = 5000
+
+
+def synthetic_data(ingredients, nutrients=16, seed=1):
+    """Nutrient `(code, unit)` pairs, `amounts` triples and `measures` for ids 1..ingredients."""
+    rng = random.Random(seed)
+    columns = range(nutrients)
+    nutrients = [(f'n{column}', 'g') for column in columns]
+    amounts, measures = [], {}
+    for ingredient_id in range(1, ingredients + 1):
+        if rng.random() < 0.05:
+            # no data
+            continue
+        for column in columns:
+            if rng.random() < 0.7:
+                amounts.append((ingredient_id, column, rng.uniform(0, 100)))
+        measures[ingredient_id] = (
+            rng.uniform(0.3, 1.5) if rng.random() < 0.8 else None,
+            rng.uniform(5, 200) if rng.random() < 0.5 else None,
+        )
+    return nutrients, amounts, measures
+
+
+def synthetic_lines(recipes, ingredients, seed=2):
+    rng = random.Random(seed)
+    lines = []
+    for recipe_id in range(1, recipes + 1):
+        for ingredient_id in rng.sample(range(1, ingredients + 1), rng.randint(5, 15)):
+            quantity = None if rng.random() < 0.03 else round(rng.uniform(0.25, 500), 2)
+            lines.append((recipe_id, ingredient_id, quantity, rng.choice(UNITS)))
+    return lines
+
+
+def max_difference(expected, actual):
+    worst = 0.0
+    for owner, total in expected.items():
+        assert actual[owner].unresolved == total.unresolved
+        for amount, other in zip(total.values, actual[owner].values):
+            worst = max(worst, abs(other - amount) / max(1.0, abs(amount)))
+    return worst
+
+
+def bench_matrix(args):
+    from health.nutrition import NutrientMatrix, np
+
+    print(f'{args.ingredients} ingredients x {args.nutrients} nutrients, numpy {"yes" if np is not None else "no"}')
+    matrix = NutrientMatrix.from_amounts(*synthetic_data(args.ingredients, args.nutrients))
+    for recipes in args.recipes:
+        lines = synthetic_lines(recipes, args.ingredients)
+        repeat = max(3, min(args.repeat, 200_000 // len(lines)))
+        naive = summarize(measure(lambda: matrix.naive_totals(lines), repeat=repeat, warmup=1))
+        vectorized = summarize(measure(lambda: matrix.totals(lines), repeat=repeat, warmup=1))
+        difference = max_difference(matrix.naive_totals(lines), matrix.totals(lines))
+        print(format_row(f'{recipes} recipes, naive loop', naive, f'{len(lines)} lines'))
+        print(format_row(
+            f'{recipes} recipes, vectorized', vectorized,
+            f'{naive["p50"] / vectorized["p50"]:.1f}x faster, max rel. difference {difference:.1e}',
+        ))
+
+
+def seed_database(recipes, ingredients):
+    from health.models import IngredientMeasure, IngredientNutrient, Nutrient
+    from recipes.models import Ingredient, Recipe, RecipeIngredient
+
+    nutrients, amounts, measures = synthetic_data(ingredients)
+    Ingredient.objects.bulk_create([Ingredient(id=pk, name=f'ingredient {pk}') for pk in range(1, ingredients + 1)])
+    columns = list(Nutrient.objects.values_list('id', flat=True))
+    IngredientNutrient.objects.bulk_create(
+        [
+            IngredientNutrient(ingredient_id=pk, nutrient_id=columns[column % len(columns)], per_100g=amount)
+            for pk, column, amount in amounts
+        ],
+        batch_size=SEED_BATCH, ignore_conflicts=True,
+    )
+    IngredientMeasure.objects.bulk_create([
+        IngredientMeasure(ingredient_id=pk, grams_per_ml=per_ml, grams_per_piece=per_piece)
+        for pk, (per_ml, per_piece) in measures.items()
+    ], batch_size=SEED_BATCH)
+    Recipe.objects.bulk_create([Recipe(id=pk, title=f'recipe {pk}') for pk in range(1, recipes + 1)], batch_size=SEED_BATCH)
+    RecipeIngredient.objects.bulk_create([
+        RecipeIngredient(recipe_id=recipe_id, ingredient_id=ingredient_id, quantity=quantity, unit=unit)
+        for recipe_id, ingredient_id, quantity, unit in synthetic_lines(recipes, ingredients)
+    ], batch_size=SEED_BATCH)
+
+
+def bench_database(args):
+    from health.models import RecipeNutrition
+    from health.nutrition import compute_recipe_totals, recipe_totals, reset_matrix
+
+    with test_database():
+        seed_database(args.db, args.ingredients)
+        reset_matrix()
+        ids = list(range(1, args.db + 1))
+        start = time.perf_counter()
+        compute_recipe_totals(ids)
+        elapsed = time.perf_counter() - start
+        print(f'{args.db} recipes totalled and stored in {elapsed:.2f} s ({args.db / elapsed:,.0f}/s)')
+        sample = ids[:1000]
+        stats = summarize(measure(lambda: recipe_totals(sample), repeat=args.repeat))
+        print(format_row('read 1000 stored totals', stats))
+        RecipeNutrition.objects.filter(recipe_id__in=sample[:100]).delete()
+        stats = summarize(measure(lambda: compute_recipe_totals(sample[:100], store=False), repeat=args.repeat))
+        print(format_row('recompute 100 recipes', stats))
+        assert not math.isnan(recipe_totals([1])[1].grams)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--recipes', type=int, nargs='+', default=[100, 1000, 10_000])
+    parser.add_argument('--ingredients', type=int, default=5000)
+    parser.add_argument('--nutrients', type=int, default=16)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--db', type=int, default=0, metavar='N')
+    args = parser.parse_args(argv)
+
+    setup_django()
+    bench_matrix(args)
+    if args.db:
+        bench_database(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Page-number vs keyset pagination on the verification request list.
+
+Seeds `--rows` verification requests into a test database and times page 1
+and page `--page` of `/api/auth/verification/requests/` in both modes:
+
+    python -m benchmarks.pagination --rows 250000 --page 10000
+
+Page-number mode pays for `COUNT(*)` plus an `OFFSET` scan that grows with
+the page number; keyset mode should cost the same on every page. The
+response cache is off, so every request reaches the database.
+"""
+import argparse
+
+from benchmarks.harness import count_queries, format_row, measure, setup_django, summarize, test_database
+
+PAGE_SIZE = 20
+URL = '/api/auth/verification/requests/'
+
+
+def seed(rows, batch=5000):
+    from django.contrib.auth import get_user_model
+    from users.models import VerificationRequest
+
+    User = get_user_model()
+    admin = User.objects.create_user(username='bench-admin', email='bench-admin@example.com', password=None,
+                                     role=User.ROLE_ADMIN, admin_level=100)
+    for start in range(0, rows, batch):
+        count = min(batch, rows - start)
+        users = User.objects.bulk_create([
+            User(username=f'bench{start + i}', email=f'bench{start + i}@example.com', password='!')
+            for i in range(count)
+        ])
+        VerificationRequest.objects.bulk_create([
+            VerificationRequest(user=u, requested_role=VerificationRequest.REQUEST_NUTRITIONIST) for u in users
+        ])
+    return admin
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=250000)
+    parser.add_argument('--page', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args(argv)
+    if args.page < 2:
+        parser.error('--page must be 2 or more (page 1 is always timed)')
+    if (args.page - 1) * PAGE_SIZE >= args.rows:
+        parser.error('--rows is too small to reach --page')
+
+    setup_django()
+    from django.test import override_settings
+    from rest_framework.test import APIClient
+
+    from core.pagination import KeysetPagination
+    from users.models import VerificationRequest
+    from users.views import VerificationRequestList
+
+    # every repeat after the first would be a response cache hit
+    with test_database(), override_settings(RESPONSE_CACHE_ENABLED=False):
+        admin = seed(args.rows)
+        client = APIClient()
+        client.force_authenticate(admin)
+
+        ordering = VerificationRequestList.keyset_ordering
+        offset = (args.page - 1) * PAGE_SIZE
+        before = VerificationRequest.objects.order_by(*ordering)[offset - 1]
+        cursors = {1: '', args.page: KeysetPagination.encode_cursor(before, ordering)}
+
+        print(f'{args.rows} verification requests, page size {PAGE_SIZE}')
+        for page in (1, args.page):
+            cases = {
+                f'page-number page {page}': {'page': page},
+                f'keyset page {page}': {'cursor': cursors[page]},
+            }
+            for label, params in cases.items():
+                def request():
+                    resp = client.get(URL, params)
+                    assert resp.status_code == 200, resp.status_code
+
+                queries = count_queries(request)
+                stats = summarize(measure(request, repeat=args.repeat))
+                print(format_row(label, stats, f'{queries} queries'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""Pantry search latency over a large catalog.
+
+Builds the in-memory pantry index (recipes/pantry.py) for `--recipes`
+synthetic recipes of 5-15 ingredients each, drawn with a Zipf-like skew from
+`--ingredients` ingredients (so "salt" and "onion" sit in a large share of
+the catalog), and times searches for pantries of several sizes plus the
+incremental update of changed recipes:
+
+    python -m benchmarks.pantry --recipes 1000000
+
+`--api N` also seeds N recipes into a test database and times the
+`/api/recipes/pantry/` endpoint end to end (index build included once).
+"""
+import argparse
+import random
+import time
+
+from benchmarks.harness import count_queries, format_row, measure, setup_django, summarize, test_database
+
+PANTRY_SIZES = (3, 10, 25)
+SEED_BATCH = 5000
+
+
+def synthetic_catalog(recipes, ingredients, seed=1):
+    """`{recipe id: ingredient ids}` with ids from 1, skewed towards low ingredient ids."""
+    rng = random.Random(seed)
+    weights = [1 / rank for rank in range(1, ingredients + 1)]
+    population = range(1, ingredients + 1)
+    catalog = {}
+    for recipe_id in range(1, recipes + 1):
+        size = rng.randint(5, 15)
+        chosen = set(rng.choices(population, weights, k=size))
+        while len(chosen) < size:
+            chosen.add(rng.randint(1, ingredients))
+        catalog[recipe_id] = chosen
+    return catalog
+
+
+def pairs(catalog):
+    rows = sorted((ingredient_id, recipe_id) for recipe_id, chosen in catalog.items() for ingredient_id in chosen)
+    return [row[0] for row in rows], [row[1] for row in rows]
+
+
+def pantries(ingredients, size, count, seed=2):
+    rng = random.Random(seed)
+    # half common ingredients, half from the long tail
+    common = range(1, 51)
+    tail = range(51, ingredients + 1)
+    return [set(rng.sample(common, size // 2)) | set(rng.sample(tail, size - size // 2)) for _ in range(count)]
+
+
+def bench_index(args):
+    from recipes.pantry import PantryIndex, np
+
+    print(f'{args.recipes} recipes, {args.ingredients} ingredients, numpy {"yes" if np is not None else "no"}')
+    start = time.perf_counter()
+    catalog = synthetic_catalog(args.recipes, args.ingredients)
+    ingredient_ids, recipe_ids = pairs(catalog)
+    print(f'generated {len(recipe_ids)} recipe lines in {time.perf_counter() - start:.1f} s')
+    start = time.perf_counter()
+    index = PantryIndex.from_pairs(ingredient_ids, recipe_ids)
+    print(f'index built in {time.perf_counter() - start:.2f} s')
+    del ingredient_ids, recipe_ids
+
+    for size in PANTRY_SIZES:
+        queue = iter(pantries(args.ingredients, size, args.repeat + 2))
+        stats = summarize(measure(lambda: index.search(next(queue), limit=20), repeat=args.repeat))
+        print(format_row(f'search, pantry of {size}', stats))
+        queue = iter(pantries(args.ingredients, size, args.repeat + 2))
+        stats = summarize(measure(lambda: index.search(next(queue), limit=20, max_missing=2), repeat=args.repeat))
+        print(format_row(f'search, pantry of {size}, max_missing=2', stats))
+
+    rng = random.Random(3)
+    changed = {rng.randint(1, args.recipes): set(rng.sample(range(1, args.ingredients + 1), 8)) for _ in range(1000)}
+    start = time.perf_counter()
+    index.apply(changed)
+    print(f'1000 changed recipes applied in {(time.perf_counter() - start) * 1000:.1f} ms')
+    queue = iter(pantries(args.ingredients, 10, args.repeat + 2))
+    stats = summarize(measure(lambda: index.search(next(queue), limit=20), repeat=args.repeat))
+    print(format_row('search, pantry of 10, 1000 overrides', stats))
+    start = time.perf_counter()
+    index.compact()
+    print(f'overrides compacted in {(time.perf_counter() - start) * 1000:.1f} ms')
+
+
+def seed_database(catalog):
+    from recipes.models import Ingredient, Recipe, RecipeIngredient
+
+    Ingredient.objects.bulk_create(
+        [Ingredient(id=i, name=f'ingredient {i}') for i in {i for chosen in catalog.values() for i in chosen}]
+    )
+    items = list(catalog.items())
+    for start in range(0, len(items), SEED_BATCH):
+        batch = items[start:start + SEED_BATCH]
+        Recipe.objects.bulk_create([Recipe(id=recipe_id, title=f'Recipe {recipe_id}') for recipe_id, _ in batch])
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(recipe_id=recipe_id, ingredient_id=ingredient_id)
+            for recipe_id, chosen in batch for ingredient_id in chosen
+        ])
+
+
+def bench_api(args):
+    from rest_framework.test import APIClient
+
+    from recipes import pantry
+
+    with test_database():
+        seed_database(synthetic_catalog(args.api, args.ingredients))
+        client = APIClient()
+        pantry.reset_index()
+        start = time.perf_counter()
+        pantry.find_recipes({1})
+        print(f'\n{args.api} recipes in the database; index built in {time.perf_counter() - start:.2f} s')
+        for size in PANTRY_SIZES:
+            queue = iter(pantries(args.ingredients, size, args.repeat + 3))
+
+            def request():
+                names = ','.join(f'ingredient {i}' for i in next(queue))
+                resp = client.get('/api/recipes/pantry/', {'ingredients': names})
+                assert resp.status_code == 200, resp.content[:200]
+
+            queries = count_queries(request)
+            stats = summarize(measure(request, repeat=args.repeat))
+            print(format_row(f'GET pantry of {size}', stats, f'{queries} queries'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--recipes', type=int, default=1_000_000)
+    parser.add_argument('--ingredients', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--api', type=int, default=0, help='also time the endpoint over this many seeded recipes')
+    args = parser.parse_args(argv)
+
+    setup_django()
+    bench_index(args)
+    if args.api:
+        bench_api(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Full-text recipe search latency, with facets, over a seeded catalog.
+
+Seeds `--recipes` synthetic recipes (titles, descriptions and steps built
+from a small food vocabulary, random cuisines, diet tags and prep times)
+into a test database, rebuilds the search index and times
+`/api/recipes/search/` for common and rare terms, with and without filters:
+
+    python -m benchmarks.recipe_search --recipes 200000
+"""
+import argparse
+import random
+import time
+
+from benchmarks.harness import count_queries, format_row, measure, setup_django, summarize, test_database
+
+SEED_BATCH = 5000
+WORDS = (
+    'spicy sweet smoky crispy creamy tangy roasted grilled braised baked fresh quick hearty light rustic '
+    'lentil chickpea tomato onion garlic ginger chili lime lemon basil coriander cumin paprika rice noodle '
+    'potato carrot spinach kale mushroom chicken beef pork salmon tofu tempeh coconut yogurt cheese bread '
+    'soup stew curry salad bowl pie tart cake pancake taco burger risotto pasta stir fry dal'
+).split()
+CUISINES = ('indian', 'italian', 'mexican', 'thai', 'greek', 'french', 'japanese', 'american', 'ethiopian', '')
+SCENARIOS = (
+    ('common term', {'q': 'spicy'}),
+    ('two terms', {'q': 'spicy lentil'}),
+    ('three terms + diet', {'q': 'creamy coconut curry', 'diet': 'vegan'}),
+    ('rare phrase', {'q': 'ethiopian tempeh risotto'}),
+    ('term + cuisine + prep', {'q': 'soup', 'cuisine': 'thai', 'max_prep': '30'}),
+    ('browse, diet only', {'diet': 'vegetarian'}),
+)
+
+
+def seed(recipes, seed=1):
+    from recipes.models import Recipe
+
+    rng = random.Random(seed)
+    tags = len(Recipe.DIET_TAGS)
+    for start in range(0, recipes, SEED_BATCH):
+        Recipe.objects.bulk_create([
+            Recipe(
+                title=' '.join(rng.sample(WORDS, 3)),
+                description=' '.join(rng.choices(WORDS, k=20)),
+                steps=' '.join(rng.choices(WORDS, k=60)),
+                cuisine=rng.choice(CUISINES),
+                prep_minutes=rng.choice((None, 10, 20, 30, 45, 90)),
+                diet_flags=sum(1 << bit for bit in range(tags) if rng.random() < 0.15),
+            )
+            for _ in range(min(SEED_BATCH, recipes - start))
+        ])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--recipes', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from rest_framework.test import APIClient
+
+    from recipes.search import rebuild_index
+
+    with test_database():
+        seed(args.recipes)
+        start = time.perf_counter()
+        rebuild_index()
+        print(f'{args.recipes} recipes indexed in {time.perf_counter() - start:.1f} s')
+        client = APIClient()
+        for label, params in SCENARIOS:
+            def request():
+                resp = client.get('/api/recipes/search/', params)
+                assert resp.status_code == 200, resp.content[:200]
+                return resp
+
+            count = request().data['count']
+            queries = count_queries(request)
+            stats = summarize(measure(request, repeat=args.repeat))
+            print(format_row(label, stats, f'{queries} queries, {count} matches'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""Worker start-up time: imports, `django.setup()` and the first request.
+
+Each run starts a fresh interpreter with `-X importtime` and times the
+phases a gunicorn worker goes through:
+
+    settings+setup   import settings, `django.setup()` (apps, models, signals)
+    application      `get_asgi_application()` (middleware chain)
+    urlconf          load the URLconf and the view modules it references
+    first request    one unauthenticated GET through the ASGI app
+
+then forks (as gunicorn does with `preload_app`) and times the first
+request in the child, which is what a preloaded worker pays after fork:
+
+    python -m benchmarks.startup --runs 5 --top 25
+
+The import table lists the slowest modules (cumulative microseconds, as
+reported by `-X importtime`) and the packages with the most self time.
+`--target-ms` (default 300) is the budget for fork-to-first-response
+without preloading, i.e. the sum of all phases.
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+URL = '/api/auth/me/'
+PHASES = ('settings+setup', 'application', 'urlconf', 'first request')
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def first_request(app):
+    import httpx
+
+    async def get():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://localhost') as client:
+            return (await client.get(URL)).status_code
+
+    return asyncio.run(get())
+
+
+def child():
+    """Run the phases in this process and print them as JSON."""
+    timings = {}
+    start = time.perf_counter()
+
+    def mark(name):
+        nonlocal start
+        now = time.perf_counter()
+        timings[name] = (now - start) * 1000
+        start = now
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    import django
+
+    django.setup()
+    mark('settings+setup')
+    from django.core.asgi import get_asgi_application
+
+    app = get_asgi_application()
+    mark('application')
+    from django.urls import get_resolver
+
+    get_resolver().url_patterns
+    mark('urlconf')
+    # importing httpx is load-generator overhead, not worker start-up
+    import httpx  # noqa: F401
+
+    start = time.perf_counter()
+    status = first_request(app)
+    mark('first request')
+
+    from core.lazy import DEFERRED_MODULES
+
+    loaded = sorted(name for name in DEFERRED_MODULES if name in sys.modules)
+
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read)
+        forked = time.perf_counter()
+        first_request(app)
+        os.write(write, str((time.perf_counter() - forked) * 1000).encode())
+        os._exit(0)
+    os.close(write)
+    os.waitpid(pid, 0)
+    with os.fdopen(read) as pipe:
+        timings['after fork (preloaded)'] = float(pipe.read())
+    print(json.dumps({'timings': timings, 'status': status, 'deferred_loaded': loaded}))
+
+
+def parse_importtime(stderr):
+    """Return `[(cumulative_us, self_us, module)]` from `-X importtime` output."""
+    rows = []
+    for line in stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            rows.append((int(match.group(2)), int(match.group(1)), match.group(4)))
+    return rows
+
+
+def run_once(env):
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-m', 'benchmarks.startup'],
+        cwd=PROJECT_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    wall = (time.perf_counter() - started) * 1000
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    report['wall'] = wall
+    return report, parse_importtime(result.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=25, help='modules to list in the import table')
+    parser.add_argument('--target-ms', type=float, default=300)
+    args, _ = parser.parse_known_args(argv)
+
+    if os.environ.get('STARTUP_CHILD'):
+        child()
+        return
+
+    env = {
+        **os.environ,
+        'STARTUP_CHILD': '1',
+        'PYTHONPATH': str(PROJECT_DIR),
+        'ALLOWED_HOSTS': 'localhost',
+        'DEBUG': 'False',
+    }
+    reports, imports = [], None
+    for _ in range(args.runs):
+        report, rows = run_once(env)
+        reports.append(report)
+        imports = imports or rows
+
+    print(f'{"phase":<28} {"median":>9} {"min":>9}')
+    for phase in (*PHASES, 'after fork (preloaded)'):
+        values = [report['timings'][phase] for report in reports]
+        print(f'{phase:<28} {statistics.median(values):7.1f}ms {min(values):7.1f}ms')
+    totals = [sum(report['timings'][phase] for phase in PHASES) for report in reports]
+    walls = [report['wall'] for report in reports]
+    print(f'{"start-up total":<28} {statistics.median(totals):7.1f}ms {min(totals):7.1f}ms'
+          f'  (target {args.target_ms:.0f}ms: {"ok" if statistics.median(totals) <= args.target_ms else "OVER"})')
+    print(f'{"process wall clock":<28} {statistics.median(walls):7.1f}ms {min(walls):7.1f}ms'
+          '  (includes interpreter start and -X importtime overhead)')
+    print(f'first response status {reports[0]["status"]}; deferred modules loaded: '
+          f'{", ".join(reports[0]["deferred_loaded"]) or "none"}')
+
+    print('\nslowest imports (cumulative, first run)')
+    for cumulative, _, module in sorted(imports, reverse=True)[:args.top]:
+        print(f'  {cumulative / 1000:7.1f}ms  {module}')
+    packages = Counter()
+    for _, self_us, module in imports:
+        packages[module.split('.')[0]] += self_us
+    print('\nself time by top-level package')
+    for package, self_us in packages.most_common(args.top):
+        print(f'  {self_us / 1000:7.1f}ms  {package}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+"""API benchmark suite with SQL query budgets.
+
+Seeds a test database with `--scale` users (1k, 100k or 1m; half of them
+with a pending verification request), then drives the auth and admin
+endpoints through the Django test client and records, per scenario, the
+SQL statements of one warm request and the latency percentiles over
+`--repeat` requests:
+
+    python -m benchmarks.suite --scale 1k
+    python -m benchmarks.suite --scale 100k --only admin-users
+
+Results are compared with `benchmarks/baseline.json`. A scenario running
+more queries than its budget fails the run (exit status 1); latency is only
+reported next to the baseline, since it depends on the machine. After an
+intended change, `--update-baseline` rewrites the entries of the scale that
+was run.
+
+Requests authenticate like clients do (DRF token or JWT header), so the
+authentication caches are part of the measurement. The per-view response
+cache is off (`RESPONSE_CACHE_ENABLED = False`) so the numbers describe the
+database path rather than a cache hit.
+"""
+import argparse
+import itertools
+import json
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+
+from benchmarks.harness import count_queries, measure, setup_django, summarize, test_database
+
+BASELINE_PATH = Path(__file__).resolve().parent / 'baseline.json'
+SCALES = {'1k': 1_000, '100k': 100_000, '1m': 1_000_000}
+PASSWORD = 'suite-password-123'
+SEED_BATCH = 5000
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    path: object  # str, or callable returning the path of the next request
+    data: object = None  # dict, or callable returning the body of the next request
+    client: str = 'admin'
+    repeat: int = None  # overrides --repeat (password hashing scenarios)
+    expected: tuple = (200,)
+
+    def resolve(self, value):
+        return value() if callable(value) else value
+
+
+def seed(rows):
+    """Create `rows` users (half with pending verification requests) and the
+    clients' users; returns `{client name: user}`."""
+    from django.contrib.auth import get_user_model
+    from users.models import VerificationRequest
+
+    User = get_user_model()
+    roles = itertools.cycle([User.ROLE_REGULAR] * 3 + [User.ROLE_NUTRITIONIST])
+    for start in range(0, rows, SEED_BATCH):
+        count = min(SEED_BATCH, rows - start)
+        users = User.objects.bulk_create([
+            User(username=f'suite{start + i}', email=f'suite{start + i}@example.com', password='!',
+                 first_name='Suite', last_name=f'User{start + i}', role=next(roles))
+            for i in range(count)
+        ])
+        VerificationRequest.objects.bulk_create([
+            VerificationRequest(user=user, requested_role=VerificationRequest.REQUEST_NUTRITIONIST)
+            for user in users[::2]
+        ])
+    return {
+        'admin': User.objects.create_user(username='suite-admin', email='suite-admin@example.com',
+                                          password=PASSWORD, role=User.ROLE_ADMIN, admin_level=100),
+        'nutritionist': User.objects.create_user(username='suite-nutritionist', email='suite-n@example.com',
+                                                 password=PASSWORD, role=User.ROLE_NUTRITIONIST),
+        'regulator': User.objects.create_user(username='suite-regulator', email='suite-r@example.com',
+                                              password=PASSWORD, role=User.ROLE_REGULATOR, admin_level=50),
+    }
+
+
+def build_clients(users):
+    from users.models import AuthToken
+    from rest_framework.test import APIClient
+
+    clients = {'anonymous': APIClient()}
+    for name, user in users.items():
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {AuthToken.objects.for_user(user).key}')
+        clients[name] = client
+    return clients
+
+
+def build_scenarios(users, clients):
+    from django.conf import settings
+    from django.contrib.auth import get_user_model
+    from users.models import VerificationRequest
+
+    User = get_user_model()
+    registrations = itertools.count()
+
+    def registration():
+        n = next(registrations)
+        return {'username': f'suite-new{n}', 'email': f'suite-new{n}@example.com', 'password': PASSWORD}
+
+    pending = iter(
+        VerificationRequest.objects.filter(status=VerificationRequest.STATUS_PENDING)
+        .order_by('pk').values_list('pk', flat=True)
+    )
+    target = User.objects.filter(username__startswith='suite', role=User.ROLE_REGULAR).order_by('pk').first()
+    roles = itertools.cycle([User.ROLE_NUTRITIONIST, User.ROLE_REGULAR])
+    next_cursor = clients['admin'].get('/api/auth/admin/users/', {'cursor': ''}).data.get('next')
+
+    scenarios = [
+        Scenario('register', 'post', '/api/auth/register/', client='anonymous', repeat=5, expected=(201,),
+                 data=registration),
+        Scenario('token-obtain', 'post', '/api/auth/token/', client='anonymous', repeat=5,
+                 data={'username': 'suite-admin', 'password': PASSWORD}),
+        Scenario('me', 'get', '/api/auth/me/'),
+        Scenario('nutritionist-area', 'get', '/api/auth/nutritionist-area/', client='nutritionist'),
+        Scenario('regulator-area', 'get', '/api/auth/regulator-area/', client='regulator'),
+        Scenario('admin-area', 'get', '/api/auth/admin-area/'),
+        Scenario('admin-users', 'get', '/api/auth/admin/users/'),
+        Scenario('admin-users-search', 'get', '/api/auth/admin/users/?search=suite1'),
+        Scenario('admin-users-role', 'get', '/api/auth/admin/users/?role=nutritionist'),
+        Scenario('admin-users-keyset', 'get', next_cursor or '/api/auth/admin/users/?cursor='),
+        Scenario('admin-user-update', 'patch', f'/api/auth/admin/users/{target.pk}/',
+                 data=lambda: {'role': next(roles)}),
+        Scenario('verification-list', 'get', '/api/auth/verification/requests/'),
+        Scenario('verification-list-pending', 'get', '/api/auth/verification/requests/?status=pending'),
+        Scenario('verification-review', 'patch', lambda: f'/api/auth/verification/requests/{next(pending)}/',
+                 data={'status': VerificationRequest.STATUS_APPROVED}),
+    ]
+    if settings.HAS_SIMPLEJWT:
+        refresh = clients['anonymous'].post(
+            '/api/auth/token/', {'username': 'suite-admin', 'password': PASSWORD}, format='json',
+        ).data['refresh']
+        scenarios.insert(2, Scenario('token-refresh', 'post', '/api/auth/token/refresh/', client='anonymous',
+                                     data={'refresh': refresh}))
+    return scenarios
+
+
+def run_scenario(scenario, clients, repeat):
+    client = clients[scenario.client]
+
+    def request():
+        method = getattr(client, scenario.method)
+        resp = method(scenario.resolve(scenario.path), scenario.resolve(scenario.data), format='json')
+        if resp.status_code not in scenario.expected:
+            raise AssertionError(f'{scenario.name}: unexpected status {resp.status_code}: {resp.content[:200]!r}')
+
+    request()  # warm authentication and other caches
+    queries = count_queries(request)
+    stats = summarize(measure(request, repeat=scenario.repeat or repeat, warmup=0))
+    return {'queries': queries, **{f'{key}_ms': round(value, 2) for key, value in stats.items()}}
+
+
+def compare(results, baseline):
+    """Print results against `baseline`; return the names over their query budget."""
+    failures = []
+    print(f'{"scenario":<28} {"queries":>7} {"budget":>6} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"base p95":>9}')
+    for name, result in results.items():
+        budget = baseline.get(name, {}).get('queries')
+        over = budget is not None and result['queries'] > budget
+        if over:
+            failures.append(name)
+        base_p95 = baseline.get(name, {}).get('p95_ms')
+        print(f"{name:<28} {result['queries']:>7} {budget if budget is not None else '-':>6} "
+              f"{result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f} "
+              f"{base_p95 if base_p95 is not None else '-':>9}{'  OVER BUDGET' if over else ''}")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=SCALES, default='1k')
+    parser.add_argument('--repeat', type=int, default=30)
+    parser.add_argument('--only', nargs='*', help='run only these scenarios')
+    parser.add_argument('--baseline', type=Path, default=BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true',
+                        help='write the results of this scale into the baseline file')
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from django.test import override_settings
+
+    with test_database(), override_settings(RESPONSE_CACHE_ENABLED=False):
+        users = seed(SCALES[args.scale])
+        clients = build_clients(users)
+        scenarios = build_scenarios(users, clients)
+        if args.only:
+            scenarios = [s for s in scenarios if s.name in args.only]
+        print(f'{SCALES[args.scale]} users, {args.repeat} requests per scenario')
+        results = {s.name: run_scenario(s, clients, args.repeat) for s in scenarios}
+
+    baselines = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    failures = compare(results, baselines.get(args.scale, {}))
+    if args.update_baseline:
+        baselines.setdefault(args.scale, {}).update(results)
+        args.baseline.write_text(json.dumps(baselines, indent=2, sort_keys=True) + '\n')
+        print(f'baseline for {args.scale} written to {args.baseline}')
+    elif failures:
+        print(f'query budget exceeded: {", ".join(failures)}', file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,177 @@
+"""Throughput of the auth endpoints under the production serving modes.
+
+Starts real gunicorn servers against a scratch SQLite database and drives
+them over HTTP with `--concurrency` clients for `--duration` seconds, mixing
+`GET /api/auth/me/` (DRF token) with one `POST /api/auth/token/` login in
+every `--login-every` requests:
+
+    python -m benchmarks.throughput --duration 20 --concurrency 64
+
+Configurations (`--config`, default both):
+
+    sync   `gunicorn config.wsgi:application` with gunicorn's defaults
+           (one sync worker), what the images ran before
+    asgi   `gunicorn -c config/gunicorn.conf.py` (uvicorn workers, preload,
+           recycling); `WEB_CONCURRENCY` and the other variables documented
+           there apply
+
+The load generator runs on the same host and takes CPU from the server, so
+compare configurations on one machine rather than reading absolute numbers.
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from benchmarks.harness import format_row, summarize
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+ME_URL = '/api/auth/me/'
+TOKEN_URL = '/api/auth/token/'
+PASSWORD = 'throughput-password-123'
+
+COMMANDS = {
+    'sync': ['gunicorn', 'config.wsgi:application'],
+    'asgi': ['gunicorn', '-c', 'config/gunicorn.conf.py'],
+}
+
+
+def seed():
+    """Create the benchmark users; prints the DRF token of the `/me/` user."""
+    import django
+
+    django.setup()
+    from django.contrib.auth import get_user_model
+    from users.models import AuthToken
+
+    User = get_user_model()
+    User.objects.create_user(username='loadlogin', email='loadlogin@example.com', password=PASSWORD)
+    reader = User.objects.create_user(username='loadreader', email='loadreader@example.com', password=None)
+    print(AuthToken.objects.create(user=reader).key)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'server exited with status {process.returncode}')
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'server did not listen on port {port} within {timeout}s')
+
+
+async def load(base_url, token_key, args):
+    import httpx
+
+    headers = {'Authorization': f'Token {token_key}'}
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    counter = iter(range(sys.maxsize))
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.request_timeout, limits=limits) as client:
+        for _ in range(args.concurrency):
+            await client.get(ME_URL, headers=headers)
+        deadline = time.perf_counter() + args.duration
+
+        async def worker():
+            while time.perf_counter() < deadline:
+                login = args.login_every and next(counter) % args.login_every == 0
+                start = time.perf_counter()
+                try:
+                    if login:
+                        resp = await client.post(TOKEN_URL, json={'username': 'loadlogin', 'password': PASSWORD})
+                    else:
+                        resp = await client.get(ME_URL, headers=headers)
+                    ok = resp.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                name = 'login' if login else 'me'
+                latencies[name].append((time.perf_counter() - start) * 1000)
+                if not ok:
+                    errors[name] += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+    return latencies, errors, elapsed
+
+
+def run_config(name, env, token_key, args):
+    port = free_port()
+    command = [*COMMANDS[name], '--bind', f'127.0.0.1:{port}', '--log-level', 'warning']
+    server = subprocess.Popen(command, cwd=PROJECT_DIR, env={**env, 'GUNICORN_ACCESS_LOG': ''})
+    try:
+        wait_for_port(port, server)
+        latencies, errors, elapsed = asyncio.run(load(f'http://127.0.0.1:{port}', token_key, args))
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+
+    total = sum(len(samples) for samples in latencies.values())
+    print(f'{name}: {total / elapsed:.1f} requests/s over {elapsed:.1f}s ({args.concurrency} clients)')
+    for endpoint in ('me', 'login'):
+        samples = latencies.get(endpoint)
+        if samples:
+            print(format_row(f'  {name}: {endpoint}', summarize(samples),
+                             f' ({len(samples)} requests, {errors[endpoint]} failed)'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--duration', type=float, default=20, help='seconds of load per configuration')
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--login-every', type=int, default=20,
+                        help='one login per N requests (0 disables logins)')
+    parser.add_argument('--request-timeout', type=float, default=60)
+    parser.add_argument('--config', choices=('sync', 'asgi', 'both'), default='both')
+    args, _ = parser.parse_known_args(argv)
+
+    if os.environ.get('THROUGHPUT_SEED'):
+        seed()
+        return
+
+    workdir = Path(tempfile.mkdtemp(prefix='kk-throughput-'))
+    try:
+        env = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': 'config.settings',
+            'DATABASE_URL': f'sqlite:///{workdir / "db.sqlite3"}',
+            # several workers need a cache they share (config/cache.py)
+            'CACHE_URL': 'db://kk_cache',
+            'DEBUG': 'False',
+            'ALLOWED_HOSTS': '127.0.0.1,localhost',
+            'PYTHONPATH': str(PROJECT_DIR),
+        }
+        subprocess.run([sys.executable, 'manage.py', 'migrate', '--noinput', '-v', '0'],
+                       cwd=PROJECT_DIR, env=env, check=True)
+        subprocess.run([sys.executable, 'manage.py', 'createcachetable'], cwd=PROJECT_DIR, env=env, check=True)
+        token_key = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.throughput'], cwd=PROJECT_DIR,
+            env={**env, 'THROUGHPUT_SEED': '1'}, check=True, capture_output=True, text=True,
+        ).stdout.strip().splitlines()[-1]
+        configs = ('sync', 'asgi') if args.config == 'both' else (args.config,)
+        for name in configs:
+            run_config(name, env, token_key, args)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
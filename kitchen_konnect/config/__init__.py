@@ -1,3 +1,7 @@
-# Apply runtime compatibility fixes (keeps site-packages untouched)
-from . import compat  # noqa: F401
+import sys
 
+# Apply runtime compatibility fixes (keeps site-packages untouched). Only
+# Python 3.14+ needs them; skipping the import elsewhere also keeps the
+# template engine out of worker start-up.
+if sys.version_info >= (3, 14):
+    from . import compat  # noqa: F401
@@ -0,0 +1,91 @@
+"""Build `CACHES` from the environment.
+
+`CACHE_URL` selects the backend of the default cache:
+
+    locmem://                  per-process memory (default; one process only)
+    file:///var/cache/kk       files in a directory (one process only)
+    db://django_cache          table in the default database (single host;
+                               run `manage.py createcachetable` once)
+    redis://host:6379/1        Redis (several hosts; needs `redis`)
+    memcached://host:11211     memcached (several hosts; needs `pymemcache`),
+                               several servers separated by commas
+    dummy://                   no caching
+
+`CACHE_TIMEOUT` (seconds, default 300) and `CACHE_KEY_PREFIX` apply to all
+backends.
+
+The cache carries invalidations between processes: response cache and
+conditional GET versions, token and auth-version revocations, throttle
+counters. A locmem cache is private to its process, so a write handled by
+one worker never reaches the others, and the file cache's `incr` is a
+read-then-write that concurrent workers race on. Serving with several
+workers therefore needs the db, redis or memcached backend;
+`require_shared_cache()` refuses to start gunicorn otherwise (see
+config/gunicorn.conf.py).
+"""
+import os
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from django.core.exceptions import ImproperlyConfigured
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'db': 'django.core.cache.backends.db.DatabaseCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+    'rediss': 'django.core.cache.backends.redis.RedisCache',
+    'memcached': 'django.core.cache.backends.memcached.PyMemcacheCache',
+    'dummy': 'django.core.cache.backends.dummy.DummyCache',
+}
+
+# backends that cannot carry invalidations from one process to another
+PROCESS_LOCAL_BACKENDS = (BACKENDS['locmem'], BACKENDS['file'])
+
+
+def _location(url, scheme, base_dir):
+    parts = urlsplit(url)
+    if scheme == 'locmem':
+        return parts.netloc or 'kitchen-konnect'
+    if scheme == 'file':
+        path = (parts.netloc + parts.path) or ''
+        return str(Path(path) if Path(path).is_absolute() else Path(base_dir) / (path or '.cache'))
+    if scheme == 'db':
+        return parts.netloc or parts.path.lstrip('/') or 'django_cache'
+    if scheme in ('redis', 'rediss'):
+        return url
+    if scheme == 'memcached':
+        return [host.strip() for host in parts.netloc.split(',') if host.strip()]
+    return ''
+
+
+def build_caches(base_dir, env=None):
+    """Return the `CACHES` setting for `env` (defaults to `os.environ`)."""
+    env = os.environ if env is None else env
+    url = env.get('CACHE_URL') or 'locmem://'
+    scheme = urlsplit(url).scheme
+    if scheme not in BACKENDS:
+        raise ImproperlyConfigured(f'Unsupported CACHE_URL scheme {scheme!r}; use one of {", ".join(BACKENDS)}.')
+    config = {
+        'BACKEND': BACKENDS[scheme],
+        'TIMEOUT': int(env.get('CACHE_TIMEOUT', '300')),
+        'KEY_PREFIX': env.get('CACHE_KEY_PREFIX', 'kk'),
+    }
+    location = _location(url, scheme, base_dir)
+    if location:
+        config['LOCATION'] = location
+    if scheme in ('locmem', 'file'):
+        config['OPTIONS'] = {'MAX_ENTRIES': int(env.get('CACHE_MAX_ENTRIES', '10000'))}
+    return {'default': config}
+
+
+def require_shared_cache(caches, workers):
+    """Raise ImproperlyConfigured when `workers` processes would serve from a
+    default cache they cannot share."""
+    backend = caches['default']['BACKEND']
+    if workers > 1 and backend in PROCESS_LOCAL_BACKENDS:
+        raise ImproperlyConfigured(
+            f'{backend} cannot be shared by {workers} workers: invalidations would only reach '
+            'the worker that made them. Set CACHE_URL to a db://, redis:// or memcached:// '
+            'cache, or run a single worker (WEB_CONCURRENCY=1).'
+        )
@@ -0,0 +1,207 @@
+"""Send read-only API traffic to database replicas.
+
+`ReplicaRoutingMiddleware` picks a replica for GET/HEAD requests whose view
+opts in with `replica_reads = True` (`AdminUserList`,
+`VerificationRequestList`, `/me/`); `ReplicaRouter` then sends every read
+of that request to it. Everything else, all writes and all requests made
+while no replica is configured use `default`.
+
+Read-your-writes: a non-safe request (POST, PATCH, ...) pins the client to
+the primary for `REPLICA_PIN_SECONDS`, so reads made right after a write
+do not hit a replica that has not caught up yet. The pin is recorded in a
+cookie, and for API clients that do not keep cookies, in the cache under
+a digest of their Authorization header. Authentication itself always
+reads from the primary (`users.authentication.HeaderDispatchAuthentication`),
+so a new or rotated token that is not pinned yet still authenticates.
+
+The middleware runs natively in both the sync (WSGI) and async (ASGI)
+handler, so async views are not pushed through a thread on its account; the
+read alias is a context variable and is set the same way on both paths.
+
+Replicas come from `settings.DATABASE_REPLICAS` (see `config/database.py`).
+"""
+import contextvars
+import hashlib
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+
+DEFAULT_ALIAS = 'default'
+PIN_COOKIE = 'db_pin'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_read_alias = contextvars.ContextVar('read_alias', default=None)
+
+
+def get_replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', ()))
+
+
+def pin_seconds():
+    return int(getattr(settings, 'REPLICA_PIN_SECONDS', 5))
+
+
+def current_read_alias():
+    """Alias serving reads in the current context (None means `default`)."""
+    return _read_alias.get()
+
+
+class use_replica:
+    """Route reads in the block to `alias` (or a random replica).
+
+    Also usable from management commands and tasks. With no replica
+    configured the block reads from `default`.
+    """
+
+    def __init__(self, alias=None):
+        self.alias = alias
+
+    def __enter__(self):
+        alias = self.alias
+        if alias is None:
+            replicas = get_replicas()
+            alias = random.choice(replicas) if replicas else None
+        self._token = _read_alias.set(alias)
+        return alias
+
+    def __exit__(self, *exc_info):
+        _read_alias.reset(self._token)
+
+
+class use_primary(use_replica):
+    def __enter__(self):
+        self._token = _read_alias.set(None)
+        return DEFAULT_ALIAS
+
+
+class ReplicaRouter:
+    def _aliases(self):
+        return {DEFAULT_ALIAS, *get_replicas()}
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = self._aliases()
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas receive the schema through replication
+        if db in get_replicas():
+            return False
+        return None
+
+
+def _pin_cache_key(request):
+    header = request.META.get('HTTP_AUTHORIZATION')
+    if not header:
+        return None
+    return 'db:pin:' + hashlib.sha256(header.encode()).hexdigest()[:32]
+
+
+def _pinned_by_cookie(request):
+    try:
+        return float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def is_pinned(request):
+    if _pinned_by_cookie(request):
+        return True
+    key = _pin_cache_key(request)
+    return key is not None and cache.get(key) is not None
+
+
+async def ais_pinned(request):
+    if _pinned_by_cookie(request):
+        return True
+    key = _pin_cache_key(request)
+    return key is not None and await cache.aget(key) is not None
+
+
+def _set_pin_cookie(response):
+    seconds = pin_seconds()
+    if seconds > 0:
+        response.set_cookie(PIN_COOKIE, str(int(time.time() + seconds)), max_age=seconds, httponly=True,
+                            samesite='Lax')
+    return seconds
+
+
+def pin_to_primary(request, response):
+    seconds = _set_pin_cookie(response)
+    key = _pin_cache_key(request)
+    if seconds > 0 and key is not None:
+        cache.set(key, 1, seconds)
+
+
+async def apin_to_primary(request, response):
+    seconds = _set_pin_cookie(response)
+    key = _pin_cache_key(request)
+    if seconds > 0 and key is not None:
+        await cache.aset(key, 1, seconds)
+
+
+def _view_allows_replica(view_func):
+    view = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None) or view_func
+    return getattr(view, 'replica_reads', False)
+
+
+def _replicas_for(request, view_func):
+    if request.method not in SAFE_METHODS or not _view_allows_replica(view_func):
+        return []
+    return get_replicas()
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            # the pin lookup may go to a network cache; keep it off the loop
+            self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _read_alias.set(None)
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_alias.reset(token)
+        if request.method not in SAFE_METHODS and get_replicas():
+            pin_to_primary(request, response)
+        return response
+
+    async def __acall__(self, request):
+        token = _read_alias.set(None)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _read_alias.reset(token)
+        if request.method not in SAFE_METHODS and get_replicas():
+            await apin_to_primary(request, response)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        replicas = _replicas_for(request, view_func)
+        if replicas and not is_pinned(request):
+            _read_alias.set(random.choice(replicas))
+        return None
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        replicas = _replicas_for(request, view_func)
+        if replicas and not await ais_pinned(request):
+            _read_alias.set(random.choice(replicas))
+        return None
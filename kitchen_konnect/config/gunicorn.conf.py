@@ -0,0 +1,109 @@
+"""Production gunicorn settings: uvicorn workers serving `config.asgi`.
+
+    gunicorn -c config/gunicorn.conf.py
+
+Every value can be overridden from the environment (or on the command line,
+which wins over this file):
+
+    GUNICORN_BIND              listen address (default 0.0.0.0:$PORT, PORT=8000)
+    WEB_CONCURRENCY            worker processes (default 2 * CPUs + 1)
+    GUNICORN_PRELOAD           import the app once in the master (default True)
+    GUNICORN_MAX_REQUESTS      recycle a worker after this many requests (1000)
+    GUNICORN_MAX_REQUESTS_JITTER   random extra requests so workers do not
+                               all restart at once (100)
+    GUNICORN_TIMEOUT           kill a worker silent for this long (30 s)
+    GUNICORN_GRACEFUL_TIMEOUT  time to finish in-flight requests on
+                               restart/shutdown (30 s)
+    GUNICORN_KEEPALIVE         idle keep-alive seconds (5; raise behind a
+                               load balancer that reuses connections)
+
+Worker count: an ASGI worker runs the async views (`ASYNC_AUTH_VIEWS`) on its
+event loop, but Django runs sync views on one thread per worker, so CPU-bound
+sync work still needs several processes per CPU, like sync workers.
+
+Preloading imports Django and the URLconf in the master before forking, so
+workers share those pages copy-on-write and serve their first request right
+after the fork (`python -m benchmarks.startup` measures both paths); `gc.freeze()`
+keeps the collector from touching (and so copying) them. Database
+connections are opened lazily per worker and never inherited.
+
+Workers share cache invalidations through the default cache, so with more
+than one worker `CACHE_URL` must name a db, redis or memcached cache: the
+master refuses to start on a locmem or file cache (config/cache.py
+`require_shared_cache`).
+
+Workers write their Prometheus metrics to files in `METRICS_DIR`
+(core/metrics.py); the master empties it on start and folds the files of
+exited workers into an archive file, so totals survive worker restarts.
+"""
+import gc
+import multiprocessing
+import os
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+wsgi_app = 'config.asgi:application'
+worker_class = 'config.workers.DjangoUvicornWorker'
+
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', '8000')}")
+workers = _env_int('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1)
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'True') == 'True'
+
+max_requests = _env_int('GUNICORN_MAX_REQUESTS', 1000)
+max_requests_jitter = _env_int('GUNICORN_MAX_REQUESTS_JITTER', 100)
+timeout = _env_int('GUNICORN_TIMEOUT', 30)
+graceful_timeout = _env_int('GUNICORN_GRACEFUL_TIMEOUT', 30)
+keepalive = _env_int('GUNICORN_KEEPALIVE', 5)
+
+# proxy headers (X-Forwarded-For/Proto) are trusted from these addresses
+forwarded_allow_ips = os.environ.get('FORWARDED_ALLOW_IPS', '127.0.0.1')
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-') or None
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+
+def _metrics_dir():
+    from core.metrics import DEFAULT_DIR
+
+    return os.environ.get('METRICS_DIR') or DEFAULT_DIR
+
+
+def on_starting(server):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    from django.conf import settings
+
+    from config.cache import require_shared_cache
+    from core.metrics import reset_directory
+
+    require_shared_cache(settings.CACHES, server.cfg.workers)
+
+    reset_directory(_metrics_dir())
+
+
+def when_ready(server):
+    # runs in the master after the app was preloaded, before the first fork
+    if server.cfg.preload_app:
+        from django.urls import get_resolver
+
+        # import the URLconf and its views once here rather than on each
+        # worker's first request
+        get_resolver().url_patterns
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    if not server.cfg.preload_app:
+        return
+    from django.db import connections
+
+    # drop any connection the master opened while importing the app
+    connections.close_all()
+
+
+def child_exit(server, worker):
+    from core.metrics import mark_process_dead
+
+    mark_process_dead(worker.pid, _metrics_dir())
@@ -10,14 +10,20 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+from datetime import timedelta
 from pathlib import Path
+import importlib.util
 import os
-from dotenv import load_dotenv
-# commented out dj_database_url import to force default sqlite during local development
-# import dj_database_url
+from config.cache import build_caches
+from config.database import build_databases, replica_aliases
+
+# Load environment variables from .env (if present; containers usually pass
+# the environment directly, so python-dotenv is only imported when needed)
+ENV_FILE = Path(__file__).resolve().parent.parent / '.env'
+if ENV_FILE.exists():
+    from dotenv import load_dotenv
 
-# Load environment variables from .env (if present)
-load_dotenv(Path(__file__).resolve().parent.parent / '.env')
+    load_dotenv(ENV_FILE)
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -73,12 +79,18 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # first, so its timings cover the whole stack (see core/instrumentation.py)
+    'core.instrumentation.InstrumentationMiddleware',
+    # sheds password-hashing requests before they queue (see core/throttling.py)
+    'core.throttling.ConcurrencyLimitMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'config.db_router.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -107,37 +119,60 @@ WSGI_APPLICATION = 'config.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': os.getenv('DB_ENGINE', 'django.db.backends.sqlite3'),
-        'NAME': os.getenv('DB_NAME', BASE_DIR / 'db.sqlite3'),
-        'USER': os.getenv('DB_USER', ''),
-        'PASSWORD': os.getenv('DB_PASSWORD', ''),
-        'HOST': os.getenv('DB_HOST', ''),
-        'PORT': os.getenv('DB_PORT', ''),
-    }
-}
-
-# Use DATABASE_URL if provided (recommended for production)
-DATABASE_URL = os.getenv('DATABASE_URL')
-# The DATABASE_URL override is commented out so the project uses the default
-# local sqlite configuration during development. To enable a remote DB,
-# uncomment the block below and ensure `dj_database_url` is installed and
-# imported above.
-# if DATABASE_URL:
-#     # Parse the DATABASE_URL and require SSL for managed providers like Supabase
-#     DATABASES['default'] = dj_database_url.parse(DATABASE_URL, conn_max_age=600, ssl_require=True)
-
-# --- Local override: ensure default sqlite is used for development ---
-# The following explicit `DATABASES` assignment forces the default Django
-# sqlite backend regardless of any `DATABASE_URL` environment variable.
-# This was added to make local development deterministic and to quickly
-# revert DB changes introduced earlier.
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+# DATABASE_URL (or the DB_* variables) with persistent, health-checked
+# connections, an optional pool and read replicas; see config/database.py.
+DATABASES = build_databases(BASE_DIR)
+DATABASE_REPLICAS = replica_aliases(DATABASES)
+DATABASE_ROUTERS = ['config.db_router.ReplicaRouter']
+# Seconds a client reads from the primary after a write request
+REPLICA_PIN_SECONDS = int(os.getenv('REPLICA_PIN_SECONDS', '5'))
+
+
+# Cache tier selected by CACHE_URL (locmem, file, db, redis, memcached);
+# see config/cache.py.
+CACHES = build_caches(BASE_DIR)
+# Per-view response caching (core/response_cache.py) and the number of
+# requests between flushes of the per-process hit/miss counters
+RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'True') == 'True'
+RESPONSE_CACHE_STATS_FLUSH = int(os.getenv('RESPONSE_CACHE_STATS_FLUSH', '100'))
+
+# gzip/brotli compression of text and JSON responses (core/compression.py);
+# bodies smaller than COMPRESSION_MIN_SIZE bytes are sent as they are
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '1024'))
+COMPRESSION_GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL', '6'))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', '5'))
+
+# Per-request SQL/phase timings as sampled JSON log lines, and as
+# Server-Timing headers when enabled (core/instrumentation.py; the header
+# shows every client how long the backend spent, so it is off unless set).
+# Slow requests and slow queries (with the code location that ran them) are
+# always logged.
+INSTRUMENTATION_ENABLED = os.getenv('INSTRUMENTATION_ENABLED', 'True') == 'True'
+INSTRUMENTATION_SERVER_TIMING = os.getenv('INSTRUMENTATION_SERVER_TIMING', 'False') == 'True'
+INSTRUMENTATION_SAMPLE_RATE = float(os.getenv('INSTRUMENTATION_SAMPLE_RATE', '0.01'))
+INSTRUMENTATION_SLOW_REQUEST_MS = int(os.getenv('INSTRUMENTATION_SLOW_REQUEST_MS', '500'))
+INSTRUMENTATION_SLOW_QUERY_MS = int(os.getenv('INSTRUMENTATION_SLOW_QUERY_MS', '100'))
+# Prometheus metrics at /api/metrics/ (core/metrics.py), summed over the
+# per-process files in METRICS_DIR (default: a directory in the system temp dir)
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'
+METRICS_DIR = os.getenv('METRICS_DIR', '')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'line': {'format': '%(asctime)s %(levelname)s %(name)s %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'line'},
+    },
+    'loggers': {
+        'kitchen_konnect': {
+            'handlers': ['console'],
+            'level': os.getenv('APP_LOG_LEVEL', 'INFO'),
+            'propagate': False,
+        },
+    },
 }
 
 
@@ -187,46 +222,113 @@ MEDIA_ROOT = BASE_DIR / 'media'
 AUTH_USER_MODEL = 'users.CustomUser'
 
 # Django REST Framework
-DEFAULT_AUTH_CLASSES = [
-    'rest_framework.authentication.SessionAuthentication',
-    'rest_framework.authentication.BasicAuthentication',
-]
 # Detect simplejwt availability without importing it (avoid triggering package-level imports)
-import importlib.util
-if importlib.util.find_spec('rest_framework_simplejwt') is not None:
-    # Ensure TokenAuthentication runs before JWTAuthentication so DRF token
-    # keys (simple string tokens) are accepted. If JWTAuthentication runs
-    # first it will attempt to parse non-JWT tokens and raise an error,
-    # preventing TokenAuthentication from being tried.
-    DEFAULT_AUTH_CLASSES = [
-        'rest_framework.authentication.TokenAuthentication',
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    ]
+HAS_SIMPLEJWT = importlib.util.find_spec('rest_framework_simplejwt') is not None
+
+# A single authenticator picks Token or JWT auth from the
+# Authorization header prefix (see users/authentication.py) instead of DRF
+# trying each class in turn.
+AUTH_JWT_AUTHENTICATION_CLASS = (
+    'users.tokens.AuthClaimsJWTAuthentication' if HAS_SIMPLEJWT else None
+)
+
+# Stateless JWT mode: authorize from the role/admin_level claims without
+# loading the user row; revocation is checked against a cached per-user
+# auth_version (see users/tokens.py and users/auth_versions.py).
+JWT_STATELESS_AUTH = os.getenv('JWT_STATELESS_AUTH', 'False') == 'True'
+AUTH_VERSION_CACHE = {
+    'LOCAL_TTL': int(os.getenv('AUTH_VERSION_LOCAL_TTL', '5')),
+    'SHARED_TTL': int(os.getenv('AUTH_VERSION_TTL', '3600')),
+}
+
+# Token key -> user snapshot cache used by CachedTokenAuthentication.
+# LOCAL_TTL bounds how long another worker may keep a revoked entry (with a
+# cache shared by the workers, see config/cache.py).
+AUTH_TOKEN_CACHE = {
+    'LOCAL_SIZE': int(os.getenv('AUTH_TOKEN_CACHE_LOCAL_SIZE', '4096')),
+    'LOCAL_TTL': int(os.getenv('AUTH_TOKEN_CACHE_LOCAL_TTL', '5')),
+    'SHARED_TTL': int(os.getenv('AUTH_TOKEN_CACHE_TTL', '300')),
+}
+
+# Lifetime of the opaque API tokens (users.AuthToken) and the minimum
+# seconds between two writes of a token's last_used_at
+AUTH_TOKEN_TTL = timedelta(days=int(os.getenv('AUTH_TOKEN_TTL_DAYS', '30')))
+AUTH_TOKEN_TOUCH_INTERVAL = int(os.getenv('AUTH_TOKEN_TOUCH_INTERVAL', '300'))
+
+# Serve register, token obtain, me and the role-area endpoints from the
+# async views in users/async_views.py (for ASGI deployments). Password
+# hashing then runs on a pool of PASSWORD_HASH_WORKERS threads; keep it
+# below the CPU count so a login burst leaves room for other requests.
+ASYNC_AUTH_VIEWS = os.getenv('ASYNC_AUTH_VIEWS', 'False') == 'True'
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', str(max(1, (os.cpu_count() or 2) // 2))))
+# Password-hashing requests a process runs or queues at once; more get a 503
+# with Retry-After (0 = unlimited)
+PASSWORD_HASH_CONCURRENCY = int(os.getenv('PASSWORD_HASH_CONCURRENCY', str(PASSWORD_HASH_WORKERS * 2)))
+
+# Password hashing processes used by the admin bulk user import endpoint
+# (the `import_users` command defaults to one per CPU).
+USER_IMPORT_WORKERS = int(os.getenv('USER_IMPORT_WORKERS', '2'))
+
+# Pantry search (recipes/pantry.py): seconds between two checks of the
+# recipe change log when the cache announces nothing, and the age at which
+# `prune_pantry_changes` deletes change rows (an index idle for longer is
+# rebuilt)
+PANTRY_INDEX_SYNC_INTERVAL = float(os.getenv('PANTRY_INDEX_SYNC_INTERVAL', '5'))
+PANTRY_CHANGE_RETENTION = timedelta(days=int(os.getenv('PANTRY_CHANGE_RETENTION_DAYS', '7')))
+
+# Nutrition totals (health/nutrition.py): seconds a process keeps its
+# nutrient matrix without hearing of a change through the shared cache
+NUTRITION_MATRIX_MAX_AGE = float(os.getenv('NUTRITION_MATRIX_MAX_AGE', '300'))
+
+# Recipe and profile photos (core/images.py): processes rendering the resized
+# variants off the request path (0 renders them in the uploading thread),
+# and the largest upload accepted, in bytes and pixels. Every web worker
+# starts its own pool, so the host runs WEB_CONCURRENCY * IMAGE_WORKERS
+# render processes.
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', '1'))
+IMAGE_MAX_UPLOAD_BYTES = int(os.getenv('IMAGE_MAX_UPLOAD_BYTES', str(10 << 20)))
+IMAGE_MAX_PIXELS = int(os.getenv('IMAGE_MAX_PIXELS', '40000000'))
 
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
-    'DEFAULT_AUTHENTICATION_CLASSES': DEFAULT_AUTH_CLASSES + [
-        'rest_framework.authentication.TokenAuthentication',
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'users.authentication.HeaderDispatchAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
+    # token buckets of the password-hashing endpoints (register, token obtain),
+    # per client IP, per username and per route; see core/throttling.py
+    'DEFAULT_THROTTLE_RATES': {
+        'auth.ip': os.getenv('AUTH_THROTTLE_IP_RATE', '20/min'),
+        'auth.username': os.getenv('AUTH_THROTTLE_USERNAME_RATE', '10/min'),
+        'auth.route': os.getenv('AUTH_THROTTLE_ROUTE_RATE', '600/min'),
+    },
+    # proxies in front of Django that append to X-Forwarded-For; the per-IP
+    # buckets key on the address the nearest untrusted hop connected from.
+    # 0 uses REMOTE_ADDR, which gunicorn's uvicorn workers already take from
+    # the proxies in FORWARDED_ALLOW_IPS (unset, DRF would trust the
+    # client-supplied header and every request could pick a fresh bucket)
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', '0')),
 }
 
 # djangorestframework-simplejwt settings (if installed)
-from datetime import timedelta
-import importlib
-if importlib.util.find_spec('rest_framework_simplejwt') is not None:
+# JWT_BLACKLIST rotates refresh tokens and blacklists the used ones (one
+# row per issued refresh token; `purge_tokens` deletes the expired rows)
+JWT_BLACKLIST = HAS_SIMPLEJWT and os.getenv('JWT_BLACKLIST', 'False') == 'True'
+if HAS_SIMPLEJWT:
     # sensible defaults; override with env vars in production
     SIMPLE_JWT = {
         'ACCESS_TOKEN_LIFETIME': timedelta(minutes=int(os.getenv('JWT_ACCESS_MINUTES', '5'))),
         'REFRESH_TOKEN_LIFETIME': timedelta(days=int(os.getenv('JWT_REFRESH_DAYS', '7'))),
-        'ROTATE_REFRESH_TOKENS': False,
-        'BLACKLIST_AFTER_ROTATION': False,
+        'ROTATE_REFRESH_TOKENS': JWT_BLACKLIST,
+        'BLACKLIST_AFTER_ROTATION': JWT_BLACKLIST,
         'AUTH_HEADER_TYPES': ('Bearer', 'Token'),
         'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     }
+if JWT_BLACKLIST:
+    INSTALLED_APPS.append('rest_framework_simplejwt.token_blacklist')
 
 
 # CORS
@@ -16,6 +16,7 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from core.views import MetricsView, serve_image
 from .views import csrf_token_view
 
 urlpatterns = [
@@ -26,4 +27,7 @@ urlpatterns = [
     path('api/csrf/', csrf_token_view),
     path('api/recipes/', include('recipes.urls')),
     path('api/health/', include('health.urls')),
+    path('api/metrics/', MetricsView.as_view()),
+    # content-addressed photos (see core/images.py); the web server may serve these itself
+    path('media/images/<str:prefix>/<str:digest>/<str:name>', serve_image, name='image'),
 ]
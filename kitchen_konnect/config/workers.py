@@ -0,0 +1,8 @@
+"""Gunicorn worker class for serving `config.asgi` (see config/gunicorn.conf.py)."""
+from uvicorn_worker import UvicornWorker
+
+
+class DjangoUvicornWorker(UvicornWorker):
+    # Django does not implement the ASGI lifespan protocol; without this
+    # every worker start logs a "lifespan unsupported" message
+    CONFIG_KWARGS = {**UvicornWorker.CONFIG_KWARGS, 'lifespan': 'off'}
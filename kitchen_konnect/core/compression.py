@@ -0,0 +1,114 @@
+"""Negotiated brotli/gzip compression for API responses.
+
+Like `django.middleware.gzip.GZipMiddleware`, but:
+
+- prefers brotli when the client accepts it and the `brotli` package is
+  installed (gzip otherwise);
+- only compresses bodies of at least `COMPRESSION_MIN_SIZE` bytes (smaller
+  JSON bodies gain little and cost CPU) and only text-like content types;
+- uses `COMPRESSION_GZIP_LEVEL` / `COMPRESSION_BROTLI_QUALITY`, defaulting to
+  mid levels that trade a little ratio for much less CPU than the maxima.
+
+Strong ETags are weakened as the body no longer matches them byte for byte;
+304 responses and already encoded bodies pass through untouched.
+
+The middleware runs natively under both the WSGI and the ASGI handler.
+"""
+import gzip
+import re
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/javascript', 'application/xml', 'text/')
+
+_zero_quality = re.compile(r'^\s*q\s*=\s*0(\.0*)?\s*$')
+
+
+def accepted_encodings(header):
+    """Encodings named in an Accept-Encoding header, minus those with q=0."""
+    accepted = set()
+    for item in header.split(','):
+        name, _, params = item.partition(';')
+        name = name.strip().lower()
+        if name and not (params and _zero_quality.match(params)):
+            accepted.add(name)
+    return accepted
+
+
+def choose_encoding(header, streaming=False):
+    accepted = accepted_encodings(header or '')
+    # brotli is only used for complete bodies; streams use gzip
+    if brotli is not None and not streaming and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def _compressible(response):
+    content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+    return any(content_type.startswith(prefix) for prefix in COMPRESSIBLE_TYPES)
+
+
+class CompressionMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        return self.process_response(request, response)
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        return self.process_response(request, response)
+
+    def process_response(self, request, response):
+        if response.status_code == 304 or response.has_header('Content-Encoding'):
+            return response
+        if not _compressible(response):
+            return response
+        # varies whether or not this response ends up compressed
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING'), response.streaming)
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                return response
+            response.streaming_content = compress_sequence(response.streaming_content)
+            del response.headers['Content-Length']
+        else:
+            if len(response.content) < getattr(settings, 'COMPRESSION_MIN_SIZE', 1024):
+                return response
+            compressed = self.compress(response.content, encoding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
+
+    def compress(self, content, encoding):
+        if encoding == 'br':
+            return brotli.compress(content, quality=getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 5))
+        return gzip.compress(content, compresslevel=getattr(settings, 'COMPRESSION_GZIP_LEVEL', 6), mtime=0)
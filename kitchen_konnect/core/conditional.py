@@ -0,0 +1,136 @@
+"""Conditional GET for DRF list and detail views.
+
+`ConditionalGetMixin` answers `If-None-Match` / `If-Modified-Since` with 304
+before the view queries its page or serializes anything. The validators
+are change counters kept in the default cache, one per model in
+`conditional_models` (by default the model of the view's queryset), read
+with one `get_many`. `bump_table_versions()` increments them once the
+writing transaction has committed: it is called by the `post_save` /
+`post_delete` handlers in `users/signals.py`, and explicitly next to
+queryset updates and bulk inserts. Counting commits rather than taking the
+newest `updated_at` matters for long transactions, which commit timestamps
+older than ones already visible, and for deletions, which leave no
+timestamp at all.
+
+The counters never expire, so every worker must read the same ones: a
+worker with its own counters would answer 304 to a changed list forever.
+With several workers the cache must be shared (db, redis or memcached);
+the gunicorn master refuses to start on a locmem or file cache
+(`config.cache.require_shared_cache`).
+
+A counter says nothing about how far a replica has caught up, so requests
+reading from a replica (see config/db_router.py) get no validators and
+always a full response.
+
+The ETag also covers the request path and query string and the requesting
+user, so different pages, filters and users never share one.
+
+Responses carry `Cache-Control: private, no-cache`, so browsers keep them
+but revalidate on every use and get a body-less 304 while nothing changed.
+"""
+import hashlib
+import secrets
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from config.db_router import current_read_alias
+
+VERSION_PREFIX = 'cond:ver:'
+
+
+def _version_key(label):
+    return VERSION_PREFIX + label.lower()
+
+
+def _new_version():
+    # a random start, so an evicted counter does not come back at a value
+    # an old ETag was built from
+    return {'version': secrets.randbits(48), 'changed_at': timezone.now()}
+
+
+def bump_table_versions(*labels):
+    """Bump the change counters of models `labels` after the current
+    transaction commits (at once outside a transaction)."""
+    keys = [_version_key(label) for label in set(labels)]
+
+    def bump():
+        cache.set_many({key: _new_version() for key in keys}, None)
+
+    transaction.on_commit(bump)
+
+
+def table_versions(labels):
+    """`{label: (version, changed_at)}` of `labels`."""
+    keys = {label: _version_key(label) for label in labels}
+    values = cache.get_many(keys.values())
+    for key in set(keys.values()).difference(values):
+        cache.add(key, _new_version(), None)
+    if len(values) < len(keys):
+        values = cache.get_many(keys.values())
+    versions = {}
+    for label, key in keys.items():
+        value = values.get(key) or {'version': '', 'changed_at': None}
+        versions[label] = (value['version'], value['changed_at'])
+    return versions
+
+
+class ConditionalGetMixin:
+    # models whose changes can change the response; None: the queryset's model
+    conditional_models = None
+
+    def conditional_validators(self):
+        """Return `(values, last_modified)`: strings that change whenever the
+        response may, and the time of the latest change (None if unknown);
+        None when the request gets no validators.
+
+        The counters cover whole tables rather than the rows of this page or
+        filter: any change to the table revalidates every list URL, but the
+        lookup stays one cache read at any table size.
+        """
+        if current_read_alias():
+            return None
+        labels = self.conditional_models or (self.get_queryset().model._meta.label,)
+        versions = table_versions(labels)
+        known = [changed_at for _, changed_at in versions.values() if changed_at is not None]
+        return [f'{label}:{versions[label][0]}' for label in labels], max(known) if known else None
+
+    def conditional_state(self, request):
+        """Return `(etag, last_modified)` for the current request, `(None, None)`
+        without validators."""
+        validators = self.conditional_validators()
+        if validators is None:
+            return None, None
+        values, last_modified = validators
+        user = getattr(request, 'user', None)
+        parts = [request.get_full_path(), str(getattr(user, 'pk', None)), *values]
+        etag = 'W/"%s"' % hashlib.sha256('\n'.join(parts).encode()).hexdigest()[:32]
+        return etag, last_modified
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method not in ('GET', 'HEAD'):
+            return
+        name = request.method.lower()
+        handler = getattr(self, name, None)
+        if handler is None:
+            return
+        etag, last_modified = self.conditional_state(request)
+        if etag is None:
+            return
+        last_modified_ts = int(last_modified.timestamp()) if last_modified is not None else None
+
+        def conditional(request, *args, **kwargs):
+            not_modified = get_conditional_response(request._request, etag=etag, last_modified=last_modified_ts)
+            response = not_modified if not_modified is not None else handler(request, *args, **kwargs)
+            if response.status_code in (200, 304):
+                response['ETag'] = etag
+                if last_modified_ts is not None:
+                    response['Last-Modified'] = http_date(last_modified_ts)
+                patch_cache_control(response, private=True, no_cache=True)
+            return response
+
+        setattr(self, name, conditional)
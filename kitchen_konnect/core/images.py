@@ -0,0 +1,355 @@
+"""Content-addressed image storage with resized WebP/JPEG variants.
+
+An upload (`store_image`) is streamed to storage while it is hashed, checked
+with Pillow (format, pixel count) and filed under its SHA-256:
+
+    MEDIA_ROOT/images/<d[:2]>/<digest>/original.<jpg|png|webp|gif>
+    MEDIA_ROOT/images/<d[:2]>/<digest>/<variant>.<webp|jpg>
+
+so the same photo uploaded twice is stored once and shares one
+`StoredImage` row. Models reference images by digest (a foreign key to
+`StoredImage.digest`), so URLs are built from the referencing row alone.
+
+The upload request only writes the original. The variants (bounding boxes
+of `VARIANT_SIZES`, each as WebP and JPEG) are rendered after commit by a
+pool of `IMAGE_WORKERS` processes (`schedule_variants`), so upload latency
+does not depend on how many variants there are; `IMAGE_WORKERS = 0`
+renders them in the calling thread (tests, management commands).
+
+Files never change once written, so `file_response` (behind the
+`/media/images/` URLs, see `core.views.serve_image`) sends them with a
+year-long immutable `Cache-Control`, a strong ETag and byte-range support.
+A variant requested before it exists is answered with the original, marked
+`no-cache`, and scheduled. Whoever schedules an image first (the upload or a
+request for a variant) creates its `.pending` marker, so other requests and
+processes do not queue the same image again while it renders. In production the web server may serve
+`MEDIA_ROOT/images/` itself with the same headers.
+"""
+import hashlib
+import logging
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.db import transaction
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+
+from .lazy import optional_module
+
+Image = optional_module('PIL.Image')
+ImageOps = optional_module('PIL.ImageOps')
+
+logger = logging.getLogger(__name__)
+
+IMAGE_ROOT = 'images'
+# Pillow format: (file extension, content type)
+ORIGINAL_FORMATS = {
+    'JPEG': ('jpg', 'image/jpeg'),
+    'PNG': ('png', 'image/png'),
+    'WEBP': ('webp', 'image/webp'),
+    'GIF': ('gif', 'image/gif'),
+}
+# name: longest side in pixels (images are never enlarged)
+VARIANT_SIZES = {'thumb': 160, 'small': 480, 'medium': 960, 'large': 1600}
+# file extension: (Pillow format, content type, save options)
+VARIANT_FORMATS = {
+    'webp': ('WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+CONTENT_TYPES = {ext: content_type for ext, content_type in ORIGINAL_FORMATS.values()}
+IMMUTABLE = 'public, max-age=31536000, immutable'
+READ_SIZE = 1 << 16
+# next to the original while its variants are being rendered
+PENDING_MARKER = '.pending'
+# a marker older than this was left by a worker that died
+PENDING_TIMEOUT = 600
+
+DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+_range_re = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def image_directory(digest):
+    return f'{IMAGE_ROOT}/{digest[:2]}/{digest}'
+
+
+def image_path(digest, name):
+    return os.path.join(settings.MEDIA_ROOT, image_directory(digest), name)
+
+
+def image_url(digest, name):
+    return f'{settings.MEDIA_URL}{image_directory(digest)}/{name}'
+
+
+def variant_urls(digest):
+    """`{variant: {ext: url}}` of image `digest`, or None without an image."""
+    if not digest:
+        return None
+    return {
+        variant: {ext: image_url(digest, f'{variant}.{ext}') for ext in VARIANT_FORMATS}
+        for variant in VARIANT_SIZES
+    }
+
+
+def missing_variants(digest):
+    names = [f'{variant}.{ext}' for variant in VARIANT_SIZES for ext in VARIANT_FORMATS]
+    return [name for name in names if not os.path.exists(image_path(digest, name))]
+
+
+# -- upload -------------------------------------------------------------------
+
+
+def store_image(upload):
+    """File `upload` (an uploaded or open binary file) under its digest and
+    return its `StoredImage`; raises `InvalidImage` for files that are too
+    large, not an image or not one of `ORIGINAL_FORMATS`."""
+    from .models import StoredImage
+
+    if Image is None:
+        raise InvalidImage('Image uploads need Pillow.')
+    max_bytes = settings.IMAGE_MAX_UPLOAD_BYTES
+    staging = os.path.join(settings.MEDIA_ROOT, IMAGE_ROOT, 'tmp')
+    os.makedirs(staging, exist_ok=True)
+    # in MEDIA_ROOT, so the final move is a rename
+    fd, temp_path = tempfile.mkstemp(dir=staging)
+    try:
+        hasher, size = hashlib.sha256(), 0
+        with os.fdopen(fd, 'wb') as out:
+            if hasattr(upload, 'chunks'):
+                chunks = upload.chunks(READ_SIZE)
+            else:
+                chunks = iter(lambda: upload.read(READ_SIZE), b'')
+            for chunk in chunks:
+                size += len(chunk)
+                if size > max_bytes:
+                    raise InvalidImage(f'Images are limited to {max_bytes // (1 << 20)} MB.')
+                hasher.update(chunk)
+                out.write(chunk)
+        fmt, width, height = inspect_image(temp_path)
+        digest = hasher.hexdigest()
+        ext = ORIGINAL_FORMATS[fmt][0]
+        path = image_path(digest, f'original.{ext}')
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    image, _ = StoredImage.objects.get_or_create(
+        digest=digest, defaults={'format': ext, 'width': width, 'height': height, 'size': size},
+    )
+    if missing_variants(digest):
+        transaction.on_commit(lambda: schedule_variants(digest, ext))
+    return image
+
+
+def inspect_image(path):
+    """`(Pillow format, width, height)` of the image at `path`, read from its header."""
+    try:
+        with Image.open(path) as img:
+            fmt, (width, height) = img.format, img.size
+            if fmt not in ORIGINAL_FORMATS:
+                raise InvalidImage(f'Unsupported image format {fmt}; use JPEG, PNG, WebP or GIF.')
+            if width * height > settings.IMAGE_MAX_PIXELS:
+                raise InvalidImage(f'Images are limited to {settings.IMAGE_MAX_PIXELS:,} pixels.')
+            img.verify()
+    except InvalidImage:
+        raise
+    except Exception as exc:  # Pillow raises a variety of errors on bad data
+        raise InvalidImage('Not a valid image file.') from exc
+    return fmt, width, height
+
+
+# -- variants -----------------------------------------------------------------
+
+
+def render_variants(source, directory):
+    """Write every missing variant of the image file `source` into `directory`;
+    return the names written. Runs in the worker processes.
+
+    JPEGs are decoded at the smallest DCT scale that still covers the
+    largest variant (`draft`), and each variant is resized from the next
+    larger one rather than from the original.
+    """
+    largest = max(VARIANT_SIZES.values())
+    written = []
+    with Image.open(source) as img:
+        img.draft('RGB', (largest, largest))
+        current = ImageOps.exif_transpose(img)
+        if current.mode not in ('RGB', 'RGBA'):
+            current = current.convert('RGBA' if 'transparency' in current.info or 'A' in current.mode else 'RGB')
+        for variant, size in sorted(VARIANT_SIZES.items(), key=lambda item: -item[1]):
+            if max(current.size) > size:
+                current = current.copy()
+                current.thumbnail((size, size), Image.Resampling.LANCZOS)
+            for ext, (fmt, _, options) in VARIANT_FORMATS.items():
+                name = f'{variant}.{ext}'
+                path = os.path.join(directory, name)
+                if os.path.exists(path):
+                    continue
+                out = current
+                if fmt == 'JPEG' and current.mode == 'RGBA':
+                    out = Image.new('RGB', current.size, (255, 255, 255))
+                    out.paste(current, mask=current.getchannel('A'))
+                # written aside and renamed, so readers never see a partial file
+                temp_path = f'{path}.{os.getpid()}.tmp'
+                out.save(temp_path, fmt, **options)
+                os.replace(temp_path, path)
+                written.append(name)
+    return written
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_image_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                # spawned rather than forked from a threaded server process
+                _executor = ProcessPoolExecutor(
+                    max_workers=settings.IMAGE_WORKERS, mp_context=multiprocessing.get_context('spawn'),
+                )
+    return _executor
+
+
+def _claim_variants(digest):
+    # the `.pending` marker; a stale one was left by a worker that died
+    path = image_path(digest, PENDING_MARKER)
+    try:
+        os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        try:
+            if time.time() - os.path.getmtime(path) < PENDING_TIMEOUT:
+                return False
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+    return True
+
+
+def _release_variants(digest):
+    try:
+        os.remove(image_path(digest, PENDING_MARKER))
+    except FileNotFoundError:
+        pass
+
+
+def schedule_variants(digest, ext):
+    """Render the missing variants of image `digest` in the worker pool.
+
+    Only the caller that creates the image's `.pending` marker renders it,
+    and the marker is removed once rendering ends. Returns the future, or
+    None when the image is already pending (in any process) or was rendered
+    inline (`IMAGE_WORKERS = 0`).
+    """
+    source = image_path(digest, f'original.{ext}')
+    directory = os.path.dirname(source)
+    if not _claim_variants(digest):
+        return None
+    if not settings.IMAGE_WORKERS:
+        try:
+            render_variants(source, directory)
+        finally:
+            _release_variants(digest)
+        return None
+    try:
+        future = get_image_executor().submit(render_variants, source, directory)
+    except Exception:
+        _release_variants(digest)
+        raise
+
+    def done(future):
+        _release_variants(digest)
+        if future.exception() is not None:
+            logger.error('Rendering variants of image %s failed', digest, exc_info=future.exception())
+
+    future.add_done_callback(done)
+    return future
+
+
+# -- serving ------------------------------------------------------------------
+
+
+def file_response(request, path, content_type, etag):
+    """The file at `path` with immutable caching headers, answering
+    `If-None-Match` with 304 and a single `Range` with 206.
+
+    Multi-range requests get the whole file, as HTTP allows.
+    """
+    if etag and etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        response['Cache-Control'] = IMMUTABLE
+        return response
+    size = os.path.getsize(path)
+    byte_range = parse_range(request, size, etag)
+    if byte_range == 'unsatisfiable':
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+    elif byte_range is not None:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            read_range(path, start, end - start + 1), status=206, content_type=content_type,
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+    else:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    response['Accept-Ranges'] = 'bytes'
+    if etag:
+        response['ETag'] = etag
+    response['Cache-Control'] = IMMUTABLE
+    return response
+
+
+def parse_range(request, size, etag):
+    """`(first, last)` byte of the request's `Range`, None to send the whole
+    file, or `'unsatisfiable'`."""
+    header = request.headers.get('Range')
+    if not header or request.method not in ('GET', 'HEAD'):
+        return None
+    if_range = request.headers.get('If-Range')
+    if if_range is not None and (etag is None or if_range != etag):
+        return None
+    match = _range_re.match(header.replace(' ', ''))
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # the last N bytes
+        length = int(last)
+        if not length or not size:
+            return 'unsatisfiable'
+        return max(0, size - length), size - 1
+    first = int(first)
+    last = min(int(last), size - 1) if last else size - 1
+    if first >= size:
+        return 'unsatisfiable'
+    if last < first:
+        return None
+    return first, last
+
+
+def read_range(path, start, length):
+    with open(path, 'rb') as fh:
+        fh.seek(start)
+        while length > 0:
+            chunk = fh.read(min(READ_SIZE, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
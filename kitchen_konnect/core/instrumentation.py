@@ -0,0 +1,259 @@
+"""Per-request SQL and timing instrumentation.
+
+`InstrumentationMiddleware` (first in `MIDDLEWARE`) measures every request:
+
+- number of SQL statements and time spent in the database (all aliases,
+  through an execute wrapper added to each new connection);
+- time spent in DRF authentication, permission checks, serialization
+  (`to_representation`) and rendering (`response.render()`);
+- the view that handled it.
+
+and, with `INSTRUMENTATION_SERVER_TIMING` (off by default: it tells every
+client where the backend spends its time), reports them as a
+`Server-Timing` header (visible in the browser's network panel)::
+
+    Server-Timing: db;dur=4.1;desc="3 queries", auth;dur=0.2, permissions;dur=0.0,
+                   serialize;dur=1.3, render;dur=0.4, total;dur=7.9
+
+A JSON line on the `kitchen_konnect.requests` logger is written for a random
+`INSTRUMENTATION_SAMPLE_RATE` share of requests, and always for requests
+slower than `INSTRUMENTATION_SLOW_REQUEST_MS`. Statements slower than
+`INSTRUMENTATION_SLOW_QUERY_MS` are logged on `kitchen_konnect.db` with the
+project frame that issued them (the stack is only inspected for those).
+With `METRICS_ENABLED`, every request is also added to the Prometheus
+metrics in `core/metrics.py`.
+
+Authentication and permission checks are timed by `InstrumentedViewMixin`
+and serialization by `InstrumentedSerializerMixin`, which the project's
+views and serializers inherit; DRF classes used as they are (third-party
+views) only contribute to `db` and `total`. Rendering is timed by the
+middleware's `process_template_response` hook, and the execute wrapper is
+added by `install()` at start-up (see `CoreConfig.ready`). Outside a
+request, and with `INSTRUMENTATION_ENABLED = False`, the mixins and the
+execute wrapper only look up a context variable.
+"""
+import contextvars
+import json
+import logging
+import random
+import time
+import traceback
+from contextlib import contextmanager
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from core.metrics import observe_request
+
+logger = logging.getLogger('kitchen_konnect.requests')
+db_logger = logging.getLogger('kitchen_konnect.db')
+
+PHASES = ('auth', 'permissions', 'serialize', 'render')
+SQL_LOG_LENGTH = 500
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+# frames from files under the project directory count as query origins
+_project_dir = str(Path(__file__).resolve().parent.parent)
+
+
+class RequestMetrics:
+    __slots__ = ('started', 'queries', 'db_time', 'phases', 'running', 'view', 'slow_queries')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.running = set()
+        self.view = None
+        self.slow_queries = []
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+
+def current_metrics():
+    """The `RequestMetrics` of the request being served, or None."""
+    return _current.get()
+
+
+@contextmanager
+def phase(name):
+    """Add the time spent in the block to phase `name` of the current request."""
+    metrics = _current.get()
+    if metrics is None or name in metrics.running:
+        # nested timing of the same phase (e.g. serializers inside
+        # serializers) is already covered by the outer block
+        yield
+        return
+    metrics.running.add(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.running.discard(name)
+        metrics.phases[name] = metrics.phases.get(name, 0.0) + time.perf_counter() - start
+
+
+def query_origin():
+    """`path:line in function` of the innermost project frame (outside this module)."""
+    for frame in reversed(traceback.extract_stack()[:-2]):
+        filename = frame.filename
+        if filename.startswith(_project_dir) and 'site-packages' not in filename and filename != __file__:
+            return f'{Path(filename).relative_to(_project_dir)}:{frame.lineno} in {frame.name}'
+    return None
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.queries += 1
+        metrics.db_time += elapsed
+        slow_ms = getattr(settings, 'INSTRUMENTATION_SLOW_QUERY_MS', 100)
+        if elapsed * 1000 >= slow_ms:
+            entry = {
+                'duration_ms': round(elapsed * 1000, 2),
+                'sql': sql[:SQL_LOG_LENGTH],
+                'alias': context['connection'].alias,
+                'origin': query_origin(),
+            }
+            metrics.slow_queries.append(entry)
+            db_logger.warning('slow query %s', json.dumps(entry))
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """`connection_created` receiver: time every statement run on `connection`."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def install():
+    """Time every statement run on a database connection (idempotent)."""
+    from django.db.backends.signals import connection_created
+
+    connection_created.connect(install_query_recorder, dispatch_uid='core.instrumentation')
+
+
+class InstrumentedViewMixin:
+    """Time a DRF view's authentication and permission checks."""
+
+    def perform_authentication(self, request):
+        with phase('auth'):
+            super().perform_authentication(request)
+
+    def check_permissions(self, request):
+        with phase('permissions'):
+            super().check_permissions(request)
+
+    def check_object_permissions(self, request, obj):
+        with phase('permissions'):
+            super().check_object_permissions(request, obj)
+
+
+class InstrumentedSerializerMixin:
+    """Time a serializer's output; in lists, each row's share is added up."""
+
+    def to_representation(self, instance):
+        if _current.get() is None:
+            return super().to_representation(instance)
+        with phase('serialize'):
+            return super().to_representation(instance)
+
+
+def view_name(view_func):
+    # views wrapped by core.lazy name their class without importing it
+    lazy_path = getattr(view_func, 'lazy_view_path', None)
+    if lazy_path is not None:
+        return lazy_path
+    view = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None) or view_func
+    return f'{view.__module__}.{getattr(view, "__qualname__", view.__class__.__name__)}'
+
+
+def server_timing(metrics, total_ms):
+    parts = [f'db;dur={metrics.db_time * 1000:.1f};desc="{metrics.queries} queries"']
+    parts += [f'{name};dur={seconds * 1000:.1f}' for name, seconds in metrics.phases.items()]
+    parts.append(f'total;dur={total_ms:.1f}')
+    return ', '.join(parts)
+
+
+class InstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'INSTRUMENTATION_ENABLED', True)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            # a sync hook would wait for the thread that runs sync views
+            self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = _current.get()
+        if metrics is not None:
+            metrics.view = view_name(view_func)
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        self.process_view(request, view_func, view_args, view_kwargs)
+
+    def process_template_response(self, request, response):
+        # the handler's own render() is then a no-op; as the first
+        # middleware this hook runs after every other one
+        if _current.get() is not None:
+            with phase('render'):
+                response.render()
+        return response
+
+    def finish(self, request, response, metrics):
+        total_ms = metrics.elapsed_ms()
+        if getattr(settings, 'INSTRUMENTATION_SERVER_TIMING', False):
+            response['Server-Timing'] = server_timing(metrics, total_ms)
+        slow = total_ms >= getattr(settings, 'INSTRUMENTATION_SLOW_REQUEST_MS', 500)
+        if slow or metrics.slow_queries or random.random() < getattr(settings, 'INSTRUMENTATION_SAMPLE_RATE', 0.01):
+            line = {
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'view': metrics.view,
+                'duration_ms': round(total_ms, 2),
+                'db_ms': round(metrics.db_time * 1000, 2),
+                'queries': metrics.queries,
+                **{f'{name}_ms': round(seconds * 1000, 2) for name, seconds in metrics.phases.items()},
+            }
+            if metrics.slow_queries:
+                line['slow_queries'] = metrics.slow_queries
+            logger.log(logging.WARNING if slow else logging.INFO, json.dumps(line))
+        if getattr(settings, 'METRICS_ENABLED', True):
+            observe_request(request, response, metrics, total_ms / 1000)
+        return response
@@ -0,0 +1,84 @@
+"""Deferred imports for stacks most requests never touch.
+
+Worker start-up imports settings, the apps and (on the first request) the
+URLconf with every view module it references. Heavy or optional packages
+(SimpleJWT views, the OpenAI client, Pillow, ...) should not ride along:
+
+    urlpatterns = [path('token/', lazy_view('users.tokens.AuthClaimsTokenObtainPairView'))]
+
+    Image = optional_module('PIL.Image')   # None when Pillow is missing
+
+    def thumbnail(path):
+        with Image.open(path) as img:      # Pillow is imported here
+            ...
+
+`python -m benchmarks.startup` lists what start-up imports and how long
+it takes; `core.tests.StartupImportsTest` keeps the modules in
+`DEFERRED_MODULES` out of it.
+"""
+import functools
+import importlib.util
+import sys
+import types
+
+from django.utils.module_loading import import_string
+
+# must not be imported by django.setup() plus URLconf loading
+DEFERRED_MODULES = ('rest_framework_simplejwt.views', 'openai', 'PIL', 'pydantic')
+
+
+def lazy_view(dotted_path, **initkwargs):
+    """Return a URL view that imports the DRF view class `dotted_path` on first call.
+
+    DRF's `APIView.as_view()` is CSRF-exempt (SessionAuthentication enforces
+    CSRF itself), and so is the returned stand-in, since the CSRF middleware
+    inspects the view before it is loaded.
+    """
+
+    @functools.cache
+    def load():
+        return import_string(dotted_path).as_view(**initkwargs)
+
+    def view(request, *args, **kwargs):
+        return load()(request, *args, **kwargs)
+
+    view.csrf_exempt = True
+    view.__name__ = view.__qualname__ = dotted_path.rpartition('.')[2]
+    view.lazy_view_path = dotted_path
+    view.load = load
+    return view
+
+
+class DeferredSubmodule(types.ModuleType):
+    """Stand-in for a submodule whose package is not imported yet."""
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self.__name__)
+        # later lookups find the attributes directly
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+
+def optional_module(name):
+    """Return module `name`, imported on first attribute access, or None if it is not installed.
+
+    For a submodule ('PIL.Image') only the top-level package is looked up,
+    since finding the submodule would import the package.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    if '.' in name:
+        if importlib.util.find_spec(name.partition('.')[0]) is None:
+            return None
+        return DeferredSubmodule(name)
+    try:
+        spec = importlib.util.find_spec(name)
+    except ModuleNotFoundError:  # parent package missing
+        return None
+    if spec is None:
+        return None
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from core.response_cache import get_stats, reset_stats
+
+
+class Command(BaseCommand):
+    help = 'Show response cache hits, misses and hit ratio per view (see core/response_cache.py)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Clear the counters after printing them')
+
+    def handle(self, *args, **options):
+        stats = get_stats()
+        if not stats:
+            self.stdout.write('No response cache activity recorded.')
+        for view_name, row in sorted(stats.items(), key=lambda item: -(item[1]['hits'] + item[1]['misses'])):
+            self.stdout.write(
+                f"{view_name:<60} hits {row['hits']:>8}  misses {row['misses']:>8}  ratio {row['ratio']:6.1%}"
+            )
+        if options['reset']:
+            reset_stats()
+            self.stdout.write('Counters reset.')
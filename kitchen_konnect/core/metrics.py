@@ -0,0 +1,360 @@
+"""Prometheus metrics aggregated across worker processes.
+
+Every process adds its samples to its own memory-mapped file in
+`METRICS_DIR` (`metrics_<pid>.db`); a scrape of `/api/metrics/` reads all
+files in the directory and sums them, so the totals cover every gunicorn
+worker without a push gateway or shared server. Collected per DRF view
+(label `view`, `unmatched` for requests no view handled):
+
+    kk_http_requests_total                  by method and status code
+    kk_http_request_duration_seconds        latency histogram
+    kk_db_queries_per_request               SQL statements histogram
+    kk_db_duration_seconds                  database time histogram
+    kk_auth_failures_total                  401 responses, by Authorization scheme
+
+Samples are taken by `InstrumentationMiddleware` (so they need
+`INSTRUMENTATION_ENABLED` as well as `METRICS_ENABLED`). Histogram buckets
+are stored cumulatively, one counter per `le`, so a sample is a handful of
+in-place float additions.
+
+File layout: an 8-byte header holding the number of bytes used, then
+entries of `uint32 key length, key (padded to 8 bytes), float64 value`.
+The writer fills in an entry before moving the header past it, so readers
+in other processes only ever see complete entries.
+
+Counters never go down, so a process's totals outlive it: its file is
+folded into `metrics_archive.db` once it exits (`mark_process_dead`). Under
+gunicorn the `child_exit` hook does that and `on_starting` empties the
+directory (`reset_directory`); elsewhere (runserver, other ASGI servers,
+tests) each process sweeps the files of dead pids when it opens its own,
+and every scrape does before reading (`mark_dead_processes`), so files do
+not pile up. Folding takes an exclusive `flock` on the directory's lock
+file, scrapes a shared one.
+"""
+import bisect
+import json
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+from pathlib import Path
+
+from django.conf import settings
+
+from core.lazy import optional_module
+
+fcntl = optional_module('fcntl')  # not available on Windows: no locking
+
+DEFAULT_DIR = os.path.join(tempfile.gettempdir(), 'kitchen_konnect_metrics')
+ARCHIVE = 'metrics_archive.db'
+LOCK = '.lock'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+INITIAL_SIZE = 64 * 1024
+HTTP_METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'))
+AUTH_SCHEMES = frozenset(('bearer', 'token', 'basic'))
+
+_HEADER = struct.Struct('i4x')
+_LENGTH = struct.Struct('i')
+_VALUE = struct.Struct('d')
+
+
+def metrics_dir():
+    return Path(getattr(settings, 'METRICS_DIR', '') or DEFAULT_DIR)
+
+
+class MmapValues:
+    """Float values by key in a file only this process writes to."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = open(self.path, 'a+b')
+        size = os.fstat(self._file.fileno()).st_size
+        if size < INITIAL_SIZE:
+            self._file.truncate(INITIAL_SIZE)
+            size = INITIAL_SIZE
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self._used = _HEADER.unpack_from(self._map)[0] or _HEADER.size
+        self._positions = {key: pos for key, _, pos in _entries(self._map, self._used)}
+
+    def add(self, key, amount):
+        self.add_many(((key, amount),))
+
+    def add_many(self, increments):
+        with self._lock:
+            for key, amount in increments:
+                pos = self._positions.get(key)
+                if pos is None:
+                    pos = self._append(key)
+                _VALUE.pack_into(self._map, pos, _VALUE.unpack_from(self._map, pos)[0] + amount)
+
+    def _append(self, key):
+        encoded = key.encode()
+        padded = _LENGTH.size + len(encoded)
+        padded += -padded % 8
+        needed = self._used + padded + _VALUE.size
+        if needed > len(self._map):
+            size = len(self._map)
+            while size < needed:
+                size *= 2
+            self._map.close()
+            self._file.truncate(size)
+            self._map = mmap.mmap(self._file.fileno(), size)
+        self._map[self._used:self._used + padded] = _LENGTH.pack(len(encoded)) + encoded.ljust(padded - _LENGTH.size)
+        pos = self._used + padded
+        _VALUE.pack_into(self._map, pos, 0.0)
+        self._used = pos + _VALUE.size
+        _HEADER.pack_into(self._map, 0, self._used)
+        self._positions[key] = pos
+        return pos
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+def _entries(buffer, used):
+    pos = _HEADER.size
+    while pos < used:
+        length = _LENGTH.unpack_from(buffer, pos)[0]
+        key = bytes(buffer[pos + _LENGTH.size:pos + _LENGTH.size + length]).decode()
+        pos += _LENGTH.size + length
+        pos += -pos % 8
+        yield key, _VALUE.unpack_from(buffer, pos)[0], pos
+        pos += _VALUE.size
+
+
+def read_values(path):
+    """Return `{key: value}` from the file at `path` (written by any process)."""
+    data = Path(path).read_bytes()
+    if len(data) < _HEADER.size:
+        return {}
+    return {key: value for key, value, _ in _entries(data, _HEADER.unpack_from(data)[0])}
+
+
+_process_values = {}
+_process_lock = threading.Lock()
+
+
+def process_values():
+    """The `MmapValues` of this process (reopened after a fork)."""
+    directory = metrics_dir()
+    key = (os.getpid(), directory)
+    values = _process_values.get(key)
+    if values is None:
+        with _process_lock:
+            values = _process_values.get(key)
+            if values is None:
+                mark_dead_processes(directory)
+                values = _process_values[key] = MmapValues(directory / f'metrics_{os.getpid()}.db')
+    return values
+
+
+class _DirectoryLock:
+    def __init__(self, directory, operation):
+        self.path = Path(directory) / LOCK
+        self.operation = operation
+
+    def __enter__(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'a')
+        if fcntl is not None:
+            fcntl.flock(self._file, getattr(fcntl, self.operation))
+
+    def __exit__(self, *exc):
+        self._file.close()  # releases the lock
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._keys = {}
+        REGISTRY[name] = self
+
+    def key(self, suffix, labels):
+        # [sample name, label pairs in declaration order]; also the sort key
+        pairs = [[name, str(labels[name])] for name in self.labels]
+        if 'le' in labels:
+            pairs.append(['le', _format_value(labels['le'])])
+        return json.dumps([self.name + suffix, pairs])
+
+    def series_keys(self, labels):
+        """The file keys of the series `labels` (encoded once per process)."""
+        values = tuple(labels[name] for name in self.labels)
+        keys = self._keys.get(values)
+        if keys is None:
+            keys = self._keys[values] = self.build_keys(labels)
+        return keys
+
+    def build_keys(self, labels):
+        return self.key('', labels)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        process_values().add(self.series_keys(labels), amount)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=()):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def build_keys(self, labels):
+        buckets = [self.key('_bucket', {**labels, 'le': bound}) for bound in self.buckets]
+        return buckets, self.key('_sum', labels), self.key('_count', labels)
+
+    def observe(self, value, **labels):
+        buckets, sum_key, count_key = self.series_keys(labels)
+        first = bisect.bisect_left(self.buckets, value)
+        process_values().add_many([(key, 1) for key in buckets[first:]] + [(sum_key, value), (count_key, 1)])
+
+
+REGISTRY = {}
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+REQUESTS = Counter('kk_http_requests_total', 'HTTP requests by view, method and status code.',
+                   ('view', 'method', 'status'))
+LATENCY = Histogram('kk_http_request_duration_seconds', 'Time to produce the response.', ('view',),
+                    LATENCY_BUCKETS)
+DB_QUERIES = Histogram('kk_db_queries_per_request', 'SQL statements run per request.', ('view',),
+                       (0, 1, 2, 3, 5, 10, 20, 50, 100))
+DB_DURATION = Histogram('kk_db_duration_seconds', 'Time spent in the database per request.', ('view',),
+                        LATENCY_BUCKETS)
+AUTH_FAILURES = Counter('kk_auth_failures_total', 'Requests answered 401, by Authorization scheme.',
+                        ('view', 'scheme'))
+
+
+def auth_scheme(request):
+    header = request.META.get('HTTP_AUTHORIZATION', '').split()
+    if not header:
+        return 'none'
+    scheme = header[0].lower()
+    return scheme if scheme in AUTH_SCHEMES else 'other'
+
+
+def observe_request(request, response, metrics, duration):
+    """Record a finished request (`metrics` is its `RequestMetrics`)."""
+    view = metrics.view or 'unmatched'
+    method = request.method if request.method in HTTP_METHODS else 'other'
+    REQUESTS.inc(view=view, method=method, status=response.status_code)
+    LATENCY.observe(duration, view=view)
+    DB_QUERIES.observe(metrics.queries, view=view)
+    DB_DURATION.observe(metrics.db_time, view=view)
+    if response.status_code == 401:
+        AUTH_FAILURES.inc(view=view, scheme=auth_scheme(request))
+
+
+def collect(directory=None):
+    """Sum the values of every process file in `directory`."""
+    directory = Path(directory or metrics_dir())
+    mark_dead_processes(directory)
+    totals = {}
+    with _DirectoryLock(directory, 'LOCK_SH'):
+        for path in directory.glob('metrics_*.db'):
+            try:
+                values = read_values(path)
+            except FileNotFoundError:
+                continue
+            for key, value in values.items():
+                totals[key] = totals.get(key, 0.0) + value
+    return totals
+
+
+def mark_process_dead(pid, directory=None):
+    """Fold the file of exited process `pid` into the archive file."""
+    directory = Path(directory or metrics_dir())
+    path = directory / f'metrics_{pid}.db'
+    with _DirectoryLock(directory, 'LOCK_EX'):
+        if not path.exists():
+            return
+        archive = MmapValues(directory / ARCHIVE)
+        try:
+            for key, value in read_values(path).items():
+                archive.add(key, value)
+        finally:
+            archive.close()
+        path.unlink()
+
+
+def _pid_running(pid):
+    if os.name != 'posix':
+        # os.kill() would terminate it
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def mark_dead_processes(directory=None):
+    """Fold the files of processes that are no longer running into the
+    archive file; return their pids."""
+    directory = Path(directory or metrics_dir())
+    dead = []
+    for path in directory.glob('metrics_*.db'):
+        pid = path.stem.partition('_')[2]
+        if pid.isdigit() and not _pid_running(int(pid)):
+            dead.append(int(pid))
+    for pid in dead:
+        mark_process_dead(pid, directory)
+    return dead
+
+
+def reset_directory(directory=None):
+    """Remove the files of a previous server run."""
+    directory = Path(directory or metrics_dir())
+    with _DirectoryLock(directory, 'LOCK_EX'):
+        for path in directory.glob('metrics_*.db'):
+            path.unlink()
+
+
+def _format_value(value):
+    return '+Inf' if value == math.inf else repr(float(value))
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def render(totals=None):
+    """Prometheus text exposition of `totals` (default: `collect()`)."""
+    totals = collect() if totals is None else totals
+    samples = {}
+    for key, value in totals.items():
+        sample, labels = json.loads(key)
+        metric = sample
+        for suffix in ('_bucket', '_sum', '_count'):
+            if sample.endswith(suffix) and sample[:-len(suffix)] in REGISTRY:
+                metric = sample[:-len(suffix)]
+        samples.setdefault(metric, []).append((sample, labels, value))
+
+    lines = []
+    for name, metric in REGISTRY.items():
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.kind}')
+        for sample, labels, value in sorted(samples.get(name, ()), key=_sample_order):
+            label_text = ','.join(f'{label}="{_escape(text)}"' for label, text in labels)
+            lines.append(f'{sample}{{{label_text}}} {_format_value(value)}' if labels else f'{sample} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def _sample_order(item):
+    sample, labels, _ = item
+    series = [pair for pair in labels if pair[0] != 'le']
+    le = next((float(text) for label, text in labels if label == 'le'), 0.0)
+    return series, sample.rpartition('_')[2] != 'bucket', sample, le
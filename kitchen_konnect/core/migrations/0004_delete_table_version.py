@@ -0,0 +1,16 @@
+# Generated by Django 5.2.3 on 2026-10-18 13:45
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_table_version'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='TableVersion',
+        ),
+    ]
@@ -1,3 +1,16 @@
 from django.db import models
 
-# Create your models here.
+
+class StoredImage(models.Model):
+    """An uploaded image, stored once per content under its SHA-256 (see core/images.py)."""
+
+    digest = models.CharField(max_length=64, unique=True)
+    # extension of the original file: jpg, png, webp or gif
+    format = models.CharField(max_length=4)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    size = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return f'{self.digest[:12]}.{self.format} ({self.width}x{self.height})'
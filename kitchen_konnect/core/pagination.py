@@ -0,0 +1,171 @@
+"""Keyset (cursor) pagination with a page-number fallback.
+
+`PageNumberPagination` issues a `COUNT(*)` and an `OFFSET` scan for every
+page, so deep pages get linearly slower. `KeysetPagination` keeps the
+page-number behaviour by default and switches to keyset mode when the client
+sends a `cursor` query parameter (an empty `?cursor=` requests the first
+page). In keyset mode each page is a single indexed range query:
+
+    WHERE (created_at, id) < (:last_created_at, :last_id)
+    ORDER BY created_at DESC, id DESC LIMIT :page_size + 1
+
+Views declare the keyset with `keyset_ordering`, a tuple of field names
+(prefix with '-' for descending) that must end in a unique field. Cursors are
+opaque base64 tokens; `?count=approx` adds an `approximate_count` taken from
+table statistics instead of counting rows.
+"""
+import base64
+import json
+from collections import OrderedDict
+
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def approximate_row_count(model, using='default'):
+    """Return the planner's row estimate for `model`'s table, or None.
+
+    PostgreSQL reads `pg_class.reltuples` (kept fresh by autovacuum); SQLite
+    reads `sqlite_stat1`, which is only populated after `ANALYZE`.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+            row = cursor.fetchone()
+            return max(int(row[0]), 0) if row else None
+        if connection.vendor == 'sqlite':
+            try:
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table])
+            except Exception:
+                # sqlite_stat1 does not exist until ANALYZE has run
+                return None
+            row = cursor.fetchone()
+            return int(row[0].split()[0]) if row else None
+    return None
+
+
+class KeysetPagination(PageNumberPagination):
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    invalid_cursor_message = 'Invalid cursor.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset_mode = self.cursor_query_param in request.query_params
+        if not self.keyset_mode:
+            return super().paginate_queryset(queryset, request, view=view)
+
+        self.request = request
+        self.ordering = tuple(getattr(view, 'keyset_ordering', ('id',)))
+        self.page_size_value = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        values, reverse = self.decode_cursor(request.query_params.get(self.cursor_query_param))
+
+        ordering = self.ordering if not reverse else tuple(self._flip(f) for f in self.ordering)
+        queryset = queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._after(queryset.model, ordering, values))
+        rows = list(queryset[:self.page_size_value + 1])
+        has_more = len(rows) > self.page_size_value
+        rows = rows[:self.page_size_value]
+        if reverse:
+            rows.reverse()
+        # In reverse mode `has_more` means there are earlier pages.
+        self.has_next = bool(rows) and (reverse or has_more)
+        self.has_previous = bool(rows) and ((not reverse and values is not None) or (reverse and has_more))
+        self.page_rows = rows
+        self.model = queryset.model
+        self.using = queryset.db
+        return rows
+
+    def get_paginated_response(self, data):
+        if not self.keyset_mode:
+            return super().get_paginated_response(data)
+        payload = OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ])
+        if self.request.query_params.get(self.count_query_param) == 'approx':
+            payload['approximate_count'] = approximate_row_count(self.model, using=self.using)
+        return Response(payload)
+
+    def get_next_link(self):
+        if not self.keyset_mode:
+            return super().get_next_link()
+        if not self.has_next:
+            return None
+        return self._link(self.page_rows[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.keyset_mode:
+            return super().get_previous_link()
+        if not self.has_previous:
+            return None
+        return self._link(self.page_rows[0], reverse=True)
+
+    # cursor helpers
+
+    @staticmethod
+    def _flip(field):
+        return field[1:] if field.startswith('-') else '-' + field
+
+    @classmethod
+    def encode_cursor(cls, row, ordering, reverse=False):
+        """Return the opaque cursor that resumes `ordering` right after `row`."""
+        values = []
+        for field in ordering:
+            value = getattr(row, field.lstrip('-'))
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        return base64.urlsafe_b64encode(
+            json.dumps({'v': values, 'r': int(reverse)}, separators=(',', ':')).encode()
+        ).decode().rstrip('=')
+
+    def _link(self, row, reverse):
+        token = self.encode_cursor(row, self.ordering, reverse=reverse)
+        url = remove_query_param(self.base_url, self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, token)
+
+    def decode_cursor(self, token):
+        if not token:
+            return None, False
+        try:
+            padded = token + '=' * (-len(token) % 4)
+            data = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+            values = list(data['v'])
+            reverse = bool(data.get('r'))
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
+
+    def _after(self, model, ordering, raw_values):
+        """Build the row-value comparison `(a, b, ...) > (x, y, ...)` as a Q.
+
+        Expanded to `a > x OR (a = x AND b > y) OR ...` so it works on every
+        backend and mixed sort directions, and prefixed with the redundant
+        bound `a >= x` so planners turn it into an index range scan instead
+        of filtering every row.
+        """
+        names = [f.lstrip('-') for f in ordering]
+        try:
+            values = [model._meta.get_field(n).to_python(v) for n, v in zip(names, raw_values)]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+        condition = Q()
+        for i, field in enumerate(ordering):
+            op = 'lt' if field.startswith('-') else 'gt'
+            term = Q(**{f'{names[i]}__{op}': values[i]})
+            for j in range(i):
+                term &= Q(**{names[j]: values[j]})
+            condition |= term
+        lead = 'lte' if ordering[0].startswith('-') else 'gte'
+        return Q(**{f'{names[0]}__{lead}': values[0]}) & condition
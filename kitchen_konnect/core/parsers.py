@@ -0,0 +1,30 @@
+"""Request body parsers."""
+import mimetypes
+
+from rest_framework.parsers import FileUploadParser
+
+# types `mimetypes` does not know
+EXTENSIONS = {
+    'application/x-ndjson': '.ndjson',
+    'application/jsonl': '.jsonl',
+}
+
+
+class RawUploadParser(FileUploadParser):
+    """`FileUploadParser` that also takes a raw body sent without a filename.
+
+    DRF's parser answers 400 "Missing filename" unless the client sends a
+    `Content-Disposition` header or the URL has a `filename` kwarg; here the
+    body becomes `request.data['file']` named `upload.<ext>`, the extension
+    following its content type, so views can still tell formats apart by name.
+    """
+
+    default_filename = 'upload'
+
+    def get_filename(self, stream, media_type, parser_context):
+        filename = super().get_filename(stream, media_type, parser_context)
+        if filename:
+            return filename
+        content_type = (media_type or '').split(';')[0].strip().lower()
+        extension = EXTENSIONS.get(content_type) or mimetypes.guess_extension(content_type) or ''
+        return f'{self.default_filename}{extension}'
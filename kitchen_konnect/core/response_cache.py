@@ -0,0 +1,250 @@
+"""Declarative response caching for DRF views.
+
+A view opts in with `CachedResponseMixin` and a `response_cache` attribute:
+
+    class UserDetailView(CachedResponseMixin, generics.RetrieveAPIView):
+        response_cache = ResponseCache(timeout=60, vary=VARY_USER,
+                                       depends_on=('users.CustomUser:user',))
+
+Only successful GET/HEAD responses are cached. The lookup happens in
+`initial()`, after DRF has authenticated the request and checked
+permissions, so a cached response is never served to a client that could
+not get it from the view. The cached value is `response.data` (rendered
+per request, so content negotiation still works).
+
+`vary` decides who shares an entry: `VARY_USER` (one entry per user),
+`VARY_ROLE` (per role and admin level) or `VARY_NONE` (every permitted
+client). The full path with its query string is always part of the key, and
+so is whether the request reads from a replica (see config/db_router.py): a
+response built from a lagging replica after a write committed is cached
+under the new versions, and must not be served to clients pinned to the
+primary for read-your-writes.
+
+Invalidation is by version: every entry key embeds the current version of
+each model it `depends_on`, and `invalidate_model()` (called from model
+signal handlers, and explicitly after queryset updates) replaces the
+version, so older entries are simply never read again and expire. The
+version is replaced once the writing transaction commits: a request that
+read the old rows while it was still open would otherwise cache them under
+the new version. Other workers only see the new version through a cache
+they share, which is why several workers need a shared `CACHE_URL`
+(config/cache.py). A dependency written `'app.Model:user'` is versioned per user: it only
+changes when a row owned by the requesting user changes (the user row
+itself, or rows whose `user_id` is the user).
+
+`RESPONSE_CACHE_ENABLED = False` turns the cache off for every view.
+
+Hits and misses are counted per view in process and flushed to the cache
+every `RESPONSE_CACHE_STATS_FLUSH` requests; `manage.py
+response_cache_stats` prints the aggregated hit ratios.
+"""
+import hashlib
+import secrets
+import threading
+from collections import Counter
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+
+from config.db_router import current_read_alias
+
+VARY_USER = 'user'
+VARY_ROLE = 'role'
+VARY_NONE = 'none'
+
+VERSION_PREFIX = 'rc:ver:'
+ENTRY_PREFIX = 'rc:entry:'
+STATS_INDEX_KEY = 'rc:stats:views'
+STATS_PREFIX = 'rc:stats:'
+
+
+def get_cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+@dataclass(frozen=True)
+class ResponseCache:
+    timeout: int = 60
+    vary: str = VARY_USER
+    depends_on: tuple = ()
+
+
+def _normalize_label(label):
+    return label.lower()
+
+
+def _version_key(label, user_id=None):
+    key = VERSION_PREFIX + _normalize_label(label)
+    return key if user_id is None else f'{key}:{user_id}'
+
+
+def _dependency_keys(depends_on, user_id):
+    keys = []
+    for dependency in depends_on:
+        label, _, scope = dependency.partition(':')
+        keys.append(_version_key(label, user_id if scope == 'user' else None))
+    return keys
+
+
+def _current_versions(keys):
+    if not keys:
+        return []
+    cache = get_cache()
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    for key in missing:
+        # never restart at a fixed value: an evicted version must not bring
+        # back entries cached under it
+        cache.add(key, secrets.token_hex(6), None)
+    if missing:
+        versions.update(cache.get_many(missing))
+    return [str(versions.get(key, '')) for key in keys]
+
+
+def invalidate_model(label, user_ids=()):
+    """Invalidate responses depending on model `label` ('app.Model') after
+    the current transaction commits (at once outside a transaction).
+
+    `user_ids` also invalidates the per-user (`'app.Model:user'`) versions
+    of those users.
+    """
+    keys = [_version_key(label)] + [_version_key(label, user_id) for user_id in user_ids]
+
+    def rotate():
+        get_cache().set_many({key: secrets.token_hex(6) for key in keys}, None)
+
+    transaction.on_commit(rotate)
+
+
+def invalidate_instance(instance):
+    """Signal-handler helper: invalidate `instance`'s model and owner."""
+    from django.contrib.auth import get_user_model
+
+    owner = instance.pk if isinstance(instance, get_user_model()) else getattr(instance, 'user_id', None)
+    invalidate_model(instance._meta.label, [owner] if owner is not None else ())
+
+
+class _Stats:
+    def __init__(self):
+        self._pending = Counter()
+        self._requests = 0
+        self._lock = threading.Lock()
+
+    def record(self, view_name, hit):
+        with self._lock:
+            self._pending[(view_name, 'hits' if hit else 'misses')] += 1
+            self._requests += 1
+            if self._requests < getattr(settings, 'RESPONSE_CACHE_STATS_FLUSH', 100):
+                return
+            pending, self._pending, self._requests = self._pending, Counter(), 0
+        self._flush(pending)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending, self._requests = self._pending, Counter(), 0
+        self._flush(pending)
+
+    def _flush(self, pending):
+        if not pending:
+            return
+        cache = get_cache()
+        views = set(cache.get(STATS_INDEX_KEY) or ())
+        for (view_name, kind), count in pending.items():
+            key = f'{STATS_PREFIX}{view_name}:{kind}'
+            if not cache.add(key, count, None):
+                try:
+                    cache.incr(key, count)
+                except ValueError:
+                    cache.set(key, count, None)
+            views.add(view_name)
+        cache.set(STATS_INDEX_KEY, sorted(views), None)
+
+
+stats = _Stats()
+
+
+def get_stats():
+    """Return `{view: {'hits', 'misses', 'ratio'}}` across all processes."""
+    stats.flush()
+    cache = get_cache()
+    result = {}
+    for view_name in cache.get(STATS_INDEX_KEY) or ():
+        hits = cache.get(f'{STATS_PREFIX}{view_name}:hits') or 0
+        misses = cache.get(f'{STATS_PREFIX}{view_name}:misses') or 0
+        total = hits + misses
+        result[view_name] = {'hits': hits, 'misses': misses, 'ratio': hits / total if total else 0.0}
+    return result
+
+
+def reset_stats():
+    stats.flush()
+    cache = get_cache()
+    views = cache.get(STATS_INDEX_KEY) or ()
+    cache.delete_many([f'{STATS_PREFIX}{v}:{k}' for v in views for k in ('hits', 'misses')] + [STATS_INDEX_KEY])
+
+
+class CachedResponseMixin:
+    """Serve `GET` responses of a DRF view from the cache (see module docs)."""
+
+    response_cache = None
+
+    def response_cache_name(self):
+        return f'{type(self).__module__}.{type(self).__name__}'
+
+    def response_cache_key(self, request):
+        config = self.response_cache
+        user = request.user
+        user_id = getattr(user, 'pk', None) if user.is_authenticated else None
+        if config.vary == VARY_USER:
+            vary = f'u{user_id}'
+        elif config.vary == VARY_ROLE:
+            vary = f"r{getattr(user, 'role', '')}:{getattr(user, 'admin_level', 0)}" if user_id is not None else 'anon'
+        else:
+            vary = '*'
+        versions = _current_versions(_dependency_keys(config.depends_on, user_id))
+        # primary and replica readers never share entries
+        source = 'replica' if current_read_alias() else 'primary'
+        digest = hashlib.sha256(
+            '\n'.join([request.get_full_path(), vary, source, *versions]).encode()
+        ).hexdigest()[:32]
+        return f'{ENTRY_PREFIX}{self.response_cache_name()}:{digest}'
+
+    def initial(self, request, *args, **kwargs):
+        # runs after authentication and permission checks; on a hit the
+        # method handler is replaced for this request so the view never runs
+        super().initial(request, *args, **kwargs)
+        if self.response_cache is None or request.method not in ('GET', 'HEAD'):
+            return
+        if not getattr(settings, 'RESPONSE_CACHE_ENABLED', True):
+            return
+        name = request.method.lower()
+        handler = getattr(self, name, None)
+        if handler is None:
+            return
+        cache = get_cache()
+        key = self.response_cache_key(request)
+        cached = cache.get(key)
+        stats.record(self.response_cache_name(), cached is not None)
+
+        if cached is not None:
+            def serve(request, *args, **kwargs):
+                response = Response(cached)
+                response['X-Response-Cache'] = 'hit'
+                return response
+
+            setattr(self, name, serve)
+            return
+
+        timeout = self.response_cache.timeout
+
+        def fill(request, *args, **kwargs):
+            response = handler(request, *args, **kwargs)
+            if response.status_code == 200 and isinstance(response, Response):
+                cache.set(key, response.data, timeout)
+                response['X-Response-Cache'] = 'miss'
+            return response
+
+        setattr(self, name, fill)
@@ -0,0 +1,244 @@
+"""Token-bucket throttles and per-process load shedding.
+
+Throttles (DRF `throttle_classes`) keep one token bucket per key in the
+shared cache, so all workers draw from the same buckets when `CACHE_URL`
+points at a shared backend. A bucket holds up to N tokens and refills at
+N per period; the rate of each bucket comes from
+`REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']['<view.throttle_scope>.<kind>']`:
+
+    IPBucketThrottle          kind 'ip'        client address (DRF's get_ident)
+    UsernameBucketThrottle    kind 'username'  `username` in the request body
+    RouteBucketThrottle       kind 'route'     every client of the URL pattern
+
+A missing or empty rate disables that bucket. An empty bucket answers 429
+with `Retry-After` set to the time until the next token.
+
+A bucket is kept as counters of the tokens taken in fixed windows of one
+period: a take is an atomic `incr` of the current window's counter, so
+concurrent requests in any process never share a token. The tokens still
+missing from the previous window are the share of its takes that falls
+inside the last period, which refills the bucket gradually as with a
+continuous bucket.
+
+`ConcurrencyLimitMiddleware` caps how many requests for views with a
+`concurrency_limiter` run (or wait to run) at once in the process, and
+answers 503 with `Retry-After` beyond that. It takes the slot before any
+other `process_view` hook: under ASGI, sync views and the hooks of
+`MiddlewareMixin` middleware all run on one thread per process, so a
+request queued there is already waiting behind the expensive ones.
+"""
+import hashlib
+import math
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+from rest_framework import exceptions
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """`'10/min'` -> `(10, 60)`: bucket capacity and refill period in seconds."""
+    if not rate:
+        return None
+    count, period = rate.split('/')
+    return int(count), PERIODS[period[0]]
+
+
+def take_token(key, capacity, period, now=None):
+    """Take a token from bucket `key`; return 0, or the seconds until one is available."""
+    now = time.time() if now is None else now
+    window, elapsed = divmod(now, period)
+    current = f'{key}:{int(window)}'
+    # a counter is read during its window and the next one
+    cache.add(current, 0, math.ceil(2 * period))
+    try:
+        taken = cache.incr(current)
+    except ValueError:  # expired between add and incr
+        cache.add(current, 1, math.ceil(2 * period))
+        taken = 1
+    previous = cache.get(f'{key}:{int(window) - 1}', 0)
+    remaining = previous * (1 - elapsed / period)
+    if taken + remaining <= capacity:
+        return 0
+    # a refused request takes nothing
+    try:
+        cache.decr(current)
+    except ValueError:
+        pass
+    spare = capacity - taken
+    if spare >= 0 and previous:
+        # wait until enough of the previous window has refilled
+        return (1 - spare / previous) * period - elapsed
+    return period - elapsed
+
+
+class BucketThrottle(BaseThrottle):
+    kind = None
+
+    def get_rate(self, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if not scope:
+            return None
+        return parse_rate(api_settings.DEFAULT_THROTTLE_RATES.get(f'{scope}.{self.kind}'))
+
+    def get_bucket(self, request, view):
+        """Return the identity of the bucket for `request` (None: not throttled)."""
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        self.wait_seconds = None
+        rate = self.get_rate(view)
+        bucket = rate and self.get_bucket(request, view)
+        if not bucket:
+            return True
+        digest = hashlib.sha256(bucket.encode()).hexdigest()[:32]
+        self.wait_seconds = take_token(f'throttle:{view.throttle_scope}.{self.kind}:{digest}', *rate)
+        return not self.wait_seconds
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class IPBucketThrottle(BucketThrottle):
+    kind = 'ip'
+
+    def get_bucket(self, request, view):
+        return self.get_ident(request)
+
+
+class UsernameBucketThrottle(BucketThrottle):
+    kind = 'username'
+
+    def get_bucket(self, request, view):
+        data = getattr(request, 'data', None)
+        username = data.get('username') if hasattr(data, 'get') else None
+        return username.strip().lower() if isinstance(username, str) and username.strip() else None
+
+
+class RouteBucketThrottle(BucketThrottle):
+    kind = 'route'
+
+    def get_bucket(self, request, view):
+        match = getattr(request, 'resolver_match', None)
+        return match.route if match is not None else request.path
+
+
+def check_throttles(request, view, throttle_classes):
+    """DRF's `APIView.check_throttles` for views that are not DRF views."""
+    waits = []
+    for throttle_class in throttle_classes:
+        throttle = throttle_class()
+        if not throttle.allow_request(request, view):
+            waits.append(throttle.wait())
+    if waits:
+        raise exceptions.Throttled(max(waits))
+
+
+class Overloaded(exceptions.APIException):
+    status_code = 503
+    default_detail = 'Server busy, please retry shortly.'
+    default_code = 'overloaded'
+
+    def __init__(self, wait, detail=None):
+        super().__init__(detail)
+        self.wait = wait
+
+
+class ConcurrencyLimiter:
+    """Non-blocking counter of requests in flight, limited by setting `setting`.
+
+    A limit of 0 (or less) means unlimited.
+    """
+
+    retry_after = 1
+
+    def __init__(self, setting, default=0):
+        self.setting = setting
+        self.default = default
+        self.active = 0
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self):
+        return getattr(settings, self.setting, self.default)
+
+    def try_acquire(self):
+        with self._lock:
+            limit = self.limit
+            if 0 < limit <= self.active:
+                return False
+            self.active += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+
+
+def view_limiter(view_func):
+    # DRF views, async views with the attribute set, then lazy views
+    view = getattr(view_func, 'cls', None) or view_func
+    limiter = getattr(view, 'concurrency_limiter', None)
+    if limiter is None and hasattr(view_func, 'load'):
+        return view_limiter(view_func.load())
+    return limiter
+
+
+def overloaded_response(exc):
+    response = JsonResponse({'detail': exc.detail}, status=exc.status_code)
+    response['Retry-After'] = str(exc.wait)
+    return response
+
+
+class ConcurrencyLimitMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self._limiters = {}
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            # awaited on the event loop rather than on the sync thread
+            self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        try:
+            return self.get_response(request)
+        finally:
+            self.release(request)
+
+    async def __acall__(self, request):
+        try:
+            return await self.get_response(request)
+        finally:
+            self.release(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        try:
+            limiter = self._limiters[view_func]
+        except KeyError:
+            limiter = self._limiters[view_func] = view_limiter(view_func)
+        if limiter is None:
+            return None
+        if not limiter.try_acquire():
+            return overloaded_response(Overloaded(limiter.retry_after))
+        request._concurrency_limiter = limiter
+        return None
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        return self.process_view(request, view_func, view_args, view_kwargs)
+
+    def release(self, request):
+        limiter = request.__dict__.pop('_concurrency_limiter', None)
+        if limiter is not None:
+            limiter.release()
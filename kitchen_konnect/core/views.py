@@ -1,3 +1,89 @@
-from django.shortcuts import render
+import os
 
-# Create your views here.
+from django.db import transaction
+from django.http import HttpResponse
+from django.views.decorators.http import require_safe
+from rest_framework import status
+from rest_framework.parsers import MultiPartParser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core import images, metrics
+from core.instrumentation import InstrumentedViewMixin
+from core.parsers import RawUploadParser
+from users.permissions import IsAdminLevel
+
+
+class MetricsView(InstrumentedViewMixin, APIView):
+    """Prometheus text exposition of the metrics of all worker processes."""
+
+    permission_classes = [IsAdminLevel]
+    min_admin_level = 50
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+class PhotoView(InstrumentedViewMixin, APIView):
+    """Set (POST/PUT a multipart `image` or a raw body) or remove (DELETE)
+    the `photo` of `get_object()`.
+
+    Only the original is written before the response; the variants follow
+    from the worker pool (see core/images.py).
+    """
+
+    parser_classes = [MultiPartParser, RawUploadParser]
+
+    def get_object(self):
+        raise NotImplementedError
+
+    def post(self, request, *args, **kwargs):
+        obj = self.get_object()
+        upload = request.data.get('image') or request.data.get('file')
+        if upload is None:
+            return Response({'detail': 'No image uploaded.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            with transaction.atomic():
+                image = images.store_image(upload)
+                obj.photo = image
+                obj.save(update_fields=['photo', 'updated_at'])
+        except images.InvalidImage as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'photo': images.variant_urls(image.digest), 'width': image.width, 'height': image.height,
+        }, status=status.HTTP_201_CREATED)
+
+    put = post
+
+    def delete(self, request, *args, **kwargs):
+        obj = self.get_object()
+        obj.photo = None
+        obj.save(update_fields=['photo', 'updated_at'])
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+@require_safe
+def serve_image(request, prefix, digest, name):
+    """GET/HEAD one stored file: an original or a variant."""
+    stem, _, ext = name.partition('.')
+    if not images.DIGEST_RE.match(digest) or prefix != digest[:2] or not ext:
+        return HttpResponse(status=404)
+    if stem == 'original' and ext in images.CONTENT_TYPES:
+        content_type = images.CONTENT_TYPES[ext]
+    elif stem in images.VARIANT_SIZES and ext in images.VARIANT_FORMATS:
+        content_type = images.VARIANT_FORMATS[ext][1]
+    else:
+        return HttpResponse(status=404)
+    path = images.image_path(digest, name)
+    if os.path.exists(path):
+        return images.file_response(request, path, content_type, etag=f'"{digest[:16]}-{name}"')
+
+    # a variant not rendered yet: the original, for now
+    for original_ext, original_type in images.CONTENT_TYPES.items():
+        original = images.image_path(digest, f'original.{original_ext}')
+        if os.path.exists(original):
+            images.schedule_variants(digest, original_ext)
+            response = images.file_response(request, original, original_type, etag=None)
+            response['Cache-Control'] = 'no-cache'
+            return response
+    return HttpResponse(status=404)
@@ -1,3 +1,38 @@
 from django.contrib import admin
+from .models import IngredientMeasure, IngredientNutrient, Meal, MealItem, Nutrient
 
-# Register your models here.
+
+@admin.register(Nutrient)
+class NutrientAdmin(admin.ModelAdmin):
+	list_display = ('code', 'name', 'unit', 'position')
+	ordering = ('position', 'id')
+
+
+@admin.register(IngredientNutrient)
+class IngredientNutrientAdmin(admin.ModelAdmin):
+	list_display = ('ingredient', 'nutrient', 'per_100g')
+	list_filter = ('nutrient',)
+	list_select_related = ('ingredient', 'nutrient')
+	raw_id_fields = ('ingredient',)
+	search_fields = ('ingredient__name',)
+
+
+@admin.register(IngredientMeasure)
+class IngredientMeasureAdmin(admin.ModelAdmin):
+	list_display = ('ingredient', 'grams_per_ml', 'grams_per_piece')
+	list_select_related = ('ingredient',)
+	raw_id_fields = ('ingredient',)
+	search_fields = ('ingredient__name',)
+
+
+class MealItemInline(admin.TabularInline):
+	model = MealItem
+	raw_id_fields = ('recipe', 'ingredient')
+	extra = 0
+
+
+@admin.register(Meal)
+class MealAdmin(admin.ModelAdmin):
+	list_display = ('user', 'name', 'eaten_at')
+	raw_id_fields = ('user',)
+	inlines = (MealItemInline,)
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from health.models import RecipeNutrition
+from health.nutrition import BATCH_SIZE, compute_recipe_totals, reload_matrices
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Recompute the stored nutrient totals of every recipe in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Recipes totalled per batch')
+        parser.add_argument('--sleep', type=float, default=0.0, help='Seconds to pause between batches')
+        parser.add_argument('--missing', action='store_true', help='Only the recipes without stored totals')
+
+    def handle(self, *args, **options):
+        # nutrient data loaded in bulk sent no signals
+        reload_matrices()
+        batch_size = max(1, options.get('batch_size') or BATCH_SIZE)
+        recipes = Recipe.objects.order_by('pk')
+        if options.get('missing'):
+            recipes = recipes.exclude(pk__in=RecipeNutrition.objects.values('recipe_id'))
+        start, last, total = time.perf_counter(), 0, 0
+        while True:
+            ids = list(recipes.filter(pk__gt=last).values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            compute_recipe_totals(ids)
+            last, total = ids[-1], total + len(ids)
+            self.stdout.write(f'{total} recipes totalled')
+            if options.get('sleep'):
+                time.sleep(options['sleep'])
+        self.stdout.write(self.style.NOTICE(f'{total} recipe totals computed in {time.perf_counter() - start:.1f} s.'))
@@ -0,0 +1,100 @@
+# Generated by Django 5.2.3 on 2026-10-18 12:58
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('recipes', '0002_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngredientMeasure',
+            fields=[
+                ('ingredient', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='measure', serialize=False, to='recipes.ingredient')),
+                ('grams_per_ml', models.FloatField(blank=True, null=True)),
+                ('grams_per_piece', models.FloatField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Nutrient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.SlugField(max_length=40, unique=True)),
+                ('name', models.CharField(max_length=100)),
+                ('unit', models.CharField(max_length=10)),
+                ('position', models.PositiveSmallIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ('position', 'id'),
+            },
+        ),
+        migrations.CreateModel(
+            name='RecipeNutrition',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='nutrition', serialize=False, to='recipes.recipe')),
+                ('amounts', models.JSONField(default=dict)),
+                ('grams', models.FloatField(default=0)),
+                ('unresolved', models.JSONField(default=list)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Meal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(blank=True, max_length=100)),
+                ('eaten_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='meals', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ('-eaten_at', '-id'),
+            },
+        ),
+        migrations.CreateModel(
+            name='MealItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('servings', models.DecimalField(decimal_places=2, default=1, max_digits=6)),
+                ('quantity', models.DecimalField(blank=True, decimal_places=3, max_digits=10, null=True)),
+                ('unit', models.CharField(blank=True, max_length=20)),
+                ('position', models.PositiveSmallIntegerField(default=0)),
+                ('ingredient', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='recipes.ingredient')),
+                ('meal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='health.meal')),
+                ('recipe', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='recipes.recipe')),
+            ],
+            options={
+                'ordering': ('position', 'id'),
+            },
+        ),
+        migrations.CreateModel(
+            name='IngredientNutrient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('per_100g', models.FloatField()),
+                ('ingredient', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='nutrient_amounts', to='recipes.ingredient')),
+                ('nutrient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='health.nutrient')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='meal',
+            index=models.Index(fields=['user', '-eaten_at', '-id'], name='health_meal_user_eaten_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='mealitem',
+            constraint=models.CheckConstraint(condition=models.Q(('recipe__isnull', True), ('ingredient__isnull', True), _connector='OR'), name='health_item_recipe_or_ingredient'),
+        ),
+        migrations.AddConstraint(
+            model_name='ingredientnutrient',
+            constraint=models.UniqueConstraint(fields=('ingredient', 'nutrient'), name='health_nutrient_once'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+# code, name, unit of the amounts; in column order
+NUTRIENTS = (
+    ('energy', 'Energy', 'kcal'),
+    ('protein', 'Protein', 'g'),
+    ('fat', 'Fat', 'g'),
+    ('saturated_fat', 'Saturated fat', 'g'),
+    ('carbohydrate', 'Carbohydrate', 'g'),
+    ('sugars', 'Sugars', 'g'),
+    ('fiber', 'Fiber', 'g'),
+    ('sodium', 'Sodium', 'mg'),
+    ('potassium', 'Potassium', 'mg'),
+    ('calcium', 'Calcium', 'mg'),
+    ('iron', 'Iron', 'mg'),
+    ('magnesium', 'Magnesium', 'mg'),
+    ('cholesterol', 'Cholesterol', 'mg'),
+    ('vitamin_a', 'Vitamin A', 'µg'),
+    ('vitamin_c', 'Vitamin C', 'mg'),
+    ('vitamin_d', 'Vitamin D', 'µg'),
+)
+
+
+def create_nutrients(apps, schema_editor):
+    Nutrient = apps.get_model('health', 'Nutrient')
+    for position, (code, name, unit) in enumerate(NUTRIENTS):
+        Nutrient.objects.get_or_create(code=code, defaults={'name': name, 'unit': unit, 'position': position})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('health', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_nutrients, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,127 @@
+from django.conf import settings
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
 
-# Create your models here.
+
+class Nutrient(models.Model):
+	"""A nutrient tracked for every ingredient (energy, protein, sodium, ...).
+
+	`unit` is the unit of its amounts; `position` orders the columns of the
+	nutrient matrix (see health/nutrition.py) and the totals in responses.
+	"""
+
+	code = models.SlugField(max_length=40, unique=True)
+	name = models.CharField(max_length=100)
+	unit = models.CharField(max_length=10)
+	position = models.PositiveSmallIntegerField(default=0)
+
+	class Meta:
+		ordering = ('position', 'id')
+
+	def __str__(self) -> str:
+		return f'{self.name} ({self.unit})'
+
+
+class IngredientNutrient(models.Model):
+	"""Amount of a nutrient in 100 g of an ingredient."""
+
+	# covered by the (ingredient, nutrient) constraint below
+	ingredient = models.ForeignKey(
+		'recipes.Ingredient', on_delete=models.CASCADE, db_index=False, related_name='nutrient_amounts',
+	)
+	nutrient = models.ForeignKey(Nutrient, on_delete=models.CASCADE, related_name='+')
+	per_100g = models.FloatField()
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=['ingredient', 'nutrient'], name='health_nutrient_once'),
+		]
+
+	def __str__(self) -> str:
+		return f'{self.nutrient_id} in {self.ingredient_id}: {self.per_100g}/100 g'
+
+
+class IngredientMeasure(models.Model):
+	"""How to weigh an ingredient measured by volume ("2 cup flour") or by
+	the piece ("3 egg"). Lines that need a missing value are left out of
+	the totals (and reported as unresolved)."""
+
+	ingredient = models.OneToOneField(
+		'recipes.Ingredient', on_delete=models.CASCADE, primary_key=True, related_name='measure',
+	)
+	grams_per_ml = models.FloatField(null=True, blank=True)
+	grams_per_piece = models.FloatField(null=True, blank=True)
+
+	def __str__(self) -> str:
+		return f'measure of {self.ingredient_id}'
+
+
+class RecipeNutrition(models.Model):
+	"""Stored nutrient totals of a whole recipe (see health/nutrition.py).
+
+	A row is deleted when the recipe's ingredient lines or the nutrient data
+	of one of its ingredients change, and computed again on the next read.
+	"""
+
+	recipe = models.OneToOneField(
+		'recipes.Recipe', on_delete=models.CASCADE, primary_key=True, related_name='nutrition',
+	)
+	# {nutrient code: amount}
+	amounts = models.JSONField(default=dict)
+	grams = models.FloatField(default=0)
+	# ingredient ids of the lines left out (no quantity, unit, measure or data)
+	unresolved = models.JSONField(default=list)
+	computed_at = models.DateTimeField(auto_now=True)
+
+	def __str__(self) -> str:
+		return f'nutrition of {self.recipe_id}'
+
+
+class Meal(models.Model):
+	"""A meal logged by a user: recipes and ingredients eaten together."""
+
+	user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='meals')
+	name = models.CharField(max_length=100, blank=True)
+	eaten_at = models.DateTimeField(default=timezone.now)
+	created_at = models.DateTimeField(auto_now_add=True)
+
+	class Meta:
+		ordering = ('-eaten_at', '-id')
+		indexes = [
+			models.Index(fields=['user', '-eaten_at', '-id'], name='health_meal_user_eaten_idx'),
+		]
+
+	def __str__(self) -> str:
+		return f'{self.name or "meal"} of {self.user_id} @ {self.eaten_at:%Y-%m-%d %H:%M}'
+
+
+class MealItem(models.Model):
+	"""`servings` of a recipe, or `quantity` `unit` of an ingredient, eaten in a meal.
+
+	An item whose recipe was deleted keeps its place in the log but counts
+	for nothing.
+	"""
+
+	meal = models.ForeignKey(Meal, on_delete=models.CASCADE, related_name='items')
+	recipe = models.ForeignKey(
+		'recipes.Recipe', on_delete=models.SET_NULL, null=True, blank=True, related_name='+',
+	)
+	servings = models.DecimalField(max_digits=6, decimal_places=2, default=1)
+	ingredient = models.ForeignKey(
+		'recipes.Ingredient', on_delete=models.PROTECT, null=True, blank=True, related_name='+',
+	)
+	quantity = models.DecimalField(max_digits=10, decimal_places=3, null=True, blank=True)
+	unit = models.CharField(max_length=20, blank=True)
+	position = models.PositiveSmallIntegerField(default=0)
+
+	class Meta:
+		ordering = ('position', 'id')
+		constraints = [
+			models.CheckConstraint(
+				condition=Q(recipe__isnull=True) | Q(ingredient__isnull=True), name='health_item_recipe_or_ingredient',
+			),
+		]
+
+	def __str__(self) -> str:
+		return f'item {self.position} of meal {self.meal_id}'
@@ -0,0 +1,404 @@
+"""Nutrient totals of recipes and meals.
+
+Every process holds the nutrient data as a dense matrix, one row per
+ingredient with data and one column per `Nutrient`:
+
+    ingredient_ids  ascending ids of the rows
+    per_gram        rows x nutrients, amount per gram   (numpy float64 array,
+                                                          lists without numpy)
+    grams_per_ml, grams_per_piece                       per row, NaN if unknown
+
+Totalling a batch of ingredient lines -- `(owner, ingredient id, quantity,
+unit)` for the recipes or meals being totalled -- is the product of the
+sparse owners x ingredients matrix of grams with `per_gram`. The lines are
+weighed in one vectorized pass (the unit's factor to grams, or to
+millilitres times the density, or to pieces times the piece weight), sorted
+by owner, and the product taken as a segment sum of `grams * per_gram[row]`
+(`np.add.reduceat`: a CSR product without scipy), so it costs lines x
+nutrients whatever the size of the matrix. A line without a quantity, with
+an unknown unit, a missing measure or an ingredient without data counts for
+nothing and is reported in `unresolved`. Without numpy, `naive_totals()`
+computes the same line by line (benchmarks/nutrition.py compares the two).
+
+Whole-recipe totals are stored as `RecipeNutrition` rows and computed, a
+batch at a time, only for the recipes without one. Writing the ingredient
+lines of a recipe deletes its row (through `recipes_updated`, see
+recipes/changes.py); writing the nutrient data of an ingredient deletes the
+rows of its recipes and makes every process reload its matrix, at once
+when the shared cache announces it (`VERSION_KEY`) and at the latest after
+`NUTRITION_MATRIX_MAX_AGE` seconds (see health/signals.py). Per-serving and
+meal totals are scaled from the stored ones when read. Totals computed
+while such a write commits can be stored stale; `refresh_recipe_nutrition`
+recomputes every row.
+"""
+import math
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+
+from core.lazy import optional_module
+from recipes.models import Ingredient, RecipeIngredient
+
+from .models import IngredientMeasure, IngredientNutrient, Nutrient, RecipeNutrition
+
+np = optional_module('numpy')
+
+VERSION_KEY = 'health:nutrition:version'
+# recipes read and totalled per statement
+BATCH_SIZE = 2000
+# owners summed per numpy product in `NutrientMatrix.totals()`
+PRODUCT_OWNERS = 128
+
+MASS, VOLUME, PIECE = 0, 1, 2
+# unit: (kind, grams, millilitres or pieces per unit)
+UNITS = {
+    'g': (MASS, 1.0), 'gram': (MASS, 1.0), 'gramme': (MASS, 1.0),
+    'kg': (MASS, 1000.0), 'kilogram': (MASS, 1000.0),
+    'mg': (MASS, 0.001), 'milligram': (MASS, 0.001),
+    'oz': (MASS, 28.349523125), 'ounce': (MASS, 28.349523125),
+    'lb': (MASS, 453.59237), 'pound': (MASS, 453.59237),
+    'ml': (VOLUME, 1.0), 'milliliter': (VOLUME, 1.0), 'millilitre': (VOLUME, 1.0),
+    'cl': (VOLUME, 10.0), 'dl': (VOLUME, 100.0),
+    'l': (VOLUME, 1000.0), 'liter': (VOLUME, 1000.0), 'litre': (VOLUME, 1000.0),
+    'tsp': (VOLUME, 4.92892159375), 'teaspoon': (VOLUME, 4.92892159375),
+    'tbsp': (VOLUME, 14.78676478125), 'tablespoon': (VOLUME, 14.78676478125),
+    'fl oz': (VOLUME, 29.5735295625), 'cup': (VOLUME, 236.5882365),
+    'pint': (VOLUME, 473.176473), 'quart': (VOLUME, 946.352946),
+    '': (PIECE, 1.0), 'piece': (PIECE, 1.0), 'pc': (PIECE, 1.0), 'each': (PIECE, 1.0),
+    'whole': (PIECE, 1.0), 'clove': (PIECE, 1.0), 'slice': (PIECE, 1.0),
+}
+
+
+def unit_scale(unit):
+    """`(kind, factor)` of `unit` ("Tbsp.", "cups", "g"), or None if it is unknown."""
+    key = ' '.join(unit.lower().replace('.', ' ').split())
+    scale = UNITS.get(key)
+    if scale is None and key.endswith('s'):
+        scale = UNITS.get(key[:-1])
+    return scale
+
+
+@dataclass(frozen=True)
+class Totals:
+    """Nutrient amounts of some ingredient lines: `values[i]` of nutrient `codes[i]`."""
+
+    codes: tuple
+    values: list
+    grams: float = 0.0
+    # ingredient ids of the lines left out, ascending
+    unresolved: tuple = ()
+
+    @classmethod
+    def from_amounts(cls, amounts, grams=0.0, unresolved=()):
+        return cls(tuple(amounts), list(amounts.values()), grams, tuple(unresolved))
+
+    @property
+    def amounts(self):
+        """`{nutrient code: amount}`."""
+        return dict(zip(self.codes, self.values))
+
+    def scaled(self, factor):
+        return Totals(self.codes, [value * factor for value in self.values], self.grams * factor, self.unresolved)
+
+    def __add__(self, other):
+        unresolved = tuple(sorted(set(self.unresolved) | set(other.unresolved)))
+        if other.codes == self.codes:
+            values = [value + more for value, more in zip(self.values, other.values)]
+            return Totals(self.codes, values, self.grams + other.grams, unresolved)
+        amounts = self.amounts
+        for code, amount in zip(other.codes, other.values):
+            amounts[code] = amounts.get(code, 0.0) + amount
+        return Totals(tuple(amounts), list(amounts.values()), self.grams + other.grams, unresolved)
+
+
+class NutrientMatrix:
+    def __init__(self, codes, ingredient_ids, per_gram, grams_per_ml, grams_per_piece, units=None):
+        """`per_gram[row][column]` is the amount of nutrient `codes[column]` in
+        a gram of ingredient `ingredient_ids[row]` (ids ascending)."""
+        self.codes = tuple(codes)
+        self.units = dict(units or {})
+        self.rows = {int(ingredient_id): row for row, ingredient_id in enumerate(ingredient_ids)}
+        self.version = None
+        self.loaded_at = time.monotonic()
+        self._python = None
+        if np is None:
+            self.ingredient_ids = list(ingredient_ids)
+            self.per_gram, self.grams_per_ml, self.grams_per_piece = per_gram, grams_per_ml, grams_per_piece
+            return
+        self.ingredient_ids = np.asarray(ingredient_ids, dtype=np.int64)
+        # row of each ingredient id; ids are dense enough for a lookup table
+        known = len(self.ingredient_ids)
+        self.row_of = np.full(int(self.ingredient_ids.max(initial=0)) + 1, known, dtype=np.int32)
+        self.row_of[self.ingredient_ids] = np.arange(known)
+        # one more row, of zeros and unknown measures, for the ingredients without data
+        self.per_gram = np.zeros((len(self.ingredient_ids) + 1, len(self.codes)))
+        self.per_gram[:-1] = np.asarray(per_gram, dtype=np.float64).reshape(-1, len(self.codes))
+        self.grams_per_ml = np.append(np.asarray(grams_per_ml, dtype=np.float64), np.nan)
+        self.grams_per_piece = np.append(np.asarray(grams_per_piece, dtype=np.float64), np.nan)
+
+    @classmethod
+    def from_amounts(cls, nutrients, amounts, measures=None):
+        """Matrix of `nutrients` (`(code, unit)` pairs, in column order) with
+        `amounts`, `(ingredient id, column, amount per 100 g)` triples, and
+        `measures`, `{ingredient id: (grams per ml, grams per piece)}`."""
+        codes = [code for code, _ in nutrients]
+        units = dict(nutrients)
+        measures = measures or {}
+        ids = sorted({ingredient_id for ingredient_id, _, _ in amounts})
+        nan = float('nan')
+        grams_per_ml, grams_per_piece = [], []
+        for ingredient_id in ids:
+            per_ml, per_piece = measures.get(ingredient_id, (None, None))
+            grams_per_ml.append(nan if per_ml is None else per_ml)
+            grams_per_piece.append(nan if per_piece is None else per_piece)
+        if np is None:
+            rows = {ingredient_id: row for row, ingredient_id in enumerate(ids)}
+            per_gram = [[0.0] * len(codes) for _ in ids]
+            for ingredient_id, column, per_100g in amounts:
+                per_gram[rows[ingredient_id]][column] = per_100g / 100
+            return cls(codes, ids, per_gram, grams_per_ml, grams_per_piece, units)
+        per_gram = np.zeros((len(ids), len(codes)))
+        if amounts:
+            ingredient_ids, columns, per_100g = (np.asarray(values) for values in zip(*amounts))
+            per_gram[np.searchsorted(ids, ingredient_ids), columns] = per_100g / 100
+        return cls(codes, ids, per_gram, grams_per_ml, grams_per_piece, units)
+
+    @classmethod
+    def load(cls):
+        """Read the matrix from the database, in three queries."""
+        nutrients, columns = [], {}
+        for pk, code, unit in Nutrient.objects.values_list('id', 'code', 'unit'):
+            columns[pk] = len(nutrients)
+            nutrients.append((code, unit))
+        rows = IngredientNutrient.objects.values_list('ingredient_id', 'nutrient_id', 'per_100g')
+        amounts = [
+            (ingredient_id, columns[nutrient_id], per_100g)
+            for ingredient_id, nutrient_id, per_100g in rows.iterator(chunk_size=10_000)
+        ]
+        measures = {
+            ingredient_id: (per_ml, per_piece)
+            for ingredient_id, per_ml, per_piece
+            in IngredientMeasure.objects.values_list('ingredient_id', 'grams_per_ml', 'grams_per_piece')
+        }
+        return cls.from_amounts(nutrients, amounts, measures)
+
+    def empty(self):
+        return Totals(self.codes, [0.0] * len(self.codes))
+
+    def totals(self, lines):
+        """`{owner: Totals}` of `lines`, `(owner, ingredient id, quantity, unit)` tuples."""
+        if np is None:
+            return self.naive_totals(lines)
+        if not lines:
+            return {}
+        # column by column: `zip(*lines)` would allocate an iterator per line
+        owners = np.fromiter(map(itemgetter(0), lines), dtype=np.int64, count=len(lines))
+        ingredient_ids = np.fromiter(map(itemgetter(1), lines), dtype=np.int64, count=len(lines))
+        # None (no quantity) becomes NaN
+        quantities = np.asarray(list(map(itemgetter(2), lines)), dtype=np.float64)
+        units = list(map(itemgetter(3), lines))
+
+        # unit factors, looked up once per distinct unit
+        distinct = {unit: index for index, unit in enumerate(set(units))}
+        unit_index = np.fromiter(map(distinct.__getitem__, units), dtype=np.intp, count=len(units))
+        scales = [unit_scale(unit) or (-1, math.nan) for unit in distinct]
+        kinds = np.array([kind for kind, _ in scales])[unit_index]
+        factors = np.array([factor for _, factor in scales])[unit_index]
+
+        # matrix rows; the ingredients without data point at the last one
+        known = len(self.ingredient_ids)
+        rows = self.row_of[np.minimum(ingredient_ids, len(self.row_of) - 1)]
+        rows[ingredient_ids >= len(self.row_of)] = known
+
+        per_unit = np.select(
+            (kinds == MASS, kinds == VOLUME, kinds == PIECE),
+            (1.0, self.grams_per_ml[rows], self.grams_per_piece[rows]),
+            np.nan,
+        )
+        grams = quantities * factors * per_unit
+        resolved = (rows < known) & np.isfinite(grams)
+        grams[~resolved] = 0.0
+
+        order = np.argsort(owners, kind='stable')
+        sorted_owners, rows, grams = owners[order], rows[order], grams[order]
+        starts = np.flatnonzero(np.concatenate(([True], sorted_owners[1:] != sorted_owners[:-1])))
+        weights = np.add.reduceat(grams, starts)
+        sums = np.empty((len(starts), len(self.codes)))
+        # a few owners at a time, so the lines x nutrients products stay in cache
+        for first in range(0, len(starts), PRODUCT_OWNERS):
+            low = starts[first]
+            high = starts[first + PRODUCT_OWNERS] if first + PRODUCT_OWNERS < len(starts) else len(rows)
+            sums[first:first + PRODUCT_OWNERS] = np.add.reduceat(
+                self.per_gram[rows[low:high]] * grams[low:high, None], starts[first:first + PRODUCT_OWNERS] - low, axis=0,
+            )
+
+        unresolved = defaultdict(set)
+        for owner, ingredient_id in zip(owners[~resolved].tolist(), ingredient_ids[~resolved].tolist()):
+            unresolved[owner].add(ingredient_id)
+        return {
+            owner: Totals(self.codes, amounts, weight, tuple(sorted(unresolved.get(owner, ()))))
+            for owner, amounts, weight in zip(sorted_owners[starts].tolist(), sums.tolist(), weights.tolist())
+        }
+
+    def naive_totals(self, lines):
+        """`totals()` computed line by line in Python."""
+        per_gram, grams_per_ml, grams_per_piece = self._python_rows()
+        width = len(self.codes)
+        sums, weights, unresolved = {}, {}, {}
+        for owner, ingredient_id, quantity, unit in lines:
+            if owner not in sums:
+                sums[owner], weights[owner], unresolved[owner] = [0.0] * width, 0.0, set()
+            row = self.rows.get(ingredient_id)
+            scale = unit_scale(unit)
+            grams = math.nan
+            if row is not None and scale is not None and quantity is not None:
+                kind, factor = scale
+                per_unit = 1.0 if kind == MASS else grams_per_ml[row] if kind == VOLUME else grams_per_piece[row]
+                grams = float(quantity) * factor * per_unit
+            if not math.isfinite(grams):
+                unresolved[owner].add(ingredient_id)
+                continue
+            amounts = sums[owner]
+            for column, amount in enumerate(per_gram[row]):
+                amounts[column] += grams * amount
+            weights[owner] += grams
+        return {
+            owner: Totals(self.codes, amounts, weights[owner], tuple(sorted(unresolved[owner])))
+            for owner, amounts in sums.items()
+        }
+
+    def _python_rows(self):
+        if self._python is None:
+            if np is None:
+                self._python = (self.per_gram, self.grams_per_ml, self.grams_per_piece)
+            else:
+                self._python = (self.per_gram.tolist(), self.grams_per_ml.tolist(), self.grams_per_piece.tolist())
+        return self._python
+
+
+_matrix = None
+_matrix_lock = threading.Lock()
+
+
+def get_matrix():
+    """The process's nutrient matrix, (re)loaded when the nutrient data changed."""
+    global _matrix
+    version = cache.get(VERSION_KEY)
+    max_age = getattr(settings, 'NUTRITION_MATRIX_MAX_AGE', 300)
+    with _matrix_lock:
+        if _matrix is None or _matrix.version != version or time.monotonic() - _matrix.loaded_at > max_age:
+            _matrix = NutrientMatrix.load()
+            _matrix.version = version
+        return _matrix
+
+
+def reset_matrix():
+    """Drop the process's matrix (the next total reloads it)."""
+    global _matrix
+    with _matrix_lock:
+        _matrix = None
+
+
+def compute_recipe_totals(recipe_ids, store=True):
+    """`{recipe id: Totals}` of whole recipes computed from their lines, and
+    stored as `RecipeNutrition` rows with `store`. One product per
+    `BATCH_SIZE` recipes; `recipe_ids` must exist."""
+    matrix = get_matrix()
+    quantity = Cast('quantity', FloatField())
+    ordered = sorted(set(recipe_ids))
+    computed = {}
+    for start in range(0, len(ordered), BATCH_SIZE):
+        chunk = ordered[start:start + BATCH_SIZE]
+        lines = RecipeIngredient.objects.filter(recipe_id__in=chunk).order_by().values_list(
+            'recipe_id', 'ingredient_id', quantity, 'unit',
+        )
+        totals = matrix.totals(list(lines))
+        for recipe_id in chunk:
+            totals.setdefault(recipe_id, matrix.empty())
+        if store:
+            RecipeNutrition.objects.bulk_create(
+                [
+                    RecipeNutrition(
+                        recipe_id=recipe_id, amounts=total.amounts, grams=total.grams,
+                        unresolved=list(total.unresolved),
+                    )
+                    for recipe_id, total in totals.items()
+                ],
+                update_conflicts=True, unique_fields=['recipe'],
+                update_fields=['amounts', 'grams', 'unresolved', 'computed_at'],
+            )
+        computed.update(totals)
+    return computed
+
+
+def recipe_totals(recipe_ids):
+    """`{recipe id: Totals}` of whole recipes: the stored ones, and the
+    others computed and stored."""
+    wanted = sorted(set(recipe_ids))
+    found = {}
+    for start in range(0, len(wanted), BATCH_SIZE):
+        stored = RecipeNutrition.objects.filter(recipe_id__in=wanted[start:start + BATCH_SIZE])
+        for row in stored:
+            found[row.recipe_id] = Totals.from_amounts(row.amounts, row.grams, row.unresolved)
+    missing = [recipe_id for recipe_id in wanted if recipe_id not in found]
+    if missing:
+        found.update(compute_recipe_totals(missing))
+    return found
+
+
+def meal_totals(meals):
+    """`{meal id: Totals}` of `meals`, with their `items` and the items'
+    recipes (for `servings`) prefetched."""
+    items = [(meal.pk, item) for meal in meals for item in meal.items.all()]
+    recipes = recipe_totals({item.recipe_id for _, item in items if item.recipe_id is not None})
+    lines = [
+        (meal_id, item.ingredient_id, item.quantity, item.unit)
+        for meal_id, item in items if item.ingredient_id is not None
+    ]
+    matrix = get_matrix()
+    results = matrix.totals(lines)
+    for meal in meals:
+        results.setdefault(meal.pk, matrix.empty())
+    for meal_id, item in items:
+        if item.recipe_id is not None:
+            share = float(item.servings) / (item.recipe.servings or 1)
+            results[meal_id] = results[meal_id] + recipes[item.recipe_id].scaled(share)
+    return results
+
+
+def unresolved_names(totals):
+    """`{ingredient id: name}` of the lines left out of `totals` (Totals)."""
+    ids = {ingredient_id for total in totals for ingredient_id in total.unresolved}
+    return dict(Ingredient.objects.filter(pk__in=ids).values_list('id', 'name')) if ids else {}
+
+
+def recipe_lines_changed(recipe_ids):
+    """Drop the stored totals of `recipe_ids`, whose lines changed."""
+    ordered = sorted(set(recipe_ids))
+    for start in range(0, len(ordered), BATCH_SIZE):
+        RecipeNutrition.objects.filter(recipe_id__in=ordered[start:start + BATCH_SIZE]).delete()
+
+
+def nutrient_data_changed(ingredient_ids=None):
+    """Drop the stored totals of the recipes using `ingredient_ids` (of all
+    recipes for None) and have every process reload its matrix."""
+    stored = RecipeNutrition.objects.all()
+    if ingredient_ids is not None:
+        using = RecipeIngredient.objects.filter(ingredient_id__in=list(ingredient_ids)).values('recipe_id')
+        stored = stored.filter(recipe_id__in=using)
+    stored.delete()
+    transaction.on_commit(reload_matrices)
+
+
+def reload_matrices():
+    """Have every process reload its matrix before its next total."""
+    cache.set(VERSION_KEY, time.time_ns(), None)
+    reset_matrix()
@@ -0,0 +1,100 @@
+from django.db import transaction
+from rest_framework import serializers
+
+from core.instrumentation import InstrumentedSerializerMixin
+from recipes.models import Ingredient, Recipe
+from recipes.normalize import normalize_ingredient_name
+
+from .models import Meal, MealItem
+from .nutrition import meal_totals, unresolved_names
+
+
+def nutrition_data(totals, names, digits=3):
+    return {
+        'grams': round(totals.grams, 1),
+        'amounts': {code: round(amount, digits) for code, amount in totals.amounts.items()},
+        'unresolved': [names.get(ingredient_id, ingredient_id) for ingredient_id in totals.unresolved],
+    }
+
+
+class MealItemSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
+    recipe = serializers.PrimaryKeyRelatedField(
+        queryset=Recipe.objects.only('id'), required=False, allow_null=True,
+    )
+    ingredient = serializers.CharField(source='ingredient.name', max_length=100, required=False, allow_null=True)
+
+    class Meta:
+        model = MealItem
+        fields = ('recipe', 'servings', 'ingredient', 'quantity', 'unit')
+
+    def validate(self, attrs):
+        name = (attrs.get('ingredient') or {}).get('name')
+        if (attrs.get('recipe') is None) == (name is None):
+            raise serializers.ValidationError('Give either a recipe (and servings) or an ingredient (and quantity).')
+        if name is not None:
+            name = normalize_ingredient_name(name)
+            if not name:
+                raise serializers.ValidationError('Ingredient names must contain letters or digits.')
+            attrs['ingredient'] = {'name': name}
+        return attrs
+
+
+class MealSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
+    """A logged meal with its items and their nutrient totals.
+
+    Totals of a page of meals are computed together by the list view and
+    passed in the `nutrition` context (`{meal id: Totals}`, with `names` of
+    the unresolved ingredients); a lone meal computes its own.
+    """
+
+    items = MealItemSerializer(many=True)
+    nutrition = serializers.SerializerMethodField()
+    max_items = 50
+
+    class Meta:
+        model = Meal
+        fields = ('id', 'name', 'eaten_at', 'items', 'nutrition', 'created_at')
+        read_only_fields = ('id', 'created_at')
+
+    def validate_items(self, value):
+        if not value:
+            raise serializers.ValidationError('A meal needs at least one item.')
+        if len(value) > self.max_items:
+            raise serializers.ValidationError(f'At most {self.max_items} items.')
+        return value
+
+    def get_nutrition(self, meal):
+        totals = self.context.get('nutrition', {}).get(meal.pk)
+        names = self.context.get('names')
+        if totals is None:
+            totals = meal_totals([meal])[meal.pk]
+            names = unresolved_names([totals])
+        return nutrition_data(totals, names or {})
+
+    def create(self, validated_data):
+        items = validated_data.pop('items')
+        with transaction.atomic():
+            meal = super().create(validated_data)
+            self._write_items(meal, items)
+        return meal
+
+    def update(self, instance, validated_data):
+        items = validated_data.pop('items', None)
+        with transaction.atomic():
+            meal = super().update(instance, validated_data)
+            if items is not None:
+                self._write_items(meal, items)
+        return meal
+
+    def _write_items(self, meal, items):
+        names = [item['ingredient']['name'] for item in items if item.get('ingredient')]
+        ids = Ingredient.objects.resolve(names, create=True) if names else {}
+        meal.items.all().delete()
+        MealItem.objects.bulk_create([
+            MealItem(
+                meal=meal, position=position, recipe=item.get('recipe'), servings=item.get('servings', 1),
+                ingredient_id=ids.get(item['ingredient']['name']) if item.get('ingredient') else None,
+                quantity=item.get('quantity'), unit=item.get('unit') or '',
+            )
+            for position, item in enumerate(items)
+        ])
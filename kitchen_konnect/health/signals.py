@@ -0,0 +1,31 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.changes import recipes_updated
+
+from .models import IngredientMeasure, IngredientNutrient, Nutrient
+from .nutrition import nutrient_data_changed, recipe_lines_changed
+
+
+@receiver(recipes_updated)
+def drop_changed_recipe_totals(sender, line_recipe_ids, **kwargs):
+    if line_recipe_ids:
+        recipe_lines_changed(line_recipe_ids)
+
+
+@receiver(post_save, sender=IngredientNutrient)
+@receiver(post_delete, sender=IngredientNutrient)
+@receiver(post_save, sender=IngredientMeasure)
+@receiver(post_delete, sender=IngredientMeasure)
+def drop_ingredient_recipe_totals(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Nutrient):
+        # cascade of a nutrient deletion, reported once below
+        return
+    nutrient_data_changed([instance.ingredient_id])
+
+
+@receiver(post_save, sender=Nutrient)
+@receiver(post_delete, sender=Nutrient)
+def drop_all_recipe_totals(sender, **kwargs):
+    # every total has the nutrient columns
+    nutrient_data_changed()
@@ -1,10 +1,171 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
 from rest_framework.test import APITestCase
 
+from recipes.models import Ingredient, Recipe
+
+from . import nutrition
+from .models import IngredientMeasure, IngredientNutrient, Nutrient, RecipeNutrition
+
+User = get_user_model()
+
 
 class HealthProtectedTest(APITestCase):
     def test_protected_requires_auth(self):
         resp = self.client.get('/api/health/protected/')
         self.assertIn(resp.status_code, (401, 403))
-from django.test import TestCase
 
-# Create your tests here.
+
+class NutritionDataMixin:
+    """Flour, egg and milk with energy and protein per 100 g."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ids = Ingredient.objects.resolve(['flour', 'egg', 'milk', 'salt'], create=True)
+        energy, protein = Nutrient.objects.get(code='energy'), Nutrient.objects.get(code='protein')
+        for name, kcal, grams in (('flour', 364, 10), ('egg', 143, 12.6), ('milk', 61, 3.2)):
+            IngredientNutrient.objects.create(ingredient_id=cls.ids[name], nutrient=energy, per_100g=kcal)
+            IngredientNutrient.objects.create(ingredient_id=cls.ids[name], nutrient=protein, per_100g=grams)
+        IngredientMeasure.objects.create(ingredient_id=cls.ids['flour'], grams_per_ml=0.53)
+        IngredientMeasure.objects.create(ingredient_id=cls.ids['egg'], grams_per_piece=50)
+        IngredientMeasure.objects.create(ingredient_id=cls.ids['milk'], grams_per_ml=1.03)
+
+    def setUp(self):
+        cache.clear()
+        nutrition.reset_matrix()
+        self.addCleanup(nutrition.reset_matrix)
+
+
+class NutrientMatrixTest(NutritionDataMixin, TestCase):
+    def lines(self):
+        return [
+            (1, self.ids['flour'], 1, 'cup'),
+            (1, self.ids['egg'], 2, ''),
+            (1, self.ids['milk'], 300, 'ml'),
+            (1, self.ids['salt'], 1, 'pinch'),
+            (2, self.ids['flour'], 250, 'G.'),
+            (2, self.ids['egg'], None, 'pieces'),
+            (2, self.ids['milk'], 2, 'handfuls'),
+        ]
+
+    def test_lines_weighed_by_unit(self):
+        totals = nutrition.get_matrix().totals(self.lines())
+        pancake = totals[1]
+        flour = 236.5882365 * 0.53
+        self.assertAlmostEqual(pancake.grams, flour + 100 + 309)
+        self.assertAlmostEqual(pancake.amounts['energy'], flour * 3.64 + 143 + 309 * 0.61)
+        self.assertAlmostEqual(pancake.amounts['protein'], flour * 0.1 + 12.6 + 309 * 0.032)
+        self.assertEqual(pancake.amounts['vitamin_c'], 0)
+        self.assertEqual(pancake.unresolved, (self.ids['salt'],))
+        self.assertAlmostEqual(totals[2].amounts['energy'], 910)
+        self.assertEqual(totals[2].unresolved, tuple(sorted((self.ids['egg'], self.ids['milk']))))
+
+    def test_naive_loop_agrees(self):
+        matrix = nutrition.get_matrix()
+        vectorized, naive = matrix.totals(self.lines()), matrix.naive_totals(self.lines())
+        self.assertEqual(vectorized.keys(), naive.keys())
+        for owner, total in vectorized.items():
+            self.assertEqual(total.unresolved, naive[owner].unresolved)
+            for code, amount in total.amounts.items():
+                self.assertAlmostEqual(amount, naive[owner].amounts[code])
+        nutrition.reset_matrix()
+        with mock.patch.object(nutrition, 'np', None):
+            python = nutrition.get_matrix().totals(self.lines())
+        self.assertAlmostEqual(python[1].amounts['energy'], vectorized[1].amounts['energy'])
+
+
+class RecipeNutritionTest(NutritionDataMixin, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = User.objects.create_user(username='baker', email='baker@example.com', password='pw-123456')
+        cls.recipe = Recipe.objects.create(title='Crepes', servings=4, author=cls.user)
+        cls.recipe.set_ingredients([
+            {'name': 'flour', 'quantity': 250, 'unit': 'g'},
+            {'name': 'eggs', 'quantity': 2},
+            {'name': 'milk', 'quantity': '0.5', 'unit': 'l'},
+            {'name': 'salt'},
+        ])
+
+    def nutrition(self):
+        resp = self.client.get(f'/api/health/recipes/{self.recipe.pk}/nutrition/')
+        self.assertEqual(resp.status_code, 200, resp.content)
+        return resp.data
+
+    def test_totals_stored_and_reused(self):
+        data = self.nutrition()
+        self.assertEqual(data['total']['energy'], 910 + 143 + 314.15)
+        self.assertEqual(data['per_serving']['energy'], round((910 + 143 + 314.15) / 4, 3))
+        self.assertEqual(data['unresolved'], ['salt'])
+        self.assertEqual(data['units']['sodium'], 'mg')
+        self.assertTrue(RecipeNutrition.objects.filter(recipe=self.recipe).exists())
+
+        with self.assertNumQueries(3):
+            # the recipe, its stored totals and the unresolved names
+            self.nutrition()
+        batch = self.client.get('/api/health/recipes/nutrition/', {'ids': f'{self.recipe.pk},0'}).data
+        self.assertEqual([r['id'] for r in batch['results']], [self.recipe.pk])
+        self.assertEqual(self.client.get('/api/health/recipes/nutrition/', {'ids': 'x'}).status_code, 400)
+
+    def test_changes_recompute_the_recipe(self):
+        self.nutrition()
+        self.client.force_authenticate(self.user)
+        resp = self.client.patch(f'/api/recipes/{self.recipe.pk}/', {
+            'ingredients': [{'name': 'flour', 'quantity': '100', 'unit': 'g'}],
+        }, format='json')
+        self.assertEqual(resp.status_code, 200, resp.content)
+        self.assertFalse(RecipeNutrition.objects.filter(recipe=self.recipe).exists())
+        self.assertEqual(self.nutrition()['total']['energy'], 364)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            IngredientNutrient.objects.filter(ingredient_id=self.ids['flour'], nutrient__code='energy').get().delete()
+        self.assertEqual(self.nutrition()['total']['energy'], 0)
+
+    def test_refresh_command(self):
+        self.nutrition()
+        RecipeNutrition.objects.update(amounts={})
+        call_command('refresh_recipe_nutrition', batch_size=1, stdout=mock.MagicMock())
+        self.assertAlmostEqual(RecipeNutrition.objects.get().amounts['protein'], 25 + 12.6 + 16.48)
+
+
+class MealLogTest(NutritionDataMixin, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = User.objects.create_user(username='eater', email='eater@example.com', password='pw-123456')
+        cls.recipe = Recipe.objects.create(title='Omelette', servings=2)
+        cls.recipe.set_ingredients([{'name': 'egg', 'quantity': 4}, {'name': 'milk', 'quantity': 100, 'unit': 'g'}])
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+
+    def test_meal_totals(self):
+        resp = self.client.post('/api/health/meals/', {
+            'name': 'breakfast',
+            'items': [
+                {'recipe': self.recipe.pk, 'servings': '1.5'},
+                {'ingredient': 'Milk', 'quantity': '200', 'unit': 'ml'},
+                {'ingredient': 'sugar', 'quantity': '1', 'unit': 'tsp'},
+            ],
+        }, format='json')
+        self.assertEqual(resp.status_code, 201, resp.content)
+        # 3/4 of the omelette (4 eggs, 100 g milk) and 206 g of milk
+        expected = round(0.75 * (286 + 61) + 206 * 0.61, 3)
+        self.assertEqual(resp.data['nutrition']['amounts']['energy'], expected)
+        self.assertEqual(resp.data['nutrition']['unresolved'], ['sugar'])
+
+        listed = self.client.get('/api/health/meals/').data['results']
+        self.assertEqual(listed[0]['nutrition']['amounts']['energy'], expected)
+        self.assertEqual(listed[0]['items'][1]['ingredient'], 'milk')
+
+        bad = self.client.post('/api/health/meals/', {'items': [{'servings': 1}]}, format='json')
+        self.assertEqual(bad.status_code, 400)
+        other = User.objects.create_user(username='other', email='other@example.com', password='pw-123456')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get('/api/health/meals/').data['count'], 0)
+        self.assertEqual(self.client.get(f'/api/health/meals/{resp.data["id"]}/').status_code, 404)
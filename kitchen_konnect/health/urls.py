@@ -1,6 +1,10 @@
 from django.urls import path
-from .views import ProtectedHealthView
+from .views import MealDetail, MealList, ProtectedHealthView, RecipeNutritionView
 
 urlpatterns = [
+    path('recipes/nutrition/', RecipeNutritionView.as_view(), name='health-recipes-nutrition'),
+    path('recipes/<int:pk>/nutrition/', RecipeNutritionView.as_view(), name='health-recipe-nutrition'),
+    path('meals/', MealList.as_view(), name='health-meals'),
+    path('meals/<int:pk>/', MealDetail.as_view(), name='health-meal-detail'),
     path('protected/', ProtectedHealthView.as_view(), name='health-protected'),
 ]
@@ -1,10 +1,112 @@
+from django.db.models import Prefetch
+from rest_framework import generics, permissions, status
+from rest_framework.exceptions import NotFound
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 
+from core.instrumentation import InstrumentedViewMixin
+from recipes.models import Recipe
+from .models import Meal, MealItem
+from .nutrition import get_matrix, meal_totals, recipe_totals, unresolved_names
+from .serializers import MealSerializer, nutrition_data
 
-class ProtectedHealthView(APIView):
+
+class ProtectedHealthView(InstrumentedViewMixin, APIView):
 	permission_classes = [IsAuthenticated]
 
 	def get(self, request):
 		return Response({'detail': 'This is a protected health endpoint', 'user': request.user.username})
+
+
+class RecipeNutritionView(InstrumentedViewMixin, APIView):
+	"""Nutrient totals of recipes, whole and per serving.
+
+	`GET recipes/<id>/nutrition/`, or `GET recipes/nutrition/?ids=1,2,3` for
+	up to `max_recipes` at once. `unresolved` names the ingredients left out
+	of the totals: no quantity, an unknown unit, no density or piece weight
+	for the unit, or no nutrient data (see health/nutrition.py). `units` gives
+	the unit of each nutrient.
+	"""
+
+	permission_classes = [permissions.AllowAny]
+	max_recipes = 100
+
+	def get(self, request, pk=None):
+		if pk is not None:
+			ids = [pk]
+		else:
+			try:
+				ids = list(dict.fromkeys(
+					int(value) for param in request.query_params.getlist('ids') for value in param.split(',') if value
+				))
+			except ValueError:
+				return Response({'detail': 'ids must be integers.'}, status=status.HTTP_400_BAD_REQUEST)
+			if not ids or len(ids) > self.max_recipes:
+				return Response(
+					{'detail': f'Pass 1 to {self.max_recipes} recipes as ?ids=1,2,3.'}, status=status.HTTP_400_BAD_REQUEST,
+				)
+		recipes = Recipe.objects.only('id', 'title', 'servings').in_bulk(ids)
+		if pk is not None and not recipes:
+			raise NotFound()
+		totals = recipe_totals(recipes)
+		names = unresolved_names(totals.values())
+		results = []
+		for recipe_id in ids:
+			recipe = recipes.get(recipe_id)
+			if recipe is None:
+				continue
+			whole = nutrition_data(totals[recipe_id], names)
+			per_serving = nutrition_data(totals[recipe_id].scaled(1 / (recipe.servings or 1)), names)
+			results.append({
+				'id': recipe.pk,
+				'title': recipe.title,
+				'servings': recipe.servings,
+				'grams': whole['grams'],
+				'total': whole['amounts'],
+				'per_serving': per_serving['amounts'],
+				'unresolved': whole['unresolved'],
+			})
+		units = get_matrix().units
+		if pk is not None:
+			return Response({**results[0], 'units': units})
+		return Response({'units': units, 'results': results})
+
+
+def meal_queryset(user):
+	items = MealItem.objects.select_related('recipe', 'ingredient').defer('recipe__description', 'recipe__steps')
+	return Meal.objects.filter(user=user).prefetch_related(Prefetch('items', queryset=items))
+
+
+class MealList(InstrumentedViewMixin, generics.ListCreateAPIView):
+	"""The user's meal log, newest first, with the nutrient totals of each meal."""
+
+	serializer_class = MealSerializer
+	permission_classes = [IsAuthenticated]
+
+	def get_queryset(self):
+		return meal_queryset(self.request.user)
+
+	def paginate_queryset(self, queryset):
+		# the totals of the page are computed together (see MealSerializer)
+		page = super().paginate_queryset(queryset)
+		self.nutrition = meal_totals(list(page if page is not None else queryset))
+		self.unresolved = unresolved_names(self.nutrition.values())
+		return page
+
+	def get_serializer_context(self):
+		context = super().get_serializer_context()
+		if hasattr(self, 'nutrition'):
+			context.update(nutrition=self.nutrition, names=self.unresolved)
+		return context
+
+	def perform_create(self, serializer):
+		serializer.save(user=self.request.user)
+
+
+class MealDetail(InstrumentedViewMixin, generics.RetrieveUpdateDestroyAPIView):
+	serializer_class = MealSerializer
+	permission_classes = [IsAuthenticated]
+
+	def get_queryset(self):
+		return meal_queryset(self.request.user)
@@ -1,3 +1,22 @@
 from django.contrib import admin
+from .models import Ingredient, Recipe, RecipeIngredient
 
-# Register your models here.
+
+class RecipeIngredientInline(admin.TabularInline):
+	model = RecipeIngredient
+	raw_id_fields = ('ingredient',)
+	extra = 0
+
+
+@admin.register(Recipe)
+class RecipeAdmin(admin.ModelAdmin):
+	list_display = ('title', 'cuisine', 'prep_minutes', 'author', 'updated_at')
+	raw_id_fields = ('author',)
+	search_fields = ('title',)
+	inlines = (RecipeIngredientInline,)
+
+
+@admin.register(Ingredient)
+class IngredientAdmin(admin.ModelAdmin):
+	search_fields = ('name',)
+	ordering = ('name',)
@@ -0,0 +1,674 @@
+"""Streaming catalog import from JSON, NDJSON or CSV.
+
+Used by the `import_catalog` management command in place of `loaddata`,
+which reads the whole fixture into memory and saves one object at a time.
+The file is read as a stream of records, processed in chunks of
+`chunk_size`:
+
+1. consecutive records of the same model are converted (each field through
+   the model field's `to_python`) and their foreign keys resolved;
+2. they are inserted with `bulk_create`, one transaction per chunk, which
+   also reports the recipes and ingredients written to the indexes
+   (recipes/changes.py) and the nutrition totals (health/nutrition.py),
+   since `bulk_create` sends no signals;
+3. the same transaction moves the `CatalogImport` checkpoint to the end of
+   the chunk.
+
+Records are Django fixture objects (`{"model": "recipes.recipe", "pk": 7,
+"fields": {...}}`, as written by `dumpdata` in the json and jsonl formats)
+or flat objects/CSV rows of `--model` (fields at the top level, `pk` or
+`id` for the source key). JSON input is one array, parsed object by object;
+NDJSON one object per line.
+
+Supported models (`MODELS`): `recipes.ingredient` (merged by normalized
+name), `recipes.recipe` (with `diet_tags` and an optional inline
+`ingredients` list of lines or names), `recipes.recipeingredient`,
+`health.nutrient` (merged by code), `health.ingredientnutrient` and
+`health.ingredientmeasure` (both upserts). Foreign keys name the source key
+of a record imported earlier in the file, resolved through an in-memory
+`IdMap` per model; ingredients may also be given by name and nutrients by
+code. Timestamps are set at import.
+
+Memory is bounded by the chunk and the id maps (8 bytes per imported row
+with a dense integer key). The maps are journalled to an append-only file
+(`<file>.ids`) before each chunk commits, tagged with the chunk's end
+position; a resumed import reloads the entries up to the committed
+checkpoint and seeks the input there. Invalid records are reported with
+their number and skipped; a chunk failing on an integrity error aborts the
+import at its checkpoint.
+"""
+import codecs
+import csv
+import json
+import os
+import re
+from array import array
+from dataclasses import dataclass, field
+from itertools import groupby
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from .changes import batch, recipes_changed
+from .models import CatalogImport, Ingredient, Recipe, RecipeIngredient
+from .normalize import normalize_ingredient_name
+
+FORMAT_JSON = 'json'
+FORMAT_NDJSON = 'ndjson'
+FORMAT_CSV = 'csv'
+FORMATS = (FORMAT_JSON, FORMAT_NDJSON, FORMAT_CSV)
+
+DEFAULT_CHUNK_SIZE = 1000
+READ_SIZE = 1 << 16
+# a JSON array element larger than this is rejected rather than buffered
+MAX_RECORD_BYTES = 16 << 20
+# errors kept for the report; later ones are only counted
+MAX_ERRORS = 1000
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class ImportAborted(Exception):
+    """A chunk could not be written; the import stops at the last checkpoint."""
+
+
+@dataclass
+class ImportResult:
+    records: int = 0
+    created: dict = field(default_factory=dict)
+    errors: list = field(default_factory=list)
+    error_count: int = 0
+    position: int = 0
+    # records already imported when the run resumed
+    resumed: int = 0
+
+    def add_error(self, number, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append({'record': number, 'error': message})
+
+    def add_created(self, label, count):
+        if count:
+            self.created[label] = self.created.get(label, 0) + count
+
+
+def detect_format(name, default=FORMAT_JSON):
+    name = (name or '').lower()
+    if name.endswith(('.ndjson', '.jsonl')):
+        return FORMAT_NDJSON
+    if name.endswith('.csv'):
+        return FORMAT_CSV
+    return default
+
+
+# -- readers ------------------------------------------------------------------
+#
+# Each yields `(record or error, position)` from a binary file, `position`
+# being the byte offset just after the record, and starts at `start` (a
+# position yielded earlier).
+
+
+def iter_ndjson(binary, start=0):
+    binary.seek(start)
+    position = start
+    for line in binary:
+        position += len(line)
+        text = line.strip()
+        if not text:
+            continue
+        try:
+            yield json.loads(text), position
+        except ValueError as exc:
+            yield ValueError(f'invalid JSON: {exc}'), position
+
+
+def iter_csv(binary, start=0):
+    binary.seek(0)
+    header_line = binary.readline()
+    header = next(csv.reader([header_line.decode('utf-8-sig')]), [])
+    consumed = max(start, len(header_line))
+    binary.seek(consumed)
+
+    def lines():
+        nonlocal consumed
+        for line in binary:
+            consumed += len(line)
+            yield line.decode('utf-8')
+
+    # the reader pulls only the lines of the record it returns
+    for row in csv.reader(lines()):
+        if row:
+            yield dict(zip(header, row)), consumed
+
+
+def iter_json_array(binary, start=0):
+    """Elements of a top-level JSON array, one at a time.
+
+    The text is decoded into a buffer read `READ_SIZE` bytes at a time and
+    each element parsed in place with `raw_decode`; consumed text is
+    dropped when the buffer is refilled.
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder('utf-8')()
+    binary.seek(start)
+    if not start and binary.read(3) != codecs.BOM_UTF8:
+        binary.seek(0)
+    position = binary.tell()
+    buffer, index, eof = '', 0, False
+    # after `[` or `,` an element is expected; after an element `,` or `]`
+    opened, expect_element, first = start > 0, start == 0, True
+
+    def consume(end):
+        nonlocal index, position
+        consumed = buffer[index:end]
+        position += len(consumed) if consumed.isascii() else len(consumed.encode())
+        index = end
+
+    while True:
+        end = WHITESPACE.match(buffer, index).end()
+        if end != index:
+            consume(end)
+        if index == len(buffer):
+            if eof:
+                if opened:
+                    yield ValueError('truncated JSON array'), position
+                return
+            chunk = binary.read(READ_SIZE)
+            eof = not chunk
+            buffer, index = buffer[index:] + text.decode(chunk, final=eof), 0
+            continue
+        char = buffer[index]
+        if not opened:
+            if char != '[':
+                yield ValueError('expected a JSON array'), position
+                return
+            opened = True
+            consume(index + 1)
+            continue
+        if char == ']' and (not expect_element or first):
+            return
+        if not expect_element:
+            if char != ',':
+                yield ValueError(f'expected "," or "]" at byte {position}'), position
+                return
+            expect_element = True
+            consume(index + 1)
+            continue
+        try:
+            value, end = decoder.raw_decode(buffer, index)
+            # a number or literal may go on in the next read
+            complete = eof or end < len(buffer)
+        except ValueError as exc:
+            if eof or len(buffer) - index > MAX_RECORD_BYTES:
+                yield ValueError(f'invalid JSON at byte {position}: {exc}'), position
+                return
+            complete = False
+        if not complete:
+            # reads grow with the element, so a large one is parsed O(log n) times
+            chunk = binary.read(max(READ_SIZE, len(buffer) - index))
+            eof = not chunk
+            buffer, index = buffer[index:] + text.decode(chunk, final=eof), 0
+            continue
+        consume(end)
+        expect_element, first = False, False
+        yield value, position
+
+
+READERS = {FORMAT_JSON: iter_json_array, FORMAT_NDJSON: iter_ndjson, FORMAT_CSV: iter_csv}
+
+
+# -- id maps ------------------------------------------------------------------
+
+
+class IdMap:
+    """Source key -> database id for one model.
+
+    Integer keys (fixture pks, CSV ids) go to an `array('q')` indexed by key
+    while they are dense, 8 bytes an entry; other keys to a dict.
+    """
+
+    MISSING = -1
+
+    def __init__(self):
+        self.dense = array('q')
+        self.sparse = {}
+
+    @staticmethod
+    def normalize(key):
+        if isinstance(key, str) and key.isdigit():
+            return int(key)
+        return key
+
+    def __setitem__(self, key, object_id):
+        key = self.normalize(key)
+        if isinstance(key, int) and 0 <= key < 2 * len(self.dense) + 4096:
+            if key >= len(self.dense):
+                self.dense.extend([self.MISSING] * (key + 1 - len(self.dense)))
+            self.dense[key] = object_id
+        else:
+            self.sparse[key] = object_id
+
+    def get(self, key):
+        key = self.normalize(key)
+        if isinstance(key, int) and 0 <= key < len(self.dense):
+            object_id = self.dense[key]
+            return None if object_id == self.MISSING else object_id
+        return self.sparse.get(key)
+
+
+class IdJournal:
+    """Append-only file of the id map entries of each chunk, tagged with the
+    chunk's end position: one JSON line `{"position": p, "ids": {label:
+    [[key, id], ...]}}` per chunk."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self, maps, position):
+        """Replay the entries of chunks up to `position` into `maps` and drop the rest."""
+        if not os.path.exists(self.path):
+            return
+        keep = 0
+        with open(self.path, 'rb') as fh:
+            for line in fh:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    break  # torn last write
+                if entry['position'] > position:
+                    break
+                for label, pairs in entry['ids'].items():
+                    id_map = maps.setdefault(label, IdMap())
+                    for key, object_id in pairs:
+                        id_map[key] = object_id
+                keep += len(line)
+        with open(self.path, 'r+b') as fh:
+            fh.truncate(keep)
+
+    def append(self, position, entries):
+        if not entries:
+            return
+        with open(self.path, 'a', encoding='utf-8') as fh:
+            fh.write(json.dumps({'position': position, 'ids': entries}, separators=(',', ':')) + '\n')
+            fh.flush()
+            os.fsync(fh.fileno())
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+# -- importer -----------------------------------------------------------------
+
+
+@dataclass
+class Row:
+    number: int
+    key: object
+    fields: dict
+
+
+class CatalogImporter:
+    # model label: handler method
+    MODELS = {
+        'recipes.ingredient': '_ingredients',
+        'recipes.recipe': '_recipes',
+        'recipes.recipeingredient': '_recipe_ingredients',
+        'health.nutrient': '_nutrients',
+        'health.ingredientnutrient': '_ingredient_nutrients',
+        'health.ingredientmeasure': '_ingredient_measures',
+    }
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE, model=None, dry_run=False, progress=None):
+        self.chunk_size = max(1, chunk_size)
+        self.default_model = model.lower() if model else None
+        self.dry_run = dry_run
+        self.progress = progress
+        self.maps = {}
+        self.nutrient_codes = None
+
+    def run(self, path, fmt, resume=False, restart=False):
+        source = os.path.abspath(path)
+        journal = IdJournal(f'{path}.ids')
+        result = ImportResult()
+        checkpoint = None
+        if not self.dry_run:
+            checkpoint = self._checkpoint(source, journal, resume, restart)
+            result.records, result.position = checkpoint.records, checkpoint.position
+            result.resumed = checkpoint.records
+            if checkpoint.position:
+                journal.load(self.maps, checkpoint.position)
+
+        with open(path, 'rb') as binary:
+            chunk = []
+            for record, position in READERS[fmt](binary, result.position):
+                result.records += 1
+                row = self._row(result.records, record, result)
+                result.position = position
+                if row is not None:
+                    chunk.append(row)
+                if len(chunk) >= self.chunk_size:
+                    self._write_chunk(chunk, position, result, journal, checkpoint)
+                    chunk = []
+            self._write_chunk(chunk, result.position, result, journal, checkpoint)
+
+        if checkpoint is not None:
+            checkpoint.finished_at = timezone.now()
+            checkpoint.save(update_fields=['finished_at', 'updated_at'])
+            journal.remove()
+        return result
+
+    def _checkpoint(self, source, journal, resume, restart):
+        existing = CatalogImport.objects.filter(source=source).first()
+        if existing is not None and restart:
+            existing.delete()
+            journal.remove()
+            existing = None
+        if existing is None:
+            journal.remove()
+            return CatalogImport.objects.create(source=source)
+        if existing.finished_at is not None:
+            raise ImportAborted(
+                f'{source} was imported on {existing.finished_at:%Y-%m-%d %H:%M}; pass --restart to import it again.'
+            )
+        if not resume:
+            raise ImportAborted(
+                f'An import of {source} stopped at byte {existing.position}; pass --resume to continue or --restart.'
+            )
+        return existing
+
+    def _row(self, number, record, result):
+        if isinstance(record, Exception):
+            result.add_error(number, str(record))
+            return None
+        if not isinstance(record, dict):
+            result.add_error(number, 'expected an object')
+            return None
+        if isinstance(record.get('fields'), dict):
+            label, key, fields = record.get('model'), record.get('pk'), dict(record['fields'])
+        else:
+            fields = dict(record)
+            label = fields.pop('model', None) or self.default_model
+            key = fields.pop('pk', None)
+            if key is None:
+                key = fields.pop('id', None)
+        label = (label or '').lower()
+        if label not in self.MODELS:
+            result.add_error(number, f'unsupported model {label!r}' if label else 'no model (pass --model)')
+            return None
+        return label, Row(number, None if key in (None, '') else key, fields)
+
+    def _write_chunk(self, chunk, position, result, journal, checkpoint):
+        if not chunk and (checkpoint is None or checkpoint.position == position):
+            return
+        created, new_ids = {}, {}
+        self.changed_recipes, self.changed_ingredients = set(), set()
+        try:
+            with transaction.atomic():
+                with batch():
+                    for label, rows in groupby(chunk, key=lambda item: item[0]):
+                        rows = [row for _, row in rows]
+                        handler = getattr(self, self.MODELS[label])
+                        mapped = handler(rows, result)
+                        created[label] = len(mapped)
+                        self._map(label, mapped, new_ids)
+                    recipes_changed(self.changed_recipes, ingredients=True)
+                if self.changed_ingredients:
+                    from health.nutrition import nutrient_data_changed
+
+                    # None: a nutrient was added, every total lacks it
+                    nutrient_data_changed(None if None in self.changed_ingredients else self.changed_ingredients)
+                if self.dry_run:
+                    transaction.set_rollback(True)
+                else:
+                    checkpoint.position, checkpoint.records = position, result.records
+                    for label, count in created.items():
+                        checkpoint.created[label] = checkpoint.created.get(label, 0) + count
+                    checkpoint.save(update_fields=['position', 'records', 'created', 'updated_at'])
+                    # journalled before the commit; entries past the committed
+                    # position are dropped on resume
+                    journal.append(position, new_ids)
+        except DatabaseError as exc:
+            raise ImportAborted(f'chunk ending at byte {position} failed: {exc}') from exc
+        for label, count in created.items():
+            result.add_created(label, count)
+        if self.progress is not None:
+            self.progress(result)
+
+    def _map(self, label, mapped, new_ids):
+        id_map = self.maps.setdefault(label, IdMap())
+        pairs = new_ids.setdefault(label, [])
+        for key, object_id in mapped:
+            if key is not None and object_id is not None:
+                id_map[key] = object_id
+                pairs.append([IdMap.normalize(key), object_id])
+        if not pairs:
+            del new_ids[label]
+
+    # -- field conversion -----------------------------------------------------
+
+    def _values(self, model, row, names, result):
+        """`{name: python value}` of the fields `names` present in `row`, or None if one is invalid."""
+        values = {}
+        for name in names:
+            if name not in row.fields:
+                continue
+            model_field = model._meta.get_field(name)
+            raw = row.fields[name]
+            if raw == '' and model_field.null:
+                raw = None
+            try:
+                value = model_field.to_python(raw)
+                if value is None and not model_field.null:
+                    raise ValidationError('this field cannot be null')
+            except ValidationError as exc:
+                result.add_error(row.number, f'{name}: {"; ".join(exc.messages)}')
+                return None
+            values[name] = value
+        return values
+
+    def _ingredient_ref(self, value, names):
+        """Id of ingredient `value` (a source key, else a name), or None with
+        the name added to `names` to be resolved."""
+        object_id = self.maps.get('recipes.ingredient', IdMap()).get(value) if value not in (None, '') else None
+        if object_id is None and isinstance(value, str) and not value.isdigit():
+            names.add(normalize_ingredient_name(value))
+        return object_id
+
+    def _ingredient_ids(self, rows, name_field, result):
+        """`{row number: ingredient id}` for `rows`, their `name_field` being a source key or a name."""
+        names, ids = set(), {}
+        for row in rows:
+            ids[row.number] = self._ingredient_ref(row.fields.get(name_field), names)
+        found = Ingredient.objects.resolve(names - {''}, create=True) if names - {''} else {}
+        for row in rows:
+            if ids[row.number] is None:
+                value = row.fields.get(name_field)
+                if isinstance(value, str):
+                    ids[row.number] = found.get(normalize_ingredient_name(value))
+                if ids[row.number] is None:
+                    result.add_error(row.number, f'unknown ingredient {value!r}')
+        return ids
+
+    # -- handlers: return `[(source key, id)]` of the rows written --------------
+
+    def _ingredients(self, rows, result):
+        names = {}
+        for row in rows:
+            name = normalize_ingredient_name(str(row.fields.get('name') or ''))
+            if not name:
+                result.add_error(row.number, 'name: ingredient names must contain letters or digits')
+                continue
+            names[row.number] = name
+        ids = Ingredient.objects.resolve(names.values(), create=True)
+        return [(row.key, ids[names[row.number]]) for row in rows if row.number in names]
+
+    def _recipes(self, rows, result):
+        fields = ('title', 'description', 'steps', 'cuisine', 'prep_minutes', 'servings', 'diet_flags')
+        User = get_user_model()
+        authors = {row.fields.get('author') for row in rows} - {None, ''}
+        existing_authors = set(User.objects.filter(pk__in=[
+            int(author) for author in authors if str(author).isdigit()
+        ]).values_list('pk', flat=True)) if authors else set()
+        recipes, lines = [], []
+        for row in rows:
+            values = self._values(Recipe, row, fields, result)
+            if values is None:
+                continue
+            if not values.get('title'):
+                result.add_error(row.number, 'title: this field is required')
+                continue
+            tags = row.fields.get('diet_tags')
+            if tags:
+                tags = tags.split(',') if isinstance(tags, str) else tags
+                unknown = set(tags) - set(Recipe.DIET_TAGS)
+                if unknown:
+                    result.add_error(row.number, f'diet_tags: unknown {", ".join(sorted(unknown))}')
+                    continue
+                values['diet_flags'] = Recipe.diet_mask(tags)
+            author = row.fields.get('author')
+            if author not in (None, '') and str(author).isdigit() and int(author) in existing_authors:
+                values['author_id'] = int(author)
+            recipes.append((row, Recipe(**values)))
+            lines.append(row.fields.get('ingredients') or [])
+        Recipe.objects.bulk_create([recipe for _, recipe in recipes])
+        self.changed_recipes.update(recipe.pk for _, recipe in recipes)
+        if any(lines):
+            self._inline_lines(recipes, lines, result)
+        return [(row.key, recipe.pk) for row, recipe in recipes]
+
+    def _inline_lines(self, recipes, lines, result):
+        """Ingredient lines given with their recipes: names, or objects with a `name`."""
+        parsed = []
+        for (row, recipe), recipe_lines in zip(recipes, lines):
+            seen = set()
+            for position, line in enumerate(recipe_lines):
+                line = {'name': line} if isinstance(line, str) else line
+                name = normalize_ingredient_name(str(line.get('name') or '')) if isinstance(line, dict) else ''
+                if not name or name in seen:
+                    if not name:
+                        result.add_error(row.number, f'ingredients: invalid line {position + 1}')
+                    continue
+                seen.add(name)
+                parsed.append((row, recipe, position, name, line))
+        ids = Ingredient.objects.resolve({name for _, _, _, name, _ in parsed}, create=True)
+        objs = []
+        for row, recipe, position, name, line in parsed:
+            quantity = line.get('quantity')
+            try:
+                quantity = RecipeIngredient._meta.get_field('quantity').to_python(quantity if quantity != '' else None)
+            except ValidationError:
+                result.add_error(row.number, f'ingredients: invalid quantity {quantity!r} for {name}')
+                quantity = None
+            objs.append(RecipeIngredient(
+                recipe_id=recipe.pk, ingredient_id=ids[name], position=position, quantity=quantity,
+                unit=str(line.get('unit') or '')[:20], note=str(line.get('note') or '')[:200],
+            ))
+        RecipeIngredient.objects.bulk_create(objs, ignore_conflicts=True)
+
+    def _recipe_ingredients(self, rows, result):
+        recipes = self.maps.get('recipes.recipe', IdMap())
+        ingredient_ids = self._ingredient_ids(rows, 'ingredient', result)
+        objs = []
+        for row in rows:
+            recipe_id = recipes.get(row.fields.get('recipe'))
+            if recipe_id is None:
+                result.add_error(row.number, f'unknown recipe {row.fields.get("recipe")!r}')
+                continue
+            if ingredient_ids[row.number] is None:
+                continue
+            values = self._values(RecipeIngredient, row, ('quantity', 'unit', 'note', 'position'), result)
+            if values is None:
+                continue
+            ingredient_id = ingredient_ids[row.number]
+            objs.append((row, RecipeIngredient(recipe_id=recipe_id, ingredient_id=ingredient_id, **values)))
+        # a repeated (recipe, ingredient) pair keeps the first line
+        RecipeIngredient.objects.bulk_create([obj for _, obj in objs], ignore_conflicts=True)
+        self.changed_recipes.update(obj.recipe_id for _, obj in objs)
+        return [(row.key, None) for row, _ in objs]
+
+    def _nutrients(self, rows, result):
+        Nutrient = apps.get_model('health', 'Nutrient')
+        codes = {}
+        for row in rows:
+            code = str(row.fields.get('code') or '').strip()
+            if not code:
+                result.add_error(row.number, 'code: this field is required')
+                continue
+            codes[row.number] = code
+        existing = dict(Nutrient.objects.filter(code__in=codes.values()).values_list('code', 'id'))
+        missing = {}
+        for row in rows:
+            code = codes.get(row.number)
+            if code is not None and code not in existing and code not in missing:
+                values = self._values(Nutrient, row, ('name', 'unit', 'position'), result)
+                if values is not None:
+                    missing[code] = Nutrient(code=code, **{'name': code, 'unit': 'g', **values})
+        if missing:
+            Nutrient.objects.bulk_create(missing.values(), ignore_conflicts=True)
+            existing.update(Nutrient.objects.filter(code__in=missing).values_list('code', 'id'))
+            self.changed_ingredients.add(None)
+            self.nutrient_codes = None
+        return [(row.key, existing[codes[row.number]]) for row in rows if codes.get(row.number) in existing]
+
+    def _nutrient_id(self, value):
+        object_id = self.maps.get('health.nutrient', IdMap()).get(value) if value not in (None, '') else None
+        if object_id is None and isinstance(value, str) and not value.isdigit():
+            if self.nutrient_codes is None:
+                Nutrient = apps.get_model('health', 'Nutrient')
+                self.nutrient_codes = dict(Nutrient.objects.values_list('code', 'id'))
+            object_id = self.nutrient_codes.get(value)
+        return object_id
+
+    def _ingredient_nutrients(self, rows, result):
+        IngredientNutrient = apps.get_model('health', 'IngredientNutrient')
+        ingredient_ids = self._ingredient_ids(rows, 'ingredient', result)
+        objs = {}
+        for row in rows:
+            nutrient_id = self._nutrient_id(row.fields.get('nutrient'))
+            if nutrient_id is None:
+                result.add_error(row.number, f'unknown nutrient {row.fields.get("nutrient")!r}')
+                continue
+            if ingredient_ids[row.number] is None:
+                continue
+            values = self._values(IngredientNutrient, row, ('per_100g',), result)
+            if values is None:
+                continue
+            if 'per_100g' not in values:
+                result.add_error(row.number, 'per_100g: this field is required')
+                continue
+            # the last amount of a pair wins, as in the upsert
+            objs[ingredient_ids[row.number], nutrient_id] = (row, IngredientNutrient(
+                ingredient_id=ingredient_ids[row.number], nutrient_id=nutrient_id, **values,
+            ))
+        IngredientNutrient.objects.bulk_create(
+            [obj for _, obj in objs.values()],
+            update_conflicts=True, unique_fields=['ingredient', 'nutrient'], update_fields=['per_100g'],
+        )
+        self.changed_ingredients.update(ingredient_id for ingredient_id, _ in objs)
+        return [(row.key, None) for row, _ in objs.values()]
+
+    def _ingredient_measures(self, rows, result):
+        IngredientMeasure = apps.get_model('health', 'IngredientMeasure')
+        ingredient_ids = self._ingredient_ids(rows, 'ingredient', result)
+        objs = {}
+        for row in rows:
+            if ingredient_ids[row.number] is None:
+                continue
+            values = self._values(IngredientMeasure, row, ('grams_per_ml', 'grams_per_piece'), result)
+            if values is not None:
+                ingredient_id = ingredient_ids[row.number]
+                objs[ingredient_id] = (row, IngredientMeasure(ingredient_id=ingredient_id, **values))
+        IngredientMeasure.objects.bulk_create(
+            [obj for _, obj in objs.values()],
+            update_conflicts=True, unique_fields=['ingredient'], update_fields=['grams_per_ml', 'grams_per_piece'],
+        )
+        self.changed_ingredients.update(objs)
+        return [(row.key, None) for row, _ in objs.values()]
+
+
+def import_catalog(path, fmt, resume=False, restart=False, **options):
+    """Import the catalog file at `path`; see `CatalogImporter` for options."""
+    return CatalogImporter(**options).run(path, fmt, resume=resume, restart=restart)
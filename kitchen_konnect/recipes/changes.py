@@ -0,0 +1,60 @@
+"""The indexes derived from recipes, updated after recipe writes.
+
+Writes report the recipes they touched with `recipes_changed(ids)`, plus
+`ingredients=True` when the ingredient lines changed (or the recipe was
+deleted). That updates:
+
+- the full-text search index (recipes/search.py), for every change;
+- the pantry index change log (recipes/pantry.py), for ingredient changes;
+- whatever listens to `recipes_updated`, sent last with the `recipe_ids`
+  reported and the `line_recipe_ids` (those of them whose ingredient lines
+  changed); the nutrition totals of health/nutrition.py are dropped that way.
+
+The signal handlers in recipes/signals.py report single-row saves and
+deletes; code writing with `bulk_create()`, `update()` or raw SQL reports
+its recipes itself. Inside `batch()` the reports are collected and applied
+once when the block ends, so rewriting the lines of a recipe updates each
+index once rather than once per line.
+"""
+import contextvars
+from contextlib import contextmanager
+
+from django.dispatch import Signal
+
+recipes_updated = Signal()
+
+_pending = contextvars.ContextVar('recipes_pending_changes', default=None)
+
+
+@contextmanager
+def batch():
+    """Apply the changes reported in the block once, when it ends."""
+    if _pending.get() is not None:
+        yield
+        return
+    text, lines = set(), set()
+    token = _pending.set((text, lines))
+    try:
+        yield
+    finally:
+        _pending.reset(token)
+    _apply(text | lines, lines)
+
+
+def recipes_changed(recipe_ids, ingredients=False):
+    pending = _pending.get()
+    if pending is None:
+        recipe_ids = set(recipe_ids)
+        _apply(recipe_ids, recipe_ids if ingredients else ())
+        return
+    pending[1 if ingredients else 0].update(recipe_ids)
+
+
+def _apply(text_ids, line_recipe_ids):
+    from .pantry import record_changes
+    from .search import index_recipes
+
+    index_recipes(text_ids)
+    record_changes(line_recipe_ids)
+    if text_ids:
+        recipes_updated.send(sender=None, recipe_ids=set(text_ids), line_recipe_ids=set(line_recipe_ids))
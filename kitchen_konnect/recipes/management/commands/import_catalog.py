@@ -0,0 +1,56 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.bulk_import import (
+    DEFAULT_CHUNK_SIZE, FORMATS, ImportAborted, detect_format, import_catalog,
+)
+
+
+class Command(BaseCommand):
+    help = 'Stream a JSON, NDJSON or CSV catalog file into the database (see recipes/bulk_import.py for records)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='JSON array, NDJSON or CSV file to import')
+        parser.add_argument('--format', choices=FORMATS, help='Input format (default: from file extension, else json)')
+        parser.add_argument('--model', help='Model of records without one, e.g. recipes.recipe for a CSV of recipes')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Records per transaction')
+        parser.add_argument('--resume', action='store_true', help='Continue an interrupted import of the file')
+        parser.add_argument('--restart', action='store_true', help='Discard the checkpoint of the file and start over')
+        parser.add_argument('--dry-run', action='store_true', help='Validate only; nothing is written')
+
+    def handle(self, *args, **options):
+        fmt = options.get('format') or detect_format(options['path'])
+        started = time.monotonic()
+
+        def progress(result):
+            elapsed = time.monotonic() - started
+            done = result.records - result.resumed
+            rate = done / elapsed if elapsed else 0.0
+            self.stdout.write(
+                f'{result.records} records (byte {result.position}), {sum(result.created.values())} rows created, '
+                f'{result.error_count} error(s), {rate:.0f} records/s'
+            )
+
+        try:
+            result = import_catalog(
+                options['path'], fmt,
+                resume=options.get('resume', False),
+                restart=options.get('restart', False),
+                model=options.get('model'),
+                chunk_size=options['chunk_size'],
+                dry_run=options.get('dry_run', False),
+                progress=progress,
+            )
+        except (OSError, ImportAborted) as exc:
+            raise CommandError(str(exc))
+
+        for error in result.errors:
+            self.stderr.write(f"record {error['record']}: {error['error']}")
+        if result.error_count > len(result.errors):
+            self.stderr.write(f'... {result.error_count - len(result.errors)} more error(s)')
+        verb = 'would be created' if options.get('dry_run') else 'created'
+        created = ', '.join(f'{count} {label}' for label, count in sorted(result.created.items())) or 'nothing'
+        self.stdout.write(self.style.NOTICE(
+            f'Done. {result.records} record(s) read, {created} {verb}, {result.error_count} record(s) rejected.'
+        ))
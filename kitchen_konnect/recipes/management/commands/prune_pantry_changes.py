@@ -0,0 +1,37 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recipes.models import PantryIndexChange
+
+
+class Command(BaseCommand):
+    help = 'Delete pantry index change rows older than PANTRY_CHANGE_RETENTION in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows deleted per statement/transaction')
+        parser.add_argument('--sleep', type=float, default=0.0, help='Seconds to pause between batches')
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would be deleted')
+
+    def handle(self, *args, **options):
+        # indexes idle for longer than the retention rebuild themselves
+        # instead of replaying (see recipes/pantry.py)
+        cutoff = timezone.now() - settings.PANTRY_CHANGE_RETENTION
+        old = PantryIndexChange.objects.filter(changed_at__lt=cutoff).order_by('id')
+        if options.get('dry_run'):
+            self.stdout.write(self.style.NOTICE(f'{old.count()} change rows would be deleted.'))
+            return
+        batch_size = max(1, options.get('batch_size') or 5000)
+        total = 0
+        while True:
+            ids = list(old.values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            # ids grow with time: one range delete per batch
+            old.filter(id__lte=ids[-1]).delete()
+            total += len(ids)
+            if options.get('sleep'):
+                time.sleep(options['sleep'])
+        self.stdout.write(self.style.NOTICE(f'{total} change rows deleted.'))
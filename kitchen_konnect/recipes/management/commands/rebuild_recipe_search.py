@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from recipes.search import INDEX_BATCH, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rewrite the full-text search document of every recipe'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=INDEX_BATCH, help='Recipes indexed per statement batch')
+        parser.add_argument('--database', default='default', help='Database alias')
+
+    def handle(self, *args, **options):
+        total = rebuild_index(
+            batch_size=max(1, options.get('batch_size') or INDEX_BATCH),
+            using=options.get('database') or 'default',
+            progress=lambda done: self.stdout.write(f'{done} recipes indexed'),
+        )
+        self.stdout.write(self.style.NOTICE(f'Search index rebuilt: {total} recipes.'))
@@ -0,0 +1,82 @@
+# Generated by Django 5.2.3 on 2026-10-18 12:49
+
+from django.db import migrations, models
+
+# Full-text search documents of recipes (see recipes/search.py, whose
+# table names and column weights these statements must match). Neither
+# table is a Django model: they are written with raw SQL from Python, and
+# filled here from the recipes that already exist (whose diet_flags are
+# still 0, so their tags are the cuisine alone).
+SQLITE_CREATE = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS recipes_recipe_fts USING fts5(
+        title, description, ingredients, steps, tags,
+        tokenize='porter unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    INSERT INTO recipes_recipe_fts(rowid, title, description, ingredients, steps, tags)
+    SELECT r.id, r.title, r.description,
+           COALESCE((SELECT group_concat(i.name, ' ') FROM recipes_recipeingredient ri
+                     JOIN recipes_ingredient i ON i.id = ri.ingredient_id WHERE ri.recipe_id = r.id), ''),
+           r.steps, r.cuisine
+    FROM recipes_recipe r
+    """,
+]
+SQLITE_DROP = ['DROP TABLE IF EXISTS recipes_recipe_fts']
+# no foreign key: `flush` truncates recipes_recipe without CASCADE, and the
+# search joins recipes_recipe, so a leftover document is never returned
+PG_CREATE = [
+    'CREATE TABLE IF NOT EXISTS recipes_recipe_search (recipe_id bigint PRIMARY KEY, document tsvector NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS recipes_recipe_search_gin ON recipes_recipe_search USING gin (document)',
+    """
+    INSERT INTO recipes_recipe_search(recipe_id, document)
+    SELECT r.id,
+           setweight(to_tsvector('english', r.title), 'A')
+           || setweight(to_tsvector('english', r.description), 'C')
+           || setweight(to_tsvector('english', COALESCE((
+                  SELECT string_agg(i.name, ' ') FROM recipes_recipeingredient ri
+                  JOIN recipes_ingredient i ON i.id = ri.ingredient_id WHERE ri.recipe_id = r.id), '')), 'B')
+           || setweight(to_tsvector('english', r.steps), 'D')
+           || setweight(to_tsvector('english', r.cuisine), 'B')
+    FROM recipes_recipe r
+    """,
+]
+PG_DROP = ['DROP TABLE IF EXISTS recipes_recipe_search']
+
+
+def _run(schema_editor, statements):
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        _run(schema_editor, SQLITE_CREATE)
+    elif vendor == 'postgresql':
+        _run(schema_editor, PG_CREATE)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        _run(schema_editor, SQLITE_DROP)
+    elif vendor == 'postgresql':
+        _run(schema_editor, PG_DROP)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='diet_flags',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -1,3 +1,176 @@
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+from .normalize import normalize_ingredient_name
+
+
+class IngredientManager(models.Manager):
+	def resolve(self, names, create=False):
+		"""Return `{normalized name: id}` for `names`.
+
+		Names are normalized first (see recipes/normalize.py); with
+		`create=True` the unknown ones are inserted.
+		"""
+		wanted = {normalize_ingredient_name(name) for name in names} - {''}
+		found = dict(self.filter(name__in=wanted).values_list('name', 'id'))
+		missing = wanted - found.keys()
+		if create and missing:
+			self.bulk_create([self.model(name=name) for name in sorted(missing)], ignore_conflicts=True)
+			found.update(self.filter(name__in=missing).values_list('name', 'id'))
+		return found
+
+
+class Ingredient(models.Model):
+	"""An ingredient, stored once under its normalized name ("tomato" for
+	"Tomatoes", "  TOMATO ")."""
+
+	name = models.CharField(max_length=100, unique=True)
+
+	objects = IngredientManager()
+
+	def save(self, *args, **kwargs):
+		self.name = normalize_ingredient_name(self.name)
+		return super().save(*args, **kwargs)
+
+	def __str__(self) -> str:
+		return self.name
+
+
+class Recipe(models.Model):
+	"""A recipe of the catalog.
+
+	Its ingredients are the `RecipeIngredient` rows; the pantry search
+	(recipes/pantry.py) indexes them by ingredient, the full-text search
+	(recipes/search.py) indexes them with the text fields. Diet tags are
+	stored as bits of `diet_flags` (bit i is `DIET_TAGS[i]`), so a diet
+	filter or facet is an integer test.
+	"""
+
+	DIET_TAGS = (
+		'vegan', 'vegetarian', 'pescatarian', 'gluten_free', 'dairy_free',
+		'nut_free', 'egg_free', 'low_carb', 'keto', 'halal', 'kosher',
+	)
+
+	title = models.CharField(max_length=200)
+	description = models.TextField(blank=True)
+	steps = models.TextField(blank=True)
+	cuisine = models.CharField(max_length=50, blank=True)
+	prep_minutes = models.PositiveIntegerField(null=True, blank=True)
+	servings = models.PositiveSmallIntegerField(null=True, blank=True)
+	diet_flags = models.PositiveIntegerField(default=0)
+	author = models.ForeignKey(
+		settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='recipes',
+	)
+	# by digest, so serializers build its URLs without a join (see core/images.py)
+	photo = models.ForeignKey(
+		'core.StoredImage', to_field='digest', on_delete=models.SET_NULL, null=True, blank=True,
+		db_index=False, related_name='+',
+	)
+	ingredients = models.ManyToManyField(Ingredient, through='RecipeIngredient', related_name='recipes')
+	created_at = models.DateTimeField(auto_now_add=True)
+	updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['-created_at', '-id'], name='recipes_created_idx'),
+		]
+
+	def __str__(self) -> str:
+		return self.title
+
+	@classmethod
+	def diet_mask(cls, tags):
+		"""`diet_flags` bits of `tags` (names from `DIET_TAGS`)."""
+		return sum(1 << cls.DIET_TAGS.index(tag) for tag in set(tags))
+
+	@property
+	def diet_tags(self):
+		return [tag for bit, tag in enumerate(self.DIET_TAGS) if self.diet_flags & (1 << bit)]
+
+	@diet_tags.setter
+	def diet_tags(self, tags):
+		self.diet_flags = self.diet_mask(tags)
+
+	def set_ingredients(self, lines):
+		"""Replace the ingredient lines with `lines`: dicts with a `name` and
+		optional `quantity`, `unit` and `note`, in display order.
+
+		Writes with two statements and updates the indexes once.
+		"""
+		from .changes import batch, recipes_changed
+
+		ids = Ingredient.objects.resolve([line['name'] for line in lines], create=True)
+		rows = {}
+		for position, line in enumerate(lines):
+			ingredient_id = ids.get(normalize_ingredient_name(line['name']))
+			if ingredient_id is not None and ingredient_id not in rows:
+				rows[ingredient_id] = RecipeIngredient(
+					recipe=self, ingredient_id=ingredient_id, position=position,
+					quantity=line.get('quantity'), unit=line.get('unit') or '', note=line.get('note') or '',
+				)
+		with batch():
+			self.recipe_ingredients.all().delete()
+			RecipeIngredient.objects.bulk_create(rows.values())
+			recipes_changed([self.pk], ingredients=True)
+
+
+class RecipeIngredient(models.Model):
+	"""One ingredient line of a recipe ("2 cup flour, sifted")."""
+
+	recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='recipe_ingredients')
+	# covered by the (ingredient, recipe) index below
+	ingredient = models.ForeignKey(Ingredient, on_delete=models.PROTECT, db_index=False, related_name='+')
+	quantity = models.DecimalField(max_digits=10, decimal_places=3, null=True, blank=True)
+	unit = models.CharField(max_length=20, blank=True)
+	note = models.CharField(max_length=200, blank=True)
+	position = models.PositiveSmallIntegerField(default=0)
+
+	class Meta:
+		ordering = ('position', 'id')
+		constraints = [
+			models.UniqueConstraint(fields=['recipe', 'ingredient'], name='recipes_ingredient_once'),
+		]
+		indexes = [
+			# the pantry index is built by reading this index in order
+			models.Index(fields=['ingredient', 'recipe'], name='recipes_ingredient_recipe_idx'),
+		]
+
+	def __str__(self) -> str:
+		return f'{self.ingredient_id} in {self.recipe_id}'
+
+
+class PantryIndexChange(models.Model):
+	"""A recipe whose ingredients changed (or that was deleted).
+
+	Each process keeps its pantry index current by replaying the rows added
+	since it last looked (see recipes/pantry.py); `prune_pantry_changes`
+	deletes old rows. `recipe_id` is not a foreign key so the row outlives
+	the recipe.
+	"""
+
+	recipe_id = models.BigIntegerField()
+	changed_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+	def __str__(self) -> str:
+		return f'recipe {self.recipe_id} @ {self.changed_at:%Y-%m-%d %H:%M:%S}'
+
+
+class CatalogImport(models.Model):
+	"""Progress of an `import_catalog` run over one file.
+
+	`position` is the byte offset in the file after the last record of the
+	last committed chunk and is updated in the chunk's transaction, so an
+	interrupted import resumes exactly there (see recipes/bulk_import.py).
+	"""
+
+	source = models.CharField(max_length=500, unique=True)
+	position = models.BigIntegerField(default=0)
+	records = models.BigIntegerField(default=0)
+	# {model label: rows created}
+	created = models.JSONField(default=dict)
+	started_at = models.DateTimeField(auto_now_add=True)
+	updated_at = models.DateTimeField(auto_now=True)
+	finished_at = models.DateTimeField(null=True, blank=True)
+
+	def __str__(self) -> str:
+		return f'{self.source} @ {self.position}'
@@ -0,0 +1,35 @@
+"""Ingredient name normalization.
+
+Recipes and pantry queries spell the same ingredient in many ways
+("Tomatoes", "tomato", "  TOMATO "); both sides go through
+`normalize_ingredient_name` so they meet on one `Ingredient` row:
+
+- lower case, accents removed ("Jalapeño" -> "jalapeno");
+- punctuation replaced by spaces, runs of whitespace collapsed;
+- each word reduced to a singular form by plain suffix rules
+  ("tomatoes" -> "tomato", "berries" -> "berry", "leaves" stay "leaves").
+"""
+import re
+import unicodedata
+
+_NOT_WORD = re.compile(r'[^\w]+')
+# words the suffix rules would break
+_INVARIANT = frozenset(('asparagus', 'citrus', 'couscous', 'hummus', 'molasses', 'swiss', 'watercress', 'leaves'))
+
+
+def singular(word):
+    if len(word) <= 3 or word in _INVARIANT:
+        return word
+    if word.endswith('ies'):
+        return word[:-3] + 'y'
+    if word.endswith(('oes', 'ches', 'shes', 'sses', 'xes')):
+        return word[:-2]
+    if word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+        return word[:-1]
+    return word
+
+
+def normalize_ingredient_name(name):
+    text = unicodedata.normalize('NFKD', str(name)).encode('ascii', 'ignore').decode()
+    words = _NOT_WORD.sub(' ', text.lower().replace('_', ' ')).split()
+    return ' '.join(singular(word) for word in words)[:100]
@@ -0,0 +1,308 @@
+"""Pantry search: the recipes that can be cooked with the ingredients at hand.
+
+Every process holds an inverted index of the catalog in memory:
+
+    postings   {ingredient id: sorted recipe ids}    (numpy uint32 arrays,
+                                                      `array('I')` without numpy)
+    sizes      number of ingredients of each recipe, indexed by recipe id
+    overrides  {recipe id: ingredient ids} of the recipes changed since the
+               postings were built
+
+A query with pantry P adds one to `matched[r]` for every entry of the
+postings of P's ingredients, so its cost is the total length of those
+postings, not the size of the catalog. Recipes are ranked by coverage
+(`matched / size`, the share of the recipe the pantry covers), then by
+the number of missing ingredients, then by id; `max_missing` drops the
+recipes missing more than that.
+
+The index is built once per process, on the first search. After that it
+is kept current incrementally: saving or deleting a recipe's ingredients
+appends a `PantryIndexChange` row (through recipes/changes.py), and before
+a search the index replays the rows it has not seen, re-reading only those
+recipes into `overrides`. The replay runs when the shared cache announces a newer
+change (`CHANGE_KEY`), and at least every `PANTRY_INDEX_SYNC_INTERVAL`
+seconds without it. Once there are `COMPACT_AT` overrides they are merged
+into the postings in memory. An index that has not synced for
+`PANTRY_CHANGE_RETENTION` (the age at which `prune_pantry_changes` deletes
+change rows) is rebuilt instead.
+"""
+import heapq
+import threading
+import time
+from array import array
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from itertools import groupby
+from operator import itemgetter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from core.lazy import optional_module
+
+from .models import PantryIndexChange, RecipeIngredient
+
+np = optional_module('numpy')
+
+CHANGE_KEY = 'recipes:pantry:change'
+# overrides merged into the postings beyond this many
+COMPACT_AT = 10_000
+# a replay of more recipes than this rebuilds the index instead
+REBUILD_AT = 100_000
+# change ids may commit out of order (PostgreSQL sequences); this many ids
+# below the last one seen are read again, skipping those already applied
+CHANGE_OVERLAP = 1000
+READ_CHUNK = 10_000
+MAX_SIZE = 0xFFFF
+
+
+@dataclass(frozen=True)
+class PantryMatch:
+    recipe_id: int
+    matched: int
+    total: int
+
+    @property
+    def missing(self):
+        return self.total - self.matched
+
+    @property
+    def coverage(self):
+        return self.matched / self.total
+
+
+def _read_pairs():
+    """`(ingredient ids, recipe ids)` of every recipe line, ordered by ingredient then recipe."""
+    table = connection.ops.quote_name(RecipeIngredient._meta.db_table)
+    ingredients, recipes = array('q'), array('q')
+    with connection.cursor() as cursor:
+        # read in the order of the (ingredient, recipe) index
+        cursor.execute(f'SELECT ingredient_id, recipe_id FROM {table} ORDER BY ingredient_id, recipe_id')
+        while rows := cursor.fetchmany(READ_CHUNK):
+            ingredients.extend(map(itemgetter(0), rows))
+            recipes.extend(map(itemgetter(1), rows))
+    return ingredients, recipes
+
+
+def _recent_change_ids():
+    return list(PantryIndexChange.objects.order_by('-id').values_list('id', flat=True)[:CHANGE_OVERLAP])
+
+
+class PantryIndex:
+    def __init__(self, postings, sizes, last_change=0, seen=()):
+        self.postings = postings
+        self.sizes = sizes
+        self.overrides = {}
+        self.last_change = last_change
+        # change ids above `last_change - CHANGE_OVERLAP` already applied
+        self.seen = set(seen)
+        self.synced_at = time.monotonic()
+        self.synced_wall = time.time()
+
+    @classmethod
+    def from_pairs(cls, ingredient_ids, recipe_ids, last_change=0, seen=()):
+        """Index from parallel sequences of recipe lines sorted by (ingredient, recipe)."""
+        if np is not None:
+            ingredients = np.asarray(ingredient_ids, dtype=np.int64)
+            recipes = np.asarray(recipe_ids, dtype=np.uint32)
+            starts = np.flatnonzero(np.diff(ingredients)) + 1
+            keys = ingredients[np.concatenate(([0], starts))].tolist() if len(ingredients) else []
+            postings = dict(zip(keys, np.split(recipes, starts)))
+            sizes = np.minimum(np.bincount(recipes, minlength=1), MAX_SIZE).astype(np.uint16)
+        else:
+            postings = {
+                key: array('I', map(itemgetter(1), group))
+                for key, group in groupby(zip(ingredient_ids, recipe_ids), key=itemgetter(0))
+            }
+            counts = Counter(recipe_ids)
+            sizes = array('H', bytes(2 * (max(counts, default=0) + 1)))
+            for recipe_id, count in counts.items():
+                sizes[recipe_id] = min(count, MAX_SIZE)
+        return cls(postings, sizes, last_change, seen)
+
+    @classmethod
+    def build(cls):
+        # changes logged while the lines are read are replayed by the next sync
+        seen = _recent_change_ids()
+        return cls.from_pairs(*_read_pairs(), last_change=max(seen, default=0), seen=seen)
+
+    # -- incremental updates --------------------------------------------------
+
+    def _ensure_size(self, length):
+        current = len(self.sizes)
+        if length <= current:
+            return
+        length = max(length, current * 2)
+        if np is not None:
+            self.sizes = np.concatenate((self.sizes, np.zeros(length - current, dtype=np.uint16)))
+        else:
+            self.sizes.extend(array('H', bytes(2 * (length - current))))
+
+    def apply(self, changes):
+        """Set the ingredients of recipes (`{recipe id: ingredient ids}`; empty when deleted)."""
+        for recipe_id, ingredient_ids in changes.items():
+            self._ensure_size(recipe_id + 1)
+            self.sizes[recipe_id] = min(len(ingredient_ids), MAX_SIZE)
+            self.overrides[recipe_id] = frozenset(ingredient_ids)
+        if len(self.overrides) >= COMPACT_AT:
+            self.compact()
+
+    def compact(self):
+        """Merge the overrides into the postings."""
+        added = defaultdict(list)
+        for recipe_id, ingredient_ids in self.overrides.items():
+            for ingredient_id in ingredient_ids:
+                added[ingredient_id].append(recipe_id)
+        postings = {}
+        if np is not None:
+            stale = np.zeros(len(self.sizes), dtype=bool)
+            stale[np.fromiter(self.overrides, dtype=np.int64, count=len(self.overrides))] = True
+            for ingredient_id in self.postings.keys() | added.keys():
+                posting = self.postings.get(ingredient_id)
+                posting = posting[~stale[posting]] if posting is not None else np.zeros(0, dtype=np.uint32)
+                if ingredient_id in added:
+                    posting = np.sort(np.concatenate((posting, np.array(added[ingredient_id], dtype=np.uint32))))
+                if len(posting):
+                    postings[ingredient_id] = posting
+        else:
+            stale = self.overrides.keys()
+            for ingredient_id in self.postings.keys() | added.keys():
+                kept = [r for r in self.postings.get(ingredient_id, ()) if r not in stale]
+                posting = array('I', sorted(kept + added.get(ingredient_id, [])))
+                if posting:
+                    postings[ingredient_id] = posting
+        self.postings = postings
+        self.overrides = {}
+
+    def expired(self):
+        retention = getattr(settings, 'PANTRY_CHANGE_RETENTION', None)
+        return retention is not None and time.time() - self.synced_wall > retention.total_seconds()
+
+    def sync(self):
+        """Replay the change rows not applied yet; False if a rebuild is cheaper."""
+        announced = cache.get(CHANGE_KEY)
+        due = time.monotonic() - self.synced_at >= getattr(settings, 'PANTRY_INDEX_SYNC_INTERVAL', 5)
+        if not due and (announced is None or announced <= self.last_change):
+            return True
+        self.synced_at, self.synced_wall = time.monotonic(), time.time()
+        rows = list(
+            PantryIndexChange.objects.filter(id__gt=max(0, self.last_change - CHANGE_OVERLAP))
+            .order_by('id').values_list('id', 'recipe_id')
+        )
+        recipe_ids = {recipe_id for change_id, recipe_id in rows if change_id not in self.seen}
+        if len(recipe_ids) > REBUILD_AT:
+            return False
+        if rows:
+            self.last_change = max(self.last_change, rows[-1][0])
+            self.seen = {change_id for change_id, _ in rows if change_id > self.last_change - CHANGE_OVERLAP}
+        if recipe_ids:
+            self.apply(_recipe_ingredients(recipe_ids))
+        return True
+
+    # -- queries --------------------------------------------------------------
+
+    def search(self, ingredient_ids, limit=20, max_missing=None):
+        """Best `limit` recipes for a pantry of `ingredient_ids`, as `PantryMatch`es."""
+        pantry = frozenset(ingredient_ids)
+        if not pantry or limit <= 0:
+            return []
+        if np is None:
+            return self._search_python(pantry, limit, max_missing)
+        matched = np.zeros(len(self.sizes), dtype=np.uint16)
+        for ingredient_id in pantry:
+            posting = self.postings.get(ingredient_id)
+            if posting is not None:
+                # a recipe appears once per posting, so plain fancy-index
+                # addition counts correctly
+                matched[posting] += 1
+        for recipe_id, recipe_ingredients in self.overrides.items():
+            matched[recipe_id] = len(recipe_ingredients & pantry)
+        ids = np.flatnonzero(matched)
+        hits = matched[ids].astype(np.int64)
+        totals = self.sizes[ids].astype(np.int64)
+        missing = totals - hits
+        if max_missing is not None:
+            keep = missing <= max_missing
+            ids, hits, totals, missing = ids[keep], hits[keep], totals[keep], missing[keep]
+        rows = _top_rows(hits / totals, missing, limit)
+        return [PantryMatch(int(ids[row]), int(hits[row]), int(totals[row])) for row in rows]
+
+    def _search_python(self, pantry, limit, max_missing):
+        matched = Counter()
+        for ingredient_id in pantry:
+            matched.update(self.postings.get(ingredient_id, ()))
+        for recipe_id, recipe_ingredients in self.overrides.items():
+            count = len(recipe_ingredients & pantry)
+            if count:
+                matched[recipe_id] = count
+            else:
+                matched.pop(recipe_id, None)
+        rows = (
+            (recipe_id, count, self.sizes[recipe_id]) for recipe_id, count in matched.items()
+            if max_missing is None or self.sizes[recipe_id] - count <= max_missing
+        )
+        best = heapq.nsmallest(limit, rows, key=lambda row: (-row[1] / row[2], row[2] - row[1], row[0]))
+        return [PantryMatch(*row) for row in best]
+
+
+def _top_rows(coverage, missing, limit):
+    """Positions of the best `limit` rows: coverage descending, then missing
+    ascending, then position; without sorting all of them."""
+    count = len(coverage)
+    if count > limit:
+        threshold = np.partition(coverage, count - limit)[count - limit]
+        better = np.flatnonzero(coverage > threshold)
+        ties = np.flatnonzero(coverage == threshold)
+        needed = limit - len(better)
+        if len(ties) > needed:
+            tie_missing = missing[ties]
+            cut = np.partition(tie_missing, needed - 1)[needed - 1]
+            # positions are ascending within each part
+            ties = np.concatenate((ties[tie_missing < cut], ties[tie_missing == cut]))[:needed]
+        rows = np.concatenate((better, ties))
+    else:
+        rows = np.arange(count)
+    return rows[np.lexsort((rows, missing[rows], -coverage[rows]))]
+
+
+def _recipe_ingredients(recipe_ids):
+    current = {recipe_id: set() for recipe_id in recipe_ids}
+    ordered = sorted(current)
+    for start in range(0, len(ordered), 500):
+        lines = RecipeIngredient.objects.filter(recipe_id__in=ordered[start:start + 500])
+        for recipe_id, ingredient_id in lines.values_list('recipe_id', 'ingredient_id'):
+            current[recipe_id].add(ingredient_id)
+    return current
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def find_recipes(ingredient_ids, limit=20, max_missing=None):
+    """Search the process's pantry index, building or syncing it first."""
+    global _index
+    with _index_lock:
+        if _index is None or _index.expired() or not _index.sync():
+            _index = PantryIndex.build()
+        return _index.search(ingredient_ids, limit=limit, max_missing=max_missing)
+
+
+def reset_index():
+    """Drop the process's index (the next search rebuilds it)."""
+    global _index
+    with _index_lock:
+        _index = None
+
+
+def record_changes(recipe_ids):
+    """Log that the ingredients of `recipe_ids` changed (see recipes/changes.py)."""
+    recipe_ids = sorted(set(recipe_ids))
+    if not recipe_ids:
+        return
+    rows = PantryIndexChange.objects.bulk_create([PantryIndexChange(recipe_id=pk) for pk in recipe_ids])
+    latest = max((row.id for row in rows if row.id is not None), default=None)
+    if latest is not None:
+        # other processes replay the rows once they are committed
+        transaction.on_commit(lambda: cache.set(CHANGE_KEY, latest, None))
@@ -0,0 +1,13 @@
+from rest_framework.permissions import SAFE_METHODS, BasePermission
+
+
+class IsAuthorOrReadOnly(BasePermission):
+    """Anyone may read; the author of a recipe and admins may change it."""
+
+    def has_object_permission(self, request, view, obj):
+        if request.method in SAFE_METHODS:
+            return True
+        user = request.user
+        if not (user and user.is_authenticated):
+            return False
+        return obj.author_id == user.pk or getattr(user, 'role', '') == 'admin'
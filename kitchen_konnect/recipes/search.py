@@ -0,0 +1,268 @@
+"""Ranked full-text recipe search with facet counts.
+
+Every recipe has one search document with five columns: title,
+description, ingredient names, steps and tags (cuisine and diet tags, so
+"vegan" finds recipes tagged vegan that never say it):
+
+- SQLite: FTS5 table `recipes_recipe_fts` (rowid = recipe id, porter
+  stemming), ranked by `bm25()` with per-column weights;
+- PostgreSQL: table `recipes_recipe_search` of weighted `tsvector`s
+  (title A, ingredients and tags B, description C, steps D) with a GIN
+  index, ranked by `ts_rank_cd()`.
+
+Both are created by migration 0002. Documents are rewritten from Python
+whenever a recipe, its ingredient lines or an ingredient name change
+(`index_recipes`, called through recipes/changes.py), and
+`manage.py rebuild_recipe_search` rewrites all of them.
+
+`search_recipes` runs one statement: the matching recipes, with the
+filters applied, are materialized once and read twice, for the ranked
+page and for counts grouped by (cuisine, diet flags, prep time bucket)::
+
+    WITH matched AS MATERIALIZED (SELECT id, score, cuisine, diet_flags, bucket ...)
+    SELECT ... FROM (SELECT ... FROM matched ORDER BY score DESC, id LIMIT n OFFSET m)
+    UNION ALL
+    SELECT ... COUNT(*) ... FROM matched GROUP BY cuisine, diet_flags, bucket
+
+The groups are few (cuisines x diet combinations x buckets), and the
+facets and the total are summed from them in Python. Other database
+backends fall back to `icontains` filters without ranking.
+"""
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+
+from django.db import connections
+from django.db.models import Case, CharField, Count, F, Q, Value, When
+
+from .models import Recipe, RecipeIngredient
+
+SQLITE_TABLE = 'recipes_recipe_fts'
+PG_TABLE = 'recipes_recipe_search'
+PG_CONFIG = 'english'
+# bm25 weights of title, description, ingredients, steps, tags
+SQLITE_WEIGHTS = (10.0, 2.0, 5.0, 1.0, 5.0)
+MAX_TERMS = 8
+INDEX_BATCH = 500
+# (facet value, upper bound in minutes); longer and unknown times follow
+PREP_BUCKETS = (('0-15', 15), ('16-30', 30), ('31-60', 60))
+PREP_OVER = '60+'
+PREP_UNKNOWN = 'unknown'
+PREP_BUCKET_NAMES = tuple(name for name, _ in PREP_BUCKETS) + (PREP_OVER, PREP_UNKNOWN)
+
+_WORD = re.compile(r'\w+')
+
+
+def _vendor(using):
+    return connections[using].vendor
+
+
+def search_terms(text):
+    return _WORD.findall((text or '').lower())[:MAX_TERMS]
+
+
+def recipe_documents(recipe_ids, using='default'):
+    """`(id, title, description, ingredients, steps, tags)` of the recipes that exist."""
+    recipes = (
+        Recipe.objects.using(using).filter(pk__in=recipe_ids)
+        .values_list('id', 'title', 'description', 'steps', 'cuisine', 'diet_flags')
+    )
+    names = {}
+    lines = (
+        RecipeIngredient.objects.using(using).filter(recipe_id__in=recipe_ids)
+        .order_by('recipe_id', 'position', 'id').values_list('recipe_id', 'ingredient__name')
+    )
+    for recipe_id, name in lines:
+        names.setdefault(recipe_id, []).append(name)
+    documents = []
+    for pk, title, description, steps, cuisine, flags in recipes:
+        tags = [cuisine] + [tag.replace('_', ' ') for bit, tag in enumerate(Recipe.DIET_TAGS) if flags & (1 << bit)]
+        documents.append((pk, title, description, ' '.join(names.get(pk, ())), steps, ' '.join(filter(None, tags))))
+    return documents
+
+
+def index_recipes(recipe_ids, using='default'):
+    """Rewrite the search documents of `recipe_ids` (deleted recipes lose theirs)."""
+    vendor = _vendor(using)
+    if vendor not in ('sqlite', 'postgresql'):
+        return
+    ordered = sorted(set(recipe_ids))
+    for start in range(0, len(ordered), INDEX_BATCH):
+        chunk = ordered[start:start + INDEX_BATCH]
+        _write_documents(chunk, recipe_documents(chunk, using=using), using)
+
+
+def _write_documents(recipe_ids, documents, using):
+    connection = connections[using]
+    placeholders = ', '.join(['%s'] * len(recipe_ids))
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'DELETE FROM {SQLITE_TABLE} WHERE rowid IN ({placeholders})', recipe_ids)
+            cursor.executemany(
+                f'INSERT INTO {SQLITE_TABLE}(rowid, title, description, ingredients, steps, tags) '
+                'VALUES (%s, %s, %s, %s, %s, %s)',
+                documents,
+            )
+        else:
+            cursor.execute(f'DELETE FROM {PG_TABLE} WHERE recipe_id IN ({placeholders})', recipe_ids)
+            cursor.executemany(
+                f"INSERT INTO {PG_TABLE}(recipe_id, document) VALUES (%s, "
+                f"setweight(to_tsvector('{PG_CONFIG}', %s), 'A') || setweight(to_tsvector('{PG_CONFIG}', %s), 'C') || "
+                f"setweight(to_tsvector('{PG_CONFIG}', %s), 'B') || setweight(to_tsvector('{PG_CONFIG}', %s), 'D') || "
+                f"setweight(to_tsvector('{PG_CONFIG}', %s), 'B'))",
+                documents,
+            )
+
+
+def rebuild_index(batch_size=INDEX_BATCH, using='default', progress=None):
+    """Rewrite every search document; return the number of recipes indexed."""
+    vendor = _vendor(using)
+    if vendor not in ('sqlite', 'postgresql'):
+        return 0
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SQLITE_TABLE}' if vendor == 'sqlite' else f'TRUNCATE {PG_TABLE}')
+    ids = Recipe.objects.using(using).order_by('pk').values_list('pk', flat=True)
+    last, total = 0, 0
+    while True:
+        chunk = list(ids.filter(pk__gt=last)[:batch_size])
+        if not chunk:
+            break
+        _write_documents(chunk, recipe_documents(chunk, using=using), using)
+        last, total = chunk[-1], total + len(chunk)
+        if progress:
+            progress(total)
+    if vendor == 'sqlite':
+        with connections[using].cursor() as cursor:
+            # merge the b-tree segments written batch by batch
+            cursor.execute(f"INSERT INTO {SQLITE_TABLE}({SQLITE_TABLE}) VALUES ('optimize')")
+    return total
+
+
+@dataclass
+class RecipeSearch:
+    # (recipe id, score), best first
+    hits: list = field(default_factory=list)
+    count: int = 0
+    facets: dict = field(default_factory=dict)
+
+
+def _bucket_sql(column):
+    whens = ' '.join(f"WHEN {column} <= {bound} THEN '{name}'" for name, bound in PREP_BUCKETS)
+    return f"CASE WHEN {column} IS NULL THEN '{PREP_UNKNOWN}' {whens} ELSE '{PREP_OVER}' END"
+
+
+def _filter_sql(diet_mask, cuisine, max_prep):
+    clauses, params = [], []
+    if diet_mask:
+        clauses.append('(r.diet_flags & %s) = %s')
+        params += [diet_mask, diet_mask]
+    if cuisine:
+        clauses.append('r.cuisine = %s')
+        params.append(cuisine)
+    if max_prep is not None:
+        clauses.append('r.prep_minutes <= %s')
+        params.append(max_prep)
+    return clauses, params
+
+
+def search_recipes(text='', diet=(), cuisine=None, max_prep=None, limit=20, offset=0, using='default'):
+    """Rank the recipes matching every term of `text` (all recipes, newest
+    first, without terms) and the filters; return a `RecipeSearch`.
+
+    `diet` requires all of the given tags; `max_prep` is in minutes.
+    """
+    terms = search_terms(text)
+    vendor = _vendor(using)
+    diet_mask = Recipe.diet_mask(diet)
+    if vendor not in ('sqlite', 'postgresql'):
+        return _search_orm(terms, diet_mask, cuisine, max_prep, limit, offset, using)
+
+    clauses, params = _filter_sql(diet_mask, cuisine, max_prep)
+    table = connections[using].ops.quote_name(Recipe._meta.db_table)
+    if not terms:
+        source, score, order = f'{table} r', '0.0', 'id DESC'
+    elif vendor == 'sqlite':
+        weights = ', '.join(str(weight) for weight in SQLITE_WEIGHTS)
+        source = f'{SQLITE_TABLE} JOIN {table} r ON r.id = {SQLITE_TABLE}.rowid'
+        # bm25() is lower for better matches
+        score, order = f'-bm25({SQLITE_TABLE}, {weights})', 'score DESC, id'
+        clauses.insert(0, f'{SQLITE_TABLE} MATCH %s')
+        params.insert(0, ' '.join('"%s"' % term.replace('"', '""') for term in terms))
+    else:
+        source = (
+            f"{PG_TABLE} s JOIN {table} r ON r.id = s.recipe_id "
+            f"CROSS JOIN plainto_tsquery('{PG_CONFIG}', %s) AS q(query)"
+        )
+        score, order = 'ts_rank_cd(s.document, q.query)', 'score DESC, id'
+        clauses.insert(0, 's.document @@ q.query')
+        params.insert(0, ' '.join(terms))
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    sql = (
+        f'WITH matched AS MATERIALIZED ('
+        f'SELECT r.id AS id, {score} AS score, r.cuisine AS cuisine, r.diet_flags AS diet_flags, '
+        f'{_bucket_sql("r.prep_minutes")} AS bucket FROM {source} {where}) '
+        f'SELECT 0, id, score, NULL, NULL, NULL FROM ('
+        f'SELECT id, score FROM matched ORDER BY {order} LIMIT %s OFFSET %s) page '
+        f'UNION ALL '
+        f'SELECT 1, COUNT(*), NULL, cuisine, diet_flags, bucket FROM matched GROUP BY cuisine, diet_flags, bucket'
+    )
+    with connections[using].cursor() as cursor:
+        cursor.execute(sql, params + [limit, offset])
+        rows = cursor.fetchall()
+
+    hits = [(row[1], float(row[2])) for row in rows if row[0] == 0]
+    # UNION ALL does not promise to keep the page order
+    hits.sort(key=(lambda hit: (-hit[1], hit[0])) if terms else (lambda hit: -hit[0]))
+    return _with_facets(hits, [row[1:] for row in rows if row[0] == 1])
+
+
+def _with_facets(hits, groups):
+    """`groups`: (count, -, cuisine, diet flags, prep bucket) rows."""
+    diet = dict.fromkeys(Recipe.DIET_TAGS, 0)
+    cuisines = Counter()
+    prep = dict.fromkeys(PREP_BUCKET_NAMES, 0)
+    total = 0
+    for count, _, cuisine, flags, bucket in groups:
+        total += count
+        for bit, tag in enumerate(Recipe.DIET_TAGS):
+            if flags & (1 << bit):
+                diet[tag] += count
+        if cuisine:
+            cuisines[cuisine] += count
+        prep[bucket] += count
+    facets = {
+        'diet_tags': diet,
+        'cuisine': dict(sorted(cuisines.items(), key=lambda item: (-item[1], item[0]))),
+        'prep_time': prep,
+    }
+    return RecipeSearch(hits=hits, count=total, facets=facets)
+
+
+def _search_orm(terms, diet_mask, cuisine, max_prep, limit, offset, using):
+    queryset = Recipe.objects.using(using).all()
+    for term in terms:
+        queryset = queryset.filter(
+            Q(title__icontains=term) | Q(description__icontains=term) | Q(steps__icontains=term)
+            | Q(cuisine__icontains=term) | Q(recipe_ingredients__ingredient__name__icontains=term)
+        )
+    if terms:
+        queryset = Recipe.objects.using(using).filter(pk__in=queryset.values('pk'))
+    if diet_mask:
+        queryset = queryset.alias(_diet=F('diet_flags').bitand(diet_mask)).filter(_diet=diet_mask)
+    if cuisine:
+        queryset = queryset.filter(cuisine=cuisine)
+    if max_prep is not None:
+        queryset = queryset.filter(prep_minutes__lte=max_prep)
+    bucket = Case(
+        When(prep_minutes__isnull=True, then=Value(PREP_UNKNOWN)),
+        *(When(prep_minutes__lte=bound, then=Value(name)) for name, bound in PREP_BUCKETS),
+        default=Value(PREP_OVER), output_field=CharField(),
+    )
+    groups = (
+        queryset.annotate(bucket=bucket).values('cuisine', 'diet_flags', 'bucket')
+        .annotate(count=Count('pk')).order_by()
+    )
+    hits = [(pk, 0.0) for pk in queryset.order_by('-pk').values_list('pk', flat=True)[offset:offset + limit]]
+    return _with_facets(hits, [
+        (group['count'], None, group['cuisine'], group['diet_flags'], group['bucket']) for group in groups
+    ])
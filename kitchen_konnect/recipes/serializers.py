@@ -0,0 +1,70 @@
+from django.db import transaction
+from rest_framework import serializers
+
+from core.images import variant_urls
+from core.instrumentation import InstrumentedSerializerMixin
+
+from .changes import batch
+from .models import Recipe, RecipeIngredient
+from .normalize import normalize_ingredient_name
+
+
+class RecipeIngredientSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
+    name = serializers.CharField(source='ingredient.name', max_length=100)
+
+    class Meta:
+        model = RecipeIngredient
+        fields = ('name', 'quantity', 'unit', 'note')
+
+
+class RecipeSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
+    ingredients = RecipeIngredientSerializer(source='recipe_ingredients', many=True, required=False)
+    author = serializers.PrimaryKeyRelatedField(read_only=True)
+    diet_tags = serializers.MultipleChoiceField(choices=Recipe.DIET_TAGS, required=False)
+    # set through /api/recipes/<id>/photo/
+    photo = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Recipe
+        fields = (
+            'id', 'title', 'description', 'steps', 'cuisine', 'prep_minutes', 'servings', 'diet_tags',
+            'author', 'ingredients', 'photo', 'created_at', 'updated_at',
+        )
+        read_only_fields = ('id', 'created_at', 'updated_at')
+
+    def validate_ingredients(self, value):
+        lines, names = [], set()
+        for line in value:
+            name = normalize_ingredient_name(line['ingredient']['name'])
+            if not name:
+                raise serializers.ValidationError('Ingredient names must contain letters or digits.')
+            if name in names:
+                raise serializers.ValidationError(f'Duplicate ingredient: {name}.')
+            names.add(name)
+            lines.append({**{key: line.get(key) for key in ('quantity', 'unit', 'note')}, 'name': name})
+        return lines
+
+    def get_photo(self, instance):
+        return variant_urls(instance.photo_id)
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # in declaration order rather than as a set
+        data['diet_tags'] = instance.diet_tags
+        return data
+
+    def create(self, validated_data):
+        lines = validated_data.pop('recipe_ingredients', [])
+        # one search index write for the row and its lines
+        with transaction.atomic(), batch():
+            recipe = super().create(validated_data)
+            recipe.set_ingredients(lines)
+        return recipe
+
+    def update(self, instance, validated_data):
+        lines = validated_data.pop('recipe_ingredients', None)
+        with transaction.atomic(), batch():
+            recipe = super().update(instance, validated_data)
+            if lines is not None:
+                recipe.set_ingredients(lines)
+        return recipe
@@ -0,0 +1,43 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .changes import recipes_changed
+from .models import Ingredient, Recipe, RecipeIngredient
+
+
+@receiver(post_save, sender=Recipe)
+def index_saved_recipe(sender, instance, **kwargs):
+    recipes_changed([instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+def unindex_deleted_recipe(sender, instance, **kwargs):
+    recipes_changed([instance.pk], ingredients=True)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def index_recipe_line_change(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Recipe):
+        # cascade of a recipe deletion, reported once above
+        return
+    recipes_changed([instance.recipe_id], ingredients=True)
+
+
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def index_recipe_ingredients_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        recipes_changed([instance.pk], ingredients=True)
+    elif pk_set:
+        recipes_changed(pk_set, ingredients=True)
+
+
+@receiver(post_save, sender=Ingredient)
+def reindex_renamed_ingredient(sender, instance, created, **kwargs):
+    if created:
+        return
+    # the search documents of its recipes hold the name
+    recipe_ids = RecipeIngredient.objects.filter(ingredient=instance).values_list('recipe_id', flat=True)
+    recipes_changed(list(recipe_ids))
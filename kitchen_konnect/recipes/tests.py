@@ -1,4 +1,23 @@
-from rest_framework.test import APITestCase
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient, APITestCase
+
+from . import bulk_import, pantry, search
+from .models import CatalogImport, Ingredient, PantryIndexChange, Recipe, RecipeIngredient
+from .normalize import normalize_ingredient_name
+
+User = get_user_model()
 
 
 class RecipesProtectedTest(APITestCase):
@@ -6,6 +25,296 @@ class RecipesProtectedTest(APITestCase):
         resp = self.client.get('/api/recipes/protected/')
         # should be unauthorized (401) if not logged in
         self.assertIn(resp.status_code, (401, 403))
-from django.test import TestCase
 
-# Create your tests here.
+
+class IngredientNormalizationTest(TestCase):
+    def test_spellings_meet_on_one_name(self):
+        for raw in ('Tomatoes', ' tomato ', 'TOMATO!'):
+            self.assertEqual(normalize_ingredient_name(raw), 'tomato')
+        self.assertEqual(normalize_ingredient_name('Jalapeño  Peppers'), 'jalapeno pepper')
+        self.assertEqual(normalize_ingredient_name('blueberries'), 'blueberry')
+        self.assertEqual(normalize_ingredient_name('asparagus'), 'asparagus')
+
+    def test_resolve_creates_normalized_rows(self):
+        ids = Ingredient.objects.resolve(['Onions', 'onion', 'Garlic'], create=True)
+        self.assertEqual(sorted(ids), ['garlic', 'onion'])
+        self.assertEqual(Ingredient.objects.count(), 2)
+
+
+class PantrySearchTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='cook', email='cook@example.com', password='pw-123456')
+        cls.salad = cls.recipe('Salad', ['tomato', 'cucumber', 'onion'])
+        cls.salsa = cls.recipe('Salsa', ['tomato', 'onion', 'chili', 'lime'])
+        cls.soup = cls.recipe('Soup', ['potato', 'leek'])
+
+    @classmethod
+    def recipe(cls, title, names):
+        recipe = Recipe.objects.create(title=title, author=cls.user)
+        recipe.set_ingredients([{'name': name} for name in names])
+        return recipe
+
+    def setUp(self):
+        cache.clear()
+        pantry.reset_index()
+        self.addCleanup(pantry.reset_index)
+
+    def search(self, ingredients, **params):
+        resp = self.client.get('/api/recipes/pantry/', {'ingredients': ingredients, **params})
+        self.assertEqual(resp.status_code, 200, resp.content)
+        return resp.data
+
+    def test_ranked_by_coverage_then_missing(self):
+        data = self.search('Tomatoes,onion,cucumber,chili,saffron')
+        self.assertEqual(data['unknown'], ['saffron'])
+        ranked = [(r['title'], r['matched'], r['missing_count']) for r in data['results']]
+        self.assertEqual(ranked, [('Salad', 3, 0), ('Salsa', 3, 1)])
+        self.assertEqual(data['results'][1]['missing'], ['lime'])
+
+        only_complete = self.search('tomato,onion,cucumber,chili', max_missing=0)
+        self.assertEqual([r['title'] for r in only_complete['results']], ['Salad'])
+
+    def test_python_fallback_ranks_the_same(self):
+        with_numpy = self.search('tomato,onion,lime,leek')['results']
+        pantry.reset_index()
+        with mock.patch.object(pantry, 'np', None):
+            without = self.search('tomato,onion,lime,leek')['results']
+        self.assertEqual(without, with_numpy)
+        self.assertEqual([r['title'] for r in without], ['Salsa', 'Salad', 'Soup'])
+
+    def test_saves_update_the_index_incrementally(self):
+        self.search('tomato')
+        index = pantry._index
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            resp = self.client.post('/api/recipes/', {
+                'title': 'Bruschetta',
+                'ingredients': [{'name': 'Tomatoes', 'quantity': '2'}, {'name': 'bread'}],
+            }, format='json')
+            self.assertEqual(resp.status_code, 201, resp.content)
+        self.assertEqual(PantryIndexChange.objects.filter(recipe_id=resp.data['id']).count(), 1)
+
+        data = self.search('tomato,bread')
+        self.assertIs(pantry._index, index)  # replayed, not rebuilt
+        self.assertEqual(data['results'][0]['title'], 'Bruschetta')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/recipes/{self.salad.pk}/', {'ingredients': [{'name': 'bread'}]}, format='json')
+            self.client.delete(f'/api/recipes/{resp.data["id"]}/')
+        titles = [r['title'] for r in self.search('tomato,bread')['results']]
+        self.assertEqual(titles, ['Salad', 'Salsa'])
+        self.assertIs(pantry._index, index)
+
+    def test_compaction_keeps_results(self):
+        self.search('tomato')
+        index = pantry._index
+        index.apply({self.soup.pk: {Ingredient.objects.get(name='tomato').pk}})
+        before = index.search({Ingredient.objects.get(name='tomato').pk}, limit=10)
+        index.compact()
+        self.assertEqual(index.overrides, {})
+        self.assertEqual(index.search({Ingredient.objects.get(name='tomato').pk}, limit=10), before)
+        self.assertEqual([m.recipe_id for m in before], [self.soup.pk, self.salad.pk, self.salsa.pk])
+
+    def test_only_authors_edit(self):
+        other = User.objects.create_user(username='other', email='other@example.com', password='pw-123456')
+        self.client.force_authenticate(other)
+        resp = self.client.patch(f'/api/recipes/{self.salad.pk}/', {'title': 'Mine'}, format='json')
+        self.assertEqual(resp.status_code, 403)
+
+
+class RecipeSearchTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='chef', email='chef@example.com', password='pw-123456')
+        client = APIClient()
+        client.force_authenticate(cls.user)
+        cls.dal = cls.create(
+            client, title='Spicy red lentil dal', cuisine='indian', prep_minutes=40,
+            diet_tags=['vegan', 'gluten_free'], description='A weeknight staple.',
+            ingredients=['red lentils', 'chili', 'onion'],
+        )
+        cls.curry = cls.create(
+            client, title='Chickpea curry', cuisine='indian', prep_minutes=25, diet_tags=['vegan'],
+            description='Mild and creamy; add lentils for body.', ingredients=['chickpeas', 'coconut milk'],
+        )
+        cls.soup = cls.create(
+            client, title='Lentil soup', cuisine='greek', prep_minutes=None, diet_tags=['vegetarian'],
+            steps='Simmer until spicy and thick.', ingredients=['lentils', 'carrot'],
+        )
+
+    @staticmethod
+    def create(client, ingredients, **fields):
+        # through the API, so the search index is written as in production
+        body = {**fields, 'ingredients': [{'name': name} for name in ingredients]}
+        resp = client.post('/api/recipes/', body, format='json')
+        assert resp.status_code == 201, resp.content
+        return resp.data['id']
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.user)
+
+    def search(self, **params):
+        resp = self.client.get('/api/recipes/search/', params)
+        self.assertEqual(resp.status_code, 200, resp.content)
+        return resp.data
+
+    def test_ranked_matches_with_facets_in_one_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            data = self.search(q='spicy vegan lentil')
+        # the search statement and the hydration of the page
+        self.assertEqual(len(queries), 2)
+        # "vegan" matches the tags, "lentils" the stemmed ingredient
+        self.assertEqual([r['id'] for r in data['results']], [self.dal])
+        self.assertEqual(data['results'][0]['diet_tags'], ['vegan', 'gluten_free'])
+
+        data = self.search(q='lentils')
+        self.assertEqual(data['count'], 3)
+        # title and ingredient matches rank above a description match
+        self.assertEqual(data['results'][-1]['id'], self.curry)
+        self.assertEqual(data['facets']['cuisine'], {'indian': 2, 'greek': 1})
+        self.assertEqual(data['facets']['diet_tags']['vegan'], 2)
+        self.assertEqual(data['facets']['prep_time'], {'0-15': 0, '16-30': 1, '31-60': 1, '60+': 0, 'unknown': 1})
+
+    def test_filters_narrow_results_and_facets(self):
+        data = self.search(q='lentil', diet='vegan', max_prep=30)
+        self.assertEqual([r['id'] for r in data['results']], [self.curry])
+        self.assertEqual(data['count'], 1)
+        self.assertEqual(data['facets']['prep_time']['16-30'], 1)
+        self.assertEqual(self.search(cuisine='greek')['count'], 1)
+        self.assertEqual(self.client.get('/api/recipes/search/', {'diet': 'carnivore'}).status_code, 400)
+
+    def test_index_follows_saves_and_deletes(self):
+        self.client.patch(f'/api/recipes/{self.soup}/', {'title': 'Barley broth'}, format='json')
+        self.assertNotIn(self.soup, [r['id'] for r in self.search(q='lentil soup')['results']])
+        self.assertIn(self.soup, [r['id'] for r in self.search(q='barley')['results']])
+        self.client.patch(f'/api/recipes/{self.curry}/', {'ingredients': [{'name': 'barley'}]}, format='json')
+        self.assertEqual(self.search(q='barley')['count'], 2)
+
+        Ingredient.objects.filter(name='barley').update(name='pearl barley')
+        Ingredient.objects.get(name='pearl barley').save()
+        self.assertEqual(self.search(q='pearl')['count'], 1)
+
+        self.client.delete(f'/api/recipes/{self.curry}/')
+        self.assertEqual(self.search(q='barley')['count'], 1)
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.SQLITE_TABLE}')
+        self.assertEqual(self.search(q='lentil')['count'], 0)
+        call_command('rebuild_recipe_search', batch_size=2, stdout=mock.MagicMock())
+        self.assertEqual(self.search(q='lentil')['count'], 3)
+
+
+class CatalogImportTest(TestCase):
+    FIXTURE = [
+        {'model': 'recipes.ingredient', 'pk': 10, 'fields': {'name': 'Lentils'}},
+        {'model': 'recipes.ingredient', 'pk': 11, 'fields': {'name': 'Onions'}},
+        {'model': 'health.nutrient', 'pk': 90, 'fields': {'code': 'energy', 'name': 'Energy', 'unit': 'kcal'}},
+        {'model': 'health.ingredientnutrient', 'pk': 1, 'fields': {'ingredient': 10, 'nutrient': 90, 'per_100g': 116}},
+        {'model': 'health.ingredientmeasure', 'pk': 10, 'fields': {'ingredient': 10, 'grams_per_piece': None}},
+        {'model': 'recipes.recipe', 'pk': 5, 'fields': {
+            'title': 'Dal', 'author': 999, 'prep_minutes': '40', 'diet_flags': 3, 'created_at': '2020-01-01T00:00:00Z',
+        }},
+        {'model': 'recipes.recipeingredient', 'pk': 1, 'fields': {
+            'recipe': 5, 'ingredient': 10, 'quantity': '200.000', 'unit': 'g', 'position': 0,
+        }},
+        {'model': 'recipes.recipeingredient', 'pk': 2, 'fields': {
+            'recipe': 5, 'ingredient': 'red onion', 'position': 1,
+        }},
+        {'model': 'recipes.recipe', 'pk': 6, 'fields': {'title': '', 'prep_minutes': 'soon'}},
+        {'model': 'recipes.recipeingredient', 'pk': 3, 'fields': {'recipe': 6, 'ingredient': 11}},
+    ]
+
+    def setUp(self):
+        cache.clear()
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.dir.name, name)
+        with open(path, 'w', encoding='utf-8') as fh:
+            fh.write(content)
+        return path
+
+    def run_import(self, path, *args):
+        out, err = StringIO(), StringIO()
+        call_command('import_catalog', path, *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_fixture_maps_keys_and_reports_bad_records(self):
+        content = json.dumps(self.FIXTURE, indent=2)
+        path = self.write('catalog.json', content)
+        out, err = self.run_import(path, '--chunk-size', '3')
+
+        dal = Recipe.objects.get()
+        self.assertEqual((dal.title, dal.author, dal.prep_minutes, dal.diet_flags), ('Dal', None, 40, 3))
+        lines = RecipeIngredient.objects.filter(recipe=dal).order_by('position')
+        self.assertEqual([line.ingredient.name for line in lines], ['lentil', 'red onion'])
+        self.assertEqual(str(lines[0].quantity), '200.000')
+        lentil = Ingredient.objects.get(name='lentil')
+        self.assertEqual(lentil.nutrient_amounts.get().per_100g, 116)
+        self.assertEqual(self.client.get('/api/recipes/search/', {'q': 'dal'}).data['count'], 1)
+
+        self.assertIn('record 9: prep_minutes', err)
+        self.assertIn('record 10: unknown recipe 6', err)
+        self.assertIn('10 record(s) read', out)
+        checkpoint = CatalogImport.objects.get()
+        self.assertEqual(checkpoint.position, content.rindex('}') + 1)
+        self.assertIsNotNone(checkpoint.finished_at)
+        self.assertFalse(os.path.exists(f'{path}.ids'))
+        with self.assertRaisesMessage(CommandError, '--restart'):
+            self.run_import(path)
+
+    def test_ndjson_inline_lines_and_csv(self):
+        path = self.write('recipes.ndjson', '\n'.join(json.dumps(record) for record in (
+            {'title': 'Pancakes', 'diet_tags': ['vegetarian'], 'ingredients': [
+                'Flour', {'name': 'milk', 'quantity': '0.5', 'unit': 'l'},
+            ]},
+            {'title': 'Porridge', 'ingredients': ['oats', 'milk']},
+        )) + '\n')
+        self.run_import(path, '--model', 'recipes.recipe')
+        pancakes = Recipe.objects.get(title='Pancakes')
+        self.assertEqual(pancakes.diet_tags, ['vegetarian'])
+        self.assertEqual(
+            sorted(RecipeIngredient.objects.filter(recipe=pancakes).values_list('ingredient__name', 'unit')),
+            [('flour', ''), ('milk', 'l')],
+        )
+
+        path = self.write('more.csv', 'id,title,cuisine,prep_minutes\n1,Tacos,mexican,20\n2,"Salad, green",,\n')
+        _, err = self.run_import(path, '--model', 'recipes.recipe', '--chunk-size', '1')
+        self.assertEqual(err, '')
+        salad = Recipe.objects.get(title='Salad, green')
+        self.assertIsNone(salad.prep_minutes)
+        self.assertEqual(Recipe.objects.get(title='Tacos').prep_minutes, 20)
+
+    def test_resume_after_interruption(self):
+        path = self.write('catalog.json', json.dumps(self.FIXTURE[:8]))
+        original = bulk_import.CatalogImporter._recipe_ingredients
+
+        def fail(importer, rows, result):
+            raise bulk_import.ImportAborted('interrupted')
+
+        with mock.patch.object(bulk_import.CatalogImporter, '_recipe_ingredients', fail):
+            with self.assertRaisesMessage(CommandError, 'interrupted'):
+                self.run_import(path, '--chunk-size', '2')
+        checkpoint = CatalogImport.objects.get()
+        self.assertIsNone(checkpoint.finished_at)
+        self.assertEqual(checkpoint.records, 6)
+        self.assertEqual(Recipe.objects.count(), 1)
+        self.assertTrue(os.path.exists(f'{path}.ids'))
+
+        with self.assertRaisesMessage(CommandError, '--resume'):
+            self.run_import(path)
+        with mock.patch.object(bulk_import.CatalogImporter, '_recipe_ingredients', original):
+            self.run_import(path, '--resume', '--chunk-size', '2')
+        # the lines resolve the recipe and lentils imported before the interruption
+        self.assertEqual(Recipe.objects.count(), 1)
+        self.assertEqual(
+            sorted(RecipeIngredient.objects.values_list('ingredient__name', flat=True)), ['lentil', 'red onion'],
+        )
+        self.assertEqual(CatalogImport.objects.get().created['recipes.recipe'], 1)
+
+        self.run_import(path, '--restart')
+        self.assertEqual(Recipe.objects.count(), 2)
@@ -1,6 +1,11 @@
 from django.urls import path
-from .views import ProtectedRecipeView
+from .views import PantrySearchView, ProtectedRecipeView, RecipeDetail, RecipeList, RecipePhotoView, RecipeSearchView
 
 urlpatterns = [
+    path('', RecipeList.as_view(), name='recipes-list'),
+    path('<int:pk>/', RecipeDetail.as_view(), name='recipes-detail'),
+    path('<int:pk>/photo/', RecipePhotoView.as_view(), name='recipes-photo'),
+    path('search/', RecipeSearchView.as_view(), name='recipes-search'),
+    path('pantry/', PantrySearchView.as_view(), name='recipes-pantry'),
     path('protected/', ProtectedRecipeView.as_view(), name='recipes-protected'),
 ]
@@ -1,10 +1,184 @@
+from django.db.models import Prefetch
+from django.shortcuts import get_object_or_404
+from rest_framework import generics, permissions, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 
+from core.instrumentation import InstrumentedViewMixin
+from core.pagination import KeysetPagination
+from core.views import PhotoView
+from .models import Ingredient, Recipe, RecipeIngredient
+from .normalize import normalize_ingredient_name
+from .pantry import find_recipes
+from .permissions import IsAuthorOrReadOnly
+from .search import search_recipes
+from .serializers import RecipeSerializer
 
-class ProtectedRecipeView(APIView):
+
+class ProtectedRecipeView(InstrumentedViewMixin, APIView):
 	permission_classes = [IsAuthenticated]
 
 	def get(self, request):
 		return Response({'detail': 'This is a protected recipe endpoint', 'user': request.user.username})
+
+
+def recipe_queryset():
+	lines = RecipeIngredient.objects.select_related('ingredient')
+	return Recipe.objects.prefetch_related(Prefetch('recipe_ingredients', queryset=lines))
+
+
+class RecipeList(InstrumentedViewMixin, generics.ListCreateAPIView):
+	"""List the catalog (newest first) or add a recipe with its ingredient lines."""
+
+	serializer_class = RecipeSerializer
+	# `?cursor=` switches to keyset pagination (see core/pagination.py)
+	pagination_class = KeysetPagination
+	keyset_ordering = ('-created_at', '-id')
+
+	def get_queryset(self):
+		return recipe_queryset().order_by('-created_at', '-id')
+
+	def perform_create(self, serializer):
+		serializer.save(author_id=self.request.user.pk)
+
+
+class RecipeDetail(InstrumentedViewMixin, generics.RetrieveUpdateDestroyAPIView):
+	serializer_class = RecipeSerializer
+	permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
+
+	def get_queryset(self):
+		return recipe_queryset()
+
+
+class RecipePhotoView(PhotoView):
+	permission_classes = [permissions.IsAuthenticated, IsAuthorOrReadOnly]
+
+	def get_object(self):
+		recipe = get_object_or_404(Recipe, pk=self.kwargs['pk'])
+		self.check_object_permissions(self.request, recipe)
+		return recipe
+
+
+class PantrySearchView(InstrumentedViewMixin, APIView):
+	"""Recipes to cook with the ingredients at hand.
+
+	`GET ?ingredients=tomato,onion,garlic[&max_missing=2][&limit=20]`
+	(`ingredients` may also be repeated). Results are ranked by the share of
+	the recipe the pantry covers, then by the number of missing ingredients
+	(see recipes/pantry.py), and list the missing ones. Names are matched
+	after normalization; `unknown` lists those no recipe uses.
+	"""
+
+	permission_classes = [permissions.AllowAny]
+	max_ingredients = 100
+	default_limit = 20
+	max_limit = 100
+
+	def get(self, request):
+		names = [name for value in request.query_params.getlist('ingredients') for name in value.split(',')]
+		wanted = {normalize_ingredient_name(name) for name in names} - {''}
+		if not wanted:
+			return Response({'detail': 'Pass the pantry as ?ingredients=a,b,c.'}, status=status.HTTP_400_BAD_REQUEST)
+		if len(wanted) > self.max_ingredients:
+			return Response(
+				{'detail': f'At most {self.max_ingredients} ingredients.'}, status=status.HTTP_400_BAD_REQUEST,
+			)
+		try:
+			limit = min(self.max_limit, max(1, int(request.query_params.get('limit', self.default_limit))))
+			max_missing = request.query_params.get('max_missing')
+			max_missing = max(0, int(max_missing)) if max_missing not in (None, '') else None
+		except ValueError:
+			return Response({'detail': 'limit and max_missing must be integers.'}, status=status.HTTP_400_BAD_REQUEST)
+
+		found = Ingredient.objects.resolve(wanted)
+		pantry = set(found.values())
+		matches = find_recipes(pantry, limit=limit, max_missing=max_missing) if pantry else []
+		ids = [match.recipe_id for match in matches]
+		recipes = Recipe.objects.only('id', 'title', 'cuisine', 'prep_minutes').in_bulk(ids)
+		missing = {recipe_id: [] for recipe_id in ids}
+		lines = (
+			RecipeIngredient.objects.filter(recipe_id__in=ids).exclude(ingredient_id__in=pantry)
+			.order_by('recipe_id', 'position', 'id').values_list('recipe_id', 'ingredient__name')
+		)
+		for recipe_id, name in lines:
+			missing[recipe_id].append(name)
+
+		results = []
+		for match in matches:
+			recipe = recipes.get(match.recipe_id)
+			if recipe is None:
+				# deleted since the index last synced
+				continue
+			results.append({
+				'id': recipe.pk,
+				'title': recipe.title,
+				'cuisine': recipe.cuisine,
+				'prep_minutes': recipe.prep_minutes,
+				'coverage': round(match.coverage, 4),
+				'matched': match.matched,
+				'total': match.total,
+				'missing_count': match.missing,
+				'missing': missing[match.recipe_id],
+			})
+		return Response({
+			'ingredients': sorted(found),
+			'unknown': sorted(wanted - found.keys()),
+			'results': results,
+		})
+
+
+class RecipeSearchView(InstrumentedViewMixin, APIView):
+	"""Full-text recipe search with facet counts.
+
+	`GET ?q=spicy vegan lentil[&diet=vegan,gluten_free][&cuisine=indian]
+	[&max_prep=30][&page=2][&page_size=20]`. Results are ranked by relevance
+	(newest first without `q`); `facets` counts the diet tags, cuisines and
+	prep time buckets of all the matches (see recipes/search.py).
+	"""
+
+	permission_classes = [permissions.AllowAny]
+	default_page_size = 20
+	max_page_size = 50
+	# ranked results deeper than this are not worth a scan
+	max_results = 1000
+
+	def get(self, request):
+		params = request.query_params
+		diet = [tag for value in params.getlist('diet') for tag in value.split(',') if tag]
+		unknown = sorted(set(diet) - set(Recipe.DIET_TAGS))
+		if unknown:
+			return Response({'detail': f'Unknown diet tags: {", ".join(unknown)}.'}, status=status.HTTP_400_BAD_REQUEST)
+		try:
+			page = max(1, int(params.get('page', 1)))
+			page_size = min(self.max_page_size, max(1, int(params.get('page_size', self.default_page_size))))
+			max_prep = int(params['max_prep']) if params.get('max_prep') else None
+		except ValueError:
+			return Response(
+				{'detail': 'page, page_size and max_prep must be integers.'}, status=status.HTTP_400_BAD_REQUEST,
+			)
+		offset = (page - 1) * page_size
+		if offset >= self.max_results:
+			return Response({'detail': 'Refine the search to see more results.'}, status=status.HTTP_400_BAD_REQUEST)
+
+		found = search_recipes(
+			params.get('q', ''), diet=diet, cuisine=params.get('cuisine') or None, max_prep=max_prep,
+			limit=page_size, offset=offset,
+		)
+		ids = [pk for pk, _ in found.hits]
+		recipes = Recipe.objects.only(
+			'id', 'title', 'description', 'cuisine', 'prep_minutes', 'diet_flags',
+		).in_bulk(ids)
+		results = [
+			{
+				'id': pk,
+				'title': recipes[pk].title,
+				'description': recipes[pk].description[:200],
+				'cuisine': recipes[pk].cuisine,
+				'prep_minutes': recipes[pk].prep_minutes,
+				'diet_tags': recipes[pk].diet_tags,
+				'score': round(score, 4),
+			}
+			for pk, score in found.hits if pk in recipes
+		]
+		return Response({'count': found.count, 'page': page, 'results': results, 'facets': found.facets})
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser
+from .models import AuthToken, CustomUser
 
 
 @admin.register(CustomUser)
@@ -11,3 +11,11 @@ class CustomUserAdmin(UserAdmin):
 	)
 
 	list_display = UserAdmin.list_display + ('role', 'admin_level')
+
+
+@admin.register(AuthToken)
+class AuthTokenAdmin(admin.ModelAdmin):
+	list_display = ('user', 'created', 'expires_at', 'last_used_at')
+	raw_id_fields = ('user',)
+	search_fields = ('user__username',)
+	ordering = ('-created',)
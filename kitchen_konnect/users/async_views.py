@@ -0,0 +1,216 @@
+"""Async versions of the authentication endpoints for ASGI deployments.
+
+Enabled with `ASYNC_AUTH_VIEWS = True` (see `users/urls.py`). They return the
+same payloads and status codes as the DRF views in `users/views.py`, with
+two differences:
+
+- password hashing (register) and checking (token obtain) run
+  on the bounded thread pool in `users/hashing.py`, so a burst of logins
+  occupies at most `PASSWORD_HASH_WORKERS` CPUs instead of one thread per
+  request;
+- the database work around it runs in short `sync_to_async` calls.
+
+Authentication goes through `HeaderDispatchAuthentication` and
+authorization through the classes in `users/permissions.py`, so the token
+cache, JWT revocation and stateless JWT mode behave as in the sync views.
+Credentials are checked against the model backend (username + password),
+which is the only entry in `AUTHENTICATION_BACKENDS`.
+"""
+import json
+from functools import lru_cache, wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.db import transaction
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions, permissions, status
+
+from core.instrumentation import phase
+from core.throttling import check_throttles
+
+from .authentication import HeaderDispatchAuthentication
+from .hashing import acheck_password, ahash_password, hashing_limiter
+from .models import AuthToken
+from .permissions import IsAdminLevel, IsNutritionist, IsRegulator
+from .serializers import RegisterSerializer, UserSerializer
+from .views import AUTH_THROTTLES, complete_registration, resolve_user
+
+User = get_user_model()
+# as `PasswordHashingMixin` on the sync views
+HASHING_VIEW = {'throttle_scope': 'auth', 'throttle_classes': AUTH_THROTTLES, 'concurrency_limiter': hashing_limiter}
+
+
+@lru_cache(maxsize=None)
+def get_authenticator():
+    return HeaderDispatchAuthentication()
+
+
+def error_response(exc):
+    """Render an `APIException` the way DRF's exception handler does."""
+    data = exc.detail if isinstance(exc.detail, dict) else {'detail': exc.detail}
+    response = JsonResponse(data, status=exc.status_code)
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        response['WWW-Authenticate'] = get_authenticator().authenticate_header(None)
+    if getattr(exc, 'wait', None):
+        response['Retry-After'] = '%d' % exc.wait
+    return response
+
+
+def request_data(request):
+    if hasattr(request, 'data'):  # parsed for the throttles
+        return request.data
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError as exc:
+            raise exceptions.ParseError(f'JSON parse error - {exc}')
+        if not isinstance(data, dict):
+            raise exceptions.ParseError('Expected a JSON object.')
+        return data
+    return request.POST.dict()
+
+
+async def aauthenticate_credentials(username, password):
+    """Return the active user matching the credentials, or None."""
+    user = await User.objects.filter(**{User.USERNAME_FIELD: username}).afirst()
+    valid = await acheck_password(password, user.password if user is not None else None)
+    if valid and user.is_active:
+        return user
+    return None
+
+
+async def aauthenticate(request):
+    """Async counterpart of `HeaderDispatchAuthentication.authenticate`."""
+    selected = get_authenticator().select(request)
+    if selected is None:
+        return AnonymousUser()
+    result = await sync_to_async(selected.authenticate)(request)
+    return result[0] if result is not None else AnonymousUser()
+
+
+def async_api_view(permission_class=permissions.AllowAny, methods=('GET',), min_admin_level=None,
+                   throttle_scope=None, throttle_classes=(), concurrency_limiter=None):
+    """Authenticate, authorize and throttle before running the async view `view_func`.
+
+    `concurrency_limiter` is applied by `core.throttling.ConcurrencyLimitMiddleware`.
+    """
+    allowed = tuple(methods) + (('HEAD',) if 'GET' in methods else ())
+
+    def decorator(view_func):
+        @csrf_exempt
+        @wraps(view_func)
+        async def wrapped(request, *args, **kwargs):
+            if request.method not in allowed:
+                response = error_response(exceptions.MethodNotAllowed(request.method))
+                response['Allow'] = ', '.join(allowed)
+                return response
+            try:
+                if throttle_classes:
+                    request.data = request_data(request)
+                    await sync_to_async(check_throttles)(request, wrapped, throttle_classes)
+                if permission_class is permissions.AllowAny:
+                    # like DRF, open endpoints never look at credentials
+                    return await view_func(request, *args, **kwargs)
+                with phase('auth'):
+                    request.user = await aauthenticate(request)
+                with phase('permissions'):
+                    permission = permission_class()
+                    allowed_request = permission.has_permission(request, wrapped)
+                if not allowed_request:
+                    if not request.user.is_authenticated:
+                        raise exceptions.NotAuthenticated()
+                    raise exceptions.PermissionDenied(getattr(permission, 'message', None))
+                return await view_func(request, *args, **kwargs)
+            except exceptions.APIException as exc:
+                return error_response(exc)
+
+        if min_admin_level is not None:
+            wrapped.min_admin_level = min_admin_level
+        wrapped.throttle_scope = throttle_scope
+        wrapped.concurrency_limiter = concurrency_limiter
+        return wrapped
+
+    return decorator
+
+
+def _validate_registration(data):
+    serializer = RegisterSerializer(data=data)
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data
+
+
+def _create_registered_user(validated, hashed_password, data):
+    with transaction.atomic():
+        user = User(
+            username=User.normalize_username(validated.get('username')),
+            email=User.objects.normalize_email(validated.get('email')),
+            first_name=validated.get('first_name', ''),
+            last_name=validated.get('last_name', ''),
+        )
+        user.password = hashed_password
+        user.save()
+        return complete_registration(user, data)
+
+
+@async_api_view(methods=('POST',), **HASHING_VIEW)
+async def register(request):
+    """Async `RegisterView`: validate, hash off-loop, then create the user."""
+    data = request_data(request)
+    validated = await sync_to_async(_validate_registration)(data)
+    hashed = await ahash_password(validated['password'])
+    payload = await sync_to_async(_create_registered_user)(validated, hashed, data)
+    return JsonResponse(payload, status=status.HTTP_201_CREATED)
+
+
+def _issue_tokens(user):
+    if settings.HAS_SIMPLEJWT:
+        from .tokens import refresh_token_for_user
+
+        refresh = refresh_token_for_user(user)
+        return {'refresh': str(refresh), 'access': str(refresh.access_token)}
+    token = AuthToken.objects.for_user(user)
+    return {'token': token.key, 'expires_at': token.expires_at}
+
+
+@async_api_view(methods=('POST',), **HASHING_VIEW)
+async def obtain_token(request):
+    """Async token-obtain view (SimpleJWT pair, or DRF token without it)."""
+    data = request_data(request)
+    missing = {name: ['This field is required.'] for name in ('username', 'password') if not data.get(name)}
+    if missing:
+        raise exceptions.ValidationError(missing)
+    user = await aauthenticate_credentials(data['username'], data['password'])
+    if user is None:
+        if settings.HAS_SIMPLEJWT:
+            raise exceptions.AuthenticationFailed('No active account found with the given credentials')
+        raise exceptions.ValidationError({'non_field_errors': ['Unable to log in with provided credentials.']})
+    return JsonResponse(await sync_to_async(_issue_tokens)(user))
+
+
+@async_api_view(permissions.IsAuthenticated)
+async def me(request):
+    user = request.user
+    if not isinstance(user, User):
+        user = await sync_to_async(resolve_user)(user)
+    return JsonResponse(UserSerializer(user).data)
+
+
+me.replica_reads = True
+
+
+@async_api_view(IsNutritionist)
+async def nutritionist_area(request):
+    return JsonResponse({'detail': 'nutritionist area'})
+
+
+@async_api_view(IsRegulator)
+async def regulator_area(request):
+    return JsonResponse({'detail': 'regulator area'})
+
+
+@async_api_view(IsAdminLevel, min_admin_level=50)
+async def admin_area(request):
+    return JsonResponse({'detail': 'admin area (min level 50)'})
@@ -0,0 +1,133 @@
+"""Per-user `auth_version` lookups for JWT revocation (see users/tokens.py).
+
+Versions are held in a small per-process map with a short TTL, backed by the
+shared cache and finally by the `auth_version` column. A change drops the
+cached version at once and publishes the new one with `cache.set` when the
+writing transaction commits, so a rolled-back change never leaves the cache
+ahead of the database. Readers that miss the cache fill it with
+`cache.add`: one that read the column before a commit cannot overwrite the
+version published after it. Other processes see a change once their local
+entry expires (`AUTH_VERSION_CACHE['LOCAL_TTL']` seconds).
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+# published for users that are gone or inactive, so a reader that loaded
+# their old version before the commit cannot cache it
+REVOKED = -1
+
+_versions = {}
+_versions_lock = threading.Lock()
+
+
+def _local_key(user_id):
+    # SimpleJWT stores the user id claim as a string
+    return str(user_id)
+
+
+def _version_cache_key(user_id):
+    return f'auth:version:{user_id}'
+
+
+def _ttl(name, default):
+    return getattr(settings, 'AUTH_VERSION_CACHE', {}).get(name, default)
+
+
+def _remember_locally(user_id, version):
+    with _versions_lock:
+        _versions[_local_key(user_id)] = (time.monotonic() + _ttl('LOCAL_TTL', 5), version)
+
+
+def _forget_locally(user_ids):
+    with _versions_lock:
+        for user_id in user_ids:
+            _versions.pop(_local_key(user_id), None)
+
+
+def _publish(versions):
+    cache.set_many({_version_cache_key(user_id): version for user_id, version in versions.items()},
+                   _ttl('SHARED_TTL', 3600))
+    _forget_locally(versions)
+
+
+def _load_auth_version(user_id):
+    return (
+        get_user_model().objects.filter(pk=user_id, is_active=True)
+        .values_list('auth_version', flat=True).first()
+    )
+
+
+def publish_auth_versions(versions):
+    """Forget the cached versions in `{user_id: version}` now and publish
+    them once the current transaction commits."""
+    versions = dict(versions)
+    forget_auth_versions(versions)
+    transaction.on_commit(lambda: _publish(versions))
+
+
+def remember_auth_version(user):
+    """Publish `user`'s current version once the current transaction commits."""
+    publish_auth_versions({user.pk: user.auth_version if user.is_active else REVOKED})
+
+
+def get_auth_version(user_id):
+    """Return the current auth_version of `user_id` (None if the user is gone or inactive)."""
+    entry = _versions.get(_local_key(user_id))
+    if entry is not None and entry[0] >= time.monotonic():
+        version = entry[1]
+        return None if version == REVOKED else version
+    key = _version_cache_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = _load_auth_version(user_id)
+        if version is None:
+            return None
+        # a version published since the read above wins
+        if not cache.add(key, version, _ttl('SHARED_TTL', 3600)):
+            version = cache.get(key, version)
+    _remember_locally(user_id, version)
+    return None if version == REVOKED else version
+
+
+def forget_auth_versions(user_ids):
+    """Drop the cached versions of `user_ids` now (readers reload them)."""
+    _forget_locally(user_ids)
+    cache.delete_many([_version_cache_key(user_id) for user_id in user_ids])
+
+
+def refresh_auth_versions(user_ids):
+    """Forget the versions of `user_ids` and, once the current transaction
+    commits, publish the committed ones (one query)."""
+    user_ids = list(user_ids)
+    forget_auth_versions(user_ids)
+
+    def publish():
+        versions = dict.fromkeys(user_ids, REVOKED)
+        versions.update(
+            get_user_model().objects.filter(pk__in=user_ids, is_active=True)
+            .values_list('pk', 'auth_version')
+        )
+        _publish(versions)
+
+    transaction.on_commit(publish)
+
+
+def clear_local_auth_versions():
+    with _versions_lock:
+        _versions.clear()
+
+
+def bump_auth_version(user_ids):
+    """Revoke every JWT issued to `user_ids` with one UPDATE."""
+    user_ids = list(user_ids)
+    get_user_model().objects.filter(pk__in=user_ids).update(
+        auth_version=F('auth_version') + 1, updated_at=timezone.now(),
+    )
+    refresh_auth_versions(user_ids)
@@ -0,0 +1,307 @@
+"""Authentication classes for the API.
+
+`HeaderDispatchAuthentication` is the only class in
+`REST_FRAMEWORK['DEFAULT_AUTHENTICATION_CLASSES']`. It looks at the
+Authorization header prefix once and hands the request to exactly one
+authenticator instead of letting DRF try every configured class in turn:
+
+    Bearer <jwt>            -> SimpleJWT
+    Token <jwt>             -> SimpleJWT (the frontend stores either kind)
+    Token <key>             -> CachedTokenAuthentication
+
+JWTs are only accepted when SimpleJWT is installed. Any other scheme, and a
+request without the header, is anonymous: Basic credentials would cost a
+password hash on every request, outside the auth throttles and the hashing
+limiter, and session cookies would need CSRF checks the async views skip.
+
+`CachedTokenAuthentication` resolves `users.AuthToken` keys through a small
+per-process LRU and the shared cache before falling back to the
+`AuthToken JOIN CustomUser` query. Entries are dropped by the signal handlers in
+`users/signals.py` when a token is deleted or replaced, or when a cached
+user field (role, admin_level, is_active, ...) changes. A user change bumps
+the user's generation counter (an atomic `incr`), and shared entries stored
+under an older generation are ignored. Both happen at once and again when
+the writing transaction commits: another request may read the old rows
+before the commit and cache them again in between. Other processes only
+drop their LRU entry when its (short) local TTL expires.
+
+Revocations reach the other workers only through the shared tier, so the
+default cache must be shared between them; the gunicorn master refuses to
+start several workers on a locmem or file cache (config/cache.py).
+
+Credentials are always looked up on the primary, also on views that read
+from a replica (`config/db_router.py`): a lagging replica would refuse a
+token issued moments ago and would cache a user snapshot from before a
+role change or deactivation.
+
+Cached entries carry the token's `expires_at`, so expired tokens are
+refused without a query, and its `last_used_at`: the column is only
+written when it is older than `AUTH_TOKEN_TOUCH_INTERVAL`, by the one
+process that wins a short-lived cache key for the token.
+"""
+import hashlib
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.functional import cached_property
+from django.utils.module_loading import import_string
+from rest_framework import exceptions
+from rest_framework.authentication import (
+    BaseAuthentication,
+    TokenAuthentication,
+    get_authorization_header,
+)
+
+from config.db_router import use_primary
+
+from .models import AuthToken
+
+# User columns kept in a cached snapshot. Anything else (password,
+# dietary_preferences, ...) is deferred and loaded on first access.
+# `updated_at` and `photo_id` let `/me/` answer without a query.
+SNAPSHOT_FIELDS = (
+    'id', 'username', 'email', 'first_name', 'last_name',
+    'role', 'admin_level', 'is_active', 'is_staff', 'is_superuser',
+    'photo_id', 'updated_at',
+)
+
+# token columns stored next to the user snapshot
+TOKEN_FIELDS = ('expires_at', 'last_used_at')
+
+DEFAULT_TOKEN_CACHE = {
+    'LOCAL_SIZE': 4096,
+    'LOCAL_TTL': 5,
+    'SHARED_TTL': 300,
+}
+
+
+def _cache_settings():
+    return {**DEFAULT_TOKEN_CACHE, **getattr(settings, 'AUTH_TOKEN_CACHE', {})}
+
+
+def _digest(key):
+    # never put raw token keys into (possibly shared) cache key space
+    return hashlib.sha256(key.encode()).hexdigest()[:32]
+
+
+def _token_cache_key(digest):
+    return f'auth:token:{digest}'
+
+
+def _user_generation_cache_key(user_id):
+    return f'auth:user-generation:{user_id}'
+
+
+def _token_touch_cache_key(digest):
+    return f'auth:token-touch:{digest}'
+
+
+class _LocalLRU:
+    """Thread-safe LRU of `digest -> (expires_at, user_id, snapshot)`."""
+
+    def __init__(self):
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, digest):
+        with self._lock:
+            entry = self._data.get(digest)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._data[digest]
+                return None
+            self._data.move_to_end(digest)
+            return entry[2]
+
+    def set(self, digest, user_id, snapshot, ttl, size):
+        with self._lock:
+            self._data[digest] = (time.monotonic() + ttl, user_id, snapshot)
+            self._data.move_to_end(digest)
+            while len(self._data) > size:
+                self._data.popitem(last=False)
+
+    def discard(self, digest):
+        with self._lock:
+            self._data.pop(digest, None)
+
+    def discard_user(self, user_id):
+        with self._lock:
+            for digest in [d for d, entry in self._data.items() if entry[1] == user_id]:
+                del self._data[digest]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+local_token_cache = _LocalLRU()
+
+
+def snapshot_user(user):
+    return {name: getattr(user, name) for name in SNAPSHOT_FIELDS}
+
+
+def user_from_snapshot(snapshot, using='default'):
+    """Rebuild a `CustomUser` from a snapshot; other fields stay deferred."""
+    User = get_user_model()
+    names = [f.attname for f in User._meta.concrete_fields if f.attname in snapshot]
+    return User.from_db(using, names, [snapshot[name] for name in names])
+
+
+def _user_generation(user_id):
+    """The user's current cache generation, started at a random value so a
+    counter that was evicted does not come back at a value still recorded in
+    old snapshots."""
+    generation_key = _user_generation_cache_key(user_id)
+    generation = cache.get(generation_key)
+    if generation is None:
+        cache.add(generation_key, secrets.randbits(48), None)
+        generation = cache.get(generation_key)
+    return generation
+
+
+def cache_token_user(key, user, token=None):
+    conf = _cache_settings()
+    digest = _digest(key)
+    snapshot = snapshot_user(user)
+    if token is not None:
+        snapshot.update({f'token_{name}': getattr(token, name) for name in TOKEN_FIELDS})
+    # a user change bumps the generation instead of deleting the user's
+    # entries, so there is no per-user list of digests to keep in sync
+    snapshot['generation'] = _user_generation(user.pk)
+    local_token_cache.set(digest, user.pk, snapshot, conf['LOCAL_TTL'], conf['LOCAL_SIZE'])
+    cache.set(_token_cache_key(digest), snapshot, conf['SHARED_TTL'])
+
+
+def get_cached_token_snapshot(key):
+    digest = _digest(key)
+    snapshot = local_token_cache.get(digest)
+    if snapshot is None:
+        snapshot = cache.get(_token_cache_key(digest))
+        if snapshot is None or snapshot.get('generation') != _user_generation(snapshot['id']):
+            return None
+        conf = _cache_settings()
+        local_token_cache.set(digest, snapshot['id'], snapshot, conf['LOCAL_TTL'], conf['LOCAL_SIZE'])
+    return snapshot
+
+
+def touch_token(token):
+    """Record that `token` was used, at most once per `AUTH_TOKEN_TOUCH_INTERVAL`."""
+    interval = getattr(settings, 'AUTH_TOKEN_TOUCH_INTERVAL', 300)
+    now = timezone.now()
+    if token.last_used_at is not None and (now - token.last_used_at).total_seconds() < interval:
+        return
+    # other processes still see the old value in their LRU; only one writes
+    if not cache.add(_token_touch_cache_key(_digest(token.key)), True, interval):
+        return
+    type(token).objects.filter(pk=token.key).update(last_used_at=now)
+    token.last_used_at = now
+    cache_token_user(token.key, token.user, token)
+
+
+def _now_and_on_commit(func):
+    func()
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(func)
+
+
+def _drop_token(digest):
+    local_token_cache.discard(digest)
+    cache.delete(_token_cache_key(digest))
+
+
+def _retire_user_snapshots(user_id):
+    local_token_cache.discard_user(user_id)
+    generation_key = _user_generation_cache_key(user_id)
+    try:
+        cache.incr(generation_key)
+    except ValueError:
+        # no counter: any new value retires the snapshots of the evicted one
+        cache.add(generation_key, secrets.randbits(48), None)
+
+
+def invalidate_token(key):
+    digest = _digest(key)
+    _now_and_on_commit(lambda: _drop_token(digest))
+
+
+def invalidate_user_tokens(user_id):
+    _now_and_on_commit(lambda: _retire_user_snapshots(user_id))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Expiring token auth with the token → user lookup served from cache."""
+
+    model = AuthToken
+
+    def authenticate_credentials(self, key):
+        model = self.get_model()
+        snapshot = get_cached_token_snapshot(key)
+        if snapshot is None or 'token_expires_at' not in snapshot:
+            try:
+                token = model.objects.select_related('user').get(key=key)
+            except model.DoesNotExist:
+                raise exceptions.AuthenticationFailed('Invalid token.')
+            user = token.user
+            if user.is_active and not token.is_expired:
+                cache_token_user(key, user, token)
+        else:
+            user = user_from_snapshot(snapshot)
+            token = model(key=key, user_id=user.pk, **{name: snapshot[f'token_{name}'] for name in TOKEN_FIELDS})
+            token.user = user
+
+        if token.is_expired:
+            raise exceptions.AuthenticationFailed('Token has expired.')
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+        touch_token(token)
+        return (user, token)
+
+
+class HeaderDispatchAuthentication(BaseAuthentication):
+    """Route each request to one authenticator based on its header prefix."""
+
+    www_authenticate_realm = 'api'
+
+    def __init__(self):
+        self.token_auth = CachedTokenAuthentication()
+        self.jwt_class = getattr(settings, 'AUTH_JWT_AUTHENTICATION_CLASS', None)
+
+    @cached_property
+    def jwt_auth(self):
+        # imported on the first JWT request, not at worker start-up
+        return import_string(self.jwt_class)() if self.jwt_class else None
+
+    def select(self, request):
+        """Return the authenticator responsible for `request` (or None)."""
+        header = get_authorization_header(request).split()
+        if not header:
+            return None
+        prefix = header[0].lower()
+        if prefix == b'bearer':
+            return self.jwt_auth
+        if prefix == b'token':
+            if self.jwt_class and len(header) == 2 and header[1].count(b'.') == 2:
+                return self.jwt_auth
+            return self.token_auth
+        return None
+
+    def authenticate(self, request):
+        authenticator = self.select(request)
+        if authenticator is None:
+            return None
+        # the view may read from a replica, but credentials and the user
+        # snapshot that gets cached must come from the primary
+        with use_primary():
+            return authenticator.authenticate(request)
+
+    def authenticate_header(self, request):
+        return self.token_auth.authenticate_header(request)
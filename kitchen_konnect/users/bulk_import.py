@@ -0,0 +1,253 @@
+"""Bulk user import from CSV or NDJSON.
+
+Used by the `import_users` management command and `AdminUserImport`. Rows
+are read as a stream and processed in chunks:
+
+1. validate the chunk (required fields, password length, email/username
+   format, duplicates within the file and against existing users - one
+   query each for usernames and emails);
+2. hash the passwords in a process pool (PBKDF2 dominates the cost of
+   registration);
+3. insert users, DRF tokens, role group memberships and verification
+   requests with `bulk_create` inside one transaction per chunk.
+
+Invalid rows are reported with their line number and skipped; they never
+abort the import. If a chunk hits an integrity error (e.g. a user created
+concurrently), its rows are retried one by one so only the offending rows
+fail.
+
+Recognized columns: username, email, password, first_name, last_name,
+desired_role, verification_message.
+"""
+import csv
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+
+from core.conditional import bump_table_versions
+from core.response_cache import invalidate_model
+
+from .models import AuthToken, VerificationRequest
+from .roles import group_id_for_role
+
+FORMAT_CSV = 'csv'
+FORMAT_NDJSON = 'ndjson'
+FORMATS = (FORMAT_CSV, FORMAT_NDJSON)
+
+MIN_PASSWORD_LENGTH = 8
+DEFAULT_CHUNK_SIZE = 1000
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    errors: list = field(default_factory=list)
+
+    def add_error(self, line, message):
+        self.errors.append({'line': line, 'error': message})
+
+
+def detect_format(name, default=FORMAT_CSV):
+    name = (name or '').lower()
+    if name.endswith(('.ndjson', '.jsonl', '.json')):
+        return FORMAT_NDJSON
+    if name.endswith('.csv'):
+        return FORMAT_CSV
+    return default
+
+
+def iter_rows(stream, fmt):
+    """Yield `(line_number, row_dict_or_error)` from a text stream."""
+    if fmt == FORMAT_CSV:
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == FORMAT_NDJSON:
+        for line_no, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                yield line_no, ValueError(f'invalid JSON: {exc}')
+                continue
+            if not isinstance(row, dict):
+                yield line_no, ValueError('expected a JSON object')
+                continue
+            yield line_no, row
+    else:
+        raise ValueError(f'unsupported format {fmt!r}')
+
+
+def _init_worker():
+    # Workers started with the "spawn" method do not inherit Django setup.
+    from django.apps import apps
+
+    if not apps.ready:
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+        import django
+
+        django.setup()
+
+
+def _hash_password(raw):
+    return make_password(raw)
+
+
+class UserImporter:
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE, workers=None, dry_run=False, progress=None):
+        self.chunk_size = max(1, chunk_size)
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.dry_run = dry_run
+        self.progress = progress
+        self.User = get_user_model()
+        self.request_roles = {key for key, _ in VerificationRequest.REQUEST_CHOICES}
+        self.username_validator = self.User.username_validator
+        self._seen_usernames = set()
+        self._seen_emails = set()
+
+    def run(self, stream, fmt):
+        result = ImportResult()
+        pool = ProcessPoolExecutor(self.workers, initializer=_init_worker) if self.workers > 1 else None
+        try:
+            chunk = []
+            for line_no, row in iter_rows(stream, fmt):
+                if isinstance(row, Exception):
+                    result.add_error(line_no, str(row))
+                    continue
+                chunk.append((line_no, row))
+                if len(chunk) >= self.chunk_size:
+                    self._process_chunk(chunk, result, pool)
+                    chunk = []
+            if chunk:
+                self._process_chunk(chunk, result, pool)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        return result
+
+    def _clean(self, line_no, row, result):
+        data = {k: (str(v).strip() if v is not None else '') for k, v in row.items() if k}
+        username = data.get('username', '')
+        email = data.get('email', '')
+        password = data.get('password', '')
+        desired = data.get('desired_role', '')
+        if not username or not email or not password:
+            result.add_error(line_no, 'username, email and password are required')
+            return None
+        if len(password) < MIN_PASSWORD_LENGTH:
+            result.add_error(line_no, f'password must be at least {MIN_PASSWORD_LENGTH} characters')
+            return None
+        try:
+            self.username_validator(username)
+            validate_email(email)
+        except ValidationError as exc:
+            result.add_error(line_no, '; '.join(exc.messages))
+            return None
+        if desired and desired != self.User.ROLE_REGULAR and desired not in self.request_roles:
+            result.add_error(line_no, f'unknown desired_role {desired!r}')
+            return None
+        if username in self._seen_usernames or email in self._seen_emails:
+            result.add_error(line_no, 'duplicate username or email in import')
+            return None
+        self._seen_usernames.add(username)
+        self._seen_emails.add(email)
+        data.update(username=username, email=email)
+        return data
+
+    def _process_chunk(self, chunk, result, pool):
+        rows = []
+        for line_no, row in chunk:
+            data = self._clean(line_no, row, result)
+            if data is not None:
+                rows.append((line_no, data))
+        if rows:
+            taken_usernames = set(self.User.objects.filter(
+                username__in=[d['username'] for _, d in rows]).values_list('username', flat=True))
+            taken_emails = set(self.User.objects.filter(
+                email__in=[d['email'] for _, d in rows]).values_list('email', flat=True))
+            fresh = []
+            for line_no, data in rows:
+                if data['username'] in taken_usernames or data['email'] in taken_emails:
+                    result.add_error(line_no, 'username or email already exists')
+                else:
+                    fresh.append((line_no, data))
+            rows = fresh
+
+        if rows and not self.dry_run:
+            passwords = [d['password'] for _, d in rows]
+            if pool is not None:
+                hashes = list(pool.map(_hash_password, passwords, chunksize=max(1, len(passwords) // (self.workers * 4))))
+            else:
+                hashes = [_hash_password(p) for p in passwords]
+            for (_, data), hashed in zip(rows, hashes):
+                data['password'] = hashed
+            try:
+                with transaction.atomic():
+                    self._insert(rows)
+                result.created += len(rows)
+            except IntegrityError:
+                for line_no, data in rows:
+                    try:
+                        with transaction.atomic():
+                            self._insert([(line_no, data)])
+                        result.created += 1
+                    except IntegrityError as exc:
+                        result.add_error(line_no, f'could not insert: {exc}')
+            # bulk_create sends no post_save signals
+            invalidate_model('users.CustomUser')
+            invalidate_model('users.VerificationRequest')
+            bump_table_versions('users.CustomUser', 'users.VerificationRequest')
+        elif rows:
+            result.created += len(rows)
+
+        if self.progress is not None:
+            self.progress(result)
+
+    def _insert(self, rows):
+        User = self.User
+        users = User.objects.bulk_create([
+            User(
+                username=data['username'],
+                email=data['email'],
+                password=data['password'],
+                first_name=data.get('first_name', ''),
+                last_name=data.get('last_name', ''),
+                role=User.ROLE_REGULAR,
+            )
+            for _, data in rows
+        ])
+        expires_at = AuthToken.default_expiry()
+        AuthToken.objects.bulk_create([
+            AuthToken(key=AuthToken.generate_key(), user=user, expires_at=expires_at) for user in users
+        ])
+        through = User.groups.through
+        gid = group_id_for_role(User.ROLE_REGULAR)
+        through.objects.bulk_create([through(customuser_id=user.pk, group_id=gid) for user in users])
+        requests = []
+        for user, (_, data) in zip(users, rows):
+            desired = data.get('desired_role')
+            if desired and desired != User.ROLE_REGULAR:
+                requests.append(VerificationRequest(
+                    user=user, requested_role=desired, message=data.get('verification_message', ''),
+                ))
+        if requests:
+            VerificationRequest.objects.bulk_create(requests)
+
+
+def import_users(stream, fmt, **options):
+    """Import users from a text stream; see `UserImporter` for options."""
+    return UserImporter(**options).run(stream, fmt)
+
+
+def import_users_from_bytes(fileobj, fmt, **options):
+    return import_users(io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline=''), fmt, **options)
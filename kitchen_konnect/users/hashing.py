@@ -0,0 +1,54 @@
+"""Password hashing off the event loop.
+
+PBKDF2 takes hundreds of milliseconds per call. Async views must not run it
+on the event loop, and under ASGI sync views serialize it on the single
+thread used for thread-sensitive code. These helpers run hashing and
+checking on a dedicated, bounded thread pool (`hashlib.pbkdf2_hmac` releases
+the GIL, so threads give real parallelism) sized by
+`settings.PASSWORD_HASH_WORKERS`.
+
+`hashing_limiter` bounds the requests of the views that hash (sync or
+async) a process accepts at once; see `core/throttling.py`.
+"""
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+
+from core.throttling import ConcurrencyLimiter
+
+hashing_limiter = ConcurrencyLimiter('PASSWORD_HASH_CONCURRENCY')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_hash_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = getattr(settings, 'PASSWORD_HASH_WORKERS', None) or os.cpu_count() or 1
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+    return _executor
+
+
+async def ahash_password(raw):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_hash_executor(), make_password, raw)
+
+
+async def acheck_password(raw, encoded):
+    """Check `raw` against `encoded`; hashes a dummy value when `encoded` is None.
+
+    Hashing on a miss keeps the response time of unknown usernames close to
+    that of wrong passwords (as `ModelBackend.authenticate` does).
+    """
+    loop = asyncio.get_running_loop()
+    if encoded is None:
+        await loop.run_in_executor(get_hash_executor(), make_password, raw)
+        return False
+    return await loop.run_in_executor(get_hash_executor(), check_password, raw, encoded)
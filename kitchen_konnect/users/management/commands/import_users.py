@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.bulk_import import DEFAULT_CHUNK_SIZE, FORMATS, detect_format, import_users
+
+
+class Command(BaseCommand):
+    help = 'Bulk import users from a CSV or NDJSON file (see users/bulk_import.py for columns)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV/NDJSON file to import')
+        parser.add_argument('--format', choices=FORMATS, help='Input format (default: from file extension)')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Rows per transaction')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Password hashing processes (default: CPU count, 1 disables the pool)')
+        parser.add_argument('--dry-run', action='store_true', help='Validate only; nothing is written')
+
+    def handle(self, *args, **options):
+        fmt = options.get('format') or detect_format(options['path'])
+        started = time.monotonic()
+
+        def progress(result):
+            elapsed = time.monotonic() - started
+            rate = result.created / elapsed if elapsed else 0.0
+            self.stdout.write(f'{result.created} created, {len(result.errors)} error(s), {rate:.0f} users/s')
+
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as fh:
+                result = import_users(
+                    fh, fmt,
+                    chunk_size=options['chunk_size'],
+                    workers=options.get('workers'),
+                    dry_run=options.get('dry_run', False),
+                    progress=progress,
+                )
+        except OSError as exc:
+            raise CommandError(str(exc))
+
+        for error in result.errors:
+            self.stderr.write(f"line {error['line']}: {error['error']}")
+        verb = 'would be created' if options.get('dry_run') else 'created'
+        self.stdout.write(self.style.NOTICE(
+            f'Done. {result.created} user(s) {verb}, {len(result.errors)} row(s) rejected.'
+        ))
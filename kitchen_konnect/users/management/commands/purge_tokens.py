@@ -0,0 +1,54 @@
+import time
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from users.models import AuthToken
+
+
+class Command(BaseCommand):
+    help = 'Delete expired API tokens (and expired JWT blacklist entries) in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows deleted per statement/transaction')
+        parser.add_argument('--sleep', type=float, default=0.0,
+                            help='Seconds to pause between batches (lets other writers take the table locks)')
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would be deleted')
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        batch = {
+            'batch_size': max(1, options.get('batch_size') or 1000),
+            'sleep': options.get('sleep') or 0.0,
+            'dry_run': options.get('dry_run', False),
+        }
+        expired = AuthToken.objects.filter(expires_at__lte=now)
+        # the expires_at index serves both the filter and the order
+        deleted = self.purge(expired.order_by('expires_at'), 'key', **batch)
+        self.stdout.write(self.style.NOTICE(f'API tokens: {deleted} expired.'))
+
+        if apps.is_installed('rest_framework_simplejwt.token_blacklist'):
+            from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+            # ids grow with issue time and expiry follows it, so walking the
+            # primary key meets the expired rows first
+            outstanding = OutstandingToken.objects.filter(expires_at__lte=now).order_by('id')
+            deleted = self.purge(outstanding, 'id', **batch)
+            self.stdout.write(self.style.NOTICE(f'JWT outstanding/blacklisted tokens: {deleted} expired.'))
+
+    def purge(self, queryset, pk_name, batch_size, sleep, dry_run):
+        """Delete `queryset` one primary-key batch at a time; return the row count."""
+        if dry_run:
+            return queryset.count()
+        total = 0
+        while True:
+            pks = list(queryset.values_list(pk_name, flat=True)[:batch_size])
+            if not pks:
+                return total
+            # each batch is its own short transaction (autocommit)
+            queryset.model.objects.filter(pk__in=pks).delete()
+            total += len(pks)
+            self.stdout.write(f'{queryset.model._meta.label}: {total} deleted')
+            if sleep:
+                time.sleep(sleep)
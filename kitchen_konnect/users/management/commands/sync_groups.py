@@ -1,6 +1,12 @@
+import time
+
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
+from django.db import transaction
+from django.db.models import Case, IntegerField, Value, When
+
+from users.roles import ROLE_TO_GROUP, GROUP_USERS, get_role_group_ids
 
 
 class Command(BaseCommand):
@@ -9,8 +15,16 @@ class Command(BaseCommand):
     def add_arguments(self, parser):
         parser.add_argument('--dry-run', action='store_true', help='Show what would change without applying')
         parser.add_argument('--username', type=str, help='Only sync a single username')
+        parser.add_argument('--bulk', action='store_true',
+                            help='Diff memberships in id-ordered chunks with set-based queries (for large tables)')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Users per chunk/transaction in --bulk mode')
+        parser.add_argument('--start-id', type=int, default=0,
+                            help='Resume --bulk mode after this user id (printed with each progress line)')
 
     def handle(self, *args, **options):
+        if options.get('bulk'):
+            return self.handle_bulk(**options)
+
         User = get_user_model()
         dry = options.get('dry_run', False)
         username = options.get('username')
@@ -54,3 +68,79 @@ class Command(BaseCommand):
                         self.stderr.write(f'Error updating {u.username}: {e}')
 
         self.stdout.write(self.style.NOTICE(f'Done. {changed} user(s) changed.'))
+
+    def handle_bulk(self, **options):
+        """Set-based sync: target group computed in SQL, diffed per id chunk.
+
+        Each chunk reads the target group for up to `--chunk-size` users and
+        their current membership rows (two queries), then deletes stale rows
+        and inserts missing ones inside one transaction. Progress lines carry
+        the last processed id so an interrupted run can continue with
+        `--start-id`.
+        """
+        User = get_user_model()
+        through = User.groups.through
+        dry = options.get('dry_run', False)
+        chunk_size = max(1, options.get('chunk_size') or 5000)
+        last_id = options.get('start_id') or 0
+
+        group_ids = get_role_group_ids()
+        target_expr = Case(
+            *[When(role=role, then=Value(group_ids[name])) for role, name in ROLE_TO_GROUP.items()],
+            default=Value(group_ids[GROUP_USERS]),
+            output_field=IntegerField(),
+        )
+        users_qs = User.objects.order_by('id')
+        if options.get('username'):
+            users_qs = users_qs.filter(username=options['username'])
+
+        total = users_qs.filter(id__gt=last_id).count()
+        processed = added = removed = 0
+        started = time.monotonic()
+        while True:
+            rows = list(
+                users_qs.filter(id__gt=last_id)
+                .annotate(target_group=target_expr)
+                .values_list('id', 'target_group')[:chunk_size]
+            )
+            if not rows:
+                break
+            low, high = rows[0][0], rows[-1][0]
+            desired = set(rows)
+            current = through.objects.filter(customuser_id__gte=low, customuser_id__lte=high)
+            if options.get('username'):
+                current = current.filter(customuser_id__in=[uid for uid, _ in rows])
+            stale_ids = []
+            present = set()
+            for pk, uid, gid in current.values_list('id', 'customuser_id', 'group_id'):
+                if (uid, gid) in desired:
+                    present.add((uid, gid))
+                else:
+                    stale_ids.append(pk)
+            missing = desired - present
+
+            if not dry and (stale_ids or missing):
+                with transaction.atomic():
+                    if stale_ids:
+                        through.objects.filter(pk__in=stale_ids).delete()
+                    through.objects.bulk_create(
+                        [through(customuser_id=uid, group_id=gid) for uid, gid in missing],
+                        ignore_conflicts=True,
+                    )
+
+            processed += len(rows)
+            removed += len(stale_ids)
+            added += len(missing)
+            last_id = high
+            elapsed = time.monotonic() - started
+            rate = processed / elapsed if elapsed else 0.0
+            prefix = '[DRY] ' if dry else ''
+            self.stdout.write(
+                f'{prefix}{processed}/{total} users, +{added}/-{removed} memberships, '
+                f'{rate:.0f} users/s, last id {last_id}'
+            )
+
+        verb = 'would change' if dry else 'changed'
+        self.stdout.write(self.style.NOTICE(
+            f'Done. {processed} user(s) scanned, {added} membership(s) added and {removed} removed ({verb}).'
+        ))
@@ -0,0 +1,89 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:39
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+from users.migrations._sqlite_search import REBUILD, TRIGGERS_V1
+
+# Substring search index for the admin user list. SQLite gets an external
+# content FTS5 table with the trigram tokenizer, kept in sync by triggers;
+# PostgreSQL gets a pg_trgm GIN index over the same lower-cased document
+# (the expression must match `users.search.PG_SEARCH_DOCUMENT`).
+SQLITE_FTS_CREATE = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS users_customuser_fts USING fts5(
+        username, email, first_name, last_name, role,
+        content='users_customuser', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    *TRIGGERS_V1,
+    REBUILD,
+]
+SQLITE_FTS_DROP = [
+    'DROP TRIGGER IF EXISTS users_customuser_fts_ai',
+    'DROP TRIGGER IF EXISTS users_customuser_fts_ad',
+    'DROP TRIGGER IF EXISTS users_customuser_fts_au',
+    'DROP TABLE IF EXISTS users_customuser_fts',
+]
+PG_TRGM_CREATE = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    """
+    CREATE INDEX IF NOT EXISTS users_customuser_search_trgm ON users_customuser USING gin (
+        (lower(username || ' ' || email || ' ' || first_name || ' ' || last_name || ' ' || role)) gin_trgm_ops
+    )
+    """,
+]
+PG_TRGM_DROP = ['DROP INDEX IF EXISTS users_customuser_search_trgm']
+
+
+def _run(schema_editor, statements):
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        _run(schema_editor, SQLITE_FTS_CREATE)
+    elif vendor == 'postgresql':
+        _run(schema_editor, PG_TRGM_CREATE)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        _run(schema_editor, SQLITE_FTS_DROP)
+    elif vendor == 'postgresql':
+        _run(schema_editor, PG_TRGM_DROP)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0004_create_role_groups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(django.db.models.functions.text.Lower('username'), name='users_username_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(django.db.models.functions.text.Lower('email'), name='users_email_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(django.db.models.functions.text.Lower('first_name'), name='users_first_name_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(django.db.models.functions.text.Lower('last_name'), name='users_last_name_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['role', 'admin_level'], name='users_role_level_idx'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
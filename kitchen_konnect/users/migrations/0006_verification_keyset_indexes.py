@@ -0,0 +1,21 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='verificationrequest',
+            index=models.Index(fields=['created_at', 'id'], name='users_verif_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='verificationrequest',
+            index=models.Index(fields=['status', 'created_at', 'id'], name='users_verif_status_created_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-18 11:47
+
+from django.db import migrations, models
+
+from users.migrations._sqlite_search import install_triggers_v1
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_verification_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='auth_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        # adding a NOT NULL column rebuilds the table on SQLite, dropping
+        # the search triggers from 0005
+        migrations.RunPython(install_triggers_v1, migrations.RunPython.noop),
+    ]
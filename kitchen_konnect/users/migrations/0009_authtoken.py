@@ -0,0 +1,49 @@
+# Generated by Django 5.2.3 on 2026-10-18 12:37
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+BATCH_SIZE = 1000
+
+
+def copy_drf_tokens(apps, schema_editor):
+    """Keep issued DRF tokens working: same key, expiring one TTL from now."""
+    Token = apps.get_model('authtoken', 'Token')
+    AuthToken = apps.get_model('users', 'AuthToken')
+    expires_at = timezone.now() + settings.AUTH_TOKEN_TTL
+    tokens = Token.objects.using(schema_editor.connection.alias).values_list('key', 'user_id', 'created')
+    batch = []
+    for key, user_id, created in tokens.iterator(chunk_size=BATCH_SIZE):
+        batch.append(AuthToken(key=key, user_id=user_id, created=created, expires_at=expires_at))
+        if len(batch) == BATCH_SIZE:
+            AuthToken.objects.using(schema_editor.connection.alias).bulk_create(batch)
+            batch = []
+    AuthToken.objects.using(schema_editor.connection.alias).bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_updated_at'),
+        ('authtoken', '0002_auto_20160226_1747'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthToken',
+            fields=[
+                ('key', models.CharField(max_length=40, primary_key=True, serialize=False)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('expires_at', models.DateTimeField(db_index=True)),
+                ('last_used_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='auth_tokens', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'expires_at'], name='users_authtoken_user_exp_idx')],
+            },
+        ),
+        migrations.RunPython(copy_drf_tokens, migrations.RunPython.noop),
+    ]
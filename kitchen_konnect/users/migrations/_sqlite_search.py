@@ -0,0 +1,44 @@
+"""SQLite FTS5 search triggers shared by the users migrations.
+
+Migrations 0005 (which creates the index), 0007 and 0008 (which rebuild
+users_customuser, dropping its triggers) run this DDL, so it must never be
+edited: a trigger that changes needs a new set of statements here and a new
+migration installing it. The module name starts with an underscore so the
+migration loader skips it.
+"""
+
+# version 1: created by 0005_search_indexes
+TRIGGERS_V1 = (
+    """
+    CREATE TRIGGER IF NOT EXISTS users_customuser_fts_ai AFTER INSERT ON users_customuser BEGIN
+        INSERT INTO users_customuser_fts(rowid, username, email, first_name, last_name, role)
+        VALUES (new.id, new.username, new.email, new.first_name, new.last_name, new.role);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS users_customuser_fts_ad AFTER DELETE ON users_customuser BEGIN
+        INSERT INTO users_customuser_fts(users_customuser_fts, rowid, username, email, first_name, last_name, role)
+        VALUES ('delete', old.id, old.username, old.email, old.first_name, old.last_name, old.role);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS users_customuser_fts_au
+    AFTER UPDATE OF username, email, first_name, last_name, role ON users_customuser BEGIN
+        INSERT INTO users_customuser_fts(users_customuser_fts, rowid, username, email, first_name, last_name, role)
+        VALUES ('delete', old.id, old.username, old.email, old.first_name, old.last_name, old.role);
+        INSERT INTO users_customuser_fts(rowid, username, email, first_name, last_name, role)
+        VALUES (new.id, new.username, new.email, new.first_name, new.last_name, new.role);
+    END
+    """,
+)
+
+REBUILD = "INSERT INTO users_customuser_fts(users_customuser_fts) VALUES ('rebuild')"
+
+
+def install_triggers_v1(apps, schema_editor):
+    """RunPython helper: (re)create the version 1 triggers and rebuild the index."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in TRIGGERS_V1:
+        schema_editor.execute(sql)
+    schema_editor.execute(REBUILD)
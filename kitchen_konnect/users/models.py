@@ -1,5 +1,13 @@
+import binascii
+import os
+
+from django.conf import settings
 from django.db import models
-from django.contrib.auth.models import AbstractUser, Group
+from django.db.models.functions import Lower
+from django.utils import timezone
+from django.contrib.auth.models import AbstractUser
+
+from .roles import sync_user_group
 
 
 class CustomUser(AbstractUser):
@@ -16,6 +24,7 @@ class CustomUser(AbstractUser):
 	- `email` is unique and used as a primary contact field.
 	- `dietary_preferences` stores structured user preferences (JSON).
 	- `bio` is a short user-provided description.
+	- `photo` is the profile photo (see core/images.py).
 	"""
 
 	ROLE_REGULAR = 'regular'
@@ -33,15 +42,77 @@ class CustomUser(AbstractUser):
 	email = models.EmailField('email address', unique=True)
 	dietary_preferences = models.JSONField(blank=True, null=True, default=dict)
 	bio = models.TextField(blank=True)
+	# profile photo, by digest (see core/images.py)
+	photo = models.ForeignKey(
+		'core.StoredImage', to_field='digest', on_delete=models.SET_NULL, null=True, blank=True,
+		db_index=False, related_name='+',
+	)
 
 	# Role and admin hierarchy
 	role = models.CharField(max_length=20, choices=ROLE_CHOICES, default=ROLE_REGULAR)
 	# admin_level gives ordering among admin users; non-admins may keep 0
 	admin_level = models.PositiveSmallIntegerField(default=0)
+	# Embedded in issued JWTs; bumping it revokes every token issued before
+	# (see users/tokens.py). `save()` bumps it when role, admin_level or
+	# is_active change.
+	auth_version = models.PositiveIntegerField(default=0)
+	# Bumped on every save (and by the queryset updates in users/review.py
+	# and users/auth_versions.py); the ETag of `/me/` is derived from it
+	# (see users/views.py).
+	updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+	class Meta(AbstractUser.Meta):
+		# Expression indexes back the case-insensitive prefix search used by
+		# the admin user list (see users/search.py); substring search goes
+		# through the trigram index created in migration 0005.
+		indexes = [
+			models.Index(Lower('username'), name='users_username_lower_idx'),
+			models.Index(Lower('email'), name='users_email_lower_idx'),
+			models.Index(Lower('first_name'), name='users_first_name_lower_idx'),
+			models.Index(Lower('last_name'), name='users_last_name_lower_idx'),
+			models.Index(fields=['role', 'admin_level'], name='users_role_level_idx'),
+		]
+
+	# Fields whose value at load time is remembered so `save()` and signal
+	# handlers can tell whether side effects tied to them (group membership,
+	# cached auth snapshots) need to run.
+	TRACKED_FIELDS = (
+		'role', 'admin_level', 'is_active', 'is_staff', 'is_superuser',
+		'username', 'email', 'first_name', 'last_name', 'auth_version',
+		'photo_id', 'updated_at',
+	)
+	# Changing any of these invalidates the authorization claims in JWTs.
+	AUTH_CLAIM_FIELDS = ('role', 'admin_level', 'is_active')
+
+	def __init__(self, *args, **kwargs):
+		super().__init__(*args, **kwargs)
+		self._remember_tracked_fields()
 
 	def __str__(self) -> str:
 		return self.username
 
+	def _remember_tracked_fields(self):
+		deferred = self.get_deferred_fields()
+		self._loaded_values = {
+			name: getattr(self, name) for name in self.TRACKED_FIELDS if name not in deferred
+		}
+
+	def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+		super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+		for name in self.TRACKED_FIELDS:
+			if fields is None or name in fields:
+				self._loaded_values[name] = getattr(self, name)
+
+	def has_field_changed(self, name) -> bool:
+		"""Return True if tracked field `name` differs from its value at load time.
+
+		Fields that were deferred when the instance was loaded are reported as
+		changed, since their original value is unknown.
+		"""
+		if name not in self._loaded_values:
+			return True
+		return self._loaded_values[name] != getattr(self, name)
+
 	# convenience helpers
 	def is_nutritionist(self) -> bool:
 		return self.role == self.ROLE_NUTRITIONIST
@@ -81,26 +152,34 @@ class CustomUser(AbstractUser):
 			# regulator/admin-level endpoints. Preserve any higher level.
 			if (not self.admin_level) or (self.admin_level < 50):
 				self.admin_level = 50
+		created = self._state.adding
+		update_fields = kwargs.get('update_fields')
+		if not created and any(self.has_field_changed(f) for f in self.AUTH_CLAIM_FIELDS):
+			if update_fields is None or any(f in update_fields for f in self.AUTH_CLAIM_FIELDS):
+				self.auth_version = (self.auth_version or 0) + 1
+				if update_fields is not None:
+					kwargs['update_fields'] = update_fields = list(update_fields) + ['auth_version']
+		if update_fields is not None and 'updated_at' not in update_fields:
+			# auto_now only applies to the fields being saved
+			kwargs['update_fields'] = update_fields = list(update_fields) + ['updated_at']
 		super_ret = super().save(*args, **kwargs)
 
 		# Ensure group membership mirrors role grouping used by the app.
-		# Groups: 'users' (default), 'regulators', 'admins'
-		try:
-			users_grp, _ = Group.objects.get_or_create(name='users')
-			regs_grp, _ = Group.objects.get_or_create(name='regulators')
-			admins_grp, _ = Group.objects.get_or_create(name='admins')
-
-			if self.role == self.ROLE_ADMIN:
-				self.groups.set([admins_grp])
-			elif self.role == self.ROLE_REGULATOR:
-				self.groups.set([regs_grp])
-			else:
-				# regular and nutritionist users belong to the 'users' group
-				self.groups.set([users_grp])
-		except Exception:
-			# Avoid raising errors on group management during migrations or
-			# when auth tables may not be ready.
-			pass
+		# Groups: 'users' (default), 'regulators', 'admins'. Only touch the
+		# membership table when the role could have changed: saves such as
+		# `save(update_fields=['last_login'])` or profile edits skip it.
+		if update_fields is not None and 'role' not in update_fields:
+			needs_sync = False
+		else:
+			needs_sync = created or self.has_field_changed('role')
+		if needs_sync:
+			try:
+				sync_user_group(self, created=created)
+			except Exception:
+				# Avoid raising errors on group management during migrations or
+				# when auth tables may not be ready.
+				pass
+		self._remember_tracked_fields()
 
 		return super_ret
 
@@ -138,9 +217,68 @@ class VerificationRequest(models.Model):
 	reviewed_by = models.ForeignKey(CustomUser, null=True, blank=True, on_delete=models.SET_NULL, related_name='reviewed_verifications')
 	reviewed_at = models.DateTimeField(null=True, blank=True)
 	created_at = models.DateTimeField(auto_now_add=True)
+	updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
 	class Meta:
 		ordering = ('-created_at',)
+		# keyset pagination walks (created_at, id), optionally per status
+		indexes = [
+			models.Index(fields=['created_at', 'id'], name='users_verif_created_id_idx'),
+			models.Index(fields=['status', 'created_at', 'id'], name='users_verif_status_created_idx'),
+		]
 
 	def __str__(self) -> str:
 		return f"{self.user.username} -> {self.requested_role} ({self.status})"
+
+
+class AuthTokenManager(models.Manager):
+	def for_user(self, user):
+		"""Return the user's newest unexpired token, creating one if there is none."""
+		token = self.filter(user=user, expires_at__gt=timezone.now()).order_by('-expires_at').first()
+		return token or self.create(user=user)
+
+
+class AuthToken(models.Model):
+	"""Opaque API token (`Authorization: Token <key>`) that expires.
+
+	Replaces DRF's permanent one-per-user `authtoken.Token`: a user may hold
+	several tokens (one per client), each valid until `expires_at`
+	(`AUTH_TOKEN_TTL` after it was issued or rotated). `last_used_at` is
+	written at most once per `AUTH_TOKEN_TOUCH_INTERVAL` (see
+	`users/authentication.py`), and `purge_tokens` deletes expired rows.
+	"""
+
+	key = models.CharField(max_length=40, primary_key=True)
+	user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='auth_tokens')
+	created = models.DateTimeField(default=timezone.now)
+	expires_at = models.DateTimeField(db_index=True)
+	last_used_at = models.DateTimeField(null=True, blank=True)
+
+	objects = AuthTokenManager()
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['user', 'expires_at'], name='users_authtoken_user_exp_idx'),
+		]
+
+	def save(self, *args, **kwargs):
+		if not self.key:
+			self.key = self.generate_key()
+		if self.expires_at is None:
+			self.expires_at = self.default_expiry()
+		return super().save(*args, **kwargs)
+
+	@staticmethod
+	def generate_key():
+		return binascii.hexlify(os.urandom(20)).decode()
+
+	@staticmethod
+	def default_expiry():
+		return timezone.now() + settings.AUTH_TOKEN_TTL
+
+	@property
+	def is_expired(self):
+		return self.expires_at <= timezone.now()
+
+	def __str__(self) -> str:
+		return f"token of {self.user_id} (expires {self.expires_at:%Y-%m-%d %H:%M})"
@@ -1,3 +1,9 @@
+"""Role and admin-level permission classes.
+
+They only read `role` / `admin_level` from `request.user`, which in
+stateless JWT mode is a `users.tokens.ClaimsUser` answering from token
+claims, so authorization needs no database query.
+"""
 from functools import wraps
 
 from rest_framework.permissions import BasePermission
@@ -0,0 +1,148 @@
+"""Approving and rejecting verification requests.
+
+`VerificationRequestReview` (one request) and `VerificationRequestBulkReview`
+(up to `BULK_REVIEW_MAX` requests) both run in a single transaction and
+apply approvals with set-based queries instead of per-user `save()` calls:
+
+- one UPDATE per requested role sets `role`, raises `admin_level` to the
+  role's minimum, sets the admin staff/superuser flags and bumps
+  `auth_version` (revoking issued JWTs), only for users whose values
+  actually change;
+- one DELETE and one INSERT per role replace the users' role group
+  membership (see `users/roles.py`).
+
+The values match what `CustomUser.save()` derives for the same role:
+regulators get `admin_level >= 50`, admins `admin_level >= 100` plus
+`is_staff` and `is_superuser`. Superusers are left alone since `save()`
+always keeps them in the admin role.
+
+Queryset updates bypass the `post_save` handlers, so callers run
+`invalidate_reviewed_users()` once the transaction is over (token and
+auth-version caches, and the response cache in `core/response_cache.py`).
+"""
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from core.conditional import bump_table_versions
+from core.response_cache import invalidate_model
+
+from .auth_versions import REVOKED, publish_auth_versions
+from .authentication import invalidate_user_tokens
+from .models import VerificationRequest
+from .roles import group_id_for_role
+from .verification import invalidate_verification_summary
+
+BULK_REVIEW_MAX = 1000
+
+REVIEW_STATUSES = (VerificationRequest.STATUS_APPROVED, VerificationRequest.STATUS_REJECTED)
+
+
+def min_admin_level_for_role(role):
+    User = get_user_model()
+    return {User.ROLE_ADMIN: 100, User.ROLE_REGULATOR: 50}.get(role, 0)
+
+
+def apply_approved_roles(assignments):
+    """Give each user in `{user_id: role}` the approved role.
+
+    Returns `{user_id: new auth_version}` for the users whose row changed
+    (`REVOKED` for inactive users). Must run inside a transaction; the user
+    rows are locked before they are updated.
+    """
+    User = get_user_model()
+    through = User.groups.through
+    by_role = defaultdict(list)
+    for user_id, role in assignments.items():
+        by_role[role].append(user_id)
+
+    changed = {}
+    for role in sorted(by_role):
+        min_level = min_admin_level_for_role(role)
+        stale = ~Q(role=role)
+        updates = {'role': role, 'auth_version': F('auth_version') + 1, 'updated_at': timezone.now()}
+        if min_level:
+            stale |= Q(admin_level__lt=min_level)
+            updates['admin_level'] = Greatest(F('admin_level'), Value(min_level))
+        if role == User.ROLE_ADMIN:
+            stale |= Q(is_staff=False)
+            updates.update(is_staff=True, is_superuser=True)
+        rows = list(
+            User.objects.select_for_update()
+            .filter(pk__in=by_role[role], is_superuser=False)
+            .filter(stale)
+            .order_by('pk')
+            .values_list('pk', 'auth_version', 'is_active')
+        )
+        if not rows:
+            continue
+        user_ids = [pk for pk, _, _ in rows]
+        User.objects.filter(pk__in=user_ids).update(**updates)
+        gid = group_id_for_role(role)
+        through.objects.filter(customuser_id__in=user_ids).exclude(group_id=gid).delete()
+        through.objects.bulk_create(
+            [through(customuser_id=user_id, group_id=gid) for user_id in user_ids],
+            ignore_conflicts=True,
+        )
+        # the rows are locked, so the bumped versions are known without a re-read
+        changed.update((pk, version + 1 if is_active else REVOKED) for pk, version, is_active in rows)
+    return changed
+
+
+def invalidate_reviewed_users(versions):
+    """Drop cached token snapshots and responses of updated users and publish
+    their new auth versions (`{user_id: version}` from `apply_approved_roles`)."""
+    for user_id in versions:
+        invalidate_user_tokens(user_id)
+    if versions:
+        publish_auth_versions(versions)
+        invalidate_model('users.CustomUser', list(versions))
+        bump_table_versions('users.CustomUser')
+
+
+@dataclass
+class BulkReviewResult:
+    reviewed: list = field(default_factory=list)
+    skipped: list = field(default_factory=list)
+    users_updated: int = 0
+
+
+def review_requests(request_ids, status, reviewer_id):
+    """Set `status` on the pending requests among `request_ids`.
+
+    Requests that do not exist or are no longer pending are reported as
+    skipped. When a user has several approved requests in the batch, the
+    most recent one wins.
+    """
+    request_ids = set(request_ids)
+    with transaction.atomic():
+        pending = list(
+            VerificationRequest.objects.select_for_update()
+            .filter(pk__in=request_ids, status=VerificationRequest.STATUS_PENDING)
+            .order_by('pk')
+            .values_list('pk', 'user_id', 'requested_role')
+        )
+        reviewed = [pk for pk, _, _ in pending]
+        changed = {}
+        if reviewed:
+            now = timezone.now()
+            VerificationRequest.objects.filter(pk__in=reviewed).update(
+                status=status, reviewed_by_id=reviewer_id, reviewed_at=now, updated_at=now,
+            )
+            if status == VerificationRequest.STATUS_APPROVED:
+                changed = apply_approved_roles({user_id: role for _, user_id, role in pending})
+    invalidate_reviewed_users(changed)
+    if reviewed:
+        invalidate_verification_summary()
+        invalidate_model('users.VerificationRequest', {user_id for _, user_id, _ in pending})
+        bump_table_versions('users.VerificationRequest')
+    return BulkReviewResult(
+        reviewed=reviewed,
+        skipped=sorted(request_ids.difference(reviewed)),
+        users_updated=len(changed),
+    )
@@ -0,0 +1,82 @@
+"""Role → group mapping and a per-process group registry.
+
+Every user belongs to exactly one of the role groups below. Resolving a group
+name to its primary key used to cost a `get_or_create` per group on every
+`CustomUser.save()`; the registry keeps the name → id mapping in memory for
+the lifetime of the process and is cleared by the signal handlers in
+`users/signals.py` whenever a Group is saved or deleted (or the auth tables
+are flushed/migrated).
+"""
+import threading
+
+from django.contrib.auth.models import Group
+from django.db import transaction
+
+GROUP_USERS = 'users'
+GROUP_REGULATORS = 'regulators'
+GROUP_ADMINS = 'admins'
+
+ROLE_GROUP_NAMES = (GROUP_USERS, GROUP_REGULATORS, GROUP_ADMINS)
+
+# roles not listed here (regular, nutritionist) fall into the 'users' group
+ROLE_TO_GROUP = {
+    'admin': GROUP_ADMINS,
+    'regulator': GROUP_REGULATORS,
+}
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def group_name_for_role(role):
+    """Return the name of the group that mirrors `role`."""
+    return ROLE_TO_GROUP.get(role, GROUP_USERS)
+
+
+def get_group_id(name):
+    """Return the primary key of group `name`, creating the group if needed."""
+    gid = _registry.get(name)
+    if gid is None:
+        group, _ = Group.objects.get_or_create(name=name)
+        gid = group.pk
+        # Only remember ids that are committed: a group created inside a
+        # transaction that later rolls back must not stay in the registry.
+        transaction.on_commit(lambda: _remember(name, gid))
+    return gid
+
+
+def _remember(name, gid):
+    with _registry_lock:
+        _registry[name] = gid
+
+
+def get_role_group_ids():
+    """Return a `{group name: id}` dict for all role groups."""
+    return {name: get_group_id(name) for name in ROLE_GROUP_NAMES}
+
+
+def group_id_for_role(role):
+    return get_group_id(group_name_for_role(role))
+
+
+def clear_group_registry():
+    with _registry_lock:
+        _registry.clear()
+
+
+def sync_user_group(user, created=False):
+    """Make the group matching `user.role` the user's only group.
+
+    For freshly created users there is nothing to remove, so a single INSERT
+    is issued. Otherwise stale memberships are deleted and the target one is
+    inserted if missing (the same end state as `user.groups.set([group])`
+    without reading the current membership first).
+    """
+    through = user.groups.through
+    gid = group_id_for_role(user.role)
+    if not created:
+        through.objects.filter(customuser_id=user.pk).exclude(group_id=gid).delete()
+    through.objects.bulk_create(
+        [through(customuser_id=user.pk, group_id=gid)],
+        ignore_conflicts=True,
+    )
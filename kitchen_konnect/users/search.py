@@ -0,0 +1,102 @@
+"""Server-side search and filtering for the admin user list.
+
+Search terms are matched case-insensitively against username, email,
+first/last name and role. Every term must match (AND); a term may match any
+of the fields.
+
+- Terms shorter than three characters are matched as prefixes using range
+  scans on the lower-cased expression indexes declared on `CustomUser.Meta`.
+- Longer terms are matched as substrings through the trigram index created in
+  migration 0005 (FTS5 on SQLite, pg_trgm on PostgreSQL). Other backends fall
+  back to unindexed `icontains`.
+
+SQLite drops the FTS triggers whenever a migration rebuilds
+users_customuser; such migrations reinstall them with the frozen helpers in
+`users/migrations/_sqlite_search.py`.
+"""
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Lower
+from rest_framework.exceptions import ValidationError
+
+SEARCH_FIELDS = ('username', 'email', 'first_name', 'last_name', 'role')
+PREFIX_FIELDS = ('username', 'email', 'first_name', 'last_name')
+MIN_TRIGRAM_LENGTH = 3
+MAX_TERMS = 5
+
+# Upper bound for prefix range scans: sorts after every character that can
+# follow the prefix.
+_PREFIX_END = '\U0010ffff'
+
+PG_SEARCH_DOCUMENT = (
+    "lower(username || ' ' || email || ' ' || first_name || ' ' || last_name || ' ' || role)"
+)
+
+INT_FILTERS = ('admin_level', 'admin_level__gte', 'admin_level__lte', 'admin_level__gt', 'admin_level__lt')
+
+
+def _fts_phrase(term):
+    return '"%s"' % term.replace('"', '""')
+
+
+def _prefix_q(queryset, term):
+    q = Q()
+    for name in PREFIX_FIELDS:
+        alias = f'_{name}_lower'
+        queryset = queryset.alias(**{alias: Lower(name)})
+        q |= Q(**{f'{alias}__gte': term, f'{alias}__lt': term + _PREFIX_END})
+    return queryset, q
+
+
+def _substring_filter(queryset, terms):
+    vendor = connections[queryset.db].vendor
+    if vendor == 'sqlite':
+        match = ' AND '.join(_fts_phrase(t) for t in terms)
+        return queryset.filter(id__in=RawSQL(
+            'SELECT rowid FROM users_customuser_fts WHERE users_customuser_fts MATCH %s', (match,)
+        ))
+    if vendor == 'postgresql':
+        queryset = queryset.alias(_search_doc=RawSQL(PG_SEARCH_DOCUMENT, ()))
+        for term in terms:
+            queryset = queryset.filter(_search_doc__contains=term)
+        return queryset
+    for term in terms:
+        q = Q()
+        for name in SEARCH_FIELDS:
+            q |= Q(**{f'{name}__icontains': term})
+        queryset = queryset.filter(q)
+    return queryset
+
+
+def search_users(queryset, text):
+    """Restrict `queryset` to users matching every whitespace-separated term."""
+    terms = [t for t in (text or '').lower().split() if t][:MAX_TERMS]
+    long_terms = [t for t in terms if len(t) >= MIN_TRIGRAM_LENGTH]
+    for term in terms:
+        if len(term) < MIN_TRIGRAM_LENGTH:
+            queryset, q = _prefix_q(queryset, term)
+            queryset = queryset.filter(q)
+    if long_terms:
+        queryset = _substring_filter(queryset, long_terms)
+    return queryset
+
+
+def filter_users(queryset, params):
+    """Apply `?search=`, `?role=` and `?admin_level[__gte|__lte|__gt|__lt]=` filters."""
+    role = params.get('role')
+    if role:
+        queryset = queryset.filter(role=role)
+    for name in INT_FILTERS:
+        value = params.get(name)
+        if value in (None, ''):
+            continue
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            raise ValidationError({name: 'Must be an integer.'})
+        queryset = queryset.filter(**{name: value})
+    search = params.get('search')
+    if search:
+        queryset = search_users(queryset, search)
+    return queryset
@@ -1,19 +1,28 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from core.images import variant_urls
+from core.instrumentation import InstrumentedSerializerMixin
 
 User = get_user_model()
 from .models import VerificationRequest
+from .review import BULK_REVIEW_MAX, REVIEW_STATUSES
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
+    # set through /api/auth/me/photo/
+    photo = serializers.SerializerMethodField()
+
     class Meta:
         model = User
         # Public-facing user serializer used for `/me/` and public APIs.
         # Keep this minimal to avoid leaking internal role/level metadata.
-        fields = ('id', 'username', 'email', 'first_name', 'last_name')
+        fields = ('id', 'username', 'email', 'first_name', 'last_name', 'photo')
+
+    def get_photo(self, user):
+        return variant_urls(user.photo_id)
 
 
-class RegisterSerializer(serializers.ModelSerializer):
+class RegisterSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, min_length=8)
 
     class Meta:
@@ -33,7 +42,7 @@ class RegisterSerializer(serializers.ModelSerializer):
         return user
 
 
-class AdminUserSerializer(serializers.ModelSerializer):
+class AdminUserSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('id', 'username', 'email', 'role', 'admin_level')
@@ -59,10 +68,18 @@ class AdminUserSerializer(serializers.ModelSerializer):
         return instance
 
 
-class VerificationRequestSerializer(serializers.ModelSerializer):
-    user = serializers.StringRelatedField(read_only=True)
+class VerificationRequestSerializer(InstrumentedSerializerMixin, serializers.ModelSerializer):
+    # Read from the joined user row (views select_related('user')) rather
+    # than calling str() on a lazily loaded instance per row.
+    user = serializers.CharField(source='user.username', read_only=True)
 
     class Meta:
         model = VerificationRequest
         fields = ('id', 'user', 'requested_role', 'message', 'status', 'reviewed_by', 'reviewed_at', 'created_at')
 
+
+class VerificationBulkReviewSerializer(InstrumentedSerializerMixin, serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=BULK_REVIEW_MAX,
+    )
+    status = serializers.ChoiceField(choices=REVIEW_STATUSES)
@@ -0,0 +1,77 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+from core.conditional import bump_table_versions
+from core.response_cache import invalidate_instance
+
+from .auth_versions import refresh_auth_versions, remember_auth_version
+from .authentication import SNAPSHOT_FIELDS, invalidate_token, invalidate_user_tokens
+from .models import AuthToken, VerificationRequest
+from .roles import clear_group_registry
+from .verification import invalidate_verification_summary
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_registry(sender, **kwargs):
+    clear_group_registry()
+
+
+@receiver(post_migrate)
+def invalidate_group_registry_after_migrate(sender, **kwargs):
+    # `flush` (used by TransactionTestCase) and migrations emit post_migrate
+    # without deleting Group rows one by one, so cached ids may be stale.
+    clear_group_registry()
+
+
+@receiver(post_save, sender=VerificationRequest)
+@receiver(post_delete, sender=VerificationRequest)
+def invalidate_verification_counts(sender, **kwargs):
+    invalidate_verification_summary()
+
+
+@receiver(post_save, sender=AuthToken)
+@receiver(post_delete, sender=AuthToken)
+def invalidate_cached_token(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+# `updated_at` moves on every save, the login's `last_login` one included;
+# the snapshot's copy only feeds the `/me/` ETag, whose fields are checked here
+SNAPSHOT_CHANGE_FIELDS = tuple(name for name in SNAPSHOT_FIELDS if name not in ('id', 'updated_at'))
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_cached_user_tokens(sender, instance, created, **kwargs):
+    if created:
+        # replaces what a deleted user with the same id left behind
+        remember_auth_version(instance)
+        return
+    if any(instance.has_field_changed(name) for name in SNAPSHOT_CHANGE_FIELDS):
+        invalidate_user_tokens(instance.pk)
+    if instance.has_field_changed('auth_version'):
+        remember_auth_version(instance)
+
+
+@receiver(post_delete, sender=get_user_model())
+def invalidate_deleted_user_tokens(sender, instance, **kwargs):
+    invalidate_user_tokens(instance.pk)
+    refresh_auth_versions([instance.pk])
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+@receiver(post_save, sender=VerificationRequest)
+@receiver(post_delete, sender=VerificationRequest)
+def invalidate_cached_responses(sender, instance, **kwargs):
+    invalidate_instance(instance)
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+@receiver(post_save, sender=VerificationRequest)
+@receiver(post_delete, sender=VerificationRequest)
+def bump_conditional_versions(sender, instance, **kwargs):
+    bump_table_versions(sender._meta.label)
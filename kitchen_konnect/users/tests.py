@@ -1,11 +1,50 @@
-from django.test import TestCase
+import base64
+import importlib.util
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from rest_framework.test import APITestCase
-import importlib.util
+
+from core.throttling import take_token
+
+from . import async_views, verification
+from .auth_versions import clear_local_auth_versions, get_auth_version
+from .authentication import cache_token_user, get_cached_token_snapshot, local_token_cache
+from .hashing import hashing_limiter
+from .models import AuthToken, VerificationRequest
+from .roles import get_group_id
+from .serializers import UserSerializer
+
+User = get_user_model()
+
+
+def clear_caches():
+	# user ids are reused between tests; drop what earlier ones cached
+	cache.clear()
+	local_token_cache.clear()
+	clear_local_auth_versions()
 
 
 class AuthAPITest(APITestCase):
 	def setUp(self):
+		clear_caches()
 		self.register_url = '/api/auth/register/'
 		self.token_url = '/api/auth/token/'
 		self.refresh_url = '/api/auth/token/refresh/'
@@ -48,9 +87,13 @@ class AuthAPITest(APITestCase):
 			self.assertEqual(refresh_resp.status_code, 200)
 			self.assertIn('access', refresh_resp.data)
 		else:
-			# session auth fallback
-			logged_in = self.client.login(username=self.user_data['username'], password=self.user_data['password'])
-			self.assertTrue(logged_in)
+			# expiring API token flow
+			token_resp = self.client.post(self.token_url, {
+				'username': self.user_data['username'],
+				'password': self.user_data['password'],
+			}, format='json')
+			self.assertEqual(token_resp.status_code, 200)
+			self.client.credentials(HTTP_AUTHORIZATION=f"Token {token_resp.data['token']}")
 			me_resp = self.client.get(self.me_url)
 			self.assertEqual(me_resp.status_code, 200)
 			self.assertEqual(me_resp.data['username'], self.user_data['username'])
@@ -76,10 +119,677 @@ class AuthAPITest(APITestCase):
 
 	def test_user_serializer_fields(self):
 		# ensure serializer exposes expected fields
-		from .serializers import UserSerializer
-		from django.contrib.auth import get_user_model
-		User = get_user_model()
-		u = User.objects.create_user(username='seruser', email='s@example.com', password='strongPass123', first_name='S', last_name='U')
+		u = User.objects.create_user(
+			username='seruser', email='s@example.com', password='strongPass123',
+			first_name='S', last_name='U',
+		)
 		data = UserSerializer(u).data
-		self.assertSetEqual(set(data.keys()), {'id', 'username', 'email', 'first_name', 'last_name'})
+		self.assertSetEqual(set(data.keys()), {'id', 'username', 'email', 'first_name', 'last_name', 'photo'})
+
+
+class RoleGroupSyncTest(TestCase):
+	@classmethod
+	def setUpTestData(cls):
+		cls.user = User.objects.create_user(username='grp', email='grp@example.com', password='strongPass123')
+
+	def group_names(self, user):
+		return sorted(user.groups.values_list('name', flat=True))
+
+	def test_new_user_joins_users_group(self):
+		self.assertEqual(self.group_names(self.user), ['users'])
+
+	def test_save_without_role_change_is_a_single_update(self):
+		user = User.objects.get(pk=self.user.pk)
+		user.bio = 'likes lentils'
+		with self.assertNumQueries(1):
+			user.save()
+		with self.assertNumQueries(1):
+			user.save(update_fields=['last_login'])
+
+	def test_role_change_moves_user_to_role_group(self):
+		user = User.objects.get(pk=self.user.pk)
+		user.role = User.ROLE_REGULATOR
+		user.save()
+		self.assertEqual(self.group_names(user), ['regulators'])
+		user.role = User.ROLE_NUTRITIONIST
+		user.save()
+		self.assertEqual(self.group_names(user), ['users'])
+
+	def test_registry_is_invalidated_when_group_deleted(self):
+		old_id = get_group_id('admins')
+		Group.objects.get(pk=old_id).delete()
+		self.assertNotEqual(get_group_id('admins'), old_id)
+
+
+class SyncGroupsCommandTest(TestCase):
+	def test_bulk_mode_repairs_memberships(self):
+		through = User.groups.through
+		users = [User.objects.create_user(username=f'bulk{i}', email=f'bulk{i}@example.com', password='strongPass123') for i in range(5)]
+		# simulate drift that per-instance saves would not notice
+		User.objects.filter(pk=users[0].pk).update(role=User.ROLE_ADMIN)
+		through.objects.filter(customuser_id=users[1].pk).delete()
+
+		out = StringIO()
+		call_command('sync_groups', '--bulk', '--dry-run', '--chunk-size', '2', stdout=out)
+		self.assertFalse(through.objects.filter(customuser_id=users[1].pk).exists())
+
+		call_command('sync_groups', '--bulk', '--chunk-size', '2', stdout=out)
+		self.assertEqual(list(users[0].groups.values_list('name', flat=True)), ['admins'])
+		self.assertEqual(list(users[1].groups.values_list('name', flat=True)), ['users'])
+		self.assertIn('2 membership(s) added and 1 removed', out.getvalue().splitlines()[-1])
+
+
+class AdminUserSearchTest(APITestCase):
+	url = '/api/auth/admin/users/'
+
+	@classmethod
+	def setUpTestData(cls):
+		cls.admin = User.objects.create_user(
+			username='boss', email='boss@example.com', password='strongPass123',
+			role=User.ROLE_ADMIN, admin_level=60,
+		)
+		User.objects.create_user(username='alice', email='alice@kitchen.org', password='strongPass123', first_name='Alice', last_name='Waters')
+		User.objects.create_user(username='bob', email='bob@example.com', password='strongPass123', role=User.ROLE_REGULATOR)
+
+	def setUp(self):
+		clear_caches()
+		self.client.force_authenticate(self.admin)
+
+	def usernames(self, params):
+		resp = self.client.get(self.url, params)
+		self.assertEqual(resp.status_code, 200)
+		return [u['username'] for u in resp.data['results']]
+
+	def test_substring_and_prefix_search(self):
+		self.assertEqual(self.usernames({'search': 'kitchen'}), ['alice'])
+		self.assertEqual(self.usernames({'search': 'WATERS'}), ['alice'])
+		self.assertEqual(self.usernames({'search': 'bo'}), ['boss', 'bob'])
+		self.assertEqual(self.usernames({'search': 'regulator'}), ['bob'])
+
+	def test_search_index_follows_updates(self):
+		User.objects.filter(username='alice').update(email='alice@pantry.net')
+		self.assertEqual(self.usernames({'search': 'kitchen'}), [])
+		self.assertEqual(self.usernames({'search': 'pantry'}), ['alice'])
+
+	def test_role_and_admin_level_filters(self):
+		self.assertEqual(self.usernames({'role': 'regulator'}), ['bob'])
+		self.assertEqual(self.usernames({'admin_level__gte': '55'}), ['boss'])
+		resp = self.client.get(self.url, {'admin_level__gte': 'high'})
+		self.assertEqual(resp.status_code, 400)
+
+
+class KeysetPaginationTest(APITestCase):
+	@classmethod
+	def setUpTestData(cls):
+		cls.admin = User.objects.create_user(
+			username='pager', email='pager@example.com', password='strongPass123',
+			role=User.ROLE_ADMIN, admin_level=60,
+		)
+		for i in range(5):
+			u = User.objects.create_user(username=f'req{i}', email=f'req{i}@example.com', password='strongPass123')
+			VerificationRequest.objects.create(user=u, requested_role='nutritionist')
+
+	def setUp(self):
+		clear_caches()
+		self.client.force_authenticate(self.admin)
+
+	def walk(self, url):
+		ids, pages = [], []
+		while url:
+			resp = self.client.get(url)
+			self.assertEqual(resp.status_code, 200)
+			self.assertNotIn('count', resp.data)
+			ids += [r['id'] for r in resp.data['results']]
+			pages.append(resp.data)
+			url = resp.data['next']
+		return ids, pages
+
+	def test_cursor_walks_every_row_once(self):
+		ids, pages = self.walk('/api/auth/verification/requests/?cursor=&page_size=2')
+		expected = list(VerificationRequest.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+		self.assertEqual(ids, expected)
+		self.assertEqual(len(pages), 3)
+		# stepping back from the last page returns the middle page
+		back = self.client.get(pages[-1]['previous'])
+		self.assertEqual([r['id'] for r in back.data['results']], expected[2:4])
+
+	def test_page_number_mode_is_default(self):
+		resp = self.client.get('/api/auth/admin/users/')
+		self.assertEqual(resp.data['count'], 6)
+
+	def test_invalid_cursor(self):
+		resp = self.client.get('/api/auth/admin/users/', {'cursor': 'not-a-cursor'})
+		self.assertEqual(resp.status_code, 404)
+
+
+class VerificationListQueriesTest(APITestCase):
+	@classmethod
+	def setUpTestData(cls):
+		cls.admin = User.objects.create_user(
+			username='rev', email='rev@example.com', password='strongPass123',
+			role=User.ROLE_ADMIN, admin_level=60,
+		)
+		roles = ['nutritionist', 'nutritionist', 'regulator', 'admin']
+		cls.requests = []
+		for i, role in enumerate(roles):
+			u = User.objects.create_user(username=f'applicant{i}', email=f'applicant{i}@example.com', password='strongPass123')
+			cls.requests.append(VerificationRequest.objects.create(user=u, requested_role=role, reviewed_by=cls.admin))
+
+	def setUp(self):
+		clear_caches()
+		self.client.force_authenticate(self.admin)
+
+	def test_list_does_not_query_per_row(self):
+		# one COUNT for page-number pagination plus one joined SELECT
+		with self.assertNumQueries(2):
+			resp = self.client.get('/api/auth/verification/requests/')
+		self.assertEqual(resp.data['results'][0]['user'], 'applicant3')
+		self.assertEqual(resp.data['results'][0]['reviewed_by'], self.admin.pk)
+
+	def test_summary_is_cached_until_a_request_changes(self):
+		url = '/api/auth/verification/requests/summary/'
+		resp = self.client.get(url)
+		self.assertEqual(resp.data['total'], 4)
+		self.assertEqual(resp.data['by_status']['pending'], 4)
+		self.assertEqual(resp.data['by_role'], {'nutritionist': 2, 'regulator': 1, 'admin': 1})
+		with self.assertNumQueries(0):
+			self.client.get(url)
+
+		req = self.requests[0]
+		req.status = req.STATUS_REJECTED
+		with self.captureOnCommitCallbacks(execute=True):
+			req.save()
+		resp = self.client.get(url)
+		self.assertEqual(resp.data['by_status']['rejected'], 1)
+		self.assertEqual(resp.data['by_status_and_role']['pending']['nutritionist'], 1)
+
+	def test_summary_counted_during_a_change_is_not_served(self):
+		url = '/api/auth/verification/requests/summary/'
+		compute = verification.compute_verification_summary
+
+		def counted_while_a_request_changes():
+			summary = compute()
+			req = self.requests[0]
+			req.status = req.STATUS_REJECTED
+			with self.captureOnCommitCallbacks(execute=True):
+				req.save()
+			return summary
+
+		with mock.patch.object(verification, 'compute_verification_summary', counted_while_a_request_changes):
+			self.assertEqual(self.client.get(url).data['by_status']['rejected'], 0)
+		self.assertEqual(self.client.get(url).data['by_status']['rejected'], 1)
+
+
+class CachedTokenAuthenticationTest(APITestCase):
+	@classmethod
+	def setUpTestData(cls):
+		cls.user = User.objects.create_user(username='cached', email='cached@example.com', password='strongPass123')
+		cls.token = AuthToken.objects.create(user=cls.user)
+
+	def setUp(self):
+		clear_caches()
+		self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+	def test_token_lookup_is_served_from_cache(self):
+		self.assertEqual(self.client.get('/api/auth/me/').status_code, 200)
+		with self.assertNumQueries(0):
+			resp = self.client.get('/api/auth/me/')
+		self.assertEqual(resp.data['username'], 'cached')
+
+	def test_role_change_and_token_deletion_invalidate_cache(self):
+		self.assertEqual(self.client.get('/api/auth/nutritionist-area/').status_code, 403)
+		self.user.role = self.user.ROLE_NUTRITIONIST
+		self.user.save()
+		self.assertEqual(self.client.get('/api/auth/nutritionist-area/').status_code, 200)
+		self.token.delete()
+		self.assertEqual(self.client.get('/api/auth/me/').status_code, 401)
+
+	def test_login_save_keeps_cached_tokens(self):
+		self.assertEqual(self.client.get('/api/auth/me/').status_code, 200)
+		user = User.objects.get(pk=self.user.pk)
+		user.last_login = timezone.now()
+		user.save(update_fields=['last_login'])
+		local_token_cache.clear()
+		self.assertIsNotNone(get_cached_token_snapshot(self.token.key))
+
+	def test_user_change_drops_every_cached_token(self):
+		other = AuthToken.objects.create(user=self.user)
+		for key in (self.token.key, other.key):
+			resp = self.client.get('/api/auth/me/', HTTP_AUTHORIZATION=f'Token {key}')
+			self.assertEqual(resp.status_code, 200)
+		self.user.is_active = False
+		self.user.save()
+		local_token_cache.clear()
+		for key in (self.token.key, other.key):
+			self.assertIsNone(get_cached_token_snapshot(key))
+			resp = self.client.get('/api/auth/me/', HTTP_AUTHORIZATION=f'Token {key}')
+			self.assertEqual(resp.status_code, 401)
+
+	def test_snapshot_cached_before_commit_is_dropped_on_commit(self):
+		self.assertEqual(self.client.get('/api/auth/me/').status_code, 200)
+		stale = User.objects.get(pk=self.user.pk)
+		with self.captureOnCommitCallbacks(execute=True):
+			self.user.is_active = False
+			self.user.save()
+			# a request in another worker read the row before the commit
+			cache_token_user(self.token.key, stale, self.token)
+		local_token_cache.clear()
+		self.assertIsNone(get_cached_token_snapshot(self.token.key))
+		self.assertEqual(self.client.get('/api/auth/me/').status_code, 401)
+
+	def test_unknown_scheme_is_anonymous(self):
+		self.client.credentials(HTTP_AUTHORIZATION='Digest abc')
+		self.assertIn(self.client.get('/api/auth/me/').status_code, (401, 403))
+
+	def test_basic_and_session_credentials_are_not_accepted(self):
+		self.user.admin_level = 100
+		self.user.save()
+		basic = 'Basic ' + base64.b64encode(b'cached:strongPass123').decode()
+		self.client.credentials(HTTP_AUTHORIZATION=basic)
+		for url in ('/api/auth/me/', '/api/auth/admin/users/'):
+			self.assertEqual(self.client.get(url).status_code, 401)
+		self.client.credentials()
+		self.client.force_login(self.user)
+		for url in ('/api/auth/me/', '/api/auth/admin/users/'):
+			self.assertEqual(self.client.get(url).status_code, 401)
+
+
+class ExpiringTokenTest(APITestCase):
+	@classmethod
+	def setUpTestData(cls):
+		cls.user = User.objects.create_user(username='expiring', email='expiring@example.com', password=None)
+		cls.token = AuthToken.objects.create(user=cls.user)
+
+	def setUp(self):
+		clear_caches()
+		self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+	def test_expired_tokens_are_refused_from_cache_too(self):
+		self.assertEqual(self.client.get('/api/auth/me/').status_code, 200)
+		# expire it behind the cache's back (no signal): the cached expiry decides
+		AuthToken.objects.filter(pk=self.token.pk).update(expires_at=timezone.now() - timedelta(seconds=1))
+		self.assertEqual(self.client.get('/api/auth/me/').status_code, 200)
+		self.token.refresh_from_db()
+		self.token.save()  # drops the cached entry
+		resp = self.client.get('/api/auth/me/')
+		self.assertEqual((resp.status_code, str(resp.data['detail'])), (401, 'Token has expired.'))
+
+	def test_last_used_is_written_once_per_interval(self):
+		self.assertIsNone(self.token.last_used_at)
+		self.client.get('/api/auth/me/')
+		first = AuthToken.objects.get(pk=self.token.pk).last_used_at
+		self.assertIsNotNone(first)
+		with self.assertNumQueries(0):
+			self.client.get('/api/auth/nutritionist-area/')
+		self.assertEqual(AuthToken.objects.get(pk=self.token.pk).last_used_at, first)
+		with self.settings(AUTH_TOKEN_TOUCH_INTERVAL=0):
+			cache.clear()
+			self.client.get('/api/auth/me/')
+		self.assertGreater(AuthToken.objects.get(pk=self.token.pk).last_used_at, first)
+
+	def test_rotation_replaces_the_key(self):
+		resp = self.client.post('/api/auth/token/rotate/')
+		self.assertEqual(resp.status_code, 200)
+		self.assertNotEqual(resp.data['token'], self.token.key)
+		self.assertEqual(self.client.get('/api/auth/me/').status_code, 401)
+		self.client.credentials(HTTP_AUTHORIZATION=f"Token {resp.data['token']}")
+		self.assertEqual(self.client.get('/api/auth/me/').data['username'], 'expiring')
+
+	def test_purge_deletes_expired_tokens_in_batches(self):
+		past = timezone.now() - timedelta(days=1)
+		for _ in range(5):
+			AuthToken.objects.create(user=self.user, expires_at=past)
+		out = StringIO()
+		call_command('purge_tokens', '--batch-size', '2', stdout=out)
+		self.assertEqual(list(AuthToken.objects.values_list('pk', flat=True)), [self.token.pk])
+		self.assertIn('API tokens: 5 expired.', out.getvalue())
+		self.assertEqual(out.getvalue().count('users.AuthToken:'), 3)
+
+
+class JWTClaimsTest(APITestCase):
+	@classmethod
+	def setUpTestData(cls):
+		cls.user = User.objects.create_user(
+			username='claims', email='claims@example.com', password='strongPass123',
+			role='nutritionist',
+		)
+
+	def setUp(self):
+		clear_caches()
+
+	def obtain(self):
+		resp = self.client.post('/api/auth/token/', {'username': 'claims', 'password': 'strongPass123'}, format='json')
+		self.assertEqual(resp.status_code, 200)
+		return resp.data
+
+	def test_tokens_carry_authorization_claims(self):
+		# SimpleJWT is optional
+		from rest_framework_simplejwt.tokens import AccessToken
+		token = AccessToken(self.obtain()['access'])
+		self.assertEqual(token['role'], 'nutritionist')
+		self.assertEqual(token['admin_level'], 0)
+		self.assertEqual(token['auth_version'], self.user.auth_version)
+
+	def test_stateless_mode_authorizes_from_claims(self):
+		access = self.obtain()['access']
+		self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+		with override_settings(JWT_STATELESS_AUTH=True):
+			self.client.get('/api/auth/nutritionist-area/')
+			with self.assertNumQueries(0):
+				resp = self.client.get('/api/auth/nutritionist-area/')
+			self.assertEqual(resp.status_code, 200)
+			self.assertEqual(self.client.get('/api/auth/me/').data['username'], 'claims')
+
+	def test_role_change_revokes_issued_tokens(self):
+		tokens = self.obtain()
+		self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+		self.assertEqual(self.client.get('/api/auth/me/').status_code, 200)
+		self.user.role = User.ROLE_REGULAR
+		self.user.save()
+		self.assertEqual(self.client.get('/api/auth/me/').status_code, 401)
+		with override_settings(JWT_STATELESS_AUTH=True):
+			self.assertEqual(self.client.get('/api/auth/me/').status_code, 401)
+		refresh = self.client.post('/api/auth/token/refresh/', {'refresh': tokens['refresh']}, format='json')
+		self.assertEqual(refresh.status_code, 401)
+
+	def test_rolled_back_change_leaves_cached_version(self):
+		version = get_auth_version(self.user.pk)
+		with self.assertRaises(RuntimeError), transaction.atomic():
+			self.user.role = User.ROLE_REGULAR
+			self.user.save()
+			raise RuntimeError
+		clear_local_auth_versions()
+		self.assertEqual(get_auth_version(self.user.pk), version)
+
+	def test_reader_cannot_overwrite_a_version_published_after_its_read(self):
+		stale = self.user.auth_version
+		user = User.objects.get(pk=self.user.pk)
+
+		def read_then_commit(user_id):
+			# the writer commits between the reader's query and its cache fill
+			with self.captureOnCommitCallbacks(execute=True):
+				user.role = User.ROLE_REGULAR
+				user.save()
+			return stale
+
+		with mock.patch('users.auth_versions._load_auth_version', side_effect=read_then_commit):
+			self.assertEqual(get_auth_version(self.user.pk), stale + 1)
+		clear_local_auth_versions()
+		self.assertEqual(get_auth_version(self.user.pk), stale + 1)
+
+
+class BulkUserImportTest(APITestCase):
+	CSV = (
+		'username,email,password,first_name,desired_role\n'
+		'clinic1,clinic1@example.com,strongPass123,Ann,\n'
+		'clinic2,clinic2@example.com,strongPass123,Ben,nutritionist\n'
+		'clinic3,not-an-email,strongPass123,Cat,\n'
+		'clinic1,other@example.com,strongPass123,Dup,\n'
+		'clinic4,clinic4@example.com,short,Dee,\n'
+	)
+
+	@classmethod
+	def setUpTestData(cls):
+		cls.admin = User.objects.create_user(
+			username='root', email='root@example.com', password='strongPass123',
+			role=User.ROLE_ADMIN, admin_level=100,
+		)
+
+	def setUp(self):
+		self.client.force_authenticate(self.admin)
+
+	def test_command_imports_valid_rows_and_reports_errors(self):
+		with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as fh:
+			fh.write(self.CSV)
+		self.addCleanup(os.unlink, fh.name)
+		out, err = StringIO(), StringIO()
+		call_command('import_users', fh.name, '--workers', '2', '--chunk-size', '2', stdout=out, stderr=err)
+
+		imported = User.objects.exclude(pk=self.admin.pk).values_list('username', flat=True)
+		self.assertEqual(sorted(imported), ['clinic1', 'clinic2'])
+		user = User.objects.get(username='clinic2')
+		self.assertTrue(user.check_password('strongPass123'))
+		self.assertTrue(AuthToken.objects.filter(user=user).exists())
+		self.assertEqual(list(user.groups.values_list('name', flat=True)), ['users'])
+		self.assertEqual(VerificationRequest.objects.get(user=user).requested_role, 'nutritionist')
+		self.assertEqual(len(err.getvalue().splitlines()), 3)
+
+	def test_admin_endpoint_accepts_ndjson_upload(self):
+		rows = [
+			{'username': 'nd1', 'email': 'nd1@example.com', 'password': 'strongPass123'},
+			{'username': 'root', 'email': 'nd2@example.com', 'password': 'strongPass123'},
+		]
+		upload = SimpleUploadedFile('users.ndjson', '\n'.join(json.dumps(r) for r in rows).encode(), content_type='application/x-ndjson')
+		resp = self.client.post('/api/auth/admin/users/import/', {'file': upload}, format='multipart')
+		self.assertEqual(resp.status_code, 201)
+		self.assertEqual(resp.data['created'], 1)
+		self.assertEqual(resp.data['errors'], [{'line': 2, 'error': 'username or email already exists'}])
+
+	def test_admin_endpoint_accepts_raw_csv_body(self):
+		resp = self.client.post('/api/auth/admin/users/import/', self.CSV, content_type='text/csv')
+		self.assertEqual(resp.status_code, 201)
+		self.assertEqual(resp.data['created'], 2)
+		self.assertEqual(resp.data['error_count'], 3)
+		self.assertEqual(sorted(User.objects.filter(username__startswith='clinic').values_list('username', flat=True)), ['clinic1', 'clinic2'])
+
+	def test_admin_endpoint_input_format_and_dry_run(self):
+		body = json.dumps({'username': 'nd1', 'email': 'nd1@example.com', 'password': 'strongPass123'})
+		resp = self.client.post('/api/auth/admin/users/import/?input_format=ndjson&dry_run=1', body, content_type='application/octet-stream')
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual((resp.data['created'], resp.data['error_count']), (1, 0))
+		self.assertFalse(User.objects.filter(username='nd1').exists())
+		resp = self.client.post('/api/auth/admin/users/import/?input_format=ndjson', body, content_type='application/octet-stream')
+		self.assertEqual(resp.status_code, 201)
+		self.assertTrue(User.objects.filter(username='nd1').exists())
+
+
+class AsyncAuthViewsTest(TestCase):
+	basic = 'Basic ' + base64.b64encode(b'async:strongPass123').decode()
+
+	@classmethod
+	def setUpTestData(cls):
+		cls.user = User.objects.create_user(username='async', email='async@example.com', password='strongPass123')
+		cls.token = AuthToken.objects.create(user=cls.user)
+
+	def setUp(self):
+		clear_caches()
+		self.factory = AsyncRequestFactory()
+
+	def post(self, view, data):
+		return view(self.factory.post('/', json.dumps(data), content_type='application/json'))
+
+	def get(self, view, auth=None):
+		return view(self.factory.get('/', headers={'Authorization': auth} if auth else None))
+
+	async def test_register_hashes_off_loop_and_issues_tokens(self):
+		resp = await self.post(async_views.register, {
+			'username': 'newasync', 'email': 'newasync@example.com', 'password': 'strongPass123', 'desired_role': 'nutritionist',
+		})
+		self.assertEqual(resp.status_code, 201)
+		self.assertIn('token', json.loads(resp.content))
+		user = await User.objects.aget(username='newasync')
+		self.assertTrue(await sync_to_async(user.check_password)('strongPass123'))
+		self.assertEqual(await user.groups.acount(), 1)
+		self.assertEqual(await user.verification_requests.acount(), 1)
+		dup = await self.post(async_views.register, {'username': 'newasync', 'email': 'x@example.com', 'password': 'strongPass123'})
+		self.assertEqual(dup.status_code, 400)
+
+	async def test_obtain_token(self):
+		ok = await self.post(async_views.obtain_token, {'username': 'async', 'password': 'strongPass123'})
+		self.assertEqual(ok.status_code, 200)
+		bad = await self.post(async_views.obtain_token, {'username': 'async', 'password': 'wrong-password'})
+		self.assertIn(bad.status_code, (400, 401))
+		missing = await self.post(async_views.obtain_token, {'username': 'nobody', 'password': 'strongPass123'})
+		self.assertIn(missing.status_code, (400, 401))
+
+	async def test_me_and_role_areas(self):
+		resp = await self.get(async_views.me, f'Token {self.token.key}')
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(json.loads(resp.content)['username'], 'async')
+		self.assertEqual((await self.get(async_views.me, self.basic)).status_code, 401)
+		self.assertEqual((await self.get(async_views.me)).status_code, 401)
+		self.assertEqual((await self.get(async_views.me, 'Token not-a-key')).status_code, 401)
+		self.assertEqual((await self.get(async_views.nutritionist_area, f'Token {self.token.key}')).status_code, 403)
+		self.assertEqual((await self.get(async_views.admin_area, f'Token {self.token.key}')).status_code, 403)
+
+
+class VerificationReviewTest(APITestCase):
+	@classmethod
+	def setUpTestData(cls):
+		cls.admin = User.objects.create_user(
+			username='reviewer', email='reviewer@example.com', password=None,
+			role='admin', admin_level=100,
+		)
+
+	def setUp(self):
+		clear_caches()
+		self.client.force_authenticate(self.admin)
+
+	def make_requests(self, count, role='regulator'):
+		users = [
+			User.objects.create_user(username=f'{role}{i}', email=f'{role}{i}@example.com', password=None)
+			for i in range(count)
+		]
+		return [VerificationRequest.objects.create(user=u, requested_role=role) for u in users]
+
+	def test_single_review_applies_role_in_one_transaction(self):
+		req = self.make_requests(1)[0]
+		user = req.user
+		resp = self.client.patch(f'/api/auth/verification/requests/{req.pk}/', {'status': 'approved'}, format='json')
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(resp.data['reviewed_by'], self.admin.pk)
+		user.refresh_from_db()
+		self.assertEqual((user.role, user.admin_level), ('regulator', 50))
+		self.assertEqual(user.auth_version, 1)
+		self.assertEqual(list(user.groups.values_list('name', flat=True)), ['regulators'])
+
+	def test_bulk_approve_uses_set_based_queries(self):
+		small = self.make_requests(2, role='admin')
+		with CaptureQueriesContext(connection) as small_ctx:
+			self.client.post('/api/auth/verification/requests/review/', {'ids': [r.pk for r in small], 'status': 'approved'}, format='json')
+		large = self.make_requests(30, role='nutritionist')
+		rejected = self.make_requests(1, role='regulator')[0]
+		rejected.status = VerificationRequest.STATUS_REJECTED
+		rejected.save()
+		ids = [r.pk for r in large] + [rejected.pk, 999999]
+		# the query count does not depend on the number of requests
+		with self.assertNumQueries(len(small_ctx.captured_queries)):
+			resp = self.client.post('/api/auth/verification/requests/review/', {'ids': ids, 'status': 'approved'}, format='json')
+		self.assertEqual(resp.status_code, 200)
+		self.assertEqual(len(resp.data['reviewed']), 30)
+		self.assertEqual(resp.data['skipped'], sorted([rejected.pk, 999999]))
+		self.assertEqual(resp.data['users_updated'], 30)
+
+		admin_user = User.objects.get(pk=small[0].user_id)
+		self.assertEqual((admin_user.role, admin_user.admin_level, admin_user.is_staff, admin_user.is_superuser), ('admin', 100, True, True))
+		self.assertEqual(list(admin_user.groups.values_list('name', flat=True)), ['admins'])
+		self.assertEqual(User.objects.filter(role='nutritionist', groups__name='users').count(), 30)
+		self.assertFalse(VerificationRequest.objects.filter(pk__in=[r.pk for r in large]).exclude(status='approved', reviewed_by=self.admin).exists())
+
+	def test_bulk_reject_leaves_users_and_revokes_nothing(self):
+		reqs = self.make_requests(3)
+		resp = self.client.post('/api/auth/verification/requests/review/', {'ids': [r.pk for r in reqs], 'status': 'rejected'}, format='json')
+		self.assertEqual(resp.data['users_updated'], 0)
+		self.assertFalse(User.objects.filter(role='regulator').exists())
+		bad = self.client.post('/api/auth/verification/requests/review/', {'ids': [], 'status': 'pending'}, format='json')
+		self.assertEqual(bad.status_code, 400)
+
+
+class AuthThrottlingTest(APITestCase):
+	def setUp(self):
+		cache.clear()
+		rates = {'auth.ip': '3/min', 'auth.username': '2/min', 'auth.route': '100/min'}
+		throttled = override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates})
+		throttled.enable()
+		self.addCleanup(throttled.disable)
+
+	def login(self, username, ip='10.0.0.1'):
+		return self.client.post('/api/auth/token/', {'username': username, 'password': 'wrong-password'}, format='json', REMOTE_ADDR=ip)
+
+	def test_username_and_ip_buckets(self):
+		self.assertNotEqual(self.login('victim', ip='10.0.0.1').status_code, 429)
+		self.assertNotEqual(self.login('victim', ip='10.0.0.2').status_code, 429)
+		# a third address still shares the username bucket
+		resp = self.login('victim', ip='10.0.0.3')
+		self.assertEqual(resp.status_code, 429)
+		self.assertGreater(int(resp['Retry-After']), 0)
+		# other usernames from a fresh address pass until that address runs dry
+		for name in ('a', 'b', 'c'):
+			self.assertNotEqual(self.login(name, ip='10.0.0.9').status_code, 429)
+		self.assertEqual(self.login('d', ip='10.0.0.9').status_code, 429)
+
+	def test_forwarded_for_does_not_pick_the_ip_bucket(self):
+		for name in ('a', 'b', 'c', 'd'):
+			resp = self.client.post(
+				'/api/auth/token/', {'username': name, 'password': 'wrong-password'}, format='json',
+				REMOTE_ADDR='10.0.0.7', HTTP_X_FORWARDED_FOR=f'203.0.113.{ord(name)}',
+			)
+		self.assertEqual(resp.status_code, 429)
+
+	def test_bucket_refills(self):
+		self.assertEqual(take_token('bucket', 2, 60, now=0), 0)
+		self.assertEqual(take_token('bucket', 2, 60, now=0), 0)
+		self.assertAlmostEqual(take_token('bucket', 2, 60, now=0), 60)
+		self.assertAlmostEqual(take_token('bucket', 2, 60, now=20), 40)
+		# the previous window's takes refill over the next period
+		self.assertAlmostEqual(take_token('bucket', 2, 60, now=60), 30)
+		self.assertAlmostEqual(take_token('bucket', 2, 60, now=80), 10)
+		self.assertEqual(take_token('bucket', 2, 60, now=90), 0)
+		self.assertAlmostEqual(take_token('bucket', 2, 60, now=90), 30)
+
+	def test_concurrent_takes_share_no_token(self):
+		# cache connections are per thread: slow down the backend class
+		backend = type(caches['default'])
+		get = backend.get
+
+		def slow_get(self, *args, **kwargs):
+			# widen any gap between reading and writing a bucket
+			value = get(self, *args, **kwargs)
+			time.sleep(0.01)
+			return value
+
+		def race(count):
+			barrier = threading.Barrier(count)
+			waits = []
+
+			def take():
+				barrier.wait()
+				waits.append(take_token('shared', 5, 60, now=0))
+
+			threads = [threading.Thread(target=take) for _ in range(count)]
+			with mock.patch.object(backend, 'get', slow_get):
+				for thread in threads:
+					thread.start()
+				for thread in threads:
+					thread.join()
+			return waits.count(0)
+
+		self.assertEqual(race(20), 5)
+		# the empty bucket stays empty however many requests race for it
+		self.assertEqual(race(20), 0)
+
+	def test_busy_process_sheds_hashing_requests_only(self):
+		user = User.objects.create_user(username='cheap', email='cheap@example.com', password=None)
+		token = AuthToken.objects.create(user=user)
+		hashing_limiter.active = hashing_limiter.limit
+		try:
+			resp = self.client.post('/api/auth/register/', {'username': 'shed', 'email': 'shed@example.com', 'password': 'strongPass123'}, format='json')
+			self.assertEqual((resp.status_code, resp['Retry-After']), (503, '1'))
+			self.assertEqual(self.login('shed').status_code, 503)
+			me = self.client.get('/api/auth/me/', HTTP_AUTHORIZATION=f'Token {token.key}')
+			self.assertEqual(me.status_code, 200)
+		finally:
+			hashing_limiter.active = 0
+		self.assertEqual(self.login('shed').status_code, 401 if importlib.util.find_spec('rest_framework_simplejwt') else 400)
+		self.assertEqual(hashing_limiter.active, 0)
 
+	async def test_async_views_are_throttled(self):
+		factory = AsyncRequestFactory()
+		statuses = []
+		for _ in range(3):
+			request = factory.post('/', json.dumps({'username': 'victim', 'password': 'wrong-password'}), content_type='application/json')
+			resp = await async_views.obtain_token(request)
+			statuses.append(resp.status_code)
+		self.assertEqual(statuses[2], 429)
+		self.assertNotIn(429, statuses[:2])
+		self.assertIn('Retry-After', resp)
@@ -0,0 +1,112 @@
+"""JWT authorization claims and revocation by `auth_version`.
+
+Tokens issued by `RegisterView` and the `/token/` endpoint carry the user's
+`role`, `admin_level` and `auth_version`. `AuthClaimsJWTAuthentication`
+rejects tokens whose `auth_version` is older than the user's current one,
+which is how tokens are revoked: `CustomUser.save()` bumps the version when
+role, admin_level or is_active change, and bulk code paths call
+`users.auth_versions.bump_auth_version`.
+
+With `JWT_STATELESS_AUTH = True` the authenticator does not load the user
+row at all: `request.user` is a `ClaimsUser` built from the token and the
+permission classes in `users/permissions.py` authorize from its claims. The
+version check then goes through the small per-process map in
+`users/auth_versions.py`, backed by the shared cache, so a request needs no
+database query.
+
+This module imports SimpleJWT and must only be imported when it is installed.
+"""
+from django.conf import settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+
+from core.instrumentation import InstrumentedViewMixin
+from .auth_versions import get_auth_version
+from .views import PasswordHashingMixin
+
+AUTH_VERSION_CLAIM = 'auth_version'
+
+
+def add_authorization_claims(token, user):
+    token['username'] = user.get_username()
+    token['role'] = user.role
+    token['admin_level'] = int(user.admin_level or 0)
+    token[AUTH_VERSION_CLAIM] = int(user.auth_version or 0)
+    return token
+
+
+def refresh_token_for_user(user):
+    """`RefreshToken.for_user` plus authorization claims (copied to access tokens)."""
+    return add_authorization_claims(RefreshToken.for_user(user), user)
+
+
+class ClaimsUser(TokenUser):
+    """Request user built from a validated token without a database query."""
+
+    @property
+    def role(self):
+        return self.token.get('role', '')
+
+    @property
+    def admin_level(self):
+        return int(self.token.get('admin_level', 0) or 0)
+
+    @property
+    def auth_version(self):
+        return int(self.token.get(AUTH_VERSION_CLAIM, 0) or 0)
+
+
+def check_auth_version(validated_token, current_version):
+    if current_version is None or validated_token.get(AUTH_VERSION_CLAIM) != current_version:
+        raise InvalidToken('Token has been revoked.')
+
+
+class AuthClaimsJWTAuthentication(JWTAuthentication):
+    """JWT authentication that honours `auth_version` revocation.
+
+    Tokens without the claim (issued before claims were added) are treated as
+    regular JWTs and resolved against the database.
+    """
+
+    def get_user(self, validated_token):
+        if AUTH_VERSION_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+        if getattr(settings, 'JWT_STATELESS_AUTH', False):
+            try:
+                user_id = validated_token[api_settings.USER_ID_CLAIM]
+            except KeyError:
+                raise InvalidToken('Token contained no recognizable user identification')
+            check_auth_version(validated_token, get_auth_version(user_id))
+            return ClaimsUser(validated_token)
+        user = super().get_user(validated_token)
+        check_auth_version(validated_token, user.auth_version)
+        return user
+
+
+class AuthClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        return add_authorization_claims(super().get_token(user), user)
+
+
+class AuthClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refuse to mint access tokens from revoked refresh tokens."""
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        if AUTH_VERSION_CLAIM in refresh:
+            check_auth_version(refresh, get_auth_version(refresh[api_settings.USER_ID_CLAIM]))
+        return super().validate(attrs)
+
+
+class AuthClaimsTokenObtainPairView(InstrumentedViewMixin, PasswordHashingMixin, TokenObtainPairView):
+    serializer_class = AuthClaimsTokenObtainPairSerializer
+
+
+class AuthClaimsTokenRefreshView(InstrumentedViewMixin, TokenRefreshView):
+    serializer_class = AuthClaimsTokenRefreshSerializer
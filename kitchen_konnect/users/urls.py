@@ -1,12 +1,17 @@
+from django.conf import settings
 from django.urls import path
-from .views import RegisterView, UserDetailView
+from core.lazy import lazy_view
+from .views import RegisterView, RotateTokenView, UserDetailView, UserPhotoView
 from .views import NutritionistArea, RegulatorArea, AdminArea
-from .views import AdminUserList, AdminUserUpdate
+from .views import AdminUserList, AdminUserUpdate, AdminUserImport
 from .views import VerificationRequestCreate, VerificationRequestList, VerificationRequestReview
+from .views import VerificationRequestSummary, VerificationRequestBulkReview
 
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
     path('me/', UserDetailView.as_view(), name='user-detail'),
+    path('me/photo/', UserPhotoView.as_view(), name='user-photo'),
+    path('token/rotate/', RotateTokenView.as_view(), name='token-rotate'),
 ]
 
 urlpatterns += [
@@ -18,28 +23,43 @@ urlpatterns += [
 urlpatterns += [
     path('admin/users/', AdminUserList.as_view(), name='admin-user-list'),
     path('admin/users/<int:pk>/', AdminUserUpdate.as_view(), name='admin-user-update'),
+    path('admin/users/import/', AdminUserImport.as_view(), name='admin-user-import'),
 ]
 
 urlpatterns += [
     path('verification/', VerificationRequestCreate.as_view(), name='verification-create'),
     path('verification/requests/', VerificationRequestList.as_view(), name='verification-list'),
+    path('verification/requests/summary/', VerificationRequestSummary.as_view(), name='verification-summary'),
+    path('verification/requests/review/', VerificationRequestBulkReview.as_view(), name='verification-bulk-review'),
     path('verification/requests/<int:pk>/', VerificationRequestReview.as_view(), name='verification-review'),
 ]
-try:
-    # Prefer SimpleJWT token endpoints when available
-    from rest_framework_simplejwt.views import (
-        TokenObtainPairView,
-        TokenRefreshView,
-    )
-
+if settings.HAS_SIMPLEJWT:
+    # Prefer SimpleJWT token endpoints when available; tokens carry role,
+    # admin_level and auth_version claims (see users/tokens.py). The views
+    # are imported on first use to keep SimpleJWT out of worker start-up.
     urlpatterns += [
-        path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
-        path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+        path('token/', lazy_view('users.tokens.AuthClaimsTokenObtainPairView'), name='token_obtain_pair'),
+        path('token/refresh/', lazy_view('users.tokens.AuthClaimsTokenRefreshView'), name='token_refresh'),
     ]
-except Exception:
+else:
     # Fall back to DRF TokenAuth if simplejwt is not installed
-    from rest_framework.authtoken.views import obtain_auth_token
+    from .views import ObtainAuthTokenView
 
     urlpatterns += [
-        path('token/', obtain_auth_token, name='api_token_auth'),
+        path('token/', ObtainAuthTokenView.as_view(), name='api_token_auth'),
     ]
+
+if settings.ASYNC_AUTH_VIEWS:
+    # Async register/token/me/role-area views take precedence over the sync
+    # ones above (see users/async_views.py); token refresh stays sync.
+    from . import async_views
+
+    urlpatterns = [
+        path('register/', async_views.register, name='register'),
+        path('token/', async_views.obtain_token,
+             name='token_obtain_pair' if settings.HAS_SIMPLEJWT else 'api_token_auth'),
+        path('me/', async_views.me, name='user-detail'),
+        path('nutritionist-area/', async_views.nutritionist_area, name='nutritionist-area'),
+        path('regulator-area/', async_views.regulator_area, name='regulator-area'),
+        path('admin-area/', async_views.admin_area, name='admin-area'),
+    ] + urlpatterns
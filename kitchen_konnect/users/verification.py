@@ -0,0 +1,84 @@
+"""Verification request queries shared by the list, review and summary views."""
+import secrets
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from .models import VerificationRequest
+
+SUMMARY_CACHE_KEY = 'users:verification-summary'
+# The summary is cached under a version that signals bump after a request
+# is saved or deleted; the timeout only bounds staleness for processes that
+# do not share a cache backend with the writer.
+SUMMARY_VERSION_KEY = 'users:verification-summary-version'
+SUMMARY_CACHE_TIMEOUT = 300
+
+# Columns rendered by VerificationRequestSerializer; `reviewed_by` is
+# serialized as a primary key so only the FK column is needed.
+LIST_FIELDS = (
+    'id', 'requested_role', 'message', 'status', 'reviewed_by_id', 'reviewed_at', 'created_at',
+    'user__id', 'user__username',
+)
+
+
+def verification_list_queryset():
+    """Requests joined with their user and narrowed to the serialized columns."""
+    return VerificationRequest.objects.select_related('user').only(*LIST_FIELDS)
+
+
+def compute_verification_summary():
+    """Counts per status, per requested role and per (status, role) pair.
+
+    One `GROUP BY status, requested_role` query; the per-status and per-role
+    totals are rolled up from its rows.
+    """
+    by_status = {key: 0 for key, _ in VerificationRequest.STATUS_CHOICES}
+    by_role = {key: 0 for key, _ in VerificationRequest.REQUEST_CHOICES}
+    matrix = {key: dict.fromkeys(by_role, 0) for key in by_status}
+    rows = (
+        VerificationRequest.objects.order_by()
+        .values_list('status', 'requested_role')
+        .annotate(n=Count('id'))
+    )
+    total = 0
+    for status, role, n in rows:
+        total += n
+        by_status[status] = by_status.get(status, 0) + n
+        by_role[role] = by_role.get(role, 0) + n
+        matrix.setdefault(status, {})[role] = matrix.get(status, {}).get(role, 0) + n
+    return {'total': total, 'by_status': by_status, 'by_role': by_role, 'by_status_and_role': matrix}
+
+
+def _summary_version():
+    version = cache.get(SUMMARY_VERSION_KEY)
+    if version is None:
+        # a random start, so an evicted version does not bring back old entries
+        cache.add(SUMMARY_VERSION_KEY, secrets.randbits(48), None)
+        version = cache.get(SUMMARY_VERSION_KEY)
+    return version
+
+
+def get_verification_summary():
+    # the version is read before counting, so a summary counted while a
+    # change commits is stored under the retired version and never served
+    key = f'{SUMMARY_CACHE_KEY}:{_summary_version()}'
+    summary = cache.get(key)
+    if summary is None:
+        summary = compute_verification_summary()
+        cache.set(key, summary, SUMMARY_CACHE_TIMEOUT)
+    return summary
+
+
+def _bump_summary_version():
+    try:
+        cache.incr(SUMMARY_VERSION_KEY)
+    except ValueError:
+        cache.add(SUMMARY_VERSION_KEY, secrets.randbits(48), None)
+
+
+def invalidate_verification_summary():
+    """Retire the cached summary once the current transaction commits (at
+    once outside a transaction); bumping earlier would let a reader cache
+    the counts from before the commit under the new version."""
+    transaction.on_commit(_bump_summary_version)
@@ -1,6 +1,7 @@
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
-from rest_framework.authtoken.models import Token
+from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.parsers import MultiPartParser
 from rest_framework.views import APIView
 
 from .serializers import (
@@ -8,15 +9,90 @@ from .serializers import (
 	UserSerializer,
 	AdminUserSerializer,
 	VerificationRequestSerializer,
+	VerificationBulkReviewSerializer,
 )
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from .models import VerificationRequest
+from django.db import transaction
+from django.utils import timezone
+from core.conditional import ConditionalGetMixin
+from core.instrumentation import InstrumentedViewMixin
+from core.pagination import KeysetPagination
+from core.parsers import RawUploadParser
+from core.views import PhotoView
+from core.response_cache import CachedResponseMixin, ResponseCache, VARY_NONE, VARY_ROLE, VARY_USER
+from core.throttling import IPBucketThrottle, RouteBucketThrottle, UsernameBucketThrottle
+from .models import AuthToken, VerificationRequest
 
 User = get_user_model()
+from . import bulk_import
+from .hashing import hashing_limiter
 from .permissions import IsNutritionist, IsRegulator, IsAdminRole, IsAdminLevel
+from .review import apply_approved_roles, invalidate_reviewed_users, review_requests
+from .search import filter_users
+from .verification import get_verification_summary, verification_list_queryset
 
 
-class RegisterView(generics.CreateAPIView):
+def resolve_user(user):
+	"""Return a `CustomUser` for `request.user`.
+
+	In stateless JWT mode `request.user` is built from token claims; views
+	that need the full row (or a model instance to assign) load it here.
+	"""
+	if isinstance(user, User):
+		return user
+	return User.objects.get(pk=user.pk)
+
+
+def complete_registration(user, data):
+	"""Post-create steps shared by the sync and async register views.
+
+	Opens a verification request when a non-regular `desired_role` was asked
+	for, issues an API token and returns the response payload (plus
+	`access`/`refresh` JWTs when simplejwt is installed).
+	"""
+	desired = data.get('desired_role')
+	if desired and desired != User.ROLE_REGULAR:
+		VerificationRequest.objects.create(user=user, requested_role=desired, message=data.get('verification_message', ''))
+
+	token_obj = AuthToken.objects.create(user=user)
+	payload = {
+		'id': user.id,
+		'username': user.username,
+		'token': token_obj.key,
+		'token_expires_at': token_obj.expires_at,
+	}
+
+	# If simplejwt is available, issue access/refresh tokens as well
+	try:
+		from .tokens import refresh_token_for_user
+
+		refresh = refresh_token_for_user(user)
+		payload['access'] = str(refresh.access_token)
+		payload['refresh'] = str(refresh)
+	except Exception:
+		# simplejwt not installed or failed; ignore
+		pass
+	return payload
+
+
+AUTH_THROTTLES = (IPBucketThrottle, UsernameBucketThrottle, RouteBucketThrottle)
+
+
+class PasswordHashingMixin:
+	"""Throttles and load shedding for open views that hash passwords.
+
+	The `auth.*` token buckets answer 429 to clients over their rate and
+	`hashing_limiter` answers 503 when the process is already busy hashing,
+	so a credential-stuffing burst cannot occupy every worker.
+	"""
+
+	throttle_scope = 'auth'
+	throttle_classes = AUTH_THROTTLES
+	concurrency_limiter = hashing_limiter
+
+
+class RegisterView(InstrumentedViewMixin, PasswordHashingMixin, generics.CreateAPIView):
 	serializer_class = RegisterSerializer
 	permission_classes = [permissions.AllowAny]
 
@@ -30,80 +106,118 @@ class RegisterView(generics.CreateAPIView):
 		serializer = self.get_serializer(data=request.data)
 		serializer.is_valid(raise_exception=True)
 		user = serializer.save()
-
-		# If user requested a non-regular role at registration, create a verification request
-		desired = request.data.get('desired_role')
-		if desired and desired != User.ROLE_REGULAR:
-			VerificationRequest.objects.create(user=user, requested_role=desired, message=request.data.get('verification_message', ''))
-
-		# Create or get DRF authtoken key
-		token_obj, _ = Token.objects.get_or_create(user=user)
-		payload = {
-			'id': user.id,
-			'username': user.username,
-			'token': token_obj.key,
-		}
-
-		# If simplejwt is available, issue access/refresh tokens as well
-		try:
-			from rest_framework_simplejwt.tokens import RefreshToken
-
-			refresh = RefreshToken.for_user(user)
-			payload['access'] = str(refresh.access_token)
-			payload['refresh'] = str(refresh)
-		except Exception:
-			# simplejwt not installed or failed; ignore
-			pass
-
+		payload = complete_registration(user, request.data)
 		headers = self.get_success_headers(serializer.data)
 		return Response(payload, status=status.HTTP_201_CREATED, headers=headers)
 
 
-class UserDetailView(generics.RetrieveAPIView):
+class ObtainAuthTokenView(InstrumentedViewMixin, PasswordHashingMixin, ObtainAuthToken):
+	"""Token obtain view for expiring API tokens, used when simplejwt is not installed."""
+
+	def post(self, request, *args, **kwargs):
+		serializer = self.get_serializer(data=request.data)
+		serializer.is_valid(raise_exception=True)
+		token = AuthToken.objects.for_user(serializer.validated_data['user'])
+		return Response({'token': token.key, 'expires_at': token.expires_at})
+
+
+class RotateTokenView(InstrumentedViewMixin, APIView):
+	"""Replace the API token the request was authenticated with by a new one.
+
+	The old key stops working immediately; the new one gets a full
+	`AUTH_TOKEN_TTL`.
+	"""
+
+	permission_classes = [permissions.IsAuthenticated]
+
+	def post(self, request, *args, **kwargs):
+		if not isinstance(request.auth, AuthToken):
+			return Response({'detail': 'Only API tokens can be rotated.'}, status=status.HTTP_400_BAD_REQUEST)
+		with transaction.atomic():
+			AuthToken.objects.filter(pk=request.auth.pk).delete()
+			token = AuthToken.objects.create(user_id=request.auth.user_id)
+		return Response({'token': token.key, 'expires_at': token.expires_at})
+
+
+class UserDetailView(InstrumentedViewMixin, ConditionalGetMixin, CachedResponseMixin, generics.RetrieveAPIView):
 	serializer_class = UserSerializer
 	permission_classes = [permissions.IsAuthenticated]
+	response_cache = ResponseCache(timeout=300, vary=VARY_USER, depends_on=('users.CustomUser:user',))
+	# served from a read replica when configured (see config/db_router.py)
+	replica_reads = True
 
 	def get_object(self):
-		return self.request.user
+		return resolve_user(self.request.user)
+
+	def conditional_validators(self):
+		# one row, so its own updated_at will do; the authenticated user
+		# (token snapshot or full row) usually has it
+		user = self.request.user
+		if isinstance(user, User) and 'updated_at' not in user.get_deferred_fields():
+			updated_at = user.updated_at
+		else:
+			updated_at = User.objects.filter(pk=user.pk).values_list('updated_at', flat=True).first()
+		return [updated_at.isoformat() if updated_at is not None else '-'], updated_at
 
 
-class NutritionistArea(APIView):
+class UserPhotoView(PhotoView):
+	permission_classes = [permissions.IsAuthenticated]
+
+	def get_object(self):
+		return resolve_user(self.request.user)
+
+
+class NutritionistArea(InstrumentedViewMixin, CachedResponseMixin, APIView):
 	"""Example endpoint that only nutritionists can access."""
 
 	permission_classes = [IsNutritionist]
+	response_cache = ResponseCache(timeout=600, vary=VARY_ROLE)
 
 	def get(self, request, *args, **kwargs):
 		return Response({"detail": "nutritionist area"})
 
 
-class RegulatorArea(APIView):
+class RegulatorArea(InstrumentedViewMixin, CachedResponseMixin, APIView):
 	permission_classes = [IsRegulator]
+	response_cache = ResponseCache(timeout=600, vary=VARY_ROLE)
 
 	def get(self, request, *args, **kwargs):
 		return Response({"detail": "regulator area"})
 
 
-class AdminArea(APIView):
+class AdminArea(InstrumentedViewMixin, CachedResponseMixin, APIView):
 	# require admin_level >= 50 by default
 	permission_classes = [IsAdminLevel]
 	min_admin_level = 50
+	response_cache = ResponseCache(timeout=600, vary=VARY_ROLE)
 
 	def get(self, request, *args, **kwargs):
 		return Response({"detail": "admin area (min level 50)"})
 
 
-class AdminUserList(generics.ListAPIView):
-	"""List all users (admin-only)."""
+class AdminUserList(InstrumentedViewMixin, ConditionalGetMixin, CachedResponseMixin, generics.ListAPIView):
+	"""List users (admin-only).
+
+	Supports `?search=` over username/email/name/role and the `?role=` and
+	`?admin_level[__gte|__lte|__gt|__lt]=` filters (see users/search.py).
+	"""
 
 	permission_classes = [IsAdminLevel]
 	min_admin_level = 50
 	serializer_class = AdminUserSerializer
+	replica_reads = True
+	# the list does not depend on who asks once the permission check passed
+	response_cache = ResponseCache(timeout=60, vary=VARY_NONE, depends_on=('users.CustomUser',))
+	# `?cursor=` switches to keyset pagination (see core/pagination.py)
+	pagination_class = KeysetPagination
+	keyset_ordering = ('id',)
 
 	def get_queryset(self):
-		return User.objects.all().order_by('id')
+		qs = User.objects.only('id', 'username', 'email', 'role', 'admin_level').order_by('id')
+		return filter_users(qs, self.request.query_params)
 
 
-class AdminUserUpdate(generics.UpdateAPIView):
+class AdminUserUpdate(InstrumentedViewMixin, generics.UpdateAPIView):
 	"""Update role/admin_level for a user (admin-only)."""
 
 	permission_classes = [IsAdminLevel]
@@ -112,54 +226,136 @@ class AdminUserUpdate(generics.UpdateAPIView):
 	queryset = User.objects.all()
 
 
-class VerificationRequestCreate(generics.CreateAPIView):
+class AdminUserImport(InstrumentedViewMixin, APIView):
+	"""Bulk-create users from an uploaded CSV or NDJSON file (top-level admins).
+
+	Send the file as multipart field `file`, or as the raw request body with a
+	`text/csv` or `application/x-ndjson` content type. `?input_format=csv|ndjson`
+	overrides the format guessed from the name and content type (`?format=` is
+	DRF's renderer override), and `?dry_run=1` only validates. Responds with the
+	number of users created and per-row errors.
+	"""
+
+	permission_classes = [IsAdminLevel]
+	min_admin_level = 100
+	parser_classes = [MultiPartParser, RawUploadParser]
+	max_reported_errors = 1000
+
+	def post(self, request, *args, **kwargs):
+		upload = request.data.get('file')
+		if upload is None:
+			return Response({'detail': 'No file uploaded.'}, status=status.HTTP_400_BAD_REQUEST)
+		fmt = request.query_params.get('input_format')
+		if fmt not in bulk_import.FORMATS:
+			content_type = getattr(upload, 'content_type', '') or request.content_type or ''
+			default = bulk_import.FORMAT_NDJSON if 'ndjson' in content_type else bulk_import.FORMAT_CSV
+			fmt = bulk_import.detect_format(getattr(upload, 'name', ''), default=default)
+		dry_run = request.query_params.get('dry_run') in ('1', 'true')
+		result = bulk_import.import_users_from_bytes(
+			upload, fmt,
+			workers=getattr(settings, 'USER_IMPORT_WORKERS', 1),
+			dry_run=dry_run,
+		)
+		return Response({
+			'created': result.created,
+			'error_count': len(result.errors),
+			'errors': result.errors[:self.max_reported_errors],
+		}, status=status.HTTP_201_CREATED if result.created and not dry_run else status.HTTP_200_OK)
+
+
+class VerificationRequestCreate(InstrumentedViewMixin, generics.CreateAPIView):
 	serializer_class = VerificationRequestSerializer
 	permission_classes = [permissions.IsAuthenticated]
 
 	def perform_create(self, serializer):
-		serializer.save(user=self.request.user)
+		serializer.save(user=resolve_user(self.request.user))
 
 
-class VerificationRequestList(generics.ListAPIView):
+class VerificationRequestList(InstrumentedViewMixin, ConditionalGetMixin, CachedResponseMixin, generics.ListAPIView):
 	"""Admins list verification requests (filter by status via ?status=)."""
 
 	serializer_class = VerificationRequestSerializer
 	permission_classes = [IsAdminLevel]
 	min_admin_level = 50
+	replica_reads = True
+	response_cache = ResponseCache(
+		timeout=60, vary=VARY_NONE, depends_on=('users.VerificationRequest', 'users.CustomUser'),
+	)
+	# rows show the requester's username, so user changes count too
+	conditional_models = ('users.VerificationRequest', 'users.CustomUser')
+	pagination_class = KeysetPagination
+	keyset_ordering = ('-created_at', '-id')
 
 	def get_queryset(self):
-		qs = VerificationRequest.objects.all()
+		qs = verification_list_queryset()
 		status = self.request.query_params.get('status')
 		if status:
 			qs = qs.filter(status=status)
 		return qs
 
 
-class VerificationRequestReview(generics.UpdateAPIView):
-	"""Admin approves/rejects verification requests."""
+class VerificationRequestSummary(InstrumentedViewMixin, APIView):
+	"""Counts of verification requests per status and per requested role."""
+
+	permission_classes = [IsAdminLevel]
+	min_admin_level = 50
+
+	def get(self, request, *args, **kwargs):
+		return Response(get_verification_summary())
+
+
+class VerificationRequestReview(InstrumentedViewMixin, generics.UpdateAPIView):
+	"""Admin approves/rejects verification requests.
+
+	The request row is locked and updated once, together with the user's
+	role change on approval, in one transaction (see users/review.py).
+	"""
 
 	serializer_class = VerificationRequestSerializer
 	permission_classes = [IsAdminLevel]
 	min_admin_level = 50
-	queryset = VerificationRequest.objects.all()
+	queryset = VerificationRequest.objects.select_related('user')
+
+	def get_queryset(self):
+		# lock the request (not the joined user) until the review commits
+		return super().get_queryset().select_for_update(of=('self',))
+
+	def update(self, request, *args, **kwargs):
+		self.changed_versions = {}
+		with transaction.atomic():
+			response = super().update(request, *args, **kwargs)
+		invalidate_reviewed_users(self.changed_versions)
+		return response
 
 	def perform_update(self, serializer):
-		instance = serializer.instance
-		old_status = instance.status
-		serializer.save()
-		new_status = serializer.instance.status
-		# record reviewer and timestamp
-		serializer.instance.reviewed_by = self.request.user
-		from django.utils.timezone import now
-		serializer.instance.reviewed_at = now()
-		serializer.instance.save()
+		old_status = serializer.instance.status
+		# record reviewer and timestamp in the same UPDATE as the new status
+		instance = serializer.save(reviewed_by_id=self.request.user.pk, reviewed_at=timezone.now())
 		# When approving, change the user's role/admin_level accordingly
-		if old_status != new_status and new_status == VerificationRequest.STATUS_APPROVED:
-			user = serializer.instance.user
-			req_role = serializer.instance.requested_role
-			user.role = req_role
-			if req_role == User.ROLE_ADMIN:
-				user.admin_level = max(user.admin_level or 0, 100)
-			elif req_role == User.ROLE_REGULATOR:
-				user.admin_level = max(user.admin_level or 0, 50)
-			user.save()
+		if old_status != instance.status and instance.status == VerificationRequest.STATUS_APPROVED:
+			self.changed_versions = apply_approved_roles({instance.user_id: instance.requested_role})
+
+
+class VerificationRequestBulkReview(InstrumentedViewMixin, APIView):
+	"""Approve or reject many pending verification requests in one call.
+
+	POST `{"ids": [...], "status": "approved" | "rejected"}`. Requests that
+	are missing or no longer pending are returned in `skipped`.
+	"""
+
+	permission_classes = [IsAdminLevel]
+	min_admin_level = 50
+
+	def post(self, request, *args, **kwargs):
+		serializer = VerificationBulkReviewSerializer(data=request.data)
+		serializer.is_valid(raise_exception=True)
+		result = review_requests(
+			serializer.validated_data['ids'],
+			serializer.validated_data['status'],
+			reviewer_id=request.user.pk,
+		)
+		return Response({
+			'reviewed': result.reviewed,
+			'skipped': result.skipped,
+			'users_updated': result.users_updated,
+		})